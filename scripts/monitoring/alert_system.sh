@@ -121,7 +121,7 @@ check_system_resources() {
 # Check service health
 check_services() {
     local pid_dir="$PROJECT_ROOT/pids"
-    local services=("celery_worker" "celery_beat" "autonomous")
+    local services=("celery_worker_realtime" "celery_worker_email" "celery_worker" "celery_beat" "autonomous")
     
     for service in "${services[@]}"; do
         local pid_file="$pid_dir/${service}.pid"
@@ -320,6 +320,8 @@ output_detailed() {
 # Main health check function
 main() {
     # Initialize health checks
+    check_process "celery_worker_realtime"
+    check_process "celery_worker_email"
     check_process "celery_worker"
     check_process "celery_beat"
     check_process "autonomous"
@@ -109,7 +109,7 @@ Write-Header "STARTING SERVICES"
 # Start Celery Worker
 Write-Info "Starting Celery Worker..."
 try {
-    $workerProcess = Start-Process -FilePath "celery" -ArgumentList "-A", "src.celery_app", "worker", "--loglevel=info", "--pool=solo" -WindowStyle Minimized -PassThru
+    $workerProcess = Start-Process -FilePath "celery" -ArgumentList "-A", "src.celery_app", "worker", "-Q", "realtime,email,batch,celery", "--loglevel=info", "--pool=solo" -WindowStyle Minimized -PassThru
     Start-Sleep 3
     
     if (-not $workerProcess.HasExited) {
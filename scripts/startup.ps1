@@ -233,7 +233,7 @@ USE_MOCK_EMAIL_CLIENT=False
     
     # Start Celery Worker
     $celeryWorkerStarted = Start-ServiceSafely -ServiceName "Celery Worker" -StartScript {
-        $celeryCmd = "celery -A src.celery_app worker --loglevel=info --pool=solo"
+        $celeryCmd = "celery -A src.celery_app worker -Q realtime,email,batch,celery --loglevel=info --pool=solo"
         Start-Process -FilePath "powershell" -ArgumentList "-Command", $celeryCmd -WindowStyle Minimized
     } -TestScript {
         # Check if celery worker is running by checking Redis for worker registration
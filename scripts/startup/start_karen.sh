@@ -124,31 +124,45 @@ start_redis() {
     fi
 }
 
-# Start Celery Worker
+# Start one Celery worker per latency class (see src/celery_queues.py).
+# --autoscale=max,min bounds the pool; QueueWaitAutoscaler sizes it from queue wait.
 start_celery_worker() {
-    log "Starting Celery Worker..."
+    start_celery_worker_for "celery_worker_realtime" "realtime" "realtime" "8,2"
+    start_celery_worker_for "celery_worker_email" "email" "email" "4,1"
+    start_celery_worker_for "celery_worker" "batch" "batch,celery" "2,1"
+}
+
+start_celery_worker_for() {
+    local service="$1"
+    local node="$2"
+    local queues="$3"
+    local autoscale="$4"
+
+    log "Starting Celery Worker ($queues)..."
     
     cd "$PROJECT_ROOT"
     
-    if [[ -f "$PID_DIR/celery_worker.pid" ]]; then
-        if kill -0 "$(cat "$PID_DIR/celery_worker.pid")" 2>/dev/null; then
-            info "Celery Worker is already running"
+    if [[ -f "$PID_DIR/$service.pid" ]]; then
+        if kill -0 "$(cat "$PID_DIR/$service.pid")" 2>/dev/null; then
+            info "Celery Worker ($queues) is already running"
             return 0
         fi
     fi
     
     nohup python3 -m celery -A src.celery_app:celery_app worker \
         -l INFO \
-        --pool=solo \
-        --pidfile="$PID_DIR/celery_worker.pid" \
-        > "$LOG_DIR/celery_worker.log" 2>&1 &
+        -n "$node@%h" \
+        -Q "$queues" \
+        --autoscale="$autoscale" \
+        --pidfile="$PID_DIR/$service.pid" \
+        > "$LOG_DIR/$service.log" 2>&1 &
     
     sleep 3
     
-    if [[ -f "$PID_DIR/celery_worker.pid" ]] && kill -0 "$(cat "$PID_DIR/celery_worker.pid")" 2>/dev/null; then
-        log "Celery Worker started successfully (PID: $(cat "$PID_DIR/celery_worker.pid"))"
+    if [[ -f "$PID_DIR/$service.pid" ]] && kill -0 "$(cat "$PID_DIR/$service.pid")" 2>/dev/null; then
+        log "Celery Worker ($queues) started successfully (PID: $(cat "$PID_DIR/$service.pid"))"
     else
-        error "Failed to start Celery Worker"
+        error "Failed to start Celery Worker ($queues)"
         exit 1
     fi
 }
@@ -285,16 +299,18 @@ health_check() {
         ((issues++))
     fi
     
-    # Check Celery Worker
-    if [[ -f "$PID_DIR/celery_worker.pid" ]]; then
-        if ! kill -0 "$(cat "$PID_DIR/celery_worker.pid")" 2>/dev/null; then
-            error "Celery Worker health check failed"
+    # Check Celery Workers
+    for worker in celery_worker_realtime celery_worker_email celery_worker; do
+        if [[ -f "$PID_DIR/$worker.pid" ]]; then
+            if ! kill -0 "$(cat "$PID_DIR/$worker.pid")" 2>/dev/null; then
+                error "Celery Worker ($worker) health check failed"
+                ((issues++))
+            fi
+        else
+            error "Celery Worker ($worker) PID file not found"
             ((issues++))
         fi
-    else
-        error "Celery Worker PID file not found"
-        ((issues++))
-    fi
+    done
     
     # Check Celery Beat
     if [[ -f "$PID_DIR/celery_beat.pid" ]]; then
@@ -348,6 +364,8 @@ main() {
   "started_at": "$(date -Iseconds)",
   "environment": "$ENVIRONMENT",
   "pids": {
+    "celery_worker_realtime": "$(cat "$PID_DIR/celery_worker_realtime.pid" 2>/dev/null || echo 'null')",
+    "celery_worker_email": "$(cat "$PID_DIR/celery_worker_email.pid" 2>/dev/null || echo 'null')",
     "celery_worker": "$(cat "$PID_DIR/celery_worker.pid" 2>/dev/null || echo 'null')",
     "celery_beat": "$(cat "$PID_DIR/celery_beat.pid" 2>/dev/null || echo 'null')",
     "fastapi": "$(cat "$PID_DIR/fastapi.pid" 2>/dev/null || echo 'null')",
@@ -109,7 +109,9 @@ stop_celery_beat() {
 
 # Stop Celery Worker
 stop_celery_worker() {
-    log "Stopping Celery Worker..."
+    log "Stopping Celery Workers..."
+    stop_service "celery_worker_realtime" 45
+    stop_service "celery_worker_email" 45
     stop_service "celery_worker" 45
 }
 
@@ -185,7 +187,7 @@ generate_shutdown_report() {
         echo "Services Status After Shutdown:"
         echo "------------------------------"
         
-        for service in celery_worker celery_beat fastapi frontend autonomous; do
+        for service in celery_worker_realtime celery_worker_email celery_worker celery_beat fastapi frontend autonomous; do
             local pid_file="$PID_DIR/${service}.pid"
             if [[ -f "$pid_file" ]]; then
                 echo "⚠️  $service: PID file still exists"
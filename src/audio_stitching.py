@@ -0,0 +1,94 @@
+"""
+Audio Stitching - Template segmentation and frame-level audio concatenation
+Used by ElevenLabsVoiceHandler to assemble dynamic prompts from cached segments.
+
+Templates are split into static text and {variable} slots so each piece can be
+synthesized and cached on its own. Segments rendered with the same output
+format are joined without re-encoding: MP3 frames are concatenated after
+stripping ID3 tags, WAV files by appending their PCM frames, raw PCM directly.
+"""
+
+import io
+import re
+import wave
+from typing import Dict, List, Sequence, Tuple
+
+_SLOT = re.compile(r'\{(\w+)\}')
+_SPEAKABLE = re.compile(r'[A-Za-z0-9]')
+
+
+def split_template(template: str) -> List[Tuple[str, bool]]:
+    """[(text, is_variable)] in order; variable entries hold the slot name"""
+    segments = []
+    position = 0
+    for match in _SLOT.finditer(template):
+        if match.start() > position:
+            segments.append((template[position:match.start()], False))
+        segments.append((match.group(1), True))
+        position = match.end()
+    if position < len(template):
+        segments.append((template[position:], False))
+    return segments
+
+
+def template_variables(template: str) -> List[str]:
+    return [name for name, is_variable in split_template(template) if is_variable]
+
+
+def segment_texts(template: str, variables: Dict[str, str]) -> List[Tuple[str, bool]]:
+    """
+    Speakable (text, is_variable) pieces for a filled template. Static text
+    loses the leading punctuation left over from the preceding slot; pieces
+    with nothing to say (", ", ".") are dropped.
+    """
+    pieces = []
+    for text, is_variable in split_template(template):
+        if is_variable:
+            text = str(variables.get(text, f"{{{text}}}"))
+        else:
+            text = text.lstrip(' ,;:!?.')
+        text = text.strip()
+        if _SPEAKABLE.search(text):
+            pieces.append((text, is_variable))
+    return pieces
+
+
+def _strip_id3(data: bytes) -> bytes:
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b'TAG':
+        data = data[:-128]
+    return data
+
+
+def concat_mp3(parts: Sequence[bytes]) -> bytes:
+    """Join MP3 streams of the same format frame-for-frame"""
+    return b''.join(_strip_id3(part) for part in parts)
+
+
+def concat_wav(parts: Sequence[bytes]) -> bytes:
+    """Join WAV files sharing channels, sample width and rate"""
+    out = io.BytesIO()
+    writer = None
+    try:
+        for part in parts:
+            with wave.open(io.BytesIO(part)) as reader:
+                if writer is None:
+                    writer = wave.open(out, 'wb')
+                    writer.setparams(reader.getparams())
+                writer.writeframes(reader.readframes(reader.getnframes()))
+    finally:
+        if writer is not None:
+            writer.close()
+    return out.getvalue()
+
+
+def concat_audio(parts: Sequence[bytes], output_format: str) -> bytes:
+    """Concatenate segments for an ElevenLabs output format (mp3_*, pcm_*, or wav)"""
+    if output_format.startswith('mp3'):
+        return concat_mp3(parts)
+    if output_format.startswith('wav'):
+        return concat_wav(parts)
+    return b''.join(parts)
@@ -9,8 +9,9 @@ Author: Phone Engineer Agent
 import os
 import json
 import logging
-from datetime import datetime, timedelta, time
-from typing import Dict, List, Optional, Tuple, Any
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, time
+from typing import Dict, Iterable, List, Optional, Tuple, Any
 from dataclasses import dataclass, asdict
 from enum import Enum
 import pytz
@@ -85,6 +86,46 @@ class SpecialDay:
             'recurring_annual': self.recurring_annual
         }
 
+class OpenHoursTimeline:
+    """
+    Open intervals compiled from the schedule for a range of local dates.
+    
+    Intervals are stored as sorted epoch-second bounds (both inclusive), with
+    touching intervals merged (e.g. overnight hours running into the next day),
+    so is-open, next-open and next-close are bisect lookups.
+    """
+    
+    def __init__(self, start_date: date, end_date: date, covered_from: float, covered_until: float):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.covered_from = covered_from
+        self.covered_until = covered_until
+        self.starts: List[float] = []
+        self.ends: List[float] = []
+    
+    def add(self, start: float, end: float):
+        """Append an interval; must be called in chronological order"""
+        if self.ends and start - self.ends[-1] <= 1.0:
+            self.ends[-1] = max(self.ends[-1], end)
+        else:
+            self.starts.append(start)
+            self.ends.append(end)
+    
+    def covers(self, start: float, end: float) -> bool:
+        return self.covered_from <= start and end < self.covered_until
+    
+    def is_open(self, timestamp: float) -> bool:
+        index = bisect_right(self.starts, timestamp) - 1
+        return index >= 0 and timestamp <= self.ends[index]
+    
+    def next_opening(self, timestamp: float) -> Optional[float]:
+        index = bisect_right(self.starts, timestamp)
+        return self.starts[index] if index < len(self.starts) else None
+    
+    def next_closing(self, timestamp: float) -> Optional[float]:
+        index = bisect_right(self.ends, timestamp)
+        return self.ends[index] if index < len(self.ends) else None
+
 class BusinessHoursManager:
     """
     Comprehensive business hours management with:
@@ -95,8 +136,16 @@ class BusinessHoursManager:
     - Special events and closures
     - Time zone support
     - Dynamic messaging based on context
+    
+    Open/closed intervals are compiled into an OpenHoursTimeline and rebuilt
+    when the schedule changes through this class. Call invalidate_timeline()
+    after editing special_days or seasonal_adjustments directly.
     """
     
+    TIMELINE_DAYS_BEHIND = 7
+    TIMELINE_DAYS_AHEAD = 90
+    NEXT_EVENT_SEARCH_DAYS = 14
+    
     def __init__(self, timezone: str = 'America/New_York'):
         self.timezone = pytz.timezone(timezone)
         self.company_name = "757 Handy"
@@ -144,6 +193,9 @@ class BusinessHoursManager:
         # Initialize US holidays
         self.us_holidays = holidays.US(years=range(2024, 2030))
         
+        # Compiled open intervals, built lazily for the dates queried
+        self._timeline: Optional[OpenHoursTimeline] = None
+        
         # Special days and company holidays
         self.special_days: Dict[str, SpecialDay] = {}
         self._initialize_company_holidays()
@@ -238,30 +290,87 @@ class BusinessHoursManager:
         if check_time is None:
             check_time = datetime.now(self.timezone)
         
-        # Localize if naive datetime
+        timestamp = self._to_local(check_time).timestamp()
+        return self._timeline_covering(timestamp, timestamp).is_open(timestamp)
+    
+    def classify_business_hours(self, timestamps: Iterable[datetime]) -> List[bool]:
+        """Open/closed flag for each timestamp, e.g. to split historical calls into business and after-hours"""
+        epochs = [self._to_local(timestamp).timestamp() for timestamp in timestamps]
+        if not epochs:
+            return []
+        
+        timeline = self._timeline_covering(min(epochs), max(epochs))
+        starts = timeline.starts
+        ends = timeline.ends
+        results = []
+        for epoch in epochs:
+            index = bisect_right(starts, epoch) - 1
+            results.append(index >= 0 and epoch <= ends[index])
+        return results
+    
+    def invalidate_timeline(self):
+        """Drop the compiled timeline; the next query rebuilds it from the current schedule"""
+        self._timeline = None
+    
+    def _to_local(self, check_time: datetime) -> datetime:
+        # Localize naive datetimes, then convert to business timezone
         if check_time.tzinfo is None:
             check_time = self.timezone.localize(check_time)
-        
-        # Convert to business timezone
-        local_time = check_time.astimezone(self.timezone)
-        
-        # Check for special days first
-        date_str = local_time.strftime('%Y-%m-%d')
+        return check_time.astimezone(self.timezone)
+    
+    def _hours_for_date(self, check_date: date) -> Optional[BusinessHours]:
+        """Effective hours for a local date: special day, then federal holiday (closed), then weekly"""
+        date_str = check_date.strftime('%Y-%m-%d')
         if date_str in self.special_days:
-            special_day = self.special_days[date_str]
-            return special_day.hours.is_open_at(local_time.time())
+            return self.special_days[date_str].hours
         
-        # Check if it's a federal holiday
-        if local_time.date() in self.us_holidays:
-            return False  # Closed on federal holidays
+        if check_date in self.us_holidays:
+            return None  # Closed on federal holidays
         
-        # Check regular weekly hours
-        weekday = local_time.weekday()
+        weekday = check_date.weekday()
         if weekday in self.weekly_hours:
-            business_hours = self._get_adjusted_hours(local_time, weekday)
-            return business_hours.is_open_at(local_time.time())
+            return self._get_adjusted_hours(check_date, weekday)
         
-        return False
+        return None
+    
+    def _timeline_covering(self, start: float, end: float) -> OpenHoursTimeline:
+        """Current timeline, recompiled over a wider date range if [start, end] is not covered"""
+        timeline = self._timeline
+        if timeline is not None and timeline.covers(start, end):
+            return timeline
+        
+        start_date = datetime.fromtimestamp(start, self.timezone).date() - timedelta(days=self.TIMELINE_DAYS_BEHIND)
+        end_date = datetime.fromtimestamp(end, self.timezone).date() + timedelta(days=self.TIMELINE_DAYS_AHEAD)
+        if timeline is not None:
+            start_date = min(start_date, timeline.start_date)
+            end_date = max(end_date, timeline.end_date)
+        
+        self._timeline = self._compile_timeline(start_date, end_date)
+        return self._timeline
+    
+    def _compile_timeline(self, start_date: date, end_date: date) -> OpenHoursTimeline:
+        """Build open intervals for local dates in [start_date, end_date)"""
+        def local_epoch(day: date, at: time) -> float:
+            return self.timezone.localize(datetime.combine(day, at)).timestamp()
+        
+        timeline = OpenHoursTimeline(start_date, end_date,
+                                     local_epoch(start_date, time.min), local_epoch(end_date, time.min))
+        check_date = start_date
+        while check_date < end_date:
+            hours = self._hours_for_date(check_date)
+            if hours and hours.open_time and hours.close_time:
+                open_at = local_epoch(check_date, hours.open_time)
+                close_at = local_epoch(check_date, hours.close_time)
+                if hours.open_time <= hours.close_time:
+                    timeline.add(open_at, close_at)
+                else:
+                    # Overnight hours: open from midnight until close, and from open until midnight
+                    timeline.add(local_epoch(check_date, time.min), close_at)
+                    timeline.add(open_at, local_epoch(check_date + timedelta(days=1), time.min) - 1e-6)
+            check_date += timedelta(days=1)
+        
+        logger.debug(f"Compiled business hours timeline {start_date} to {end_date}: {len(timeline.starts)} open intervals")
+        return timeline
     
     def _get_adjusted_hours(self, check_date: datetime, weekday: int) -> BusinessHours:
         """Get business hours adjusted for seasonal changes"""
@@ -384,90 +493,50 @@ class BusinessHoursManager:
     
     def _get_next_opening(self, from_time: datetime) -> Optional[Dict[str, Any]]:
         """Get next opening time"""
-        search_date = from_time.date()
-        search_time = from_time.time()
-        
-        # Search up to 14 days ahead
-        for days_ahead in range(14):
-            check_date = search_date + timedelta(days=days_ahead)
-            check_datetime = datetime.combine(check_date, time.min).replace(tzinfo=self.timezone)
-            weekday = check_date.weekday()
-            
-            # Skip if no hours defined for this weekday
-            if weekday not in self.weekly_hours:
-                continue
-            
-            # Check for special day
-            date_str = check_date.strftime('%Y-%m-%d')
-            if date_str in self.special_days:
-                special_day = self.special_days[date_str]
-                if special_day.hours.open_time:
-                    open_time = special_day.hours.open_time
-                    if days_ahead == 0 and open_time <= search_time:
-                        continue  # Already passed today's opening
-                    
-                    return {
-                        'time': open_time.strftime('%I:%M %p'),
-                        'date': check_date.strftime('%Y-%m-%d'),
-                        'day': check_date.strftime('%A'),
-                        'is_today': days_ahead == 0,
-                        'is_tomorrow': days_ahead == 1
-                    }
-                continue
-            
-            # Check federal holiday
-            if check_date in self.us_holidays:
-                continue
-            
-            # Check regular hours
-            business_hours = self._get_adjusted_hours(check_datetime, weekday)
-            if business_hours.open_time:
-                if days_ahead == 0 and business_hours.open_time <= search_time:
-                    continue  # Already passed today's opening
-                
-                return {
-                    'time': business_hours.open_time.strftime('%I:%M %p'),
-                    'date': check_date.strftime('%Y-%m-%d'),
-                    'day': check_date.strftime('%A'),
-                    'is_today': days_ahead == 0,
-                    'is_tomorrow': days_ahead == 1
-                }
+        local_time = self._to_local(from_time)
+        timestamp = local_time.timestamp()
+        search_end = timestamp + self.NEXT_EVENT_SEARCH_DAYS * 86400
         
-        return None
+        opening = self._timeline_covering(timestamp, search_end).next_opening(timestamp)
+        if opening is None:
+            return None
+        
+        opening_time = datetime.fromtimestamp(opening, self.timezone)
+        days_ahead = (opening_time.date() - local_time.date()).days
+        if days_ahead >= self.NEXT_EVENT_SEARCH_DAYS:
+            return None
+        
+        return {
+            'time': opening_time.strftime('%I:%M %p'),
+            'date': opening_time.strftime('%Y-%m-%d'),
+            'day': opening_time.strftime('%A'),
+            'is_today': days_ahead == 0,
+            'is_tomorrow': days_ahead == 1
+        }
     
     def _get_next_closing(self, from_time: datetime) -> Optional[Dict[str, Any]]:
         """Get next closing time"""
-        check_date = from_time.date()
-        weekday = check_date.weekday()
+        local_time = self._to_local(from_time)
+        timestamp = local_time.timestamp()
+        search_end = timestamp + self.NEXT_EVENT_SEARCH_DAYS * 86400
         
-        # Check today first
-        date_str = check_date.strftime('%Y-%m-%d')
-        if date_str in self.special_days:
-            special_day = self.special_days[date_str]
-            if special_day.hours.close_time and special_day.hours.close_time > from_time.time():
-                return {
-                    'time': special_day.hours.close_time.strftime('%I:%M %p'),
-                    'date': check_date.strftime('%Y-%m-%d'),
-                    'day': check_date.strftime('%A'),
-                    'is_today': True
-                }
-        elif weekday in self.weekly_hours:
-            check_datetime = datetime.combine(check_date, time.min).replace(tzinfo=self.timezone)
-            business_hours = self._get_adjusted_hours(check_datetime, weekday)
-            if business_hours.close_time and business_hours.close_time > from_time.time():
-                return {
-                    'time': business_hours.close_time.strftime('%I:%M %p'),
-                    'date': check_date.strftime('%Y-%m-%d'),
-                    'day': check_date.strftime('%A'),
-                    'is_today': True
-                }
+        closing = self._timeline_covering(timestamp, search_end).next_closing(timestamp)
+        if closing is None or closing > search_end:
+            return None
         
-        return None
+        closing_time = datetime.fromtimestamp(closing, self.timezone)
+        return {
+            'time': closing_time.strftime('%I:%M %p'),
+            'date': closing_time.strftime('%Y-%m-%d'),
+            'day': closing_time.strftime('%A'),
+            'is_today': closing_time.date() == local_time.date()
+        }
     
     def add_special_day(self, special_day: SpecialDay):
         """Add a special day (holiday, closure, etc.)"""
         date_str = special_day.date.strftime('%Y-%m-%d')
         self.special_days[date_str] = special_day
+        self.invalidate_timeline()
         logger.info(f"Added special day: {date_str} - {special_day.description}")
     
     def remove_special_day(self, date: datetime):
@@ -475,12 +544,14 @@ class BusinessHoursManager:
         date_str = date.strftime('%Y-%m-%d')
         if date_str in self.special_days:
             del self.special_days[date_str]
+            self.invalidate_timeline()
             logger.info(f"Removed special day: {date_str}")
     
     def update_weekly_hours(self, weekday: int, hours: BusinessHours):
         """Update regular weekly hours"""
         if 0 <= weekday <= 6:
             self.weekly_hours[weekday] = hours
+            self.invalidate_timeline()
             logger.info(f"Updated hours for {['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][weekday]}")
     
     def get_weekly_schedule(self) -> Dict[str, Any]:
@@ -519,12 +590,12 @@ class BusinessHoursManager:
                 })
         
         # Check federal holidays
-        for date in self.us_holidays:
-            if today <= date <= end_date:
+        for holiday in self.us_holidays:
+            if today <= holiday <= end_date:
                 upcoming.append({
-                    'date': date.strftime('%Y-%m-%d'),
+                    'date': holiday.strftime('%Y-%m-%d'),
                     'type': 'holiday',
-                    'description': self.us_holidays[date],
+                    'description': self.us_holidays[holiday],
                     'day_type': 'holiday',
                     'hours': BusinessHours(service_level=ServiceLevel.EMERGENCY_ONLY).to_dict()
                 })
@@ -613,6 +684,9 @@ class BusinessHoursManager:
             
         except Exception as e:
             logger.error(f"Failed to load configuration from {file_path}: {e}")
+        
+        # Rebuild even after a partial load so queries match the hours actually in effect
+        self.invalidate_timeline()
 
 if __name__ == "__main__":
     # Test the business hours manager
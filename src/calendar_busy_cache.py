@@ -0,0 +1,208 @@
+"""
+Calendar Busy Cache - Local free/busy intervals for CalendarClient
+Keeps each calendar's busy events for a rolling window so conflict checks and
+slot searches are answered locally instead of with a freebusy round-trip.
+
+The cache is filled by a full events.list sync and kept current with the
+events `syncToken`; our own create/update/delete calls are written through.
+All datetimes are naive UTC, matching CalendarClient's conventions.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[datetime, datetime]
+
+
+def parse_utc(value: str) -> datetime:
+    """Parse an RFC3339 timestamp or date into a naive UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def format_utc(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def event_busy_interval(event: Dict[str, Any]) -> Optional[Interval]:
+    """Return the (start, end) an event blocks, or None if it does not count as busy"""
+    if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+        return None
+    for attendee in event.get('attendees', []):
+        if attendee.get('self') and attendee.get('responseStatus') == 'declined':
+            return None
+
+    start = event.get('start', {})
+    end = event.get('end', {})
+    try:
+        start_dt = parse_utc(start.get('dateTime') or start['date'])
+        end_dt = parse_utc(end.get('dateTime') or end['date'])
+    except (KeyError, ValueError) as e:
+        logger.warning(f"Skipping calendar event {event.get('id')} with unreadable times: {e}")
+        return None
+    return (start_dt, end_dt) if end_dt > start_dt else None
+
+
+class _CalendarBusyState:
+    """Busy events for one calendar plus the merged interval index built from them"""
+
+    __slots__ = ('events', 'sync_token', 'coverage_start', 'coverage_end',
+                 'last_sync', 'stale', '_merged', '_merged_ends')
+
+    def __init__(self):
+        self.events: Dict[str, Interval] = {}
+        self.sync_token: Optional[str] = None
+        self.coverage_start: Optional[datetime] = None
+        self.coverage_end: Optional[datetime] = None
+        self.last_sync = 0.0
+        self.stale = True
+        self._merged: Optional[List[Interval]] = None
+        self._merged_ends: List[datetime] = []
+
+    def apply(self, event: Dict[str, Any]):
+        event_id = event.get('id')
+        if not event_id:
+            return
+        interval = event_busy_interval(event)
+        if interval and self.coverage_start and (interval[1] <= self.coverage_start
+                                                 or interval[0] >= self.coverage_end):
+            interval = None
+        if interval:
+            self.events[event_id] = interval
+        elif self.events.pop(event_id, None) is None:
+            return
+        self._merged = None
+
+    def merged(self) -> List[Interval]:
+        if self._merged is None:
+            merged: List[List[datetime]] = []
+            for start, end in sorted(self.events.values()):
+                if merged and start <= merged[-1][1]:
+                    if end > merged[-1][1]:
+                        merged[-1][1] = end
+                else:
+                    merged.append([start, end])
+            self._merged = [(start, end) for start, end in merged]
+            self._merged_ends = [end for _, end in self._merged]
+        return self._merged
+
+    def busy_between(self, start: datetime, end: datetime) -> List[Interval]:
+        merged = self.merged()
+        result = []
+        for index in range(bisect.bisect_right(self._merged_ends, start), len(merged)):
+            busy_start, busy_end = merged[index]
+            if busy_start >= end:
+                break
+            result.append((max(busy_start, start), min(busy_end, end)))
+        return result
+
+
+class BusyIntervalCache:
+    """
+    Per-calendar busy intervals over a rolling window with bounded staleness.
+
+    A calendar's data is served locally for `max_staleness_seconds` after its
+    last successful sync; after that the owner must run an incremental sync
+    before reading again. Ranges outside the window always go to the API.
+    """
+
+    def __init__(self, window_days: int = 30, max_staleness_seconds: float = 60.0,
+                 time_fn: Callable[[], float] = time.time):
+        self.window_days = window_days
+        self.max_staleness_seconds = max_staleness_seconds
+        self.time_fn = time_fn
+        self._calendars: Dict[str, _CalendarBusyState] = {}
+        self._lock = threading.RLock()
+
+    def _utcnow(self) -> datetime:
+        return datetime.fromtimestamp(self.time_fn(), tz=timezone.utc).replace(tzinfo=None)
+
+    def window_for(self, start: datetime, end: datetime) -> Optional[Interval]:
+        """Coverage a full sync should fetch for this query, or None if it is outside the window"""
+        window_start = self._utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        window_end = window_start + timedelta(days=self.window_days + 1)
+        if start < window_start or end > window_end:
+            return None
+        return window_start, window_end
+
+    def covers(self, calendar_id: str, start: datetime, end: datetime) -> bool:
+        with self._lock:
+            state = self._calendars.get(calendar_id)
+            return bool(state and state.coverage_start is not None
+                        and state.coverage_start <= start and end <= state.coverage_end)
+
+    def is_fresh(self, calendar_id: str) -> bool:
+        with self._lock:
+            state = self._calendars.get(calendar_id)
+            return bool(state and not state.stale
+                        and self.time_fn() - state.last_sync <= self.max_staleness_seconds)
+
+    def sync_token(self, calendar_id: str) -> Optional[str]:
+        with self._lock:
+            state = self._calendars.get(calendar_id)
+            return state.sync_token if state else None
+
+    def load_full(self, calendar_id: str, events: Iterable[Dict[str, Any]],
+                  sync_token: Optional[str], coverage_start: datetime, coverage_end: datetime):
+        """Replace a calendar's state with the result of a full events.list"""
+        state = _CalendarBusyState()
+        state.coverage_start = coverage_start
+        state.coverage_end = coverage_end
+        for event in events:
+            state.apply(event)
+        state.sync_token = sync_token
+        state.last_sync = self.time_fn()
+        state.stale = False
+        with self._lock:
+            self._calendars[calendar_id] = state
+        logger.debug(f"Busy cache loaded {len(state.events)} events for {calendar_id}")
+
+    def apply_changes(self, calendar_id: str, events: Iterable[Dict[str, Any]],
+                      sync_token: Optional[str]):
+        """Apply an incremental sync page set and record the new sync token"""
+        with self._lock:
+            state = self._calendars.get(calendar_id)
+            if state is None:
+                return
+            for event in events:
+                state.apply(event)
+            state.sync_token = sync_token
+            state.last_sync = self.time_fn()
+            state.stale = False
+
+    def record_event(self, calendar_id: str, event: Dict[str, Any]):
+        """Write through an event we created or changed ourselves"""
+        with self._lock:
+            state = self._calendars.get(calendar_id)
+            if state is not None:
+                state.apply(event)
+
+    def remove_event(self, calendar_id: str, event_id: str):
+        self.record_event(calendar_id, {'id': event_id, 'status': 'cancelled'})
+
+    def invalidate(self, calendar_id: Optional[str] = None):
+        """Force the next read to sync before it is answered"""
+        with self._lock:
+            states = self._calendars.values() if calendar_id is None else \
+                [self._calendars[calendar_id]] if calendar_id in self._calendars else []
+            for state in states:
+                state.stale = True
+
+    def drop(self, calendar_id: str):
+        with self._lock:
+            self._calendars.pop(calendar_id, None)
+
+    def busy_slots(self, calendar_id: str, start: datetime, end: datetime) -> List[Dict[str, str]]:
+        """Merged busy periods clipped to [start, end), shaped like a freebusy response"""
+        with self._lock:
+            state = self._calendars[calendar_id]
+            return [{'start': format_utc(busy_start), 'end': format_utc(busy_end)}
+                    for busy_start, busy_end in state.busy_between(start, end)]
@@ -2,10 +2,9 @@
 import os
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 from typing import List, Optional, Dict, Any, Tuple
 import re
-import requests
 from dataclasses import dataclass, field
 from enum import Enum
 
@@ -17,6 +16,11 @@ import google.auth.exceptions
 
 # Import enhanced OAuth token manager
 from .token_manager import get_credentials_with_auto_refresh
+from .calendar_busy_cache import BusyIntervalCache, parse_utc, format_utc
+from .slot_engine import SlotEngine, top_scored
+from .route_planner import (
+    Crew, DayPlan, PlannedAppointment, RoutePlanner, TravelTimeCache, create_travel_time_provider
+)
 
 # Google Calendar API scopes
 CALENDAR_SCOPES = [
@@ -138,7 +142,8 @@ DEFAULT_SERVICE_TYPES = {
 }
 
 class CalendarClient:
-    def __init__(self, email_address: str, token_path: str = None, credentials_path: str = None):
+    def __init__(self, email_address: str, token_path: str = None, credentials_path: str = None,
+                 busy_cache_window_days: int = 30, busy_cache_max_staleness_seconds: float = 60.0):
         """
         Initialize CalendarClient with secure OAuth token management
         
@@ -146,8 +151,18 @@ class CalendarClient:
             email_address: Email address for calendar access
             token_path: Legacy parameter, ignored (for backward compatibility)
             credentials_path: Legacy parameter, ignored (for backward compatibility)
+            busy_cache_window_days: Days ahead kept in the local free/busy cache
+            busy_cache_max_staleness_seconds: How long cached availability is served before re-syncing
         """
         self.email_address = email_address
+        self.busy_cache = BusyIntervalCache(
+            window_days=busy_cache_window_days,
+            max_staleness_seconds=busy_cache_max_staleness_seconds
+        )
+        self.travel_times = TravelTimeCache(
+            provider=create_travel_time_provider(),
+            fallback_fn=self._calculate_travel_time_heuristic
+        )
         
         # Legacy compatibility warnings
         if token_path:
@@ -258,62 +273,24 @@ class CalendarClient:
         return DEFAULT_SERVICE_TYPES['default']
     
     def calculate_travel_time(self, from_address: Optional[str], to_address: Optional[str]) -> int:
-        """Calculate travel time between addresses in minutes with enhanced logic"""
+        """Calculate travel time between addresses in minutes, memoized in the travel-time cache"""
         if not from_address or not to_address:
             return 0
         
         try:
-            # Check for Google Maps API key for accurate travel times
-            google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-            if google_maps_api_key:
-                return self._calculate_travel_time_google_maps(from_address, to_address, google_maps_api_key)
-            
-            # Fallback to heuristic-based calculation
-            return self._calculate_travel_time_heuristic(from_address, to_address)
-                
+            # Google Maps when GOOGLE_MAPS_API_KEY is set, heuristic estimate otherwise
+            return self.travel_times.travel_time(from_address, to_address)
         except Exception as e:
             logger.warning(f"Error calculating travel time: {e}")
             return 20  # Default travel time
     
-    def _calculate_travel_time_google_maps(self, from_address: str, to_address: str, api_key: str) -> int:
-        """Calculate travel time using Google Maps Distance Matrix API"""
-        try:
-            base_url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-            params = {
-                'origins': from_address,
-                'destinations': to_address,
-                'mode': 'driving',
-                'units': 'imperial',
-                'departure_time': 'now',
-                'traffic_model': 'best_guess',
-                'key': api_key
-            }
-            
-            response = requests.get(base_url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if data['status'] == 'OK' and data['rows']:
-                element = data['rows'][0]['elements'][0]
-                if element['status'] == 'OK':
-                    # Get duration in traffic if available, otherwise regular duration
-                    duration_key = 'duration_in_traffic' if 'duration_in_traffic' in element else 'duration'
-                    travel_seconds = element[duration_key]['value']
-                    travel_minutes = max(5, int(travel_seconds / 60))  # Minimum 5 minutes
-                    
-                    logger.info(f"Google Maps travel time: {from_address} -> {to_address}: {travel_minutes} minutes")
-                    return travel_minutes
-            
-            logger.warning(f"Google Maps API returned no results for {from_address} -> {to_address}")
-            return self._calculate_travel_time_heuristic(from_address, to_address)
-            
-        except requests.RequestException as e:
-            logger.warning(f"Google Maps API request failed: {e}")
-            return self._calculate_travel_time_heuristic(from_address, to_address)
-        except Exception as e:
-            logger.warning(f"Error with Google Maps travel time calculation: {e}")
-            return self._calculate_travel_time_heuristic(from_address, to_address)
+    def plan_day_routes(self, crews: List[Crew], appointments: List[PlannedAppointment]) -> DayPlan:
+        """Assign and order a day's appointments across crews to minimize drive time.
+        
+        Travel times for all depots and stops are fetched as one cached matrix, so
+        a full day is planned in one pass instead of slot-by-slot.
+        """
+        return RoutePlanner(self.travel_times).plan_day(crews, appointments)
     
     def _calculate_travel_time_heuristic(self, from_address: str, to_address: str) -> int:
         """Calculate travel time using heuristic-based approach"""
@@ -420,8 +397,8 @@ class CalendarClient:
         
         for busy_slot in busy_slots:
             try:
-                busy_start = datetime.fromisoformat(busy_slot['start'].replace('Z', '+00:00'))
-                busy_end = datetime.fromisoformat(busy_slot['end'].replace('Z', '+00:00'))
+                busy_start = parse_utc(busy_slot['start'])
+                busy_end = parse_utc(busy_slot['end'])
                 busy_time_slot = TimeSlot(busy_start, busy_end)
                 
                 if proposed_slot.overlaps_with(busy_time_slot):
@@ -496,122 +473,58 @@ class CalendarClient:
             logger.error("Failed to get availability for alternative slot suggestions")
             return []
         
-        # Convert busy slots to TimeSlot objects
         busy_periods = []
         for slot in busy_slots:
             try:
-                start_dt = datetime.fromisoformat(slot['start'].replace('Z', '+00:00')).replace(tzinfo=None)
-                end_dt = datetime.fromisoformat(slot['end'].replace('Z', '+00:00')).replace(tzinfo=None)
-                busy_periods.append(TimeSlot(start_dt, end_dt))
+                busy_periods.append((parse_utc(slot['start']), parse_utc(slot['end'])))
             except Exception as e:
                 logger.warning(f"Error parsing busy slot: {e}")
                 continue
         
-        # Sort busy periods by start time
-        busy_periods.sort(key=lambda x: x.start)
-        
-        # Find free slots
-        current_day = preferred_start.date()
+        # Merge buffered busy periods once, then sweep each day's allowed start range
+        engine = SlotEngine(busy_periods, buffer_minutes)
+        start_windows = []
         for day_offset in range(search_days):
-            check_date = current_day + timedelta(days=day_offset)
+            check_date = preferred_start.date() + timedelta(days=day_offset)
+            day_hours = (business_hours_start, business_hours_end)
             
-            # Skip weekends for business appointments unless emergency/urgent
+            # Skip weekends for business appointments unless emergency/urgent,
+            # which get limited weekend hours
             if check_date.weekday() >= 5:  # Saturday = 5, Sunday = 6
                 if urgency not in [AppointmentUrgency.EMERGENCY, AppointmentUrgency.URGENT]:
                     continue
-                # For emergency/urgent, allow limited weekend hours
-                if check_date.weekday() == 5:  # Saturday
-                    business_hours_start = 9
-                    business_hours_end = 15
-                else:  # Sunday
-                    business_hours_start = 10
-                    business_hours_end = 14
-            
-            # Check time slots throughout the business day
-            day_start = datetime.combine(check_date, datetime.min.time().replace(hour=business_hours_start))
-            day_end = datetime.combine(check_date, datetime.min.time().replace(hour=business_hours_end))
-            
-            # Generate 30-minute intervals throughout the day
-            current_time = day_start
-            while current_time + timedelta(minutes=duration_minutes + buffer_minutes) <= day_end:
-                proposed_end = current_time + timedelta(minutes=duration_minutes)
-                proposed_slot = TimeSlot(current_time, proposed_end)
-                
-                # Check if this slot conflicts with any busy period
-                has_conflict = False
-                for busy_period in busy_periods:
-                    # Add buffer time to busy periods
-                    buffered_busy = TimeSlot(
-                        busy_period.start - timedelta(minutes=buffer_minutes),
-                        busy_period.end + timedelta(minutes=buffer_minutes)
-                    )
-                    if proposed_slot.overlaps_with(buffered_busy):
-                        has_conflict = True
-                        break
-                
-                if not has_conflict:
-                    # Calculate priority score (closer to preferred time = higher score)
-                    time_diff = abs((current_time - preferred_start).total_seconds())
-                    base_score = max(0, 100 - (time_diff / 3600))  # Decrease by 1 point per hour
-                    
-                    # Adjust score based on urgency and priority
-                    urgency_multiplier = {
-                        AppointmentUrgency.EMERGENCY: 2.0,
-                        AppointmentUrgency.URGENT: 1.5,
-                        AppointmentUrgency.PREFERRED: 1.0,
-                        AppointmentUrgency.FLEXIBLE: 0.8
-                    }.get(urgency, 1.0)
-                    
-                    priority_bonus = {
-                        AppointmentPriority.EMERGENCY: 50,
-                        AppointmentPriority.HIGH: 20,
-                        AppointmentPriority.NORMAL: 0,
-                        AppointmentPriority.LOW: -10
-                    }.get(priority, 0)
-                    
-                    final_score = (base_score * urgency_multiplier) + priority_bonus
-                    
-                    # Bonus for same day (emergency/urgent preference)
-                    if current_time.date() == preferred_start.date() and urgency in [AppointmentUrgency.EMERGENCY, AppointmentUrgency.URGENT]:
-                        final_score += 30
-                    
-                    suggestions.append({
-                        'start': current_time.isoformat() + 'Z',
-                        'end': proposed_end.isoformat() + 'Z',
-                        'duration_minutes': duration_minutes,
-                        'priority_score': final_score,
-                        'day_of_week': check_date.strftime('%A'),
-                        'time_difference_hours': round(time_diff / 3600, 1),
-                        'urgency_level': urgency.value,
-                        'priority_level': priority.name
-                    })
-                    
-                    # Stop after finding enough suggestions (more for emergency/urgent)
-                    max_suggestions = {
-                        AppointmentUrgency.EMERGENCY: 15,
-                        AppointmentUrgency.URGENT: 12,
-                        AppointmentUrgency.PREFERRED: 10,
-                        AppointmentUrgency.FLEXIBLE: 8
-                    }.get(urgency, 10)
-                    
-                    if len(suggestions) >= max_suggestions:
-                        break
-                
-                # Move to next 30-minute slot
-                current_time += timedelta(minutes=30)
-            
-            max_suggestions = {
-                AppointmentUrgency.EMERGENCY: 15,
-                AppointmentUrgency.URGENT: 12,
-                AppointmentUrgency.PREFERRED: 10,
-                AppointmentUrgency.FLEXIBLE: 8
-            }.get(urgency, 10)
+                day_hours = (9, 15) if check_date.weekday() == 5 else (10, 14)
             
-            if len(suggestions) >= max_suggestions:
-                break
+            day_start = datetime.combine(check_date, time(hour=day_hours[0]))
+            day_end = datetime.combine(check_date, time(hour=day_hours[1]))
+            start_windows.append((day_start, day_end - timedelta(minutes=duration_minutes + buffer_minutes)))
+        
+        candidates = engine.candidate_starts(start_windows, duration_minutes, step_minutes=30)
+        
+        # Score candidates: closer to the preferred time is better, adjusted by urgency and priority
+        urgency_multiplier = {
+            AppointmentUrgency.EMERGENCY: 2.0,
+            AppointmentUrgency.URGENT: 1.5,
+            AppointmentUrgency.PREFERRED: 1.0,
+            AppointmentUrgency.FLEXIBLE: 0.8
+        }.get(urgency, 1.0)
         
-        # Sort suggestions by priority score (highest first)
-        suggestions.sort(key=lambda x: x['priority_score'], reverse=True)
+        priority_bonus = {
+            AppointmentPriority.EMERGENCY: 50,
+            AppointmentPriority.HIGH: 20,
+            AppointmentPriority.NORMAL: 0,
+            AppointmentPriority.LOW: -10
+        }.get(priority, 0)
+        
+        # Bonus for same day (emergency/urgent preference)
+        same_day_bonus = 30 if urgency in [AppointmentUrgency.EMERGENCY, AppointmentUrgency.URGENT] else 0
+        preferred_date = preferred_start.date()
+        
+        def score(candidate: datetime) -> float:
+            time_diff = abs((candidate - preferred_start).total_seconds())
+            base_score = max(0, 100 - (time_diff / 3600))  # Decrease by 1 point per hour
+            bonus = same_day_bonus if candidate.date() == preferred_date else 0
+            return (base_score * urgency_multiplier) + priority_bonus + bonus
         
         # Return different numbers of suggestions based on urgency
         return_count = {
@@ -621,8 +534,23 @@ class CalendarClient:
             AppointmentUrgency.FLEXIBLE: 4
         }.get(urgency, 5)
         
-        logger.info(f"Generated {len(suggestions)} alternative time slot suggestions for {urgency.value} urgency")
-        return suggestions[:return_count]
+        suggestions = []
+        for final_score, slot_start in top_scored(candidates, score, return_count):
+            time_diff = abs((slot_start - preferred_start).total_seconds())
+            suggestions.append({
+                'start': slot_start.isoformat() + 'Z',
+                'end': (slot_start + timedelta(minutes=duration_minutes)).isoformat() + 'Z',
+                'duration_minutes': duration_minutes,
+                'priority_score': final_score,
+                'day_of_week': slot_start.strftime('%A'),
+                'time_difference_hours': round(time_diff / 3600, 1),
+                'urgency_level': urgency.value,
+                'priority_level': priority.name
+            })
+        
+        logger.info(f"Generated {len(suggestions)} alternative time slot suggestions from "
+                    f"{len(candidates)} free candidates for {urgency.value} urgency")
+        return suggestions
     
     def find_optimal_slot(self, service_description: str, preferred_start: datetime,
                          from_address: Optional[str] = None, to_address: Optional[str] = None,
@@ -727,7 +655,22 @@ class CalendarClient:
 
     # --- Calendar specific methods will go here ---
     def get_availability(self, start_time_iso: str, end_time_iso: str, calendar_id: str = 'primary') -> Optional[List[Dict[str, str]]]:
-        """Gets free/busy information for a calendar."""
+        """
+        Gets free/busy information for a calendar.
+        
+        Ranges inside the busy cache window are answered locally; the cache is
+        re-synced with the events syncToken once it is older than the staleness bound.
+        """
+        try:
+            query_start, query_end = parse_utc(start_time_iso), parse_utc(end_time_iso)
+            cache_window = self.busy_cache.window_for(query_start, query_end)
+        except ValueError:
+            cache_window = None
+        
+        if cache_window and self.busy_cache.covers(calendar_id, query_start, query_end) \
+                and self.busy_cache.is_fresh(calendar_id):
+            return self.busy_cache.busy_slots(calendar_id, query_start, query_end)
+        
         if not self._ensure_valid_credentials():
             logger.error("Failed to ensure valid credentials for calendar operation.")
             return None
@@ -736,6 +679,9 @@ class CalendarClient:
             logger.error("Calendar service not available.")
             return None
         
+        if cache_window and self._sync_busy_cache(calendar_id, query_start, query_end, cache_window):
+            return self.busy_cache.busy_slots(calendar_id, query_start, query_end)
+        
         body = {
             "timeMin": start_time_iso,
             "timeMax": end_time_iso,
@@ -788,6 +734,7 @@ class CalendarClient:
             logger.info(f"Creating event '{summary}' from {start_datetime_iso} to {end_datetime_iso} on calendar {calendar_id}")
             created_event = self.service.events().insert(calendarId=calendar_id, body=event).execute()
             logger.info(f"Event created successfully: ID: {created_event.get('id')}, Link: {created_event.get('htmlLink')}")
+            self.busy_cache.record_event(calendar_id, created_event)
             return created_event
         except HttpError as e:
             logger.error(f"HttpError creating event '{summary}': {e.resp.status} - {e._get_reason()}", exc_info=True)
@@ -795,12 +742,122 @@ class CalendarClient:
         except Exception as e:
             logger.error(f"Error creating event '{summary}': {e}", exc_info=True)
             return None
+
+    def update_event(self, event_id: str, updates: Dict[str, Any],
+                     calendar_id: str = 'primary') -> Optional[Dict[str, Any]]:
+        """Patches an event, e.g. to reschedule it via 'start_time'/'end_time' updates."""
+        if not self._ensure_valid_credentials():
+            logger.error("Failed to ensure valid credentials for event update.")
+            return None
+            
+        if not self.service:
+            logger.error("Calendar service not available.")
+            return None
+
+        body = {key: updates[key] for key in ('summary', 'description') if key in updates}
+        for update_key, event_key in (('start_time', 'start'), ('end_time', 'end')):
+            value = updates.get(update_key)
+            if isinstance(value, datetime):
+                value = value.isoformat() + ('Z' if value.tzinfo is None else '')
+            if value:
+                body[event_key] = {'dateTime': value}
+
+        try:
+            logger.info(f"Updating event {event_id} on calendar {calendar_id}")
+            updated_event = self.service.events().patch(calendarId=calendar_id, eventId=event_id, body=body).execute()
+            self.busy_cache.record_event(calendar_id, updated_event)
+            return updated_event
+        except HttpError as e:
+            logger.error(f"HttpError updating event {event_id}: {e.resp.status} - {e._get_reason()}", exc_info=True)
+            self.busy_cache.invalidate(calendar_id)
+            return None
+        except Exception as e:
+            logger.error(f"Error updating event {event_id}: {e}", exc_info=True)
+            self.busy_cache.invalidate(calendar_id)
+            return None
+
+    def delete_event(self, event_id: str, calendar_id: str = 'primary') -> bool:
+        """Deletes (cancels) an event on the calendar."""
+        if not self._ensure_valid_credentials():
+            logger.error("Failed to ensure valid credentials for event deletion.")
+            return False
+            
+        if not self.service:
+            logger.error("Calendar service not available.")
+            return False
+
+        try:
+            logger.info(f"Deleting event {event_id} from calendar {calendar_id}")
+            self.service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
+            self.busy_cache.remove_event(calendar_id, event_id)
+            return True
+        except HttpError as e:
+            logger.error(f"HttpError deleting event {event_id}: {e.resp.status} - {e._get_reason()}", exc_info=True)
+            self.busy_cache.invalidate(calendar_id)
+            return False
+        except Exception as e:
+            logger.error(f"Error deleting event {event_id}: {e}", exc_info=True)
+            self.busy_cache.invalidate(calendar_id)
+            return False
+
+    def get_busy_times(self, start: datetime, end: datetime,
+                       calendar_id: str = 'primary') -> List[Dict[str, datetime]]:
+        """Busy periods between two naive UTC datetimes, as naive UTC datetimes."""
+        busy_slots = self.get_availability(format_utc(start), format_utc(end), calendar_id) or []
+        return [{'start': parse_utc(slot['start']), 'end': parse_utc(slot['end'])} for slot in busy_slots]
+
+    def _sync_busy_cache(self, calendar_id: str, query_start: datetime, query_end: datetime,
+                         cache_window: Tuple[datetime, datetime]) -> bool:
+        """Bring the busy cache up to date for a query; False means fall back to freeBusy."""
+        sync_token = self.busy_cache.sync_token(calendar_id)
+        if sync_token and self.busy_cache.covers(calendar_id, query_start, query_end):
+            try:
+                changed_events, next_sync_token = self._list_events(calendar_id, syncToken=sync_token)
+                self.busy_cache.apply_changes(calendar_id, changed_events, next_sync_token)
+                logger.debug(f"Incremental busy sync for {calendar_id}: {len(changed_events)} changed events")
+                return True
+            except HttpError as e:
+                if e.resp.status != 410:
+                    logger.warning(f"Incremental busy sync failed for {calendar_id}: {e.resp.status} - {e._get_reason()}")
+                    return False
+                logger.info(f"Sync token expired for {calendar_id}, running full busy sync")
+            except Exception as e:
+                logger.warning(f"Incremental busy sync failed for {calendar_id}: {e}")
+                return False
+
+        window_start, window_end = cache_window
+        try:
+            events, next_sync_token = self._list_events(
+                calendar_id, timeMin=format_utc(window_start), timeMax=format_utc(window_end)
+            )
+            self.busy_cache.load_full(calendar_id, events, next_sync_token, window_start, window_end)
+            logger.info(f"Full busy sync for {calendar_id}: {len(events)} events through {window_end.date()}")
+            return True
+        except Exception as e:
+            logger.warning(f"Full busy sync failed for {calendar_id}, using freeBusy: {e}")
+            self.busy_cache.drop(calendar_id)
+            return False
+
+    def _list_events(self, calendar_id: str, **params) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Page through events.list, returning all items and the final nextSyncToken."""
+        events = []
+        page_token = None
+        while True:
+            response = self.service.events().list(
+                calendarId=calendar_id, singleEvents=True, maxResults=2500,
+                pageToken=page_token, **params
+            ).execute()
+            events.extend(response.get('items', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return events, response.get('nextSyncToken')
     
     def create_optimized_appointment(self, summary: str, service_description: str, 
                                    preferred_start: datetime, customer_email: str,
                                    customer_address: Optional[str] = None,
                                    customer_priority: Optional[str] = None,
-                                   calendar_id: str = 'primary') -> Dict[str, Any]:
+                                   calendar_id: str = 'primary',
+                                   previous_address: Optional[str] = None) -> Dict[str, Any]:
         """Create an appointment with optimal scheduling using enhanced logic
         
         Args:
@@ -811,12 +868,14 @@ class CalendarClient:
             customer_address: Customer's address for travel time calculation
             customer_priority: Optional priority override ('emergency', 'high', 'normal', 'low')
             calendar_id: Calendar to create the appointment on
+            previous_address: Where the crew is coming from (e.g. the prior stop from plan_day_routes)
         """
         
         # Find the optimal slot with priority consideration
         optimal_slot = self.find_optimal_slot(
             service_description=service_description,
             preferred_start=preferred_start,
+            from_address=previous_address,
             to_address=customer_address,
             calendar_id=calendar_id,
             customer_priority=customer_priority
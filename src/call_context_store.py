@@ -0,0 +1,182 @@
+"""
+Call Context Store for the Voice IVR System
+Keeps each call's menu context until the call has been idle for a TTL, so
+contexts of live calls are never dropped and finished calls do not pile up.
+
+Two implementations share one interface:
+- CallContextStore: in-process, an IdleExpiringStore from conversation_state_store
+- RedisCallContextStore: shared across webhook workers through Redis, so any
+  worker can continue a call's menu flow
+"""
+
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .conversation_state_store import IdleExpiringStore
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TTL_SECONDS = 60 * 60
+DEFAULT_MAX_CONTEXTS = 20000
+
+
+class CallContextStore:
+    """In-memory call contexts that expire by last activity"""
+
+    def __init__(self, idle_ttl_seconds: float = DEFAULT_IDLE_TTL_SECONDS,
+                 max_contexts: int = DEFAULT_MAX_CONTEXTS,
+                 time_fn: Callable[[], float] = time.time):
+        self._contexts = IdleExpiringStore(idle_ttl_seconds, max_contexts, time_fn)
+
+    @property
+    def evicted_contexts(self) -> int:
+        return self._contexts.evicted
+
+    def get(self, call_sid: str) -> Optional[Any]:
+        """Context for a call; None if unknown or expired"""
+        return self._contexts.get(call_sid)
+
+    def save(self, call_sid: str, context: Any):
+        """Store the context and mark the call active now"""
+        self._contexts.put(call_sid, context)
+
+    def delete(self, call_sid: str) -> bool:
+        return self._contexts.pop(call_sid) is not None
+
+    def evict_expired(self, now: Optional[float] = None, idle_ttl_seconds: Optional[float] = None) -> int:
+        """Drop calls idle longer than the TTL and enforce the context cap"""
+        return self._contexts.evict_expired(now, idle_ttl_seconds)
+
+    def contexts(self) -> List[Any]:
+        """Live contexts, least recently active first"""
+        return self._contexts.values()
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'active_calls': len(self),
+            'evicted_contexts': self.evicted_contexts,
+            'storage_type': 'memory'
+        }
+
+
+class RedisCallContextStore:
+    """
+    Redis-backed call contexts shared by every webhook worker.
+
+    Each context is a JSON string, stamped with its last activity, whose key
+    TTL is refreshed on every save. Last activity is also indexed in a sorted
+    set, so listing and counting live calls never scans expired ones.
+    """
+
+    def __init__(self, redis_client, serialize: Callable[[Any], Dict],
+                 deserialize: Callable[[Dict], Any],
+                 idle_ttl_seconds: float = DEFAULT_IDLE_TTL_SECONDS,
+                 key_prefix: str = "ivr_context",
+                 time_fn: Callable[[], float] = time.time):
+        self.redis_client = redis_client
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.key_prefix = key_prefix
+        self.time_fn = time_fn
+
+        self._activity_key = f"{key_prefix}:active"
+
+    def _context_key(self, call_sid) -> str:
+        if isinstance(call_sid, bytes):
+            call_sid = call_sid.decode()
+        return f"{self.key_prefix}:call:{call_sid}"
+
+    def _load(self, raw, cutoff: float) -> Optional[Any]:
+        if not raw:
+            return None
+        entry = json.loads(raw)
+        # Checked here too: the key TTL has whole-second resolution
+        if entry['last_activity'] < cutoff:
+            return None
+        return self.deserialize(entry['context'])
+
+    def get(self, call_sid: str) -> Optional[Any]:
+        raw = self.redis_client.get(self._context_key(call_sid))
+        return self._load(raw, self.time_fn() - self.idle_ttl_seconds)
+
+    def save(self, call_sid: str, context: Any):
+        now = self.time_fn()
+        pipe = self.redis_client.pipeline(transaction=False)
+        entry = {'last_activity': now, 'context': self.serialize(context)}
+        pipe.set(self._context_key(call_sid), json.dumps(entry),
+                 ex=max(1, int(self.idle_ttl_seconds) + 1))
+        pipe.zadd(self._activity_key, {call_sid: now})
+        pipe.zremrangebyscore(self._activity_key, '-inf', now - self.idle_ttl_seconds)
+        pipe.execute()
+
+    def delete(self, call_sid: str) -> bool:
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.delete(self._context_key(call_sid))
+        pipe.zrem(self._activity_key, call_sid)
+        deleted, _ = pipe.execute()
+        return bool(deleted)
+
+    def evict_expired(self, now: Optional[float] = None, idle_ttl_seconds: Optional[float] = None) -> int:
+        # Context keys expire on their own; only the activity index needs trimming
+        if now is None:
+            now = self.time_fn()
+        ttl = self.idle_ttl_seconds if idle_ttl_seconds is None else idle_ttl_seconds
+        expired = self.redis_client.zrangebyscore(self._activity_key, '-inf', now - ttl)
+        if not expired:
+            return 0
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrem(self._activity_key, *expired)
+        if ttl < self.idle_ttl_seconds:
+            # A shorter sweep than the key TTL has to drop the contexts too
+            pipe.delete(*(self._context_key(call_sid) for call_sid in expired))
+        return pipe.execute()[0]
+
+    def contexts(self) -> List[Any]:
+        self.evict_expired()
+        call_sids = self.redis_client.zrange(self._activity_key, 0, -1)
+        if not call_sids:
+            return []
+        raw_contexts = self.redis_client.mget([self._context_key(call_sid) for call_sid in call_sids])
+        cutoff = self.time_fn() - self.idle_ttl_seconds
+        contexts = (self._load(raw, cutoff) for raw in raw_contexts)
+        return [context for context in contexts if context is not None]
+
+    def __len__(self) -> int:
+        self.evict_expired()
+        return self.redis_client.zcard(self._activity_key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'active_calls': len(self),
+            'storage_type': 'redis'
+        }
+
+
+def create_call_context_store(serialize: Callable[[Any], Dict],
+                              deserialize: Callable[[Dict], Any],
+                              redis_url: Optional[str] = None,
+                              **kwargs):
+    """Return a Redis-backed store when redis_url is set and reachable, else in-memory"""
+    if redis_url and REDIS_AVAILABLE:
+        try:
+            client = redis.from_url(redis_url, decode_responses=True)
+            client.ping()
+            logger.info("IVR call contexts shared through Redis")
+            return RedisCallContextStore(client, serialize, deserialize, **kwargs)
+        except Exception as e:
+            logger.warning(f"Redis unavailable for IVR call contexts, using memory: {e}")
+    kwargs.pop('key_prefix', None)
+    return CallContextStore(**kwargs)
@@ -7,6 +7,7 @@ from dotenv import load_dotenv
 import logging
 from datetime import datetime, timedelta
 import asyncio # Added for asyncio.run
+from contextlib import contextmanager
 from src.orchestrator import get_orchestrator_instance # Add this import
 
 # --- Early .env loading for Celery context ---
@@ -36,6 +37,7 @@ _celery_early_logger.removeHandler(_early_handler) # Clean up handler
 
 from celery import Celery, signals
 from celery.schedules import crontab
+from kombu import Queue
 # import os # Already imported
 # import logging # Already imported
 # from datetime import datetime, timedelta # Already imported
@@ -54,6 +56,12 @@ from .task_manager_agent import task_manager as actual_task_manager_instance # A
 
 # Import AgentCommunication
 from src.agent_communication import AgentCommunication
+from src.celery_queues import (
+    ALL_QUEUES, BATCH_QUEUE, TASK_ROUTES, QueueMonitor, latency_class_for, stamp_enqueued_at
+)
+from src.gmail_push import (
+    BUSY_REQUEUE_SECONDS, GmailWatchManager, configured_mailboxes, get_push_state, process_mailbox_push
+)
 
 # Import MockEmailClient if using it for tests
 # The decision to use MockEmailClient should ideally be in config, not directly here.
@@ -108,10 +116,22 @@ celery_app.conf.update(
     timezone=os.getenv('TZ', 'UTC'), # Use TZ from env or default to UTC
     enable_utc=True,
     worker_hijack_root_logger=False,  # Allow custom logging configuration
+    # Latency classes: realtime SMS/voice, email, batch (see celery_queues)
+    task_routes=TASK_ROUTES,
+    task_default_queue=BATCH_QUEUE,
+    # Declared so a worker started without -Q consumes every class, not just the default queue
+    task_queues=[Queue(name) for name in ALL_QUEUES],
+    # Reserve one task at a time so a long task never holds others hostage
+    worker_prefetch_multiplier=1,
+    # Pool sized from measured queue wait when a worker runs with --autoscale
+    worker_autoscaler='src.celery_queues:QueueWaitAutoscaler',
     # Add beat_schedule_filename for test isolation if not using DB scheduler
     # beat_schedule_filename = 'celerybeat-schedule-interactive-test' if config.APP_ENV == 'interactive_test' else 'celerybeat-schedule'
 )
 
+# Stamp every published task so queue wait can be measured
+signals.before_task_publish.connect(stamp_enqueued_at, weak=False)
+
 # Celery Logging Configuration
 CELERY_LOG_FMT = "[%(asctime)s: %(levelname)s/%(processName)s][%(name)s] %(message)s"
 CELERY_TASK_LOG_FMT = "[%(asctime)s: %(levelname)s/%(processName)s][%(task_name)s(%(task_id)s)] %(message)s"
@@ -201,6 +221,34 @@ def add(x, y):
     logger.info(f"Result of add task: {result}")
     return result
 
+def _process_monitored_mailbox(agent):
+    logger.info("Calling asyncio.run(agent.check_and_process_incoming_tasks()) for last 1 day")
+    # Running the async method within the synchronous Celery task
+    asyncio.run(agent.check_and_process_incoming_tasks(process_last_n_days=1))
+    logger.info("Finished asyncio.run(agent.check_and_process_incoming_tasks())")
+
+def _process_instruction_mailbox(agent):
+    logger.info("Calling agent.check_and_process_instruction_emails() for last 1 day")
+    # By default, it checks last 1 day and UNSEEN only, which is good for instructions.
+    agent.check_and_process_instruction_emails(process_last_n_days=1)
+    logger.info("Finished agent.check_and_process_instruction_emails()")
+
+@contextmanager
+def _mailbox_run(email_address):
+    """Hold the mailbox's processing flag so polls and push-triggered runs never overlap"""
+    if not email_address:
+        yield True
+        return
+    state = get_push_state()
+    address = email_address.lower()
+    if not state.begin_processing(address):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        state.end_processing(address)
+
 @celery_app.task(name='check_emails_task', ignore_result=True)
 def check_secretary_emails_task():
     print("PRINT_DEBUG: \u09af\u09cc\u0997RE-INTRODUCING get_communication_agent_instance() CALL \u09af\u09cc\u0997", flush=True)
@@ -211,10 +259,11 @@ def check_secretary_emails_task():
         agent = get_communication_agent_instance()
         print(f"PRINT_DEBUG: \u09af\u09cc\u0997CommunicationAgent instance obtained: {type(agent)} \u09af\u09cc\u0997", flush=True)
         logger.info(f"CommunicationAgent instance obtained: {type(agent)}.")
-        logger.info("Calling asyncio.run(agent.check_and_process_incoming_tasks()) for last 1 day")
-        # Running the async method within the synchronous Celery task
-        asyncio.run(agent.check_and_process_incoming_tasks(process_last_n_days=1)) 
-        logger.info("Finished asyncio.run(agent.check_and_process_incoming_tasks())")
+        with _mailbox_run(agent.monitoring_email_address) as acquired:
+            if not acquired:
+                logger.info(f"Push-triggered run in progress for {agent.monitoring_email_address}, skipping poll")
+                return
+            _process_monitored_mailbox(agent)
     except Exception as e:
         print(f"PRINT_DEBUG: \u09af\u09cc\u0997EXCEPTION in check_secretary_emails_task: {e} \u09af\u09cc\u0997", flush=True)
         logger.error(f"Error in check_secretary_emails_task: {e}", exc_info=True)
@@ -226,10 +275,11 @@ def check_instruction_emails_task_runner(): # Renamed to avoid conflict with a p
     logger.info("Celery task: \u09af\u09cc\u0997RUNNING check_instruction_emails_task_runner \u09af\u09cc\u0997")
     try:
         agent = get_communication_agent_instance()
-        logger.info("Calling agent.check_and_process_instruction_emails() for last 1 day")
-        # By default, it checks last 1 day and UNSEEN only, which is good for instructions.
-        agent.check_and_process_instruction_emails(process_last_n_days=1) 
-        logger.info("Finished agent.check_and_process_instruction_emails()")
+        with _mailbox_run(agent.secretary_email_address) as acquired:
+            if not acquired:
+                logger.info(f"Push-triggered run in progress for {agent.secretary_email_address}, skipping poll")
+                return
+            _process_instruction_mailbox(agent)
     except Exception as e:
         logger.error(f"Error in check_instruction_emails_task_runner: {e}", exc_info=True)
         raise
@@ -431,19 +481,35 @@ def memory_maintenance_task(self):
                 task_logger.info(f"Memory Engineer: Processing {msg.get('type')} from {msg.get('from')}")
                 # Add to knowledge base or internal memory structures
 
-        # TODO: Implement actual memory maintenance logic
-        # Example:
-        # memory_engineer_instance = get_memory_engineer_agent_instance() # Needs to be defined
-        # asyncio.run(memory_engineer_instance.perform_maintenance())
-        task_logger.info("Memory Engineer: Performing memory consolidation and indexing...")
-        comm.update_status('maintenance', 60, {'phase': 'consolidating_data', 'task_id': self.request.id})
-        import time
-        time.sleep(10) # Simulate maintenance work
+        task_logger.info("Memory Engineer: Deduplicating, pruning and compacting memory collections...")
+        comm.update_status('maintenance', 30, {'phase': 'compacting_memory', 'task_id': self.request.id})
+        from src.memory_maintenance import MaintenancePolicy, maintain_persistent_collection
+
+        retention_days = float(os.getenv('MEMORY_RETENTION_DAYS', '365'))
+        targets = [
+            # (persist directory, collection, metadata field duplicates must share)
+            (os.path.join(PROJECT_ROOT_FOR_CELERY, 'memory_storage'), 'conversations', 'conversation_id'),
+            (os.getenv('KAREN_MEMORY_DIR', os.path.join(PROJECT_ROOT_FOR_CELERY, 'karen_memory')),
+             'conversations', 'customer_id'),
+        ]
+        reports = []
+        for persist_directory, collection_name, scope_field in targets:
+            policy = MaintenancePolicy(retention_days=retention_days, scope_field=scope_field)
+            try:
+                report = maintain_persistent_collection(persist_directory, collection_name, policy)
+            except Exception as e:
+                task_logger.error(f"Memory maintenance failed for {persist_directory}/{collection_name}: {e}", exc_info=True)
+                continue
+            if report:
+                report.collection = f"{os.path.basename(persist_directory)}/{collection_name}"
+                reports.append(report.to_dict())
+        comm.update_status('maintenance', 90, {'phase': 'reporting', 'task_id': self.request.id})
 
         comm.share_knowledge('memory_summary', {
             'last_updated': datetime.now().isoformat(),
-            'interactions_processed_in_run': len(messages), # Example metric
-            'summary_quality': 'simulated_high'
+            'interactions_processed_in_run': len(messages),
+            'records_reclaimed': sum(report['records_reclaimed'] for report in reports),
+            'collections': reports
         })
         
         comm.update_status('completed', 100, {'phase': 'memory_maintenance_done', 'task_id': self.request.id})
@@ -530,36 +596,28 @@ def monitor_agent_platform_logs_task():
 @celery_app.task(name='monitor_redis_queues_task', ignore_result=True)
 def monitor_redis_queues_task():
     logger.info("Executing monitor_redis_queues_task.")
+    queue_stats = {}
     try:
         redis_url = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
         # The redis library is already in requirements.txt
         import redis
         r = redis.from_url(redis_url)
-        # Celery default queue is usually 'celery' but can be changed.
-        # Check common queues; this might need to be more dynamic based on actual app usage.
-        queues_to_check = ['celery'] # Default Celery queue
-        # Add other known queues if necessary, e.g., based on task_routes or config.
-        # For tasks defined in celery_integration.existing_tasks, if they use specific queues.
-        # The orchestrator config mentions "fetch_new_emails", "process_email_with_llm", "send_karen_reply"
-        # Assuming they use the default queue for now unless specified otherwise.
-
-        queue_lengths = {}
-        for q_name in queues_to_check:
-            try:
-                length = r.llen(q_name)
-                queue_lengths[q_name] = length
-                logger.info(f"Redis queue '{q_name}' length: {length}")
-            except Exception as e:
-                logger.error(f"Error checking Redis queue '{q_name}': {e}", exc_info=True)
-        
-        if not queue_lengths:
-            logger.warning("No Redis queues were checked or an error occurred for all.")
+        queue_stats = QueueMonitor(r, ALL_QUEUES).sample()
+
+        for q_name, stats in queue_stats.items():
+            latency_class = latency_class_for([q_name])
+            wait = stats.oldest_wait_seconds
+            logger.info(f"Redis queue '{q_name}' length: {stats.depth}, oldest wait: "
+                        f"{'n/a' if wait is None else f'{wait:.1f}s'}")
+            if wait is not None and wait > latency_class.target_wait_seconds:
+                logger.warning(f"Queue '{q_name}' is behind: oldest task waited {wait:.1f}s "
+                               f"(target {latency_class.target_wait_seconds}s, depth {stats.depth})")
 
     except ImportError:
         logger.error("Redis library not installed. Cannot monitor Redis queues.")
     except Exception as e:
         logger.error(f"Error connecting to Redis or monitoring queues: {e}", exc_info=True)
-    print(f"PRINT_DEBUG: monitor_redis_queues_task executed. Checked: {list(queue_lengths.keys()) if 'queue_lengths' in locals() else 'None'}", flush=True)
+    print(f"PRINT_DEBUG: monitor_redis_queues_task executed. Checked: {list(queue_stats.keys()) or 'None'}", flush=True)
 
 
 @celery_app.task(name='monitor_gmail_api_quota_task', ignore_result=True)
@@ -572,6 +630,58 @@ def monitor_gmail_api_quota_task():
     # logger.info("Link to Google Cloud API Quotas: https://console.cloud.google.com/apis/dashboard")
     print("PRINT_DEBUG: monitor_gmail_api_quota_task executed (manual check reminder).", flush=True)
 
+def _gmail_service(email_address: str):
+    from googleapiclient.discovery import build
+    from src.token_manager import get_credentials_with_auto_refresh
+
+    creds = get_credentials_with_auto_refresh(configured_mailboxes()[email_address], email_address)
+    if not creds:
+        raise RuntimeError(f"No valid Gmail credentials for {email_address}")
+    return build('gmail', 'v1', credentials=creds, cache_discovery=False)
+
+
+@celery_app.task(name='process_gmail_push_task', ignore_result=True)
+def process_gmail_push_task(email_address: str, history_id: int):
+    """Process one mailbox after a Gmail watch notification (queued by src.gmail_push)"""
+    agent = get_communication_agent_instance()
+    runners = {
+        (agent.monitoring_email_address or '').lower(): lambda: _process_monitored_mailbox(agent),
+        (agent.secretary_email_address or '').lower(): lambda: _process_instruction_mailbox(agent),
+    }
+    if email_address not in runners:
+        logger.warning(f"Gmail push for unknown mailbox {email_address}")
+        get_push_state().clear_pending(email_address)
+        return
+    try:
+        outcome = process_mailbox_push(
+            email_address, history_id, _gmail_service(email_address), runners[email_address], get_push_state(),
+            requeue=lambda: process_gmail_push_task.apply_async(args=[email_address, history_id],
+                                                                countdown=BUSY_REQUEUE_SECONDS)
+        )
+    except Exception as e:
+        # Let the next notification queue a run; the safety poll covers this one
+        get_push_state().clear_pending(email_address)
+        logger.error(f"Gmail push run for {email_address} failed: {e}", exc_info=True)
+        raise
+    logger.info(f"Gmail push run for {email_address} (history {history_id}): {outcome}")
+
+
+@celery_app.task(name='renew_gmail_watches_task', ignore_result=True)
+def renew_gmail_watches_task():
+    """Register Gmail watches and renew those expiring within a day"""
+    topic_name = os.getenv('GMAIL_PUSH_TOPIC')
+    if not topic_name:
+        logger.info("GMAIL_PUSH_TOPIC not set; Gmail push disabled")
+        return
+    watches = GmailWatchManager(get_push_state(), topic_name)
+    for email_address in configured_mailboxes():
+        try:
+            if watches.needs_renewal(email_address):
+                watches.ensure_watch(email_address, _gmail_service(email_address))
+        except Exception as e:
+            logger.error(f"Failed to renew Gmail watch for {email_address}: {e}", exc_info=True)
+
+
 @celery_app.task(name='trigger_orchestrator_action', bind=True)
 def trigger_orchestrator_action(self, action='check_health'):
     """Manually trigger orchestrator actions"""
@@ -586,16 +696,23 @@ def trigger_orchestrator_action(self, action='check_health'):
         logger.error(f"Orchestrator action failed: {e}")
         raise
 
+# With Gmail push (GMAIL_PUSH_TOPIC), new mail is processed on notification and polls are a safety net
+GMAIL_PUSH_ENABLED = bool(os.getenv('GMAIL_PUSH_TOPIC'))
+
 # Define a periodic task schedule
 celery_app.conf.beat_schedule = {
     # Existing email check tasks (adjust schedules as needed based on actual `email_check_interval`)
     'check-secretary-emails-every-2-minutes': {
         'task': 'check_emails_task', # Name of the task defined earlier
-        'schedule': crontab(minute='*/2'),
+        'schedule': crontab(minute='*/15') if GMAIL_PUSH_ENABLED else crontab(minute='*/2'),
     },
     'check-instruction-emails-every-5-minutes': {
         'task': 'check_instruction_emails_task', # Name of the task defined earlier
-        'schedule': crontab(minute='*/5'),
+        'schedule': crontab(minute='*/15') if GMAIL_PUSH_ENABLED else crontab(minute='*/5'),
+    },
+    'renew-gmail-watches-every-6-hours': {
+        'task': 'renew_gmail_watches_task',
+        'schedule': crontab(minute=5, hour='*/6'),
     },
 
     # New Agent-Related Periodic Tasks
@@ -0,0 +1,236 @@
+"""
+Celery Queues - Latency classes, queue wait monitoring and a wait-time autoscaler
+Used by celery_app (task routing, monitor_redis_queues_task) and the Celery workers.
+
+Tasks are routed into three latency classes, each with its own queue and
+worker, so a backlog of email checks or analytics never delays an SMS reply
+or an emergency:
+- realtime: SMS and voice handling
+- email: mailbox polling and push-triggered mailbox runs
+- batch: maintenance, analytics, monitoring and anything unrouted
+
+Every published task is stamped with the time it was enqueued. The monitor
+reads each queue's depth and the age of its oldest message straight from the
+Redis broker lists. QueueWaitAutoscaler, installed as the worker autoscaler,
+grows or shrinks the worker's pool from that measured wait against its
+class's target.
+"""
+
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    from celery.worker.autoscale import Autoscaler
+    CELERY_AVAILABLE = True
+except ImportError:
+    CELERY_AVAILABLE = False
+    Autoscaler = object
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REALTIME_QUEUE = 'realtime'
+EMAIL_QUEUE = 'email'
+BATCH_QUEUE = 'batch'
+# Celery's default queue; still drained by the batch worker for messages published before routing
+LEGACY_QUEUE = 'celery'
+
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+
+@dataclass(frozen=True)
+class LatencyClass:
+    name: str
+    queues: tuple
+    target_wait_seconds: float
+    min_concurrency: int
+    max_concurrency: int
+
+
+LATENCY_CLASSES: Dict[str, LatencyClass] = {
+    REALTIME_QUEUE: LatencyClass(REALTIME_QUEUE, (REALTIME_QUEUE,), target_wait_seconds=2,
+                                 min_concurrency=2, max_concurrency=8),
+    EMAIL_QUEUE: LatencyClass(EMAIL_QUEUE, (EMAIL_QUEUE,), target_wait_seconds=30,
+                              min_concurrency=1, max_concurrency=4),
+    BATCH_QUEUE: LatencyClass(BATCH_QUEUE, (BATCH_QUEUE, LEGACY_QUEUE), target_wait_seconds=600,
+                              min_concurrency=1, max_concurrency=2),
+}
+
+ALL_QUEUES: List[str] = [queue for latency_class in LATENCY_CLASSES.values() for queue in latency_class.queues]
+
+# Task name -> queue; everything else goes to task_default_queue (batch)
+TASK_QUEUES: Dict[str, str] = {
+    'sms_event_handler_task': REALTIME_QUEUE,
+    'voice_event_handler_task': REALTIME_QUEUE,
+    'handle_incoming_sms_webhook': REALTIME_QUEUE,
+    'fetch_new_sms': REALTIME_QUEUE,
+    'process_sms_with_llm': REALTIME_QUEUE,
+    'send_karen_sms_reply': REALTIME_QUEUE,
+    'notify_admin_sms_emergency': REALTIME_QUEUE,
+    'check_sms_task': REALTIME_QUEUE,
+    'check_emails_task': EMAIL_QUEUE,
+    'check_instruction_emails_task': EMAIL_QUEUE,
+    'process_gmail_push_task': EMAIL_QUEUE,
+}
+
+TASK_ROUTES: Dict[str, Dict[str, str]] = {name: {'queue': queue} for name, queue in TASK_QUEUES.items()}
+
+
+def latency_class_for(queues: Iterable[str]) -> LatencyClass:
+    """Tightest latency class among the queues a worker consumes"""
+    classes = [latency_class for latency_class in LATENCY_CLASSES.values()
+               if any(queue in latency_class.queues for queue in queues)]
+    if not classes:
+        return LATENCY_CLASSES[BATCH_QUEUE]
+    return min(classes, key=lambda latency_class: latency_class.target_wait_seconds)
+
+
+def stamp_enqueued_at(headers=None, **kwargs):
+    """before_task_publish handler: record when the task entered its queue"""
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+@dataclass
+class QueueStats:
+    queue: str
+    depth: int
+    # Age of the oldest waiting message; None if empty or published without a stamp
+    oldest_wait_seconds: Optional[float] = None
+
+
+class QueueMonitor:
+    """
+    Depth and head-of-line wait of Celery queues on a Redis broker.
+
+    Kombu LPUSHes messages onto a list per queue and workers pop from the
+    right, so the oldest message is at index -1. One pipelined round trip
+    samples every queue.
+    """
+
+    def __init__(self, redis_client, queues: Iterable[str] = ALL_QUEUES,
+                 time_fn: Callable[[], float] = time.time):
+        self.redis_client = redis_client
+        self.queues = list(queues)
+        self.time_fn = time_fn
+
+    def sample(self) -> Dict[str, QueueStats]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for queue in self.queues:
+            pipe.llen(queue)
+            pipe.lindex(queue, -1)
+        results = pipe.execute()
+        now = self.time_fn()
+
+        stats = {}
+        for index, queue in enumerate(self.queues):
+            depth, oldest = results[2 * index], results[2 * index + 1]
+            enqueued_at = self._enqueued_at(oldest) if depth else None
+            wait = max(0.0, now - enqueued_at) if enqueued_at is not None else None
+            stats[queue] = QueueStats(queue, depth, wait)
+        return stats
+
+    @staticmethod
+    def _enqueued_at(raw) -> Optional[float]:
+        if not raw:
+            return None
+        try:
+            return float(json.loads(raw)['headers'][ENQUEUED_AT_HEADER])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+
+class WaitTimeScaler:
+    """
+    Pool size for a latency class from the measured queue wait.
+
+    Waits over target grow the pool in proportion to the overshoot (twice
+    the target doubles it). The pool shrinks one process at a time, and only
+    after the queues have stayed empty with idle processes for
+    `scale_down_after_seconds`, so a bursty queue does not flap.
+    """
+
+    def __init__(self, latency_class: LatencyClass, min_concurrency: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, scale_down_after_seconds: float = 60,
+                 time_fn: Callable[[], float] = time.monotonic):
+        self.latency_class = latency_class
+        self.min_concurrency = latency_class.min_concurrency if min_concurrency is None else min_concurrency
+        self.max_concurrency = latency_class.max_concurrency if max_concurrency is None else max_concurrency
+        self.scale_down_after_seconds = scale_down_after_seconds
+        self.time_fn = time_fn
+        self._calm_since: Optional[float] = None
+
+    def desired_concurrency(self, current: int, stats: Iterable[QueueStats], busy: int = 0) -> int:
+        stats = list(stats)
+        target = self.latency_class.target_wait_seconds
+        wait = max((s.oldest_wait_seconds or 0.0 for s in stats), default=0.0)
+        depth = sum(s.depth for s in stats)
+        desired = current
+
+        if wait > target:
+            self._calm_since = None
+            desired = current + max(1, math.ceil(current * (wait / target - 1)))
+        elif depth == 0 and busy < current:
+            now = self.time_fn()
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.scale_down_after_seconds:
+                self._calm_since = now
+                desired = max(busy, current - 1)
+        else:
+            self._calm_since = None
+
+        return min(self.max_concurrency, max(self.min_concurrency, desired))
+
+
+class QueueWaitAutoscaler(Autoscaler):
+    """
+    Celery worker autoscaler (worker_autoscaler) driven by queue wait.
+
+    Celery's own autoscaler sizes the pool from the tasks this worker has
+    already reserved, which says nothing about how long tasks wait in the
+    broker. This one samples the queues the worker consumes once per tick
+    and applies WaitTimeScaler within the worker's --autoscale bounds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        app = self.worker.app
+        queues = list(app.amqp.queues.consume_from or [app.conf.task_default_queue])
+        self.latency_class = latency_class_for(queues)
+        self.scaler = WaitTimeScaler(self.latency_class, self.min_concurrency, self.max_concurrency)
+        self.monitor = None
+        broker_url = app.conf.broker_url or ''
+        if REDIS_AVAILABLE and broker_url.startswith(('redis://', 'rediss://')):
+            self.monitor = QueueMonitor(redis.from_url(broker_url, socket_timeout=2), queues)
+        logger.info(f"Autoscaling {queues} for {self.latency_class.target_wait_seconds}s wait "
+                    f"({self.min_concurrency}-{self.max_concurrency} processes)")
+
+    def _maybe_scale(self, req=None):
+        if self.monitor is None:
+            return super()._maybe_scale(req)
+        try:
+            stats = self.monitor.sample()
+        except Exception as e:
+            logger.warning(f"Queue wait unavailable, scaling on reserved tasks: {e}")
+            return super()._maybe_scale(req)
+
+        processes = self.processes
+        desired = self.scaler.desired_concurrency(processes, stats.values(), busy=self.qty)
+        if desired > processes:
+            self.scale_up(desired - processes)
+            return True
+        if desired < processes:
+            self.scale_down(processes - desired)
+            return True
+        return False
@@ -26,6 +26,7 @@ from src.phone_integration import get_phone_integration, PhoneCall
 from src.email_client import EmailClient
 from src.llm_client import LLMClient
 from src.logging_config import setup_logger
+from src.conversation_state_store import create_conversation_state_store
 from templates.sms_templates import SMSTemplates, get_template_by_intent
 from templates.email_templates import EmailTemplates, create_custom_email
 
@@ -82,6 +83,21 @@ class CommunicationMessage:
             'metadata': self.metadata
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CommunicationMessage':
+        return cls(
+            id=data['id'],
+            channel=ChannelType(data['channel']),
+            direction=data['direction'],
+            from_contact=data['from_contact'],
+            to_contact=data['to_contact'],
+            content=data['content'],
+            message_type=MessageType(data['message_type']),
+            priority=Priority(data['priority']),
+            timestamp=datetime.fromisoformat(data['timestamp']),
+            metadata=data.get('metadata', {})
+        )
+
 class CommunicationRouter:
     """Central communication routing and management system"""
     
@@ -93,9 +109,15 @@ class CommunicationRouter:
         self.email_client = EmailClient()
         self.llm_client = LLMClient()
         
-        # Message tracking
-        self.message_history: List[CommunicationMessage] = []
-        self.active_conversations: Dict[str, List[CommunicationMessage]] = {}
+        # Message tracking: bounded per-contact windows, idle contacts expire.
+        # Set COMMUNICATION_STATE_REDIS_URL to share state across API workers.
+        self.conversation_store = create_conversation_state_store(
+            serialize=CommunicationMessage.to_dict,
+            deserialize=CommunicationMessage.from_dict,
+            redis_url=os.getenv('COMMUNICATION_STATE_REDIS_URL'),
+            max_messages_per_contact=50,
+            idle_ttl_seconds=float(os.getenv('COMMUNICATION_STATE_TTL_SECONDS', 24 * 60 * 60))
+        )
         
         # Routing rules and preferences
         self.routing_rules = self._load_routing_rules()
@@ -508,23 +530,15 @@ Generate an appropriate response:"""
         return fallback_map.get(message_type, "Thank you for your message. We'll respond shortly.")
     
     def _add_to_history(self, message: CommunicationMessage):
-        """Add message to history and conversation tracking"""
-        self.message_history.append(message)
-        
-        # Add to conversation history
+        """Add message to the contact's bounded conversation window and update counters"""
         contact = message.from_contact if message.direction == 'inbound' else message.to_contact
-        if contact not in self.active_conversations:
-            self.active_conversations[contact] = []
-        
-        self.active_conversations[contact].append(message)
-        
-        # Keep only last 50 messages per conversation
-        if len(self.active_conversations[contact]) > 50:
-            self.active_conversations[contact] = self.active_conversations[contact][-50:]
+        self.conversation_store.add_message(
+            contact, message, message.channel.value, message.message_type.value
+        )
     
     def _get_conversation_history(self, contact: str) -> List[CommunicationMessage]:
         """Get conversation history for contact"""
-        return self.active_conversations.get(contact, [])
+        return self.conversation_store.get_history(contact)
     
     def _generate_message_id(self) -> str:
         """Generate unique message ID"""
@@ -608,25 +622,22 @@ Generate an appropriate response:"""
             return content
     
     def get_communication_stats(self) -> Dict:
-        """Get communication statistics"""
-        total_messages = len(self.message_history)
-        
-        # Count by channel
-        channel_counts = {}
-        for channel in ChannelType:
-            channel_counts[channel.value] = len([m for m in self.message_history if m.channel == channel])
+        """Get communication statistics from the store's running counters"""
+        store_stats = self.conversation_store.get_stats()
         
-        # Count by type
-        type_counts = {}
-        for msg_type in MessageType:
-            type_counts[msg_type.value] = len([m for m in self.message_history if m.message_type == msg_type])
+        channel_counts = {channel.value: store_stats['channel_counts'].get(channel.value, 0)
+                          for channel in ChannelType}
+        type_counts = {msg_type.value: store_stats['type_counts'].get(msg_type.value, 0)
+                       for msg_type in MessageType}
         
         return {
-            'total_messages': total_messages,
-            'active_conversations': len(self.active_conversations),
+            'total_messages': store_stats['total_messages'],
+            'active_conversations': store_stats['active_conversations'],
+            'messages_last_hour': store_stats['messages_last_hour'],
             'channel_breakdown': channel_counts,
             'message_type_breakdown': type_counts,
-            'channel_status': {ch.value: status for ch, status in self.channel_status.items()}
+            'channel_status': {ch.value: status for ch, status in self.channel_status.items()},
+            'conversation_storage': store_stats['storage_type']
         }
     
     def health_check(self) -> Dict:
@@ -0,0 +1,293 @@
+"""
+Conversation State Store for the Communication Router
+Keeps per-contact conversation windows bounded and evicts idle contacts so a
+long-running webhook process does not grow without limit.
+
+Two implementations share one interface:
+- ConversationStateStore: in-process, per-contact deques in an IdleExpiringStore
+- RedisConversationStateStore: shared across API workers through Redis
+
+IdleExpiringStore is also the in-process store behind call_context_store.
+"""
+
+import json
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MESSAGES_PER_CONTACT = 50
+DEFAULT_IDLE_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_CONTACTS = 50000
+
+
+class RollingCounter:
+    """Event counts over a sliding window using fixed-size time buckets (O(1) per event)"""
+
+    def __init__(self, window_seconds: int = 3600, bucket_seconds: int = 60,
+                 time_fn: Callable[[], float] = time.time):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = max(1, window_seconds // bucket_seconds)
+        self.time_fn = time_fn
+        self._buckets: Deque[List[int]] = deque()  # [bucket_index, count]
+        self._total = 0
+
+    def increment(self, amount: int = 1):
+        bucket = int(self.time_fn() // self.bucket_seconds)
+        self._expire(bucket)
+        if self._buckets and self._buckets[-1][0] == bucket:
+            self._buckets[-1][1] += amount
+        else:
+            self._buckets.append([bucket, amount])
+        self._total += amount
+
+    def total(self) -> int:
+        self._expire(int(self.time_fn() // self.bucket_seconds))
+        return self._total
+
+    def _expire(self, current_bucket: int):
+        oldest_allowed = current_bucket - self.bucket_count + 1
+        while self._buckets and self._buckets[0][0] < oldest_allowed:
+            self._total -= self._buckets.popleft()[1]
+
+
+class IdleExpiringStore:
+    """
+    Values that expire once idle for a TTL, with a cap on how many are kept.
+
+    Entries are kept in an OrderedDict ordered by last activity, so idle
+    entries are evicted from the front in O(expired) and the least recently
+    active go first when the cap is reached.
+    """
+
+    def __init__(self, idle_ttl_seconds: float, max_entries: int,
+                 time_fn: Callable[[], float] = time.time):
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_entries = max_entries
+        self.time_fn = time_fn
+
+        # key -> (last_activity, value), least recently active first
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.evicted = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Value for a key; None if unknown or expired. Reading does not count as activity"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.time_fn() - entry[0] > self.idle_ttl_seconds:
+            del self._entries[key]
+            self.evicted += 1
+            return None
+        return entry[1]
+
+    def put(self, key: str, value: Any, now: Optional[float] = None):
+        """Store the value and mark the key active now"""
+        if now is None:
+            now = self.time_fn()
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        self.evict_expired(now)
+
+    def pop(self, key: str) -> Optional[Any]:
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def evict_expired(self, now: Optional[float] = None, idle_ttl_seconds: Optional[float] = None) -> int:
+        """Drop entries idle longer than the TTL and enforce the cap"""
+        if now is None:
+            now = self.time_fn()
+        cutoff = now - (self.idle_ttl_seconds if idle_ttl_seconds is None else idle_ttl_seconds)
+        evicted = 0
+        entries = self._entries
+
+        while entries:
+            last_activity, _ = next(iter(entries.values()))
+            if last_activity >= cutoff and len(entries) <= self.max_entries:
+                break
+            entries.popitem(last=False)
+            evicted += 1
+
+        self.evicted += evicted
+        return evicted
+
+    def values(self) -> List[Any]:
+        """Live values, least recently active first"""
+        self.evict_expired()
+        return [value for _, value in self._entries.values()]
+
+    def __len__(self) -> int:
+        self.evict_expired()
+        return len(self._entries)
+
+
+class ConversationStateStore:
+    """In-memory conversation state: a bounded window per contact, idle contacts evicted"""
+
+    def __init__(self, max_messages_per_contact: int = DEFAULT_MESSAGES_PER_CONTACT,
+                 idle_ttl_seconds: float = DEFAULT_IDLE_TTL_SECONDS,
+                 max_contacts: int = DEFAULT_MAX_CONTACTS,
+                 time_fn: Callable[[], float] = time.time):
+        self.max_messages_per_contact = max_messages_per_contact
+        self.time_fn = time_fn
+
+        # contact -> deque of messages
+        self._conversations = IdleExpiringStore(idle_ttl_seconds, max_contacts, time_fn)
+
+        self.total_messages = 0
+        self.channel_counts: Counter = Counter()
+        self.type_counts: Counter = Counter()
+        self.recent_messages = RollingCounter(time_fn=time_fn)
+
+    @property
+    def evicted_contacts(self) -> int:
+        return self._conversations.evicted
+
+    def add_message(self, contact: str, message: Any, channel: str, message_type: str):
+        """Append a message to the contact's window and update counters"""
+        now = self.time_fn()
+        messages = self._conversations.get(contact)
+        if messages is None:
+            messages = deque(maxlen=self.max_messages_per_contact)
+        messages.append(message)
+        self._conversations.put(contact, messages, now)
+
+        self.total_messages += 1
+        self.channel_counts[channel] += 1
+        self.type_counts[message_type] += 1
+        self.recent_messages.increment()
+
+    def get_history(self, contact: str) -> List[Any]:
+        """Messages for a contact, oldest first; empty if unknown or expired"""
+        messages = self._conversations.get(contact)
+        return list(messages) if messages is not None else []
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop contacts idle longer than the TTL and enforce the contact cap"""
+        return self._conversations.evict_expired(now)
+
+    def active_count(self) -> int:
+        return len(self._conversations)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'total_messages': self.total_messages,
+            'active_conversations': self.active_count(),
+            'channel_counts': dict(self.channel_counts),
+            'type_counts': dict(self.type_counts),
+            'messages_last_hour': self.recent_messages.total(),
+            'evicted_contacts': self.evicted_contacts,
+            'storage_type': 'memory'
+        }
+
+
+class RedisConversationStateStore:
+    """
+    Redis-backed conversation state shared by every API worker.
+
+    Each contact's window is a capped list with a TTL, activity is tracked in a
+    sorted set for the active count, and counters live in one hash.
+    """
+
+    def __init__(self, redis_client, serialize: Callable[[Any], Dict],
+                 deserialize: Callable[[Dict], Any],
+                 max_messages_per_contact: int = DEFAULT_MESSAGES_PER_CONTACT,
+                 idle_ttl_seconds: float = DEFAULT_IDLE_TTL_SECONDS,
+                 key_prefix: str = "comm_router",
+                 time_fn: Callable[[], float] = time.time):
+        self.redis_client = redis_client
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.max_messages_per_contact = max_messages_per_contact
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.key_prefix = key_prefix
+        self.time_fn = time_fn
+
+        self._activity_key = f"{key_prefix}:active"
+        self._stats_key = f"{key_prefix}:stats"
+
+    def _conversation_key(self, contact: str) -> str:
+        return f"{self.key_prefix}:conv:{contact}"
+
+    def add_message(self, contact: str, message: Any, channel: str, message_type: str):
+        now = self.time_fn()
+        key = self._conversation_key(contact)
+        minute_key = f"{self.key_prefix}:minute:{int(now // 60)}"
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.rpush(key, json.dumps(self.serialize(message)))
+        pipe.ltrim(key, -self.max_messages_per_contact, -1)
+        pipe.expire(key, int(self.idle_ttl_seconds))
+        pipe.zadd(self._activity_key, {contact: now})
+        pipe.zremrangebyscore(self._activity_key, '-inf', now - self.idle_ttl_seconds)
+        pipe.hincrby(self._stats_key, 'total_messages', 1)
+        pipe.hincrby(self._stats_key, f'channel:{channel}', 1)
+        pipe.hincrby(self._stats_key, f'type:{message_type}', 1)
+        pipe.incr(minute_key)
+        pipe.expire(minute_key, 3660)
+        pipe.execute()
+
+    def get_history(self, contact: str) -> List[Any]:
+        raw_messages = self.redis_client.lrange(self._conversation_key(contact), 0, -1)
+        return [self.deserialize(json.loads(raw)) for raw in raw_messages]
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        # Conversation lists expire on their own; only the activity index needs trimming
+        if now is None:
+            now = self.time_fn()
+        return self.redis_client.zremrangebyscore(self._activity_key, '-inf', now - self.idle_ttl_seconds)
+
+    def active_count(self) -> int:
+        self.evict_idle()
+        return self.redis_client.zcard(self._activity_key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        raw_stats = self.redis_client.hgetall(self._stats_key)
+        channel_counts = {}
+        type_counts = {}
+        for field, value in raw_stats.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field.startswith('channel:'):
+                channel_counts[field[len('channel:'):]] = int(value)
+            elif field.startswith('type:'):
+                type_counts[field[len('type:'):]] = int(value)
+
+        current_minute = int(self.time_fn() // 60)
+        minute_keys = [f"{self.key_prefix}:minute:{m}" for m in range(current_minute - 59, current_minute + 1)]
+        messages_last_hour = sum(int(v) for v in self.redis_client.mget(minute_keys) if v)
+
+        total = raw_stats.get('total_messages', raw_stats.get(b'total_messages', 0))
+        return {
+            'total_messages': int(total or 0),
+            'active_conversations': self.active_count(),
+            'channel_counts': channel_counts,
+            'type_counts': type_counts,
+            'messages_last_hour': messages_last_hour,
+            'storage_type': 'redis'
+        }
+
+
+def create_conversation_state_store(serialize: Callable[[Any], Dict],
+                                    deserialize: Callable[[Dict], Any],
+                                    redis_url: Optional[str] = None,
+                                    **kwargs):
+    """Return a Redis-backed store when redis_url is set and reachable, else in-memory"""
+    if redis_url and REDIS_AVAILABLE:
+        try:
+            client = redis.from_url(redis_url)
+            client.ping()
+            logger.info("Conversation state shared through Redis")
+            return RedisConversationStateStore(client, serialize, deserialize, **kwargs)
+        except Exception as e:
+            logger.warning(f"Redis unavailable for conversation state, using memory: {e}")
+    kwargs.pop('key_prefix', None)
+    return ConversationStateStore(**kwargs)
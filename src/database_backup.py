@@ -7,19 +7,51 @@ Handles Firestore database backups, exports, and restoration.
 
 import os
 import json
-from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 import gzip
 import shutil
 
+FORMAT_VERSION = '2.0'
+MANIFEST_FILENAME = 'manifest.json'
+# Firestore rejects batches of more than 500 writes
+MAX_BATCH_WRITES = 500
+# Writers' clocks may run behind ours; their updated_at can predate our start time
+CLOCK_SKEW_MARGIN = timedelta(minutes=5)
+
+
 class FirestoreBackup:
-    """Handle Firestore database backup and restoration"""
+    """
+    Handle Firestore database backup and restoration
+
+    A backup is a directory with a manifest and, per collection, gzipped
+    newline-delimited JSON chunks of `chunk_size` documents. Collections are
+    read in pages of `page_size` documents with a cursor and written as they
+    arrive, so memory stays bounded whatever the collection size, and
+    several collections are backed up at once.
+
+    An incremental backup only exports documents whose `updated_field` is at
+    or after the previous backup's high watermark for that collection, and
+    names that backup as its base; restoring it restores the base chain
+    first. The watermark is the time the collection's export started, less
+    `clock_skew_margin`, so writes made while it ran are exported again next
+    time. Deletions are not tracked, and documents without `updated_field`
+    are only captured by full backups.
+    """
     
-    def __init__(self, db: firestore.Client, backup_dir: str = "backups"):
+    def __init__(self, db: firestore.Client, backup_dir: str = "backups",
+                 page_size: int = 1000, chunk_size: int = 10000, max_workers: int = 4,
+                 updated_field: str = 'updated_at', clock_skew_margin: timedelta = CLOCK_SKEW_MARGIN):
         self.db = db
         self.backup_dir = backup_dir
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.updated_field = updated_field
+        self.clock_skew_margin = clock_skew_margin
         self.ensure_backup_directory()
     
     def ensure_backup_directory(self):
@@ -28,63 +60,105 @@ class FirestoreBackup:
             os.makedirs(self.backup_dir)
             print(f"✅ Created backup directory: {self.backup_dir}")
     
-    def backup_collection(self, collection_name: str) -> Dict[str, Any]:
-        """Backup a single collection"""
-        print(f"📦 Backing up collection: {collection_name}")
-        
-        collection_data = {
-            'collection_name': collection_name,
-            'backup_timestamp': datetime.now(timezone.utc).isoformat(),
-            'documents': {}
-        }
+    def iter_documents(self, collection_name: str, since: Optional[datetime] = None) -> Iterator[Any]:
+        """Stream a collection's documents in cursor-paged queries"""
+        query = self.db.collection(collection_name)
+        if since is not None:
+            query = query.where(filter=FieldFilter(self.updated_field, '>=', since)).order_by(self.updated_field)
+        query = query.order_by('__name__')
+        
+        last_doc = None
+        while True:
+            page = query.limit(self.page_size)
+            if last_doc is not None:
+                page = page.start_after(last_doc)
+            docs = list(page.stream())
+            yield from docs
+            if len(docs) < self.page_size:
+                return
+            last_doc = docs[-1]
+    
+    def backup_collection(self, collection_name: str, backup_path: str, since: Optional[datetime] = None,
+                          compress: bool = True) -> Dict[str, Any]:
+        """Stream a single collection into chunk files under backup_path; returns its manifest entry"""
+        print(f"📦 Backing up collection: {collection_name}" + (f" (changed since {since.isoformat()})" if since else ""))
+        
+        collection_dir = os.path.join(backup_path, collection_name)
+        os.makedirs(collection_dir, exist_ok=True)
+        extension = '.jsonl.gz' if compress else '.jsonl'
+        
+        chunks = []
+        chunk_file = None
+        doc_count = 0
+        # Taken before the first page: anything written from here on is in the next incremental
+        high_watermark = (datetime.now(timezone.utc) - self.clock_skew_margin).timestamp()
+        if since is not None:
+            high_watermark = max(high_watermark, since.timestamp())
         
         try:
-            docs = self.db.collection(collection_name).stream()
-            doc_count = 0
-            
-            for doc in docs:
-                doc_data = doc.to_dict()
+            for doc in self.iter_documents(collection_name, since):
+                if doc_count % self.chunk_size == 0:
+                    if chunk_file:
+                        chunk_file.close()
+                    chunk_name = f"part-{len(chunks):05d}{extension}"
+                    chunk_path = os.path.join(collection_dir, chunk_name)
+                    chunk_file = (gzip.open(chunk_path, 'wt', compresslevel=6, encoding='utf-8') if compress
+                                  else open(chunk_path, 'w', encoding='utf-8'))
+                    chunks.append(f"{collection_name}/{chunk_name}")
                 
                 # Handle Firestore timestamps
-                doc_data = self._serialize_firestore_data(doc_data)
-                
-                collection_data['documents'][doc.id] = {
-                    'data': doc_data,
-                    'id': doc.id,
-                    'path': f"{collection_name}/{doc.id}"
-                }
+                doc_data = self._serialize_firestore_data(doc.to_dict())
+                chunk_file.write(json.dumps({'id': doc.id, 'data': doc_data}, ensure_ascii=False))
+                chunk_file.write('\n')
                 doc_count += 1
             
-            collection_data['document_count'] = doc_count
             print(f"✅ Backed up {doc_count} documents from {collection_name}")
             
         except Exception as e:
             print(f"❌ Failed to backup collection {collection_name}: {e}")
             raise
+        finally:
+            if chunk_file:
+                chunk_file.close()
         
-        return collection_data
+        return {
+            'collection_name': collection_name,
+            'document_count': doc_count,
+            'chunks': chunks,
+            'since': since.timestamp() if since else None,
+            'high_watermark': high_watermark
+        }
     
-    def backup_database(self, collections: Optional[List[str]] = None, compress: bool = True) -> str:
-        """Backup entire database or specified collections"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"firestore_backup_{timestamp}.json"
-        
-        if compress:
-            backup_filename += ".gz"
-        
-        backup_path = os.path.join(self.backup_dir, backup_filename)
-        
-        print(f"🔄 Starting database backup...")
+    def backup_database(self, collections: Optional[List[str]] = None, compress: bool = True,
+                        incremental: bool = False) -> str:
+        """Backup entire database or specified collections; returns the backup directory"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        backup_path = os.path.join(self.backup_dir, f"firestore_backup_{timestamp}")
+        os.makedirs(backup_path)
+        
+        base = self.latest_manifest() if incremental else None
+        if incremental and base is None:
+            print("⚠️  No previous backup found, taking a full backup")
+        mode = 'incremental' if base else 'full'
+        print(f"🔄 Starting {mode} database backup...")
         
         # Get all collections if none specified
         if collections is None:
             collections = self._get_all_collections()
         
+        def since_for(collection_name: str) -> Optional[datetime]:
+            if not base:
+                return None
+            watermark = base['manifest']['collections'].get(collection_name, {}).get('high_watermark')
+            return datetime.fromtimestamp(watermark, tz=timezone.utc) if watermark is not None else None
+        
         backup_data = {
             'backup_metadata': {
                 'created_at': datetime.now(timezone.utc).isoformat(),
-                'format_version': '1.0',
+                'format_version': FORMAT_VERSION,
                 'source': 'Karen AI Firestore',
+                'mode': mode,
+                'base': os.path.basename(base['path']) if base else None,
                 'total_collections': len(collections)
             },
             'collections': {}
@@ -92,40 +166,47 @@ class FirestoreBackup:
         
         total_documents = 0
         
-        for collection_name in collections:
-            try:
-                collection_backup = self.backup_collection(collection_name)
-                backup_data['collections'][collection_name] = collection_backup
-                total_documents += collection_backup['document_count']
-            except Exception as e:
-                print(f"⚠️  Skipping collection {collection_name} due to error: {e}")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                collection_name: executor.submit(self.backup_collection, collection_name, backup_path,
+                                                 since_for(collection_name), compress)
+                for collection_name in collections
+            }
+            for collection_name, future in futures.items():
+                try:
+                    collection_backup = future.result()
+                    backup_data['collections'][collection_name] = collection_backup
+                    total_documents += collection_backup['document_count']
+                except Exception as e:
+                    print(f"⚠️  Skipping collection {collection_name} due to error: {e}")
         
         backup_data['backup_metadata']['total_documents'] = total_documents
         
-        # Write backup file
+        # The manifest is written last: a backup without one is incomplete
         try:
-            if compress:
-                with gzip.open(backup_path, 'wt', encoding='utf-8') as f:
-                    json.dump(backup_data, f, indent=2, ensure_ascii=False)
-            else:
-                with open(backup_path, 'w', encoding='utf-8') as f:
-                    json.dump(backup_data, f, indent=2, ensure_ascii=False)
+            with open(os.path.join(backup_path, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+                json.dump(backup_data, f, indent=2, ensure_ascii=False)
             
-            file_size = os.path.getsize(backup_path)
+            file_size = self._backup_size(backup_path)
             print(f"✅ Database backup completed: {backup_path}")
             print(f"📊 Backup stats: {len(collections)} collections, {total_documents} documents, {file_size:,} bytes")
             
             return backup_path
             
         except Exception as e:
-            print(f"❌ Failed to write backup file: {e}")
+            print(f"❌ Failed to write backup manifest: {e}")
             raise
     
-    def restore_collection(self, collection_data: Dict[str, Any], overwrite: bool = False):
-        """Restore a single collection from backup data"""
-        collection_name = collection_data['collection_name']
-        documents = collection_data['documents']
-        
+    def latest_manifest(self) -> Optional[Dict[str, Any]]:
+        """Most recent complete backup with a manifest, as {'path', 'manifest'}"""
+        for backup in self.list_backups():
+            if backup['format'] == FORMAT_VERSION:
+                return {'path': backup['path'], 'manifest': self._load_manifest(backup['path'])}
+        return None
+    
+    def restore_collection(self, collection_name: str, documents: Iterable[Tuple[str, Dict[str, Any]]],
+                           overwrite: bool = False, max_workers: Optional[int] = None) -> int:
+        """Restore (doc_id, serialized data) pairs with batched writes, several batches in flight"""
         print(f"🔄 Restoring collection: {collection_name}")
         
         if not overwrite:
@@ -135,33 +216,95 @@ class FirestoreBackup:
                 response = input(f"Collection {collection_name} already exists. Overwrite? (y/N): ")
                 if response.lower() != 'y':
                     print(f"⏭️  Skipping collection {collection_name}")
-                    return
+                    return 0
         
-        restored_count = 0
+        collection_ref = self.db.collection(collection_name)
+        max_workers = max_workers or self.max_workers
         
-        for doc_id, doc_info in documents.items():
-            try:
-                doc_data = doc_info['data']
-                
+        def commit(batch_docs: List[Tuple[str, Dict[str, Any]]]) -> int:
+            batch = self.db.batch()
+            for doc_id, doc_data in batch_docs:
                 # Deserialize Firestore data
-                doc_data = self._deserialize_firestore_data(doc_data)
-                
-                # Write document
-                self.db.collection(collection_name).document(doc_id).set(doc_data)
-                restored_count += 1
-                
-            except Exception as e:
-                print(f"⚠️  Failed to restore document {doc_id}: {e}")
+                batch.set(collection_ref.document(doc_id), self._deserialize_firestore_data(doc_data))
+            batch.commit()
+            return len(batch_docs)
         
-        print(f"✅ Restored {restored_count}/{len(documents)} documents to {collection_name}")
+        restored_count = 0
+        total = 0
+        failed_batches = 0
+        pending = set()
+        batch_docs = []
+        
+        def collect(done):
+            nonlocal restored_count, failed_batches
+            for future in done:
+                try:
+                    restored_count += future.result()
+                except Exception as e:
+                    failed_batches += 1
+                    print(f"⚠️  Failed to restore a batch of {collection_name}: {e}")
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for doc in documents:
+                batch_docs.append(doc)
+                total += 1
+                if len(batch_docs) == MAX_BATCH_WRITES:
+                    # Bound what is read ahead of the writers
+                    if len(pending) >= max_workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(executor.submit(commit, batch_docs))
+                    batch_docs = []
+            if batch_docs:
+                pending.add(executor.submit(commit, batch_docs))
+            collect(wait(pending).done)
+        
+        print(f"✅ Restored {restored_count}/{total} documents to {collection_name}")
+        return restored_count
     
-    def restore_database(self, backup_path: str, collections: Optional[List[str]] = None, overwrite: bool = False):
-        """Restore database from backup file"""
+    def restore_database(self, backup_path: str, collections: Optional[List[str]] = None, overwrite: bool = False,
+                         max_workers: Optional[int] = None):
+        """Restore database from a backup directory (or its manifest), or a legacy backup file"""
         print(f"🔄 Starting database restoration from: {backup_path}")
         
         if not os.path.exists(backup_path):
             raise FileNotFoundError(f"Backup file not found: {backup_path}")
         
+        if os.path.basename(backup_path) == MANIFEST_FILENAME:
+            backup_path = os.path.dirname(backup_path)
+        if not os.path.isdir(backup_path):
+            return self._restore_legacy_file(backup_path, collections, overwrite, max_workers)
+        
+        # Incremental backups apply on top of their base chain, oldest first
+        chain = []
+        path = backup_path
+        while path:
+            manifest = self._load_manifest(path)
+            chain.append((path, manifest))
+            base = manifest['backup_metadata'].get('base')
+            path = os.path.join(os.path.dirname(path), base) if base else None
+        
+        for position, (path, manifest) in enumerate(reversed(chain)):
+            metadata = manifest['backup_metadata']
+            print(f"📋 Backup info: {metadata['created_at']} ({metadata['mode']}), {metadata['total_collections']} collections, {metadata['total_documents']} documents")
+            
+            collections_to_restore = collections or list(manifest['collections'].keys())
+            for collection_name in collections_to_restore:
+                if collection_name not in manifest['collections']:
+                    print(f"⚠️  Collection {collection_name} not found in backup")
+                    continue
+                chunks = [os.path.join(path, chunk) for chunk in manifest['collections'][collection_name]['chunks']]
+                try:
+                    self.restore_collection(collection_name, self._read_chunks(chunks),
+                                            overwrite or position > 0, max_workers)
+                except Exception as e:
+                    print(f"⚠️  Failed to restore collection {collection_name}: {e}")
+        
+        print("✅ Database restoration completed")
+    
+    def _restore_legacy_file(self, backup_path: str, collections: Optional[List[str]], overwrite: bool,
+                             max_workers: Optional[int]):
+        """Restore a single-file backup written by format 1.0"""
         # Load backup data
         try:
             if backup_path.endswith('.gz'):
@@ -186,8 +329,11 @@ class FirestoreBackup:
         
         for collection_name in collections_to_restore:
             if collection_name in backup_data['collections']:
+                documents = backup_data['collections'][collection_name]['documents']
                 try:
-                    self.restore_collection(backup_data['collections'][collection_name], overwrite)
+                    self.restore_collection(collection_name,
+                                            ((doc_id, doc_info['data']) for doc_id, doc_info in documents.items()),
+                                            overwrite, max_workers)
                 except Exception as e:
                     print(f"⚠️  Failed to restore collection {collection_name}: {e}")
             else:
@@ -195,16 +341,56 @@ class FirestoreBackup:
         
         print("✅ Database restoration completed")
     
+    def _read_chunks(self, chunk_paths: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Stream (doc_id, data) pairs from chunk files, one line at a time"""
+        for chunk_path in chunk_paths:
+            opener = gzip.open if chunk_path.endswith('.gz') else open
+            with opener(chunk_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        yield record['id'], record['data']
+    
+    def _load_manifest(self, backup_path: str) -> Dict[str, Any]:
+        with open(os.path.join(backup_path, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if 'backup_metadata' not in manifest or 'collections' not in manifest:
+            raise ValueError("Invalid backup manifest format")
+        return manifest
+    
+    def _backup_size(self, backup_path: str) -> int:
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(backup_path) for name in names)
+    
     def list_backups(self) -> List[Dict[str, Any]]:
-        """List available backup files"""
+        """List available backups: backup directories and legacy single files"""
         backups = []
         
         if not os.path.exists(self.backup_dir):
             return backups
         
         for filename in os.listdir(self.backup_dir):
-            if filename.startswith('firestore_backup_') and (filename.endswith('.json') or filename.endswith('.json.gz')):
-                file_path = os.path.join(self.backup_dir, filename)
+            if not filename.startswith('firestore_backup_'):
+                continue
+            file_path = os.path.join(self.backup_dir, filename)
+            
+            if os.path.isdir(file_path):
+                manifest_path = os.path.join(file_path, MANIFEST_FILENAME)
+                if not os.path.exists(manifest_path):
+                    continue  # Incomplete or in progress
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)['backup_metadata']
+                backups.append({
+                    'filename': filename,
+                    'path': file_path,
+                    'size': self._backup_size(file_path),
+                    'created_at': datetime.fromtimestamp(os.stat(manifest_path).st_mtime),
+                    'compressed': any(chunk.endswith('.gz') for root, _, chunks in os.walk(file_path) for chunk in chunks),
+                    'format': metadata.get('format_version'),
+                    'mode': metadata.get('mode', 'full'),
+                    'base': metadata.get('base')
+                })
+            elif filename.endswith('.json') or filename.endswith('.json.gz'):
                 file_stat = os.stat(file_path)
                 
                 backups.append({
@@ -212,26 +398,39 @@ class FirestoreBackup:
                     'path': file_path,
                     'size': file_stat.st_size,
                     'created_at': datetime.fromtimestamp(file_stat.st_ctime),
-                    'compressed': filename.endswith('.gz')
+                    'compressed': filename.endswith('.gz'),
+                    'format': '1.0',
+                    'mode': 'full',
+                    'base': None
                 })
         
-        # Sort by creation time (newest first)
-        backups.sort(key=lambda x: x['created_at'], reverse=True)
+        # Sort by creation time (newest first); names carry the backup time
+        backups.sort(key=lambda x: (x['created_at'], x['filename']), reverse=True)
         return backups
     
     def cleanup_old_backups(self, keep_count: int = 10):
-        """Remove old backup files, keeping only the specified number"""
+        """Remove old backups, keeping the specified number and the bases they need"""
         backups = self.list_backups()
         
         if len(backups) <= keep_count:
             print(f"✅ No cleanup needed. {len(backups)} backups found, keeping {keep_count}")
             return
         
-        backups_to_remove = backups[keep_count:]
+        by_name = {backup['filename']: backup for backup in backups}
+        keep = set()
+        for backup in backups[:keep_count]:
+            while backup and backup['filename'] not in keep:
+                keep.add(backup['filename'])
+                backup = by_name.get(backup['base'])
+        
+        backups_to_remove = [backup for backup in backups if backup['filename'] not in keep]
         
         for backup in backups_to_remove:
             try:
-                os.remove(backup['path'])
+                if os.path.isdir(backup['path']):
+                    shutil.rmtree(backup['path'])
+                else:
+                    os.remove(backup['path'])
                 print(f"🗑️  Removed old backup: {backup['filename']}")
             except Exception as e:
                 print(f"⚠️  Failed to remove backup {backup['filename']}: {e}")
@@ -253,7 +452,9 @@ class FirestoreBackup:
     
     def _serialize_firestore_data(self, data: Any) -> Any:
         """Convert Firestore data types to JSON-serializable format"""
-        if isinstance(data, dict):
+        if data is None or isinstance(data, (str, int, float)):
+            return data
+        elif isinstance(data, dict):
             return {k: self._serialize_firestore_data(v) for k, v in data.items()}
         elif isinstance(data, list):
             return [self._serialize_firestore_data(item) for item in data]
@@ -270,7 +471,8 @@ class FirestoreBackup:
         """Convert JSON data back to Firestore data types"""
         if isinstance(data, dict):
             if '__firestore_timestamp__' in data:
-                return firestore.SERVER_TIMESTAMP  # Use server timestamp for restoration
+                # The original time, so restored data keeps its history and incremental watermarks
+                return datetime.fromtimestamp(data['__firestore_timestamp__'], tz=timezone.utc)
             elif '__firestore_geopoint__' in data:
                 from google.cloud.firestore import GeoPoint
                 geo_data = data['__firestore_geopoint__']
@@ -284,12 +486,12 @@ class FirestoreBackup:
         else:
             return data
 
-def create_scheduled_backup(db: firestore.Client, backup_dir: str = "backups") -> str:
+def create_scheduled_backup(db: firestore.Client, backup_dir: str = "backups", incremental: bool = False) -> str:
     """Create a scheduled backup (to be called by cron or task scheduler)"""
     backup_system = FirestoreBackup(db, backup_dir)
     
     # Create backup
-    backup_path = backup_system.backup_database(compress=True)
+    backup_path = backup_system.backup_database(compress=True, incremental=incremental)
     
     # Cleanup old backups (keep last 10)
     backup_system.cleanup_old_backups(keep_count=10)
@@ -302,8 +504,8 @@ if __name__ == "__main__":
     
     if len(sys.argv) < 2:
         print("Usage: python src/database_backup.py [backup|restore|list|cleanup] [options]")
-        print("  backup [collections...]        - Backup database or specific collections")
-        print("  restore <backup_file> [colls]  - Restore from backup file")
+        print("  backup [--incremental] [collections...]  - Backup database or specific collections")
+        print("  restore <backup> [colls]       - Restore from backup directory or legacy file")
         print("  list                           - List available backups")
         print("  cleanup [keep_count]           - Remove old backups")
         sys.exit(1)
@@ -315,8 +517,10 @@ if __name__ == "__main__":
         backup_system = FirestoreBackup(db)
         
         if action == 'backup':
-            collections = sys.argv[2:] if len(sys.argv) > 2 else None
-            backup_path = backup_system.backup_database(collections)
+            args = sys.argv[2:]
+            incremental = '--incremental' in args
+            collections = [arg for arg in args if arg != '--incremental'] or None
+            backup_path = backup_system.backup_database(collections, incremental=incremental)
             print(f"🎉 Backup completed: {backup_path}")
             
         elif action == 'restore':
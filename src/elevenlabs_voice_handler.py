@@ -11,14 +11,14 @@ import json
 import logging
 import asyncio
 import aiohttp
-import hashlib
-from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
-import tempfile
 from pathlib import Path
 
+from .audio_stitching import concat_audio, segment_texts, template_variables
+from .tts_audio_cache import content_key, get_tts_audio_cache
+
 logger = logging.getLogger(__name__)
 
 class VoiceModel(Enum):
@@ -72,22 +72,34 @@ class ElevenLabsVoiceHandler:
     - Multiple voice personalities for different contexts
     - Emotional voice modulation based on call type
     - Real-time voice synthesis for dynamic content
-    - Voice caching for frequently used phrases
+    - Voice caching for frequently used phrases (content-addressed, LRU byte budget)
+    - Pre-rendered IVR templates so prompts with variable slots hit cache
+    - Segment stitching: dynamic messages reuse cached static segments and
+      synthesize only the variable parts
     - Cost optimization with smart caching
     - Quality monitoring and fallback options
     """
     
-    def __init__(self, api_key: str = None):
+    OUTPUT_FORMAT = "mp3_44100_128"  # Good quality, reasonable size
+    PREGENERATE_CONCURRENCY = 4
+    
+    def __init__(self, api_key: str = None, cache_dir: str = None):
         self.api_key = api_key or os.getenv('ELEVENLABS_API_KEY')
         if not self.api_key:
             raise ValueError("ElevenLabs API key required")
         
         self.base_url = "https://api.elevenlabs.io/v1"
         self.session = None
+        self._session_loop = None
         
-        # Voice cache directory
-        self.cache_dir = Path("voice_cache")
-        self.cache_dir.mkdir(exist_ok=True)
+        # Voice cache directory, shared by every handler using it
+        self.cache_dir = Path(cache_dir or os.getenv('ELEVENLABS_CACHE_DIR', 'voice_cache'))
+        max_age_hours = float(os.getenv('ELEVENLABS_CACHE_MAX_AGE_HOURS', '168'))
+        self.audio_cache = get_tts_audio_cache(
+            self.cache_dir,
+            max_bytes=int(float(os.getenv('ELEVENLABS_CACHE_MAX_MB', '500')) * 1024 * 1024),
+            max_age_seconds=max_age_hours * 3600 if max_age_hours > 0 else None
+        )
         
         # Premium voice profiles for 757 Handy
         self.voice_profiles = {
@@ -174,24 +186,91 @@ class ElevenLabsVoiceHandler:
             'thank_you_closing': "Thank you for calling 757 Handy. Have a wonderful day!"
         }
         
+        # Template phrases with variable slots, pre-rendered for each listed fill
+        self.phrase_templates = {
+            'time_greeting': {
+                'template': "Good {time_of_day}! Thank you for calling 757 Handy, Hampton Roads' premier home improvement experts.",
+                'context': 'greeting',
+                'emotion': EmotionStyle.WARM,
+                'variables': [{'time_of_day': period} for period in ('morning', 'afternoon', 'evening')]
+            },
+            'plain_greeting': {
+                'template': "Hello! Thank you for calling 757 Handy, Hampton Roads' premier home improvement experts.",
+                'context': 'greeting',
+                'emotion': EmotionStyle.WARM,
+                'variables': [{}]
+            },
+            'menu_option': {
+                'template': "For {option_text}, press {option_number}.",
+                'context': 'menu',
+                'emotion': None,
+                'variables': [
+                    {'option_text': text, 'option_number': str(number)}
+                    for number, text in enumerate([
+                        'appointment scheduling', 'a free estimate', 'emergency repairs',
+                        'customer service', 'billing questions', 'hours and location'
+                    ], start=1)
+                ] + [
+                    {'option_text': text, 'option_number': str(number)}
+                    for number, text in enumerate([
+                        'plumbing services', 'electrical work', 'carpentry and repairs',
+                        'HVAC services', 'general maintenance'
+                    ], start=1)
+                ]
+            }
+        }
+        
+        # Templates assembled from separately cached segments; static text is
+        # pinned in the cache and common slot values are pre-rendered
+        weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        appointment_times = [f"{(hour - 1) % 12 + 1}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+                             for hour in range(7, 19) for minute in (0, 30)]
+        self.stitch_dynamic_messages = os.getenv('ELEVENLABS_STITCH_DYNAMIC', 'true').lower() == 'true'
+        self.stitched_templates = {
+            'named_greeting': {
+                'template': "{time_greeting}, {customer_name}! Thank you for calling 757 Handy.",
+                'context': 'greeting',
+                'emotion': EmotionStyle.WARM,
+                'common_values': {'time_greeting': ['Hello', 'Good morning', 'Good afternoon', 'Good evening']}
+            },
+            'queue_wait': {
+                'template': "Your estimated wait time is approximately {minutes} minutes.",
+                'context': 'queue',
+                'emotion': None,
+                'common_values': {'minutes': [str(minutes) for minutes in range(1, 11)]}
+            },
+            'appointment_time': {
+                'template': "Your appointment is scheduled for {day} at {time}.",
+                'context': 'appointment',
+                'emotion': None,
+                'common_values': {'day': weekdays, 'time': appointment_times}
+            }
+        }
+        
         # Cost tracking
         self.usage_stats = {
             'characters_processed': 0,
             'api_calls': 0,
             'cache_hits': 0,
+            'characters_saved': 0,
             'total_cost_estimate': 0.0
         }
         
         logger.info("ElevenLabsVoiceHandler initialized with premium voice profiles")
     
     async def initialize_session(self):
-        """Initialize aiohttp session for API calls"""
+        """Initialize aiohttp session for API calls, one per event loop"""
+        loop = asyncio.get_running_loop()
+        if self.session and (self.session.closed or self._session_loop is not loop):
+            # Sessions are bound to the loop that created them
+            self.session = None
         if not self.session:
             headers = {
                 "xi-api-key": self.api_key,
                 "Content-Type": "application/json"
             }
             self.session = aiohttp.ClientSession(headers=headers)
+            self._session_loop = loop
     
     async def close_session(self):
         """Clean up aiohttp session"""
@@ -200,10 +279,11 @@ class ElevenLabsVoiceHandler:
             self.session = None
     
     async def generate_voice_for_context(self, text: str, context: str, 
-                                       emotion: EmotionStyle = None) -> str:
+                                       emotion: EmotionStyle = None, pin: bool = False) -> str:
         """
         Generate voice audio for specific context with appropriate voice and emotion
         
+        `pin` keeps the audio out of LRU eviction (static prompt segments).
         Returns: URL to generated audio file
         """
         try:
@@ -211,35 +291,34 @@ class ElevenLabsVoiceHandler:
             voice_profile_name = self.voice_selection_rules.get(context, 'karen_professional')
             voice_profile = self.voice_profiles[voice_profile_name]
             
-            # Check cache first
+            # Served from cache, or joined to an in-flight generation of the same audio
             cache_key = self._generate_cache_key(text, voice_profile_name, emotion)
-            cached_path = await self._get_from_cache(cache_key)
+            generated = False
             
-            if cached_path:
-                self.usage_stats['cache_hits'] += 1
-                logger.debug(f"Voice cache hit for context: {context}")
-                return cached_path
+            async def synthesize() -> Optional[bytes]:
+                nonlocal generated
+                generated = True
+                self.usage_stats['api_calls'] += 1
+                self.usage_stats['characters_processed'] += len(text)
+                self.usage_stats['total_cost_estimate'] += len(text) * 0.0001  # Rough estimate
+                return await self._generate_audio(text, voice_profile, emotion)
             
-            # Generate new audio
-            audio_url = await self._generate_audio(text, voice_profile, emotion)
+            audio_path = await self.audio_cache.get_or_generate(cache_key, synthesize, pinned=pin)
             
-            # Cache the result
-            if audio_url:
-                await self._save_to_cache(cache_key, audio_url)
-            
-            self.usage_stats['api_calls'] += 1
-            self.usage_stats['characters_processed'] += len(text)
-            self.usage_stats['total_cost_estimate'] += len(text) * 0.0001  # Rough estimate
+            if audio_path and not generated:
+                self.usage_stats['cache_hits'] += 1
+                self.usage_stats['characters_saved'] += len(text)
+                logger.debug(f"Voice cache hit for context: {context}")
             
-            return audio_url
+            return audio_path
             
         except Exception as e:
             logger.error(f"Failed to generate voice for context {context}: {e}")
             return None
     
     async def _generate_audio(self, text: str, voice_profile: VoiceProfile, 
-                            emotion: EmotionStyle = None) -> Optional[str]:
-        """Generate audio using ElevenLabs API"""
+                            emotion: EmotionStyle = None) -> Optional[bytes]:
+        """Generate audio bytes using ElevenLabs API; the cache writes them to disk"""
         try:
             await self.initialize_session()
             
@@ -258,26 +337,14 @@ class ElevenLabsVoiceHandler:
             # Add optimization parameters
             params = {
                 "optimize_streaming_latency": "3",  # Balance quality vs speed
-                "output_format": "mp3_44100_128"    # Good quality, reasonable size
+                "output_format": self.OUTPUT_FORMAT
             }
             
             async with self.session.post(url, json=payload, params=params) as response:
                 if response.status == 200:
-                    # Save audio to temporary file
                     audio_data = await response.read()
-                    
-                    # Create temporary file with proper extension
-                    temp_file = tempfile.NamedTemporaryFile(
-                        delete=False, 
-                        suffix='.mp3',
-                        dir=self.cache_dir
-                    )
-                    
-                    temp_file.write(audio_data)
-                    temp_file.close()
-                    
                     logger.debug(f"Generated audio: {len(audio_data)} bytes for voice {voice_profile.name}")
-                    return temp_file.name
+                    return audio_data
                 else:
                     error_text = await response.text()
                     logger.error(f"ElevenLabs API error {response.status}: {error_text}")
@@ -326,39 +393,20 @@ class ElevenLabsVoiceHandler:
     
     def _generate_cache_key(self, text: str, voice_profile: str, 
                           emotion: EmotionStyle = None) -> str:
-        """Generate cache key for text/voice/emotion combination"""
-        emotion_str = emotion.value if emotion else "neutral"
-        combined = f"{text}|{voice_profile}|{emotion_str}"
-        return hashlib.md5(combined.encode()).hexdigest()
-    
-    async def _get_from_cache(self, cache_key: str) -> Optional[str]:
-        """Check if audio is cached"""
-        cache_file = self.cache_dir / f"{cache_key}.mp3"
-        if cache_file.exists():
-            # Check if cache is still fresh (24 hours)
-            if datetime.now() - datetime.fromtimestamp(cache_file.stat().st_mtime) < timedelta(hours=24):
-                return str(cache_file)
-        return None
-    
-    async def _save_to_cache(self, cache_key: str, audio_path: str):
-        """Save audio to cache"""
-        try:
-            cache_file = self.cache_dir / f"{cache_key}.mp3"
-            
-            # Copy temp file to cache
-            import shutil
-            shutil.copy2(audio_path, cache_file)
-            
-            logger.debug(f"Cached audio: {cache_key}")
-            
-        except Exception as e:
-            logger.error(f"Failed to cache audio: {e}")
+        """
+        Content address for text/voice/emotion: hashes everything sent to the
+        API, so changing a profile's voice, model or settings never serves stale audio
+        """
+        profile = self.voice_profiles[voice_profile]
+        settings = self._adjust_settings_for_emotion(profile.settings, emotion)
+        return content_key(text, profile.voice_id, profile.model.value,
+                           json.dumps(settings.to_dict(), sort_keys=True), self.OUTPUT_FORMAT)
     
-    async def pre_generate_common_phrases(self):
-        """Pre-generate and cache commonly used phrases"""
+    async def pre_generate_common_phrases(self) -> Dict[str, int]:
+        """Pre-generate and cache commonly used phrases and every template fill"""
         logger.info("Pre-generating common phrases for cache")
         
-        tasks = []
+        jobs = []
         for phrase_name, text in self.common_phrases.items():
             # Determine context from phrase name
             if 'emergency' in phrase_name:
@@ -371,37 +419,102 @@ class ElevenLabsVoiceHandler:
                 context = 'thank_you'
             else:
                 context = 'general'
-            
-            task = self.generate_voice_for_context(text, context)
-            tasks.append(task)
+            jobs.append((text, context, None))
+        
+        for template in self.phrase_templates.values():
+            for variables in template['variables']:
+                jobs.append((self.render_template(template['template'], variables),
+                             template['context'], template['emotion']))
+        
+        # Static segments and common slot values of stitched templates, pinned
+        segment_jobs = set()
+        for template in self.stitched_templates.values():
+            slots = {name: f"{{{name}}}" for name in template_variables(template['template'])}
+            pieces = [text for text, is_variable in segment_texts(template['template'], slots) if not is_variable]
+            for values in template['common_values'].values():
+                pieces.extend(values)
+            segment_jobs.update((text, template['context'], template['emotion'], True) for text in pieces)
+        jobs = [job + (False,) for job in jobs] + sorted(segment_jobs, key=lambda job: job[:2])
+        
+        # Generate concurrently, bounded to stay within API rate limits
+        semaphore = asyncio.Semaphore(self.PREGENERATE_CONCURRENCY)
         
-        # Generate all phrases concurrently
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        async def render(text: str, context: str, emotion: Optional[EmotionStyle], pin: bool):
+            async with semaphore:
+                return await self.generate_voice_for_context(text, context, emotion, pin=pin)
+        
+        results = await asyncio.gather(*(render(*job) for job in jobs), return_exceptions=True)
         
         successful = sum(1 for r in results if isinstance(r, str))
-        logger.info(f"Pre-generated {successful}/{len(tasks)} common phrases")
+        logger.info(f"Pre-generated {successful}/{len(jobs)} common phrases")
+        return {'rendered': successful, 'total': len(jobs)}
+    
+    @staticmethod
+    def render_template(template: str, variables: Dict[str, str]) -> str:
+        """Substitute {name} placeholders; unknown placeholders are left as-is"""
+        message = template
+        for var_name, var_value in variables.items():
+            message = message.replace(f"{{{var_name}}}", var_value)
+        return message
     
     async def generate_dynamic_message(self, template: str, variables: Dict[str, str], 
                                      context: str) -> str:
         """Generate voice for dynamic messages with variable substitution"""
         try:
-            # Substitute variables in template
-            message = template
-            for var_name, var_value in variables.items():
-                placeholder = f"{{{var_name}}}"
-                message = message.replace(placeholder, var_value)
+            if self.stitch_dynamic_messages and template_variables(template):
+                return await self.generate_stitched_message(template, variables, context)
             
+            message = self.render_template(template, variables)
             return await self.generate_voice_for_context(message, context)
             
         except Exception as e:
             logger.error(f"Failed to generate dynamic message: {e}")
             return None
     
+    async def generate_stitched_message(self, template: str, variables: Dict[str, str],
+                                        context: str, emotion: EmotionStyle = None) -> Optional[str]:
+        """
+        Assemble a dynamic message from separately cached segments.
+        
+        Static template text is synthesized once and pinned; only variable
+        values not seen before reach the API. Segments are joined frame-level
+        without re-encoding, and the assembled message is cached as well.
+        Falls back to whole-sentence synthesis if any segment fails.
+        """
+        message = self.render_template(template, variables)
+        voice_profile_name = self.voice_selection_rules.get(context, 'karen_professional')
+        stitched_key = content_key('stitched', template, self._generate_cache_key(message, voice_profile_name, emotion))
+        
+        cached_path = self.audio_cache.get(stitched_key)
+        if cached_path:
+            self.usage_stats['cache_hits'] += 1
+            self.usage_stats['characters_saved'] += len(message)
+            return cached_path
+        
+        pieces = segment_texts(template, variables)
+        segment_paths = await asyncio.gather(*(
+            self.generate_voice_for_context(text, context, emotion, pin=not is_variable)
+            for text, is_variable in pieces
+        ))
+        if not pieces or not all(segment_paths):
+            logger.warning(f"Segment synthesis incomplete, synthesizing whole message for context: {context}")
+            return await self.generate_voice_for_context(message, context, emotion)
+        
+        segments = []
+        for path in segment_paths:
+            with open(path, 'rb') as segment_file:
+                segments.append(segment_file.read())
+        
+        return self.audio_cache.put(stitched_key, concat_audio(segments, self.OUTPUT_FORMAT))
+    
     async def get_voice_for_menu_option(self, option_text: str, option_number: str) -> str:
         """Generate voice for specific menu option with proper formatting"""
         try:
-            # Format menu option with proper pacing
-            formatted_text = f"For {option_text}, press {option_number}."
+            # Format menu option with proper pacing (same template as pre-rendered prompts)
+            formatted_text = self.render_template(
+                self.phrase_templates['menu_option']['template'],
+                {'option_text': option_text, 'option_number': str(option_number)}
+            )
             
             return await self.generate_voice_for_context(formatted_text, 'menu')
             
@@ -420,9 +533,18 @@ class ElevenLabsVoiceHandler:
                 time_greeting = "Hello"
             
             if customer_name:
-                greeting = f"{time_greeting}, {customer_name}! Thank you for calling 757 Handy."
+                named_greeting = self.stitched_templates['named_greeting']
+                variables = {'time_greeting': time_greeting, 'customer_name': customer_name}
+                if self.stitch_dynamic_messages:
+                    return await self.generate_stitched_message(
+                        named_greeting['template'], variables, 'greeting', EmotionStyle.WARM
+                    )
+                greeting = self.render_template(named_greeting['template'], variables)
+            elif time_of_day:
+                greeting = self.render_template(self.phrase_templates['time_greeting']['template'],
+                                                {'time_of_day': time_of_day})
             else:
-                greeting = f"{time_greeting}! Thank you for calling 757 Handy, Hampton Roads' premier home improvement experts."
+                greeting = self.phrase_templates['plain_greeting']['template']
             
             return await self.generate_voice_for_context(greeting, 'greeting', EmotionStyle.WARM)
             
@@ -432,38 +554,29 @@ class ElevenLabsVoiceHandler:
     
     def get_usage_stats(self) -> Dict[str, Any]:
         """Get usage statistics for monitoring and cost control"""
+        cache_stats = self.audio_cache.get_stats()
         return {
             **self.usage_stats,
             'cache_hit_rate': (
                 self.usage_stats['cache_hits'] / 
                 max(1, self.usage_stats['cache_hits'] + self.usage_stats['api_calls'])
             ),
+            'cost_saved_estimate': self.usage_stats['characters_saved'] * 0.0001,
+            'bytes_saved': cache_stats['bytes_saved'],
             'estimated_monthly_cost': self.usage_stats['total_cost_estimate'] * 30,
             'voices_available': len(self.voice_profiles),
-            'cache_size_mb': self._get_cache_size_mb()
+            'cache_size_mb': self._get_cache_size_mb(),
+            'cache': cache_stats
         }
     
     def _get_cache_size_mb(self) -> float:
-        """Calculate cache directory size in MB"""
-        try:
-            total_size = sum(
-                f.stat().st_size for f in self.cache_dir.rglob('*') if f.is_file()
-            )
-            return total_size / (1024 * 1024)
-        except:
-            return 0.0
+        """Cache size in MB, from the in-memory index"""
+        return self.audio_cache.total_bytes / (1024 * 1024)
     
     async def cleanup_old_cache(self, days_old: int = 7):
         """Clean up old cached audio files"""
         try:
-            cutoff_time = datetime.now() - timedelta(days=days_old)
-            removed_count = 0
-            
-            for cache_file in self.cache_dir.glob('*.mp3'):
-                if datetime.fromtimestamp(cache_file.stat().st_mtime) < cutoff_time:
-                    cache_file.unlink()
-                    removed_count += 1
-            
+            removed_count = self.audio_cache.evict_older_than(days_old * 86400)
             logger.info(f"Cleaned up {removed_count} old cache files")
             
         except Exception as e:
@@ -492,15 +605,28 @@ class ElevenLabsVoiceHandler:
             logger.error(f"Failed to validate audio quality: {e}")
             return {'is_valid': False, 'error': str(e)}
 
+# One handler per process, so voice profiles, the cache index and the HTTP session are reused
+_shared_voice_handler: Optional[ElevenLabsVoiceHandler] = None
+
+def get_elevenlabs_voice_handler() -> ElevenLabsVoiceHandler:
+    """Shared ElevenLabsVoiceHandler, created on first use"""
+    global _shared_voice_handler
+    if _shared_voice_handler is None:
+        _shared_voice_handler = ElevenLabsVoiceHandler()
+    return _shared_voice_handler
+
 # Integration functions for existing voice webhook handler
 async def get_elevenlabs_audio_url(text: str, context: str = 'general', 
-                                 emotion: str = None) -> Optional[str]:
+                                 emotion: str = None, template: str = None,
+                                 variables: Dict[str, str] = None) -> Optional[str]:
     """
     Convenience function to get ElevenLabs audio URL
     To be called from TwiML generation in voice_webhook_handler.py
+    
+    With `template` and `variables` the audio is stitched from cached segments.
     """
     try:
-        voice_handler = ElevenLabsVoiceHandler()
+        voice_handler = get_elevenlabs_voice_handler()
         
         emotion_enum = None
         if emotion:
@@ -509,8 +635,10 @@ async def get_elevenlabs_audio_url(text: str, context: str = 'general',
             except ValueError:
                 logger.warning(f"Invalid emotion style: {emotion}")
         
-        audio_path = await voice_handler.generate_voice_for_context(text, context, emotion_enum)
-        await voice_handler.close_session()
+        if template and variables is not None and voice_handler.stitch_dynamic_messages:
+            audio_path = await voice_handler.generate_stitched_message(template, variables, context, emotion_enum)
+        else:
+            audio_path = await voice_handler.generate_voice_for_context(text, context, emotion_enum)
         
         if audio_path:
             # Convert local path to accessible URL
@@ -525,10 +653,13 @@ async def get_elevenlabs_audio_url(text: str, context: str = 'general',
         logger.error(f"Failed to get ElevenLabs audio: {e}")
         return None
 
-def enhance_twiml_with_elevenlabs(voice_response, text: str, context: str = 'general'):
+def enhance_twiml_with_elevenlabs(voice_response, text: str, context: str = 'general',
+                                  template: str = None, variables: Dict[str, str] = None):
     """
     Enhance TwiML VoiceResponse with ElevenLabs audio
     Falls back to standard TTS if ElevenLabs fails
+    
+    `text` should be `template` rendered with `variables` when those are given.
     """
     try:
         # Try to get ElevenLabs audio URL
@@ -537,10 +668,15 @@ def enhance_twiml_with_elevenlabs(voice_response, text: str, context: str = 'gen
         # Run async function in sync context
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        audio_url = loop.run_until_complete(
-            get_elevenlabs_audio_url(text, context)
-        )
-        loop.close()
+        try:
+            audio_url = loop.run_until_complete(
+                get_elevenlabs_audio_url(text, context, template=template, variables=variables)
+            )
+        finally:
+            # The shared handler's session belongs to this loop
+            if _shared_voice_handler is not None:
+                loop.run_until_complete(_shared_voice_handler.close_session())
+            loop.close()
         
         if audio_url:
             # Use ElevenLabs audio
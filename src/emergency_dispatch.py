@@ -0,0 +1,168 @@
+"""
+Emergency Dispatch - Priority dispatch queue and rolling per-caller call windows
+Used by EmergencyHandler.
+
+Both structures keep their state in Redis when a client is available, so
+every process answering calls shares one queue and one call history, and
+fall back to in-process structures otherwise. The queue is a sorted set
+(a binary heap in memory) ordered by urgency score, highest first, then by
+arrival time; push and pop are O(log n) and the depth is O(1). Caller
+windows are per-caller sorted sets (deques in memory) trimmed to the window
+on every write, so lookups never scan more than a caller's recent calls.
+"""
+
+import heapq
+import itertools
+import json
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Sorted-set score: urgency buckets of 0.01 dominate, arrival seconds break ties
+_URGENCY_BUCKET_SPAN = 1e10
+
+
+def dispatch_score(urgency_score: float, arrived_at: float) -> float:
+    """Lower is served first: higher urgency, then earlier arrival"""
+    return -round(urgency_score * 100) * _URGENCY_BUCKET_SPAN + round(arrived_at, 3)
+
+
+class EmergencyDispatchQueue:
+    """Priority queue of calls waiting for dispatch"""
+
+    QUEUE_KEY = "emergency_dispatch:queue"
+    ENTRIES_KEY = "emergency_dispatch:entries"
+
+    def __init__(self, redis_client=None, time_fn: Callable[[], float] = time.time):
+        self.redis_client = redis_client
+        self._time = time_fn
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._sequence = itertools.count()
+
+    def push(self, call_sid: str, urgency_score: float, data: Optional[Dict[str, Any]] = None,
+             arrived_at: Optional[float] = None) -> float:
+        """Queue (or re-prioritize) a call; returns its dispatch score"""
+        arrived_at = self._time() if arrived_at is None else arrived_at
+        score = dispatch_score(urgency_score, arrived_at)
+        entry = dict(data or {}, call_sid=call_sid, urgency_score=urgency_score, arrived_at=arrived_at)
+
+        if self.redis_client:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zadd(self.QUEUE_KEY, {call_sid: score})
+            pipe.hset(self.ENTRIES_KEY, call_sid, json.dumps(entry, default=str))
+            pipe.execute()
+        else:
+            # Re-pushing leaves the old heap node behind; pop skips it
+            self._entries[call_sid] = (score, entry)
+            heapq.heappush(self._heap, (score, next(self._sequence), call_sid))
+        return score
+
+    def pop(self) -> Optional[Dict[str, Any]]:
+        """Remove and return the most urgent waiting call, if any"""
+        if self.redis_client:
+            # ZPOPMIN is atomic, so concurrent dispatchers never share a call
+            popped = self.redis_client.zpopmin(self.QUEUE_KEY)
+            if not popped:
+                return None
+            call_sid = popped[0][0]
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hget(self.ENTRIES_KEY, call_sid)
+            pipe.hdel(self.ENTRIES_KEY, call_sid)
+            data, _ = pipe.execute()
+            return json.loads(data) if data else {'call_sid': call_sid}
+
+        while self._heap:
+            score, _, call_sid = heapq.heappop(self._heap)
+            current = self._entries.get(call_sid)
+            if current is not None and current[0] == score:
+                del self._entries[call_sid]
+                return current[1]
+        return None
+
+    def peek(self) -> Optional[Dict[str, Any]]:
+        if self.redis_client:
+            head = self.redis_client.zrange(self.QUEUE_KEY, 0, 0)
+            if not head:
+                return None
+            data = self.redis_client.hget(self.ENTRIES_KEY, head[0])
+            return json.loads(data) if data else {'call_sid': head[0]}
+
+        while self._heap:
+            score, _, call_sid = self._heap[0]
+            current = self._entries.get(call_sid)
+            if current is not None and current[0] == score:
+                return current[1]
+            heapq.heappop(self._heap)
+        return None
+
+    def remove(self, call_sid: str) -> bool:
+        """Drop a call that no longer needs dispatch (answered, hung up)"""
+        if self.redis_client:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zrem(self.QUEUE_KEY, call_sid)
+            pipe.hdel(self.ENTRIES_KEY, call_sid)
+            removed, _ = pipe.execute()
+            return bool(removed)
+        return self._entries.pop(call_sid, None) is not None
+
+    def __len__(self) -> int:
+        if self.redis_client:
+            return self.redis_client.zcard(self.QUEUE_KEY)
+        return len(self._entries)
+
+
+class RollingCallWindow:
+    """Recent calls per caller within a fixed time window"""
+
+    KEY_PREFIX = "emergency_calls:"
+
+    def __init__(self, window_seconds: float = 86400, max_calls: int = 50, redis_client=None,
+                 time_fn: Callable[[], float] = time.time):
+        self.window_seconds = window_seconds
+        self.max_calls = max_calls
+        self.redis_client = redis_client
+        self._time = time_fn
+        self._calls: Dict[str, Deque[Tuple[float, Dict[str, Any]]]] = {}
+
+    def record(self, caller_id: str, call: Dict[str, Any], at: Optional[float] = None):
+        at = self._time() if at is None else at
+        call = dict(call, timestamp=at)
+
+        if self.redis_client:
+            key = f"{self.KEY_PREFIX}{caller_id}"
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zadd(key, {json.dumps(call, default=str): at})
+            pipe.zremrangebyscore(key, '-inf', at - self.window_seconds)
+            pipe.zremrangebyrank(key, 0, -self.max_calls - 1)
+            pipe.expire(key, int(self.window_seconds) + 60)
+            pipe.execute()
+            return
+
+        calls = self._calls.setdefault(caller_id, deque(maxlen=self.max_calls))
+        calls.append((at, call))
+        self._trim(caller_id, calls, at)
+
+    def recent(self, caller_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Calls inside the window, oldest first; `limit` keeps the newest ones"""
+        now = self._time()
+        if self.redis_client:
+            key = f"{self.KEY_PREFIX}{caller_id}"
+            members = self.redis_client.zrevrangebyscore(
+                key, '+inf', f"({now - self.window_seconds}", start=0, num=limit or self.max_calls
+            )
+            return [json.loads(member) for member in reversed(members)]
+
+        calls = self._calls.get(caller_id)
+        if not calls:
+            return []
+        self._trim(caller_id, calls, now)
+        entries = [call for _, call in calls]
+        return entries[-limit:] if limit else entries
+
+    def _trim(self, caller_id: str, calls: Deque, now: float):
+        cutoff = now - self.window_seconds
+        while calls and calls[0][0] <= cutoff:
+            calls.popleft()
+        if not calls:
+            del self._calls[caller_id]
@@ -9,6 +9,8 @@ from pydantic import BaseModel
 from datetime import datetime
 import uuid
 
+from ..knowledge_search import KnowledgeSearchIndex
+
 router = APIRouter()
 
 # Pydantic models for knowledge base
@@ -66,6 +68,21 @@ procedures_db = {}
 faqs_db = {}
 interactions_db = {}
 
+# BM25 index over procedures_db and faqs_db, updated on every write
+search_index = KnowledgeSearchIndex()
+
+def _index_procedure(procedure_data: Dict[str, Any]) -> None:
+    search_index.add_document(
+        f"procedure:{procedure_data['id']}",
+        [(procedure_data["name"], 2.0), (procedure_data["description"], 1.0)]
+    )
+
+def _index_faq(faq_data: Dict[str, Any]) -> None:
+    search_index.add_document(
+        f"faq:{faq_data['id']}",
+        [(faq_data["question"], 2.0), (faq_data["answer"], 1.0)]
+    )
+
 @router.post("/knowledge/procedures", response_model=ProcedureResponse)
 async def create_procedure(procedure: ProcedureCreate):
     """Create a new procedure."""
@@ -81,6 +98,7 @@ async def create_procedure(procedure: ProcedureCreate):
     }
     
     procedures_db[procedure_id] = procedure_data
+    _index_procedure(procedure_data)
     return ProcedureResponse(**procedure_data)
 
 @router.get("/knowledge/procedures", response_model=List[ProcedureResponse])
@@ -110,6 +128,7 @@ async def update_procedure(procedure_id: str, procedure_update: ProcedureUpdate)
         procedure_data[field] = value
     
     procedures_db[procedure_id] = procedure_data
+    _index_procedure(procedure_data)
     return ProcedureResponse(**procedure_data)
 
 @router.delete("/knowledge/procedures/{procedure_id}")
@@ -119,6 +138,7 @@ async def delete_procedure(procedure_id: str):
         raise HTTPException(status_code=404, detail="Procedure not found")
     
     del procedures_db[procedure_id]
+    search_index.remove_document(f"procedure:{procedure_id}")
     return {"message": "Procedure deleted successfully"}
 
 @router.post("/knowledge/faqs", response_model=FAQResponse)
@@ -134,6 +154,7 @@ async def create_faq(faq: FAQCreate):
     }
     
     faqs_db[faq_id] = faq_data
+    _index_faq(faq_data)
     return FAQResponse(**faq_data)
 
 @router.get("/knowledge/faqs", response_model=List[FAQResponse])
@@ -161,51 +182,36 @@ async def delete_faq(faq_id: str):
         raise HTTPException(status_code=404, detail="FAQ not found")
     
     del faqs_db[faq_id]
+    search_index.remove_document(f"faq:{faq_id}")
     return {"message": "FAQ deleted successfully"}
 
 @router.post("/knowledge/search", response_model=List[SearchResult])
 async def search_knowledge(search_request: SearchRequest):
-    """Search the knowledge base."""
-    query = search_request.query.lower()
+    """Search the knowledge base (BM25-ranked)."""
     results = []
     
-    # Search procedures
-    for proc_id, proc in procedures_db.items():
-        relevance = 0
-        if query in proc["name"].lower():
-            relevance += 0.8
-        if query in proc["description"].lower():
-            relevance += 0.6
-        
-        if relevance > 0:
+    for doc_id, score in search_index.search(search_request.query, limit=search_request.limit):
+        doc_type, item_id = doc_id.split(":", 1)
+        if doc_type == "procedure":
+            proc = procedures_db[item_id]
             results.append(SearchResult(
                 type="procedure",
-                id=proc_id,
+                id=item_id,
                 title=proc["name"],
                 content=proc["description"],
-                relevance_score=relevance
+                relevance_score=score
             ))
-    
-    # Search FAQs
-    for faq_id, faq in faqs_db.items():
-        relevance = 0
-        if query in faq["question"].lower():
-            relevance += 0.9
-        if query in faq["answer"].lower():
-            relevance += 0.7
-        
-        if relevance > 0:
+        else:
+            faq = faqs_db[item_id]
             results.append(SearchResult(
                 type="faq",
-                id=faq_id,
+                id=item_id,
                 title=faq["question"],
                 content=faq["answer"],
-                relevance_score=relevance
+                relevance_score=score
             ))
     
-    # Sort by relevance and limit results
-    results.sort(key=lambda x: x.relevance_score, reverse=True)
-    return results[:search_request.limit]
+    return results
 
 @router.post("/knowledge/learn")
 async def learn_from_interaction(interaction: InteractionRequest):
@@ -242,6 +248,7 @@ async def learn_from_interaction(interaction: InteractionRequest):
             "category": "auto-generated"
         }
         faqs_db[faq_id] = new_faq
+        _index_faq(new_faq)
         
         return {
             "message": "Interaction recorded and new FAQ created",
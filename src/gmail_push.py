@@ -0,0 +1,398 @@
+"""
+Gmail Push - users.watch registration and push-triggered mailbox processing
+Used by the FastAPI app (/gmail/push), celery_app (process_gmail_push_task,
+renew_gmail_watches_task) and `python -m src.gmail_push subscribe`.
+
+Gmail publishes a notification to a Pub/Sub topic whenever a watched mailbox
+changes. Notifications reach GmailPushDispatcher through the push endpoint or
+a pull subscriber. The dispatcher queues one processing run per mailbox; a
+burst of notifications while a run is queued adds nothing. The run first asks
+history.list whether any message was added to the inbox since the last run,
+so notifications for our own label changes end without a mailbox fetch.
+
+Watches expire after seven days and are renewed a day ahead. The cron polls
+stay in place as a slow safety net for lost notifications or a lapsed watch.
+"""
+
+import base64
+import binascii
+import hmac
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+try:
+    from celery import Celery
+    CELERY_AVAILABLE = True
+except ImportError:
+    CELERY_AVAILABLE = False
+    Celery = None
+
+try:
+    from fastapi import APIRouter, HTTPException, Request, Response
+    from starlette.concurrency import run_in_threadpool
+    FASTAPI_AVAILABLE = True
+except ImportError:
+    FASTAPI_AVAILABLE = False
+
+try:
+    from google.cloud import pubsub_v1
+    PUBSUB_AVAILABLE = True
+except ImportError:
+    PUBSUB_AVAILABLE = False
+    pubsub_v1 = None
+
+from src.celery_queues import EMAIL_QUEUE, ENQUEUED_AT_HEADER
+
+logger = logging.getLogger(__name__)
+
+PUSH_TASK_NAME = 'process_gmail_push_task'
+WATCH_LABEL_IDS = ('INBOX',)
+WATCH_RENEW_BEFORE_SECONDS = 24 * 60 * 60
+PENDING_TTL_SECONDS = 5 * 60
+PROCESSING_TTL_SECONDS = 10 * 60
+BUSY_REQUEUE_SECONDS = 5
+
+
+@dataclass
+class GmailNotification:
+    email_address: str
+    history_id: int
+    message_id: Optional[str] = None
+
+
+def decode_notification(data, message_id: Optional[str] = None) -> GmailNotification:
+    """Notification from a Pub/Sub message body: JSON with emailAddress and historyId"""
+    try:
+        payload = json.loads(data)
+        return GmailNotification(payload['emailAddress'].lower(), int(payload['historyId']), message_id)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Not a Gmail notification: {e}")
+
+
+def parse_push_envelope(envelope: Dict[str, Any]) -> GmailNotification:
+    """Notification from a Pub/Sub push request body (base64 message data)"""
+    try:
+        message = envelope['message']
+        data = base64.b64decode(message['data'])
+    except (KeyError, TypeError, binascii.Error) as e:
+        raise ValueError(f"Not a Pub/Sub push envelope: {e}")
+    return decode_notification(data, message.get('messageId') or message.get('message_id'))
+
+
+def configured_mailboxes() -> Dict[str, str]:
+    """Watched mailbox -> OAuth profile, from the environment"""
+    mailboxes = {}
+    for env_name, profile in (('MONITORED_EMAIL_ACCOUNT', 'gmail_monitor'),
+                              ('SECRETARY_EMAIL_ADDRESS', 'gmail_secretary')):
+        address = os.getenv(env_name)
+        if address:
+            mailboxes.setdefault(address.lower(), profile)
+    return mailboxes
+
+
+class GmailPushState:
+    """
+    Per-mailbox push state: queued-run and processing flags, the last
+    processed history id and the watch expiration. Shared through Redis when
+    a client is given, in process otherwise.
+    """
+
+    KEY_PREFIX = "gmail_push"
+
+    def __init__(self, redis_client=None, time_fn: Callable[[], float] = time.time):
+        self.redis_client = redis_client
+        self._time = time_fn
+        self._flags: Dict[str, float] = {}
+        self._history: Dict[str, int] = {}
+        self._watches: Dict[str, float] = {}
+
+    def _key(self, kind: str, email_address: str) -> str:
+        return f"{self.KEY_PREFIX}:{kind}:{email_address}"
+
+    def _set_flag(self, kind: str, email_address: str, ttl: float) -> bool:
+        key = self._key(kind, email_address)
+        if self.redis_client:
+            return bool(self.redis_client.set(key, self._time(), nx=True, ex=max(1, int(ttl))))
+        now = self._time()
+        if self._flags.get(key, 0) > now:
+            return False
+        self._flags[key] = now + ttl
+        return True
+
+    def _clear_flag(self, kind: str, email_address: str):
+        key = self._key(kind, email_address)
+        if self.redis_client:
+            self.redis_client.delete(key)
+        else:
+            self._flags.pop(key, None)
+
+    def mark_pending(self, email_address: str, ttl: float = PENDING_TTL_SECONDS) -> bool:
+        """True if no run was queued for the mailbox (the caller queues one)"""
+        return self._set_flag('pending', email_address, ttl)
+
+    def clear_pending(self, email_address: str):
+        self._clear_flag('pending', email_address)
+
+    def begin_processing(self, email_address: str, ttl: float = PROCESSING_TTL_SECONDS) -> bool:
+        return self._set_flag('processing', email_address, ttl)
+
+    def end_processing(self, email_address: str):
+        self._clear_flag('processing', email_address)
+
+    def history_id(self, email_address: str) -> Optional[int]:
+        if self.redis_client:
+            value = self.redis_client.hget(self._key('history', 'all'), email_address)
+            return int(value) if value else None
+        return self._history.get(email_address)
+
+    def advance_history_id(self, email_address: str, history_id: Optional[int]):
+        """Store the history id if it is newer (written only under the processing flag)"""
+        if history_id is None:
+            return
+        current = self.history_id(email_address)
+        if current is not None and current >= history_id:
+            return
+        if self.redis_client:
+            self.redis_client.hset(self._key('history', 'all'), email_address, history_id)
+        else:
+            self._history[email_address] = history_id
+
+    def watch_expiration(self, email_address: str) -> Optional[float]:
+        if self.redis_client:
+            value = self.redis_client.hget(self._key('watch', 'all'), email_address)
+            return float(value) if value else None
+        return self._watches.get(email_address)
+
+    def record_watch(self, email_address: str, expiration: float):
+        if self.redis_client:
+            self.redis_client.hset(self._key('watch', 'all'), email_address, expiration)
+        else:
+            self._watches[email_address] = expiration
+
+
+class GmailWatchManager:
+    """Registers users.watch for a mailbox and renews it before it expires"""
+
+    def __init__(self, state: GmailPushState, topic_name: str, label_ids: Iterable[str] = WATCH_LABEL_IDS,
+                 renew_before_seconds: float = WATCH_RENEW_BEFORE_SECONDS,
+                 time_fn: Callable[[], float] = time.time):
+        self.state = state
+        self.topic_name = topic_name
+        self.label_ids = list(label_ids)
+        self.renew_before_seconds = renew_before_seconds
+        self._time = time_fn
+
+    def needs_renewal(self, email_address: str) -> bool:
+        expiration = self.state.watch_expiration(email_address)
+        return expiration is None or expiration - self._time() <= self.renew_before_seconds
+
+    def ensure_watch(self, email_address: str, service, force: bool = False) -> bool:
+        """Register or renew the watch if it is missing or close to expiry; True if renewed"""
+        if not force and not self.needs_renewal(email_address):
+            return False
+        response = service.users().watch(userId='me', body={
+            'topicName': self.topic_name,
+            'labelIds': self.label_ids,
+            'labelFilterBehavior': 'INCLUDE',
+        }).execute()
+        expiration = int(response['expiration']) / 1000.0
+        self.state.record_watch(email_address, expiration)
+        # Changes before the watch started are the safety poll's to find
+        if self.state.history_id(email_address) is None:
+            self.state.advance_history_id(email_address, int(response['historyId']))
+        logger.info(f"Gmail watch on {email_address} renewed until "
+                    f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(expiration))} UTC")
+        return True
+
+
+class GmailPushDispatcher:
+    """Notification -> at most one queued processing run per mailbox"""
+
+    def __init__(self, state: GmailPushState, enqueue: Callable[[str, int], None],
+                 mailboxes: Optional[Iterable[str]] = None):
+        self.state = state
+        self.enqueue = enqueue
+        self.mailboxes = {address.lower() for address in mailboxes} if mailboxes is not None else None
+
+    def handle(self, notification: GmailNotification) -> bool:
+        """Queue a run for the notified mailbox; False if unknown, stale or already queued"""
+        email_address = notification.email_address
+        if self.mailboxes is not None and email_address not in self.mailboxes:
+            logger.warning(f"Gmail notification for unwatched mailbox {email_address} ignored")
+            return False
+        last_history_id = self.state.history_id(email_address)
+        if last_history_id is not None and notification.history_id <= last_history_id:
+            return False
+        if not self.state.mark_pending(email_address):
+            return False
+        try:
+            self.enqueue(email_address, notification.history_id)
+        except Exception:
+            self.state.clear_pending(email_address)
+            raise
+        logger.debug(f"Processing queued for {email_address} (history {notification.history_id})")
+        return True
+
+
+def inbox_messages_added(service, start_history_id: Optional[int]) -> Tuple[bool, Optional[int]]:
+    """
+    Whether any message reached the inbox after start_history_id, and the
+    mailbox's current history id. Without a usable start (none yet, or too
+    old for Gmail to answer) this reports True so the mailbox is fetched.
+    """
+    if start_history_id is None:
+        return True, None
+    page_token = None
+    latest = None
+    try:
+        while True:
+            response = service.users().history().list(
+                userId='me', startHistoryId=start_history_id, historyTypes='messageAdded',
+                labelId='INBOX', pageToken=page_token
+            ).execute()
+            latest = int(response['historyId']) if response.get('historyId') else latest
+            if any(record.get('messagesAdded') for record in response.get('history', [])):
+                return True, latest
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return False, latest
+    except Exception as e:
+        status = getattr(getattr(e, 'resp', None), 'status', None)
+        if status != 404:
+            logger.warning(f"history.list failed, fetching the mailbox instead: {e}")
+        return True, None
+
+
+def process_mailbox_push(email_address: str, history_id: int, service, process_mailbox: Callable[[], Any],
+                         state: GmailPushState, requeue: Callable[[], None]) -> str:
+    """
+    One push-triggered run: 'processed', 'skipped' (no new inbox message) or
+    'busy' (another run holds the mailbox; requeue is called to try again).
+    """
+    if not state.begin_processing(email_address):
+        # The queued flag stays set, so notifications meanwhile do not queue more runs
+        requeue()
+        return 'busy'
+    try:
+        # Notifications from here on queue a follow-up run
+        state.clear_pending(email_address)
+        added, latest = inbox_messages_added(service, state.history_id(email_address))
+        if added:
+            process_mailbox()
+        state.advance_history_id(email_address, max(history_id, latest or 0))
+        return 'processed' if added else 'skipped'
+    finally:
+        state.end_processing(email_address)
+
+
+_push_state: Optional[GmailPushState] = None
+_push_dispatcher: Optional[GmailPushDispatcher] = None
+_publisher_app = None
+
+
+def get_push_state() -> GmailPushState:
+    """Push state shared through the Celery broker's Redis, or in process without it"""
+    global _push_state
+    if _push_state is None:
+        client = None
+        redis_url = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+        if REDIS_AVAILABLE and redis_url.startswith(('redis://', 'rediss://')):
+            try:
+                client = redis.from_url(redis_url, socket_timeout=2)
+                client.ping()
+            except Exception as e:
+                logger.warning(f"Redis unavailable for Gmail push state, using memory: {e}")
+                client = None
+        _push_state = GmailPushState(client)
+    return _push_state
+
+
+def _get_publisher_app():
+    """One broker-only Celery app per process; its producer pool keeps the broker connection open"""
+    global _publisher_app
+    if _publisher_app is None:
+        if not CELERY_AVAILABLE:
+            raise RuntimeError("celery is required to queue Gmail push runs")
+        _publisher_app = Celery('gmail_push', broker=os.getenv('CELERY_BROKER_URL'))
+    return _publisher_app
+
+
+def _send_push_task(email_address: str, history_id: int):
+    """Publish process_gmail_push_task without importing the Celery app and its agents"""
+    _get_publisher_app().send_task(PUSH_TASK_NAME, args=[email_address, history_id], queue=EMAIL_QUEUE,
+                                   headers={ENQUEUED_AT_HEADER: time.time()})
+
+
+def get_push_dispatcher() -> GmailPushDispatcher:
+    global _push_dispatcher
+    if _push_dispatcher is None:
+        _push_dispatcher = GmailPushDispatcher(get_push_state(), _send_push_task, configured_mailboxes())
+    return _push_dispatcher
+
+
+def run_pull_subscriber(subscription_path: str, dispatcher: Optional[GmailPushDispatcher] = None):
+    """Receive notifications from a pull subscription (for hosts without a public push endpoint)"""
+    if not PUBSUB_AVAILABLE:
+        raise RuntimeError("google-cloud-pubsub is required for the pull subscriber")
+    dispatcher = dispatcher or get_push_dispatcher()
+
+    def callback(message):
+        try:
+            dispatcher.handle(decode_notification(message.data, message.message_id))
+        except ValueError as e:
+            logger.warning(f"Dropping unreadable Pub/Sub message {message.message_id}: {e}")
+        except Exception as e:
+            logger.error(f"Gmail notification not dispatched, redelivery requested: {e}", exc_info=True)
+            message.nack()
+            return
+        message.ack()
+
+    subscriber = pubsub_v1.SubscriberClient()
+    future = subscriber.subscribe(subscription_path, callback=callback)
+    logger.info(f"Listening for Gmail notifications on {subscription_path}")
+    with subscriber:
+        future.result()
+
+
+if FASTAPI_AVAILABLE:
+    router = APIRouter(prefix="/gmail", tags=["gmail"])
+
+    @router.post("/push", status_code=204)
+    async def gmail_push(request: Request, token: str = ''):
+        """Pub/Sub push endpoint; the subscription URL carries ?token=GMAIL_PUSH_VERIFICATION_TOKEN"""
+        expected = os.getenv('GMAIL_PUSH_VERIFICATION_TOKEN', '')
+        if not expected or not hmac.compare_digest(token, expected):
+            raise HTTPException(status_code=403, detail="Invalid push token")
+        try:
+            notification = parse_push_envelope(await request.json())
+        except ValueError as e:
+            # Acknowledge so Pub/Sub does not redeliver a message we can never read
+            logger.warning(f"Unreadable Gmail push notification: {e}")
+            return Response(status_code=204)
+        # Redis and the broker publish block, so keep them off the event loop;
+        # an error here returns 500 and Pub/Sub redelivers
+        await run_in_threadpool(get_push_dispatcher().handle, notification)
+        return Response(status_code=204)
+else:
+    router = None
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 2 or sys.argv[1] != 'subscribe':
+        print("Usage: python -m src.gmail_push subscribe  (reads GMAIL_PUSH_SUBSCRIPTION)")
+        sys.exit(2)
+    run_pull_subscriber(os.environ['GMAIL_PUSH_SUBSCRIPTION'])
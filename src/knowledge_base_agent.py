@@ -8,6 +8,8 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 import uuid
 
+from .knowledge_search import KnowledgeSearchIndex
+
 logger = logging.getLogger(__name__)
 
 # Define data models inline for now (these would typically be in separate model files)
@@ -43,12 +45,13 @@ class KnowledgeBaseAgent:
     Knowledge base management agent that handles procedures, FAQs, and learning from interactions.
     """
     
-    def __init__(self, user_role: str = 'user'):
+    def __init__(self, user_role: str = 'user', use_embeddings: bool = False):
         """
         Initialize the KnowledgeBaseAgent.
         
         Args:
             user_role: Role of the user (admin, user, etc.)
+            use_embeddings: Blend sentence-transformer similarity into search ranking
         """
         self.user_role = user_role
         
@@ -58,6 +61,10 @@ class KnowledgeBaseAgent:
         self.client_histories: Dict[str, ClientHistory] = {}
         self.pricing: Dict[str, Pricing] = {}
         
+        # Search index kept in step with every procedure/FAQ change
+        self._faq_ids_by_question: Dict[str, str] = {}
+        self.search_index = KnowledgeSearchIndex(embed_fn=self._load_embed_fn() if use_embeddings else None)
+        
         logger.info(f"KnowledgeBaseAgent initialized with role: {user_role}")
     
     def add_procedure(self, procedure: Procedure) -> bool:
@@ -72,6 +79,7 @@ class KnowledgeBaseAgent:
         """
         try:
             self.procedures[procedure.id] = procedure
+            self._index_procedure(procedure)
             logger.info(f"Added procedure: {procedure.name} (ID: {procedure.id})")
             return True
             
@@ -115,6 +123,7 @@ class KnowledgeBaseAgent:
                     setattr(procedure, field, value)
                     logger.info(f"Updated procedure {procedure_id} field {field} to {value}")
             
+            self._index_procedure(procedure)
             return True
             
         except Exception as e:
@@ -134,6 +143,7 @@ class KnowledgeBaseAgent:
         try:
             if procedure_id in self.procedures:
                 del self.procedures[procedure_id]
+                self.search_index.remove_document(f"procedure:{procedure_id}")
                 logger.info(f"Deleted procedure: {procedure_id}")
                 return True
             else:
@@ -185,18 +195,16 @@ class KnowledgeBaseAgent:
                 question = interaction['question']
                 
                 # Check if this question already exists in FAQs
-                existing_faq = None
-                for faq in self.faqs.values():
-                    if faq.question.lower() == question.lower():
-                        existing_faq = faq
-                        break
+                existing_faq_id = self._faq_ids_by_question.get(question.lower())
                 
-                if not existing_faq:
+                if existing_faq_id not in self.faqs:
                     # Create a new FAQ
                     faq_id = str(uuid.uuid4())
                     answer = self._generate_answer_for_question(question)
                     new_faq = FAQ(faq_id, question, answer)
                     self.faqs[faq_id] = new_faq
+                    self._faq_ids_by_question[question.lower()] = faq_id
+                    self._index_faq(new_faq)
                     logger.info(f"Created new FAQ from interaction: {question}")
             
             logger.info(f"Learned from interaction for client {client_id}")
@@ -223,49 +231,66 @@ class KnowledgeBaseAgent:
         
         return faqs
     
-    def search_knowledge(self, query: str) -> List[Dict[str, Any]]:
+    def search_knowledge(self, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Search the knowledge base for relevant information.
         
         Args:
             query: Search query string
+            limit: Maximum number of results (None for all matches)
             
         Returns:
-            List of relevant knowledge items
+            List of relevant knowledge items, best match first
         """
         results = []
-        query_lower = query.lower()
         
-        # Search procedures
-        for procedure in self.procedures.values():
-            if (query_lower in procedure.name.lower() or 
-                query_lower in procedure.description.lower()):
+        for doc_id, score in self.search_index.search(query, limit=limit):
+            doc_type, item_id = doc_id.split(':', 1)
+            if doc_type == 'procedure':
+                procedure = self.procedures[item_id]
                 results.append({
                     'type': 'procedure',
                     'id': procedure.id,
                     'name': procedure.name,
                     'description': procedure.description,
-                    'relevance_score': 0.8  # Simple scoring
+                    'relevance_score': score
                 })
-        
-        # Search FAQs
-        for faq in self.faqs.values():
-            if (query_lower in faq.question.lower() or 
-                query_lower in faq.answer.lower()):
+            else:
+                faq = self.faqs[item_id]
                 results.append({
                     'type': 'faq',
                     'id': faq.id,
                     'question': faq.question,
                     'answer': faq.answer,
-                    'relevance_score': 0.7
+                    'relevance_score': score
                 })
         
-        # Sort by relevance score
-        results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        
         logger.info(f"Knowledge search for '{query}' returned {len(results)} results")
         return results
     
+    def _index_procedure(self, procedure: Procedure) -> None:
+        """Add or refresh a procedure in the search index"""
+        self.search_index.add_document(
+            f"procedure:{procedure.id}",
+            [(procedure.name, 2.0), (procedure.description, 1.0), (' '.join(procedure.required_tools or []), 0.5)]
+        )
+    
+    def _index_faq(self, faq: FAQ) -> None:
+        """Add or refresh an FAQ in the search index"""
+        self.search_index.add_document(
+            f"faq:{faq.id}",
+            [(faq.question, 2.0), (faq.answer, 1.0), (faq.category, 0.5)]
+        )
+    
+    def _load_embed_fn(self):
+        """Return the sentence-transformer embedding function, or None if unavailable"""
+        try:
+            from .memory_embeddings_manager import EmbeddingGenerator
+            return EmbeddingGenerator().generate_embedding
+        except Exception as e:
+            logger.warning(f"Embeddings unavailable, knowledge search will use BM25 only: {e}")
+            return None
+    
     def _generate_answer_for_question(self, question: str) -> str:
         """
         Generate an answer for a question (placeholder implementation).
@@ -0,0 +1,179 @@
+"""
+Knowledge Search Index - Incremental BM25 inverted index for knowledge base lookups.
+Used by KnowledgeBaseAgent and the /knowledge/search endpoint so FAQ and
+procedure lookups are ranked and do not scan every entry.
+"""
+
+import heapq
+import logging
+import math
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "my", "of", "on", "or", "the", "to",
+    "what", "when", "where", "which", "who", "why", "will", "with", "you", "your",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stop words and fold simple plurals"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class KnowledgeSearchIndex:
+    """
+    Inverted index with BM25 scoring, updated one document at a time.
+
+    Documents are added with per-field text and weights, e.g. a FAQ question
+    counts more than its answer. Optionally an `embed_fn` (text -> vector) turns
+    on hybrid ranking, blending normalized BM25 with cosine similarity.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75,
+                 embed_fn: Optional[Callable[[str], Sequence[float]]] = None,
+                 semantic_weight: float = 0.3):
+        self.k1 = k1
+        self.b = b
+        self.embed_fn = embed_fn
+        self.semantic_weight = semantic_weight
+
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._payloads: Dict[str, Any] = {}
+        self._embeddings: Dict[str, Tuple[float, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_lengths
+
+    def add_document(self, doc_id: str, fields: Iterable[Tuple[str, float]], payload: Any = None):
+        """Index (or re-index) a document from (text, weight) field pairs"""
+        if doc_id in self._doc_lengths:
+            self.remove_document(doc_id)
+
+        term_freqs: Counter = Counter()
+        full_text = []
+        for text, weight in fields:
+            if not text:
+                continue
+            full_text.append(text)
+            for token in tokenize(text):
+                term_freqs[token] += weight
+
+        doc_terms = dict(term_freqs)
+        length = sum(doc_terms.values())
+        for term, freq in doc_terms.items():
+            self._postings.setdefault(term, {})[doc_id] = freq
+
+        self._doc_terms[doc_id] = doc_terms
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        self._payloads[doc_id] = payload
+
+        if self.embed_fn:
+            try:
+                self._embeddings[doc_id] = self._normalize(self.embed_fn(" ".join(full_text)))
+            except Exception as e:
+                logger.warning(f"Failed to embed knowledge document {doc_id}: {e}")
+
+    def remove_document(self, doc_id: str) -> bool:
+        """Remove a document; only its own postings are touched"""
+        doc_terms = self._doc_terms.pop(doc_id, None)
+        if doc_terms is None:
+            return False
+
+        for term in doc_terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        self._payloads.pop(doc_id, None)
+        self._embeddings.pop(doc_id, None)
+        return True
+
+    def get_payload(self, doc_id: str) -> Any:
+        return self._payloads.get(doc_id)
+
+    def search(self, query: str, limit: Optional[int] = 10,
+               doc_filter: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """Return (doc_id, score) pairs ranked by BM25, or hybrid score when embeddings are on"""
+        scores = self._bm25_scores(tokenize(query))
+        if doc_filter:
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_filter(doc_id)}
+
+        if self.embed_fn and self._embeddings:
+            scores = self._hybrid_scores(query, scores, doc_filter)
+
+        if limit:
+            return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _bm25_scores(self, query_terms: List[str]) -> Dict[str, float]:
+        doc_count = len(self._doc_lengths)
+        if not doc_count or not query_terms:
+            return {}
+
+        avg_length = self._total_length / doc_count or 1.0
+        k1 = self.k1
+        b = self.b
+        doc_lengths = self._doc_lengths
+        scores: Dict[str, float] = {}
+
+        for term in set(query_terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = k1 * (1.0 - b + b * doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+
+        return scores
+
+    def _hybrid_scores(self, query: str, bm25_scores: Dict[str, float],
+                       doc_filter: Optional[Callable[[str], bool]]) -> Dict[str, float]:
+        try:
+            query_vector = self._normalize(self.embed_fn(query))
+        except Exception as e:
+            logger.warning(f"Failed to embed knowledge query, using BM25 only: {e}")
+            return bm25_scores
+
+        max_bm25 = max(bm25_scores.values(), default=0.0) or 1.0
+        weight = self.semantic_weight
+        hybrid = {}
+        for doc_id, vector in self._embeddings.items():
+            if doc_filter and not doc_filter(doc_id):
+                continue
+            similarity = sum(q * d for q, d in zip(query_vector, vector))
+            lexical = bm25_scores.get(doc_id, 0.0) / max_bm25
+            score = (1.0 - weight) * lexical + weight * max(similarity, 0.0)
+            if score > 0:
+                hybrid[doc_id] = score
+        return hybrid
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> Tuple[float, ...]:
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return tuple(v / norm for v in vector)
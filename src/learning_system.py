@@ -8,11 +8,16 @@ import json
 import os
 import logging
 import statistics
+import tempfile
+import threading
+import atexit
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any, Set
+from typing import Callable, Dict, List, Optional, Tuple, Any, Set
 from pathlib import Path
 from dataclasses import dataclass, asdict
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, deque
+from itertools import islice
 import numpy as np
 from enum import Enum
 import pickle
@@ -96,12 +101,135 @@ class ArchitectureImprovement:
     suggested_timeline: str   # Implementation timeframe
     confidence: float         # 0.0-1.0 confidence in this suggestion
 
+def _atomic_write_json(path: Path, data: Dict[str, Any]):
+    """Write JSON to a temp file in the target directory and rename it into place"""
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class WriteBehindPersistence:
+    """
+    Batches save requests and flushes them from a background thread.
+    A flush happens when `flush_interval` seconds have passed since the first
+    pending change or when `max_pending` changes have accumulated.
+    """
+
+    def __init__(self, flush_fn: Callable[[Set[str]], None], flush_interval: float = 5.0,
+                 max_pending: int = 50):
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._dirty_sections: Set[str] = set()
+        self._pending = 0
+        self._first_pending_at: Optional[float] = None
+
+        self.flush_count = 0
+        self.events_written = 0
+
+        self._thread = threading.Thread(target=self._run, name="learning-write-behind", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, *sections: str):
+        """Record that the given sections changed; never touches the disk"""
+        with self._lock:
+            self._dirty_sections.update(sections)
+            self._pending += 1
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            if self._pending >= self.max_pending:
+                self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def flush(self):
+        """Write out all pending sections now"""
+        with self._flush_lock:
+            with self._lock:
+                sections = self._dirty_sections
+                pending = self._pending
+                self._dirty_sections = set()
+                self._pending = 0
+                self._first_pending_at = None
+
+            if not sections:
+                return
+
+            try:
+                self.flush_fn(sections)
+                self.flush_count += 1
+                self.events_written += pending
+            except Exception as e:
+                logger.error(f"Error flushing learning data: {e}")
+                # Keep the sections dirty so the next flush retries them
+                with self._lock:
+                    self._dirty_sections.update(sections)
+                    self._pending += pending
+                    if self._first_pending_at is None:
+                        self._first_pending_at = time.monotonic()
+
+    def close(self):
+        """Stop the background thread and flush anything still pending"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 1.0)
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=self._time_until_due())
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            if self._is_due():
+                self.flush()
+
+    def _time_until_due(self) -> float:
+        with self._lock:
+            if self._first_pending_at is None:
+                return self.flush_interval
+            elapsed = time.monotonic() - self._first_pending_at
+        return max(0.0, self.flush_interval - elapsed)
+
+    def _is_due(self) -> bool:
+        with self._lock:
+            if not self._pending:
+                return False
+            if self._pending >= self.max_pending:
+                return True
+            return time.monotonic() - self._first_pending_at >= self.flush_interval
+
 class LearningSystem:
     """
     Advanced learning system that analyzes agent performance and suggests improvements
     """
+
+    PERFORMANCE_HISTORY_SIZE = 1000
+    FAILURE_HISTORY_SIZE = 500
+    EXAMPLES_PER_PATTERN = 10
+    # Confidence decay for stale patterns runs at most this often instead of on every task
+    PATTERN_MAINTENANCE_INTERVAL = timedelta(days=1)
     
-    def __init__(self, agent_name: str = "learning_system"):
+    def __init__(self, agent_name: str = "learning_system", flush_interval: float = 5.0,
+                 flush_every: int = 50):
         self.agent_name = agent_name
         self.comm = AgentCommunication(agent_name)
         
@@ -121,12 +249,23 @@ class LearningSystem:
         self.architecture_improvements: Dict[str, ArchitectureImprovement] = {}
         
         # Analysis caches
-        self.performance_history = []
+        self.performance_history = deque(maxlen=self.PERFORMANCE_HISTORY_SIZE)
         self.routing_history = []
-        self.failure_history = []
+        self.failure_history = deque(maxlen=self.FAILURE_HISTORY_SIZE)
+        self._performance_time_total = 0.0
+        self._last_pattern_maintenance = datetime.now()
+        self._lock = threading.RLock()
         
         # Load existing patterns and data
         self._load_learning_data()
+
+        # Pattern files are written behind the completion path in batches
+        self._persistence = WriteBehindPersistence(
+            self._save_learning_data,
+            flush_interval=flush_interval,
+            max_pending=flush_every
+        )
+        atexit.register(self._persistence.close)
         
         logger.info(f"LearningSystem initialized with {len(self.task_patterns)} patterns")
 
@@ -173,46 +312,54 @@ class LearningSystem:
         except Exception as e:
             logger.error(f"Error loading learning data: {e}")
 
-    def _save_learning_data(self):
-        """Save learning data to files"""
-        try:
-            # Save task patterns
-            patterns_file = self.patterns_dir / 'task_patterns.json'
-            patterns_data = {}
-            for pattern_id, pattern in self.task_patterns.items():
-                pattern_dict = asdict(pattern)
-                pattern_dict['discovered_at'] = pattern.discovered_at.isoformat()
-                pattern_dict['last_updated'] = pattern.last_updated.isoformat()
-                pattern_dict['pattern_type'] = pattern.pattern_type.value
-                patterns_data[pattern_id] = pattern_dict
-            
-            with open(patterns_file, 'w') as f:
-                json.dump(patterns_data, f, indent=2)
-            
-            # Save failure patterns
-            failures_file = self.patterns_dir / 'failure_patterns.json'
-            failures_data = {}
-            for pattern_id, pattern in self.failure_patterns.items():
-                pattern_dict = asdict(pattern)
-                pattern_dict['discovered_at'] = pattern.discovered_at.isoformat()
-                pattern_dict['failure_category'] = pattern.failure_category.value
-                pattern_dict['affected_skills'] = [skill.value for skill in pattern.affected_skills]
-                failures_data[pattern_id] = pattern_dict
-            
-            with open(failures_file, 'w') as f:
-                json.dump(failures_data, f, indent=2)
-            
-            # Save architecture improvements
-            improvements_file = self.improvements_dir / 'suggestions.json'
-            improvements_data = {}
-            for improvement_id, improvement in self.architecture_improvements.items():
-                improvements_data[improvement_id] = asdict(improvement)
-            
-            with open(improvements_file, 'w') as f:
-                json.dump(improvements_data, f, indent=2)
-                
-        except Exception as e:
-            logger.error(f"Error saving learning data: {e}")
+    def _save_learning_data(self, sections: Optional[Set[str]] = None):
+        """
+        Save learning data to files. Only the named sections ('task_patterns',
+        'failure_patterns', 'improvements') are written; None writes all of them.
+        Data is snapshotted under the lock and each file is replaced atomically.
+        """
+        if sections is None:
+            sections = {'task_patterns', 'failure_patterns', 'improvements'}
+
+        writes = []
+        with self._lock:
+            if 'task_patterns' in sections:
+                patterns_data = {}
+                for pattern_id, pattern in self.task_patterns.items():
+                    pattern_dict = asdict(pattern)
+                    pattern_dict['discovered_at'] = pattern.discovered_at.isoformat()
+                    pattern_dict['last_updated'] = pattern.last_updated.isoformat()
+                    pattern_dict['pattern_type'] = pattern.pattern_type.value
+                    patterns_data[pattern_id] = pattern_dict
+                writes.append((self.patterns_dir / 'task_patterns.json', patterns_data))
+
+            if 'failure_patterns' in sections:
+                failures_data = {}
+                for pattern_id, pattern in self.failure_patterns.items():
+                    pattern_dict = asdict(pattern)
+                    pattern_dict['discovered_at'] = pattern.discovered_at.isoformat()
+                    pattern_dict['failure_category'] = pattern.failure_category.value
+                    pattern_dict['affected_skills'] = [skill.value for skill in pattern.affected_skills]
+                    failures_data[pattern_id] = pattern_dict
+                writes.append((self.patterns_dir / 'failure_patterns.json', failures_data))
+
+            if 'improvements' in sections:
+                improvements_data = {}
+                for improvement_id, improvement in self.architecture_improvements.items():
+                    improvements_data[improvement_id] = asdict(improvement)
+                writes.append((self.improvements_dir / 'suggestions.json', improvements_data))
+
+        # Disk I/O happens outside the lock so analysis is never blocked on it
+        for path, data in writes:
+            _atomic_write_json(path, data)
+
+    def flush_learning_data(self):
+        """Force any batched pattern updates to disk"""
+        self._persistence.flush()
+
+    def close(self):
+        """Stop background persistence, flushing pending updates"""
+        self._persistence.close()
 
     def analyze_task_completion(self, task_id: str, agent: str, success: bool, 
                               completion_time: float, task_data: Dict[str, Any]):
@@ -231,20 +378,25 @@ class LearningSystem:
             'timestamp': datetime.now().isoformat()
         }
         
-        if success:
-            self.performance_history.append(completion_record)
-            self._analyze_success_patterns(completion_record)
-        else:
-            self.failure_history.append(completion_record)
-            self._analyze_failure_patterns(completion_record)
-        
-        # Limit history size to prevent memory issues
-        self.performance_history = self.performance_history[-1000:]
-        self.failure_history = self.failure_history[-500:]
-        
-        # Update patterns and save
-        self._update_patterns()
-        self._save_learning_data()
+        with self._lock:
+            if success:
+                # Bounded deques trim themselves; keep the running total in step
+                if len(self.performance_history) == self.performance_history.maxlen:
+                    self._performance_time_total -= self.performance_history[0]['completion_time']
+                self.performance_history.append(completion_record)
+                self._performance_time_total += completion_time
+                self._analyze_success_patterns(completion_record)
+                dirty_section = 'task_patterns'
+            else:
+                self.failure_history.append(completion_record)
+                self._analyze_failure_patterns(completion_record)
+                dirty_section = 'failure_patterns'
+
+            # Update patterns; the save is batched by the write-behind layer
+            if self._update_patterns():
+                self._persistence.mark_dirty(dirty_section, 'task_patterns')
+            else:
+                self._persistence.mark_dirty(dirty_section)
 
     def _analyze_success_patterns(self, completion_record: Dict[str, Any]):
         """Identify patterns in successful task completions"""
@@ -285,7 +437,8 @@ class LearningSystem:
                 pattern.examples.append(completion_record['task_id'])
                 
                 # Limit examples to last 10
-                pattern.examples = pattern.examples[-10:]
+                if len(pattern.examples) > self.EXAMPLES_PER_PATTERN:
+                    del pattern.examples[:-self.EXAMPLES_PER_PATTERN]
         
         # Analyze agent-task type patterns
         if 'task_type' in task_data:
@@ -317,7 +470,8 @@ class LearningSystem:
                 pattern.confidence = min(1.0, pattern.sample_size / 10.0)
                 pattern.last_updated = datetime.now()
                 pattern.examples.append(completion_record['task_id'])
-                pattern.examples = pattern.examples[-10:]
+                if len(pattern.examples) > self.EXAMPLES_PER_PATTERN:
+                    del pattern.examples[:-self.EXAMPLES_PER_PATTERN]
 
     def _analyze_failure_patterns(self, completion_record: Dict[str, Any]):
         """Identify patterns in task failures"""
@@ -349,7 +503,8 @@ class LearningSystem:
             pattern = self.failure_patterns[failure_pattern_id]
             pattern.frequency += 1
             pattern.examples.append(completion_record['task_id'])
-            pattern.examples = pattern.examples[-10:]
+            if len(pattern.examples) > self.EXAMPLES_PER_PATTERN:
+                del pattern.examples[:-self.EXAMPLES_PER_PATTERN]
             
             # Increase impact score based on frequency
             pattern.impact_score = min(1.0, pattern.frequency / 20.0)
@@ -434,27 +589,34 @@ class LearningSystem:
         
         return suggestions.get(failure_category, ["Review task execution process"])
 
-    def _update_patterns(self):
-        """Update pattern confidence and cleanup old patterns"""
+    def _update_patterns(self, force: bool = False) -> bool:
+        """
+        Update pattern confidence and cleanup old patterns.
+
+        Per-task statistics are already maintained incrementally by the
+        _analyze_* methods, and a pattern touched by a task is never stale, so
+        the decay sweep over all patterns only runs once per
+        PATTERN_MAINTENANCE_INTERVAL. Returns True if the sweep ran.
+        """
         current_time = datetime.now()
+        if not force and current_time - self._last_pattern_maintenance < self.PATTERN_MAINTENANCE_INTERVAL:
+            return False
+        self._last_pattern_maintenance = current_time
         
-        # Update confidence scores based on recent performance
-        for pattern in self.task_patterns.values():
-            # Decay confidence for old patterns
+        # Decay confidence for old patterns and collect the ones that fall too low
+        low_confidence_patterns = []
+        for pattern_id, pattern in self.task_patterns.items():
             days_since_update = (current_time - pattern.last_updated).days
             if days_since_update > 30:
                 pattern.confidence *= 0.9  # Decay confidence by 10%
-        
-        # Remove patterns with very low confidence
-        low_confidence_patterns = [
-            pattern_id for pattern_id, pattern in self.task_patterns.items()
-            if pattern.confidence < 0.1 and pattern.sample_size < 3
-        ]
+            if pattern.confidence < 0.1 and pattern.sample_size < 3:
+                low_confidence_patterns.append(pattern_id)
         
         for pattern_id in low_confidence_patterns:
             del self.task_patterns[pattern_id]
         
         logger.debug(f"Updated patterns, removed {len(low_confidence_patterns)} low-confidence patterns")
+        return True
 
     def generate_architecture_improvements(self) -> List[ArchitectureImprovement]:
         """
@@ -477,10 +639,11 @@ class LearningSystem:
         improvements.extend(self._analyze_performance_trends())
         
         # Update stored improvements
-        for improvement in improvements:
-            self.architecture_improvements[improvement.improvement_id] = improvement
+        with self._lock:
+            for improvement in improvements:
+                self.architecture_improvements[improvement.improvement_id] = improvement
         
-        self._save_learning_data()
+        self._persistence.mark_dirty('improvements')
         
         return improvements
 
@@ -647,9 +810,10 @@ class LearningSystem:
         if len(self.performance_history) < 10:
             return improvements  # Need more data for trend analysis
         
-        # Analyze completion time trends
-        recent_times = [record['completion_time'] for record in self.performance_history[-20:]]
-        older_times = [record['completion_time'] for record in self.performance_history[-40:-20]]
+        # Analyze completion time trends (newest first, only the last 40 records)
+        latest_times = [record['completion_time'] for record in islice(reversed(self.performance_history), 40)]
+        recent_times = latest_times[:20]
+        older_times = latest_times[20:]
         
         if older_times:
             recent_avg = statistics.mean(recent_times)
@@ -843,7 +1007,7 @@ class LearningSystem:
         
         # Calculate average completion time for successful tasks
         avg_completion_time = (
-            statistics.mean([record['completion_time'] for record in self.performance_history])
+            self._performance_time_total / len(self.performance_history)
             if self.performance_history else 0
         )
         
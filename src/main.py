@@ -16,6 +16,8 @@ import sys # Added to get Python executable
 import time # Added for sleep in startup for logging clarity
 import logging.config # Added for dictionary config
 
+from .celery_queues import ALL_QUEUES
+
 # Attempt to import EmailClient and config
 try:
     from .email_client import EmailClient
@@ -154,6 +156,7 @@ def start_celery_worker():
         
         worker_command = [
             python_executable, "-m", "celery", "-A", "src.celery_app:celery_app", "worker",
+            "-Q", ",".join(ALL_QUEUES),  # Every latency class: one development worker runs them all
             "-l", "INFO", # Or DEBUG
             "--pool=solo", # Necessary on Windows for Celery 5.x
             "--without-heartbeat",
@@ -385,6 +388,14 @@ app.include_router(knowledge.router, prefix="/api/v1", tags=["knowledge"])
 app.include_router(billing.router, prefix="/api/v1", tags=["billing"])
 app.include_router(inventory.router, prefix="/api/v1", tags=["inventory"])
 
+# Gmail watch notifications (Pub/Sub push)
+try:
+    from .gmail_push import router as gmail_push_router
+    if gmail_push_router is not None:
+        app.include_router(gmail_push_router)
+except ImportError as e:
+    print(f"Warning: Could not import Gmail push router: {e}")
+
 # Include the Task Manager Agent's router
 if TASK_MANAGER_AVAILABLE:
     app.include_router(task_manager_router, prefix="/api/v1") # Prefix already in task_manager_agent's router
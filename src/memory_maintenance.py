@@ -0,0 +1,310 @@
+"""
+Memory Maintenance - Dedup, retention pruning and compaction for Chroma collections
+Used by memory_maintenance_task in celery_app.
+
+A maintenance pass walks the collection in fixed windows of ids, listed
+without embeddings or metadata, then fetches each window's records by id, so
+only one page of ids and embeddings is held however large the collection is.
+Chroma returns records in insertion order and only records of the current
+window are ever deleted, so the next window starts at the current offset plus
+the number of records kept. Records added during the pass are visited last.
+For each page:
+- records older than the retention policy are deleted
+- each remaining record's nearest neighbours are looked up with one batched
+  query; records within `duplicate_distance` of each other in the same scope
+  (conversation or customer) are merged into the oldest of them; records
+  without a scope are never merged. The
+  survivor's metadata counts the duplicates and their last sighting, and the
+  duplicates are deleted
+After the pass the SQLite file behind a persistent client is vacuumed to
+return the freed pages to the filesystem.
+
+The report gives records reclaimed, storage reclaimed and the median query
+latency for the same probe vectors before and after the pass.
+"""
+
+import logging
+import os
+import sqlite3
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SQLITE_FILENAME = "chroma.sqlite3"
+
+
+@dataclass
+class MaintenancePolicy:
+    """What a maintenance pass keeps"""
+    retention_days: Optional[float] = 365
+    # Squared L2 distance (Chroma's default space); 0.05 is cosine ~0.975 for unit vectors
+    duplicate_distance: float = 0.05
+    # Only records sharing this metadata value can be duplicates of each other
+    scope_field: Optional[str] = 'conversation_id'
+    timestamp_field: str = 'timestamp'
+    page_size: int = 500
+    neighbors: int = 5
+    latency_probes: int = 20
+    vacuum: bool = True
+
+
+@dataclass
+class MaintenanceReport:
+    collection: str
+    records_before: int = 0
+    records_after: int = 0
+    scanned: int = 0
+    duplicates_removed: int = 0
+    expired_removed: int = 0
+    survivors_merged: int = 0
+    storage_bytes_before: Optional[int] = None
+    storage_bytes_after: Optional[int] = None
+    query_latency_before_ms: Optional[float] = None
+    query_latency_after_ms: Optional[float] = None
+    duration_seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def records_reclaimed(self) -> int:
+        return self.duplicates_removed + self.expired_removed
+
+    @property
+    def query_latency_improvement_pct(self) -> Optional[float]:
+        before, after = self.query_latency_before_ms, self.query_latency_after_ms
+        if not before or after is None:
+            return None
+        return round((before - after) / before * 100, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['records_reclaimed'] = self.records_reclaimed
+        data['query_latency_improvement_pct'] = self.query_latency_improvement_pct
+        if self.storage_bytes_before is not None and self.storage_bytes_after is not None:
+            data['storage_bytes_reclaimed'] = self.storage_bytes_before - self.storage_bytes_after
+        return data
+
+
+def _epoch(value: Any) -> Optional[float]:
+    """Metadata timestamp (ISO string or epoch number) as epoch seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+class CollectionMaintainer:
+    """One maintenance pass over a Chroma collection (or anything with its API)"""
+
+    def __init__(self, collection, policy: Optional[MaintenancePolicy] = None,
+                 sqlite_path: Optional[str] = None, time_fn: Callable[[], float] = time.time):
+        self.collection = collection
+        self.policy = policy or MaintenancePolicy()
+        self.sqlite_path = sqlite_path
+        self.time_fn = time_fn
+
+    def run(self) -> MaintenanceReport:
+        policy = self.policy
+        started = time.perf_counter()
+        report = MaintenanceReport(collection=getattr(self.collection, 'name', 'collection'))
+        report.records_before = self.collection.count()
+        report.storage_bytes_before = self._storage_bytes()
+
+        probes = self._probe_embeddings()
+        report.query_latency_before_ms = self.measure_query_latency(probes)
+
+        cutoff = None
+        if policy.retention_days is not None:
+            cutoff = self.time_fn() - policy.retention_days * 86400
+
+        offset = 0
+        while True:
+            window = self.collection.get(limit=policy.page_size, offset=offset, include=[])['ids']
+            if not window:
+                break
+            page = self.collection.get(ids=window, include=['embeddings', 'metadatas'])
+            removed = self._process_page(page, cutoff, report) if page['ids'] else 0
+            report.scanned += len(page['ids'])
+            offset += len(window) - removed
+
+        if policy.vacuum:
+            self._vacuum(report)
+        report.records_after = self.collection.count()
+        report.storage_bytes_after = self._storage_bytes()
+        report.query_latency_after_ms = self.measure_query_latency(probes)
+        report.duration_seconds = round(time.perf_counter() - started, 3)
+
+        logger.info(f"Memory maintenance of {report.collection}: reclaimed {report.records_reclaimed} of "
+                    f"{report.records_before} records ({report.duplicates_removed} duplicates, "
+                    f"{report.expired_removed} expired), query latency {report.query_latency_before_ms}ms -> "
+                    f"{report.query_latency_after_ms}ms")
+        return report
+
+    def _process_page(self, page: Dict[str, Any], cutoff: Optional[float], report: MaintenanceReport) -> int:
+        policy = self.policy
+        ids = page['ids']
+        metadatas = page.get('metadatas') or [{} for _ in ids]
+        embeddings = page.get('embeddings')
+
+        def sort_key(record_id: str, metadata: Dict[str, Any]) -> Tuple[float, str]:
+            epoch = _epoch((metadata or {}).get(policy.timestamp_field))
+            return (epoch if epoch is not None else float('inf'), record_id)
+
+        expired: Set[str] = set()
+        live: List[int] = []
+        for index, record_id in enumerate(ids):
+            epoch = _epoch((metadatas[index] or {}).get(policy.timestamp_field))
+            if cutoff is not None and epoch is not None and epoch < cutoff:
+                expired.add(record_id)
+            else:
+                live.append(index)
+
+        duplicates: Set[str] = set()
+        survivors: Dict[str, Dict[str, Any]] = {}
+        if live and embeddings is not None and policy.duplicate_distance > 0:
+            results = self.collection.query(
+                query_embeddings=[list(embeddings[index]) for index in live],
+                n_results=policy.neighbors + 1,
+                include=['metadatas', 'distances']
+            )
+            # Group near-duplicates of this page with each other and with their
+            # neighbours on any page; each group collapses into its oldest record
+            parent: Dict[str, str] = {}
+            record_meta: Dict[str, Dict[str, Any]] = {}
+
+            def find(record_id: str) -> str:
+                root = record_id
+                while parent[root] != root:
+                    root = parent[root]
+                while parent[record_id] != root:
+                    parent[record_id], record_id = root, parent[record_id]
+                return root
+
+            for row, index in enumerate(live):
+                record_id = ids[index]
+                metadata = metadatas[index] or {}
+                record_meta[record_id] = metadata
+                parent.setdefault(record_id, record_id)
+                if policy.scope_field and metadata.get(policy.scope_field) is None:
+                    continue  # Unscoped records would all compare equal across scopes
+                for neighbor_id, distance, neighbor_meta in zip(results['ids'][row], results['distances'][row],
+                                                                results['metadatas'][row]):
+                    if distance > policy.duplicate_distance:
+                        break  # Neighbours come nearest first
+                    neighbor_meta = neighbor_meta or {}
+                    if neighbor_id == record_id or neighbor_id in expired:
+                        continue
+                    if policy.scope_field and neighbor_meta.get(policy.scope_field) != metadata.get(policy.scope_field):
+                        continue
+                    neighbor_epoch = _epoch(neighbor_meta.get(policy.timestamp_field))
+                    if cutoff is not None and neighbor_epoch is not None and neighbor_epoch < cutoff:
+                        continue
+                    record_meta.setdefault(neighbor_id, neighbor_meta)
+                    parent.setdefault(neighbor_id, neighbor_id)
+                    parent[find(record_id)] = find(neighbor_id)
+
+            groups: Dict[str, List[str]] = {}
+            for record_id in parent:
+                groups.setdefault(find(record_id), []).append(record_id)
+            page_ids = set(ids)
+            for members in groups.values():
+                if len(members) < 2:
+                    continue
+                members.sort(key=lambda member: sort_key(member, record_meta[member]))
+                survivor_id = members[0]
+                # Only this page's records are deleted; later pages see the survivor as a neighbour
+                for member in members[1:]:
+                    if member in page_ids:
+                        duplicates.add(member)
+                        self._merge_into(survivors.setdefault(survivor_id, dict(record_meta[survivor_id])),
+                                         record_meta[member])
+
+        if survivors:
+            self.collection.update(ids=list(survivors), metadatas=list(survivors.values()))
+        removed = list(expired) + list(duplicates)
+        if removed:
+            self.collection.delete(ids=removed)
+
+        report.expired_removed += len(expired)
+        report.duplicates_removed += len(duplicates)
+        report.survivors_merged += len(survivors)
+        return len(removed)
+
+    def _merge_into(self, survivor: Dict[str, Any], duplicate: Dict[str, Any]):
+        """Fold a duplicate's sighting into the survivor's metadata"""
+        timestamp_field = self.policy.timestamp_field
+        survivor['duplicate_count'] = (survivor.get('duplicate_count', 0)
+                                       + duplicate.get('duplicate_count', 0) + 1)
+        sightings = [value for value in (survivor.get('last_seen'), survivor.get(timestamp_field),
+                                         duplicate.get('last_seen'), duplicate.get(timestamp_field))
+                     if _epoch(value) is not None]
+        if sightings:
+            survivor['last_seen'] = max(sightings, key=_epoch)
+
+    def _probe_embeddings(self) -> List[List[float]]:
+        if not self.policy.latency_probes:
+            return []
+        sample = self.collection.get(limit=self.policy.latency_probes, include=['embeddings'])
+        embeddings = sample.get('embeddings')
+        return [list(embedding) for embedding in embeddings] if embeddings is not None else []
+
+    def measure_query_latency(self, probes: List[List[float]], n_results: int = 10) -> Optional[float]:
+        """Median latency in ms of a nearest-neighbour query for each probe"""
+        if not probes or not self.collection.count():
+            return None
+        timings = []
+        for embedding in probes:
+            start = time.perf_counter()
+            self.collection.query(query_embeddings=[embedding], n_results=n_results, include=['distances'])
+            timings.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(timings), 3)
+
+    def _storage_bytes(self) -> Optional[int]:
+        if self.sqlite_path and os.path.exists(self.sqlite_path):
+            return os.path.getsize(self.sqlite_path)
+        return None
+
+    def _vacuum(self, report: MaintenanceReport):
+        if not self.sqlite_path or not os.path.exists(self.sqlite_path):
+            return
+        try:
+            connection = sqlite3.connect(self.sqlite_path, timeout=30)
+            try:
+                connection.execute("VACUUM")
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            # Busy writers: the freed pages are reused anyway, retry next run
+            logger.warning(f"Could not vacuum {self.sqlite_path}: {e}")
+            report.errors.append(f"vacuum: {e}")
+
+
+def maintain_persistent_collection(persist_directory: str, collection_name: str,
+                                   policy: Optional[MaintenancePolicy] = None) -> Optional[MaintenanceReport]:
+    """Run a maintenance pass over a collection of a persistent Chroma client, if it exists"""
+    if not os.path.isdir(persist_directory):
+        logger.info(f"No memory store at {persist_directory}, skipping maintenance")
+        return None
+
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(
+        path=persist_directory,
+        settings=Settings(anonymized_telemetry=False, allow_reset=True)
+    )
+    try:
+        collection = client.get_collection(name=collection_name)
+    except Exception as e:
+        logger.info(f"No collection {collection_name} in {persist_directory}: {e}")
+        return None
+
+    sqlite_path = os.path.join(persist_directory, SQLITE_FILENAME)
+    return CollectionMaintainer(collection, policy, sqlite_path=sqlite_path).run()
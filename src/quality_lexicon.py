@@ -0,0 +1,127 @@
+"""
+Quality Lexicon - Compiled phrase rules for call transcription scoring
+Used by VoiceQualityAssurance.
+
+Text is split once on spaces. A phrase without a space can only occur inside
+a single token, so its hits are looked up per token; the result for a token
+is computed once with a trie-shaped regular expression over all phrases and
+then cached, which makes the vocabulary shared between calls nearly free. A
+phrase with spaces can only occur where some token ends with its first word;
+those few candidates are then counted directly in the text. Counts come out
+exactly as `text.count(phrase)` would report them, substring semantics
+included ('so' is found in 'also').
+"""
+
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Sequence, Set, Tuple
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    trie: Dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def render(node: Dict) -> str:
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Greedy optional tail: a longer phrase wins over its own prefix
+        return f"(?:{body})?" if '' in node else body
+
+    return render(trie)
+
+
+class PhraseMatcher:
+    """Occurrence counting for a fixed set of phrases in one pass over the tokens"""
+
+    def __init__(self, phrases: Iterable[str], max_cached_tokens: int = 50000):
+        self.phrases = tuple(dict.fromkeys(phrase for phrase in phrases if phrase))
+        self.max_cached_tokens = max_cached_tokens
+
+        words = [phrase for phrase in self.phrases if ' ' not in phrase]
+        self._pattern = re.compile(_trie_pattern(words)) if words else None
+        # Phrases matching wherever the key phrase is the longest match
+        self._prefixes = {word: tuple(other for other in words if word.startswith(other)) for word in words}
+        self._spanning = tuple((phrase, phrase.split(' ')[0]) for phrase in self.phrases if ' ' in phrase)
+        self._tokens: Dict[str, Tuple] = {}
+        self._plain_tokens: Set[str] = set()
+
+    def _scan_token(self, token: str) -> Tuple:
+        """(word phrase counts, spanning phrases whose first word ends the token)"""
+        counts: Dict[str, int] = {}
+        if self._pattern is not None:
+            next_free: Dict[str, int] = {}
+            search = self._pattern.search
+            match = search(token)
+            while match is not None:
+                start = match.start()
+                for phrase in self._prefixes[match.group()]:
+                    if start >= next_free.get(phrase, 0):
+                        counts[phrase] = counts.get(phrase, 0) + 1
+                        next_free[phrase] = start + len(phrase)
+                # Resume one character on: phrases may start inside this match
+                match = search(token, start + 1)
+        starts = tuple(phrase for phrase, first_word in self._spanning if token.endswith(first_word))
+        entry = (tuple(counts.items()), starts)
+
+        if len(self._tokens) + len(self._plain_tokens) >= self.max_cached_tokens:
+            self._tokens.clear()
+            self._plain_tokens.clear()
+        if counts or starts:
+            self._tokens[token] = entry
+        else:
+            self._plain_tokens.add(token)
+        return entry
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Non-overlapping occurrences of each phrase found in `text` (as str.count)"""
+        counts: Dict[str, int] = {}
+        spanning = set()
+        cached = self._tokens
+        tokens = Counter(text.split(' '))
+        # Set difference in C skips the common tokens known to hold no phrase
+        for token in tokens.keys() - self._plain_tokens:
+            repeats = tokens[token]
+            word_counts, starts = cached.get(token) or self._scan_token(token)
+            for phrase, occurrences in word_counts:
+                counts[phrase] = counts.get(phrase, 0) + occurrences * repeats
+            spanning.update(starts)
+        # Only phrases whose first word ends some token can occur at all
+        for phrase in spanning:
+            occurrences = text.count(phrase)
+            if occurrences:
+                counts[phrase] = occurrences
+        return counts
+
+
+class RuleMatches:
+    """Phrase hits from one scan, looked up by rule name"""
+
+    def __init__(self, rules: Mapping[str, Tuple[str, ...]], counts: Dict[str, int]):
+        self._rules = rules
+        self.counts = counts
+
+    def matched(self, rule: str) -> List[str]:
+        """Phrases of `rule` present in the text, in rule order"""
+        return [phrase for phrase in self._rules[rule] if phrase in self.counts]
+
+    def any(self, rule: str) -> bool:
+        return any(phrase in self.counts for phrase in self._rules[rule])
+
+    def total(self, rule: str) -> int:
+        return sum(self.counts.get(phrase, 0) for phrase in self._rules[rule])
+
+
+class RuleSet:
+    """Named phrase rules sharing one compiled matcher"""
+
+    def __init__(self, rules: Mapping[str, Sequence[str]]):
+        self.rules = {name: tuple(phrases) for name, phrases in rules.items()}
+        self.matcher = PhraseMatcher(phrase for phrases in self.rules.values() for phrase in phrases)
+
+    def scan(self, text: str) -> RuleMatches:
+        return RuleMatches(self.rules, self.matcher.count(text))
@@ -0,0 +1,495 @@
+"""
+Route Planner - Travel-time matrices and multi-crew day planning
+Geocodes and caches addresses, fetches N x N drive-time matrices in bulk and
+assigns a day's appointments across crews to minimize total drive time.
+
+Providers:
+- GoogleMapsTravelProvider: Geocoding + Distance Matrix APIs, batched
+- LocalTravelProvider: straight-line estimate from known coordinates (tests, offline)
+"""
+
+import logging
+import math
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+Coordinates = Tuple[float, float]
+
+DEFAULT_TRAVEL_MINUTES = 20
+MINIMUM_TRAVEL_MINUTES = 5
+
+
+def normalize_address(address: str) -> str:
+    return re.sub(r'\s*,\s*', ', ', re.sub(r'\s+', ' ', address.strip().lower()))
+
+
+class TravelTimeProvider(ABC):
+    """Source of geocodes and drive-time matrices; locations are addresses or 'lat,lng' strings"""
+
+    def geocode(self, address: str) -> Optional[Coordinates]:
+        return None
+
+    @abstractmethod
+    def travel_matrix(self, origins: List[str], destinations: List[str]) -> List[List[Optional[int]]]:
+        """Drive minutes for every origin x destination element, None where unknown"""
+
+
+class GoogleMapsTravelProvider(TravelTimeProvider):
+    """Google Geocoding + Distance Matrix, chunked to the API's per-request limits"""
+
+    GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+    DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+    MAX_LOCATIONS_PER_SIDE = 25
+    MAX_ELEMENTS_PER_REQUEST = 100
+
+    def __init__(self, api_key: str, timeout: int = 10):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def geocode(self, address: str) -> Optional[Coordinates]:
+        try:
+            response = self.session.get(self.GEOCODE_URL, params={'address': address, 'key': self.api_key},
+                                        timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+            if data.get('status') == 'OK' and data.get('results'):
+                location = data['results'][0]['geometry']['location']
+                return location['lat'], location['lng']
+            logger.warning(f"Geocoding returned {data.get('status')} for {address}")
+        except requests.RequestException as e:
+            logger.warning(f"Geocoding request failed for {address}: {e}")
+        return None
+
+    def travel_matrix(self, origins: List[str], destinations: List[str]) -> List[List[Optional[int]]]:
+        matrix: List[List[Optional[int]]] = [[None] * len(destinations) for _ in origins]
+        dest_chunk = min(self.MAX_LOCATIONS_PER_SIDE, len(destinations)) or 1
+        origin_chunk = max(1, min(self.MAX_LOCATIONS_PER_SIDE, self.MAX_ELEMENTS_PER_REQUEST // dest_chunk))
+
+        for o_start in range(0, len(origins), origin_chunk):
+            for d_start in range(0, len(destinations), dest_chunk):
+                o_batch = origins[o_start:o_start + origin_chunk]
+                d_batch = destinations[d_start:d_start + dest_chunk]
+                for i, row in enumerate(self._request_matrix(o_batch, d_batch)):
+                    matrix[o_start + i][d_start:d_start + len(row)] = row
+        return matrix
+
+    def _request_matrix(self, origins: List[str], destinations: List[str]) -> List[List[Optional[int]]]:
+        params = {
+            'origins': '|'.join(origins),
+            'destinations': '|'.join(destinations),
+            'mode': 'driving',
+            'units': 'imperial',
+            'departure_time': 'now',
+            'traffic_model': 'best_guess',
+            'key': self.api_key
+        }
+        empty = [[None] * len(destinations) for _ in origins]
+        try:
+            response = self.session.get(self.DISTANCE_MATRIX_URL, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except requests.RequestException as e:
+            logger.warning(f"Distance Matrix request failed: {e}")
+            return empty
+
+        if data.get('status') != 'OK':
+            logger.warning(f"Distance Matrix returned {data.get('status')}")
+            return empty
+
+        rows = []
+        for row in data.get('rows', []):
+            values = []
+            for element in row.get('elements', []):
+                if element.get('status') != 'OK':
+                    values.append(None)
+                    continue
+                # Use duration in traffic if available, otherwise regular duration
+                duration_key = 'duration_in_traffic' if 'duration_in_traffic' in element else 'duration'
+                values.append(max(MINIMUM_TRAVEL_MINUTES, int(element[duration_key]['value'] / 60)))
+            rows.append(values)
+        return rows or empty
+
+
+class LocalTravelProvider(TravelTimeProvider):
+    """
+    Offline stand-in: drive time estimated from great-circle distance between
+    known coordinates. Unknown addresses get None so the caller's fallback applies.
+    """
+
+    def __init__(self, coordinates: Optional[Dict[str, Coordinates]] = None,
+                 average_speed_mph: float = 30.0, road_factor: float = 1.3):
+        self.coordinates = {normalize_address(a): c for a, c in (coordinates or {}).items()}
+        self.average_speed_mph = average_speed_mph
+        self.road_factor = road_factor
+        self.matrix_requests = 0
+        self.elements_requested = 0
+
+    def geocode(self, address: str) -> Optional[Coordinates]:
+        return self.coordinates.get(normalize_address(address))
+
+    def travel_matrix(self, origins: List[str], destinations: List[str]) -> List[List[Optional[int]]]:
+        self.matrix_requests += 1
+        self.elements_requested += len(origins) * len(destinations)
+        # Like Distance Matrix, plain addresses are accepted and resolved without a geocode call
+        points = {location: self._parse(location) or self.coordinates.get(normalize_address(location))
+                  for location in set(origins) | set(destinations)}
+        return [[self._minutes(points[o], points[d]) for d in destinations] for o in origins]
+
+    @staticmethod
+    def _parse(location: str) -> Optional[Coordinates]:
+        try:
+            lat, lng = location.split(',')
+            return float(lat), float(lng)
+        except ValueError:
+            return None
+
+    def _minutes(self, origin: Optional[Coordinates], destination: Optional[Coordinates]) -> Optional[int]:
+        if origin is None or destination is None:
+            return None
+        lat1, lng1, lat2, lng2 = map(math.radians, (*origin, *destination))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        miles = 3958.8 * 2 * math.asin(math.sqrt(a)) * self.road_factor
+        return max(MINIMUM_TRAVEL_MINUTES, round(miles / self.average_speed_mph * 60))
+
+
+def create_travel_time_provider() -> Optional[TravelTimeProvider]:
+    """Google Maps when GOOGLE_MAPS_API_KEY is set, otherwise None (heuristic fallback only)"""
+    api_key = os.getenv('GOOGLE_MAPS_API_KEY')
+    return GoogleMapsTravelProvider(api_key) if api_key else None
+
+
+class TravelTimeCache:
+    """
+    Memoized geocodes and pairwise drive times.
+
+    Only missing or expired pairs are requested, and never an address to
+    itself: origins needing the same destinations share one provider call, so
+    a cold N x N matrix costs N(N-1) elements and a single lookup one element.
+    Repeat lookups cost nothing.
+    """
+
+    def __init__(self, provider: Optional[TravelTimeProvider] = None,
+                 fallback_fn: Optional[Callable[[str, str], int]] = None,
+                 ttl_seconds: float = 6 * 60 * 60, time_fn: Callable[[], float] = time.time):
+        self.provider = provider
+        self.fallback_fn = fallback_fn
+        self.ttl_seconds = ttl_seconds
+        self.time_fn = time_fn
+
+        self._locations: Dict[str, str] = {}
+        self._pairs: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        # Lookups answered entirely from cache vs. ones needing the provider
+        self.hits = 0
+        self.misses = 0
+
+    def location_key(self, address: str, geocode: bool = True) -> str:
+        """Geocoded 'lat,lng' for an address (cached), or its normalized text
+
+        With geocode=False an address not geocoded yet is keyed by its text
+        rather than spending a Geocoding request on it.
+        """
+        normalized = normalize_address(address)
+        location = self._locations.get(normalized)
+        if location is None:
+            coordinates = self.provider.geocode(address) if self.provider and geocode else None
+            location = f"{coordinates[0]:.5f},{coordinates[1]:.5f}" if coordinates else normalized
+            if coordinates or geocode:
+                self._locations[normalized] = location
+        return location
+
+    def travel_time(self, origin: str, destination: str) -> int:
+        """Drive minutes for one pair: at most one Distance Matrix element, no geocoding"""
+        origin_location = self.location_key(origin, geocode=False)
+        destination_location = self.location_key(destination, geocode=False)
+        if origin_location == destination_location:
+            return 0
+        self._refresh([origin_location], [destination_location],
+                      {origin_location: origin, destination_location: destination})
+        return self._pairs[(origin_location, destination_location)][0]
+
+    def matrix(self, addresses: Sequence[str]) -> List[List[int]]:
+        """Drive minutes between every pair of addresses (0 on the diagonal)"""
+        locations = [self.location_key(address) for address in addresses]
+        address_for = dict(zip(locations, addresses))
+        unique = list(address_for)
+        self._refresh(unique, unique, address_for)
+
+        return [[0 if origin == destination else self._pairs[(origin, destination)][0]
+                 for destination in locations] for origin in locations]
+
+    def _refresh(self, origins: List[str], destinations: List[str], address_for: Dict[str, str]):
+        """Fetch the missing or expired origin -> destination pairs, diagonal excluded"""
+        now = self.time_fn()
+        # Stale destinations per origin; origins with the same ones share a request
+        groups: Dict[Tuple[str, ...], List[str]] = {}
+        for origin in origins:
+            stale = tuple(destination for destination in destinations
+                          if destination != origin and self._is_stale(origin, destination, now))
+            if stale:
+                groups.setdefault(stale, []).append(origin)
+
+        if not groups:
+            self.hits += 1
+            return
+        self.misses += 1
+        for stale, group_origins in groups.items():
+            rows = self._fetch(group_origins, list(stale))
+            for origin, row in zip(group_origins, rows):
+                for destination, minutes in zip(stale, row):
+                    if minutes is None:
+                        minutes = self._fallback(address_for[origin], address_for[destination])
+                    self._pairs[(origin, destination)] = (minutes, now)
+
+    def _is_stale(self, origin: str, destination: str, now: float) -> bool:
+        cached = self._pairs.get((origin, destination))
+        return cached is None or now - cached[1] > self.ttl_seconds
+
+    def _fetch(self, origins: List[str], destinations: List[str]) -> List[List[Optional[int]]]:
+        if self.provider:
+            try:
+                return self.provider.travel_matrix(origins, destinations)
+            except Exception as e:
+                logger.warning(f"Travel matrix request failed, using fallback estimates: {e}")
+        return [[None] * len(destinations) for _ in origins]
+
+    def _fallback(self, origin: str, destination: str) -> int:
+        if self.fallback_fn:
+            try:
+                return self.fallback_fn(origin, destination)
+            except Exception as e:
+                logger.warning(f"Fallback travel estimate failed: {e}")
+        return DEFAULT_TRAVEL_MINUTES
+
+
+@dataclass
+class Crew:
+    """A technician or crew available for a shift, starting (and ending) at a depot"""
+    crew_id: str
+    start_address: str
+    shift_start: datetime
+    shift_end: datetime
+    end_address: Optional[str] = None
+    skills: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class PlannedAppointment:
+    """An appointment to place on a crew's route"""
+    appointment_id: str
+    address: str
+    duration_minutes: int
+    earliest_start: Optional[datetime] = None
+    latest_start: Optional[datetime] = None
+    required_skills: Set[str] = field(default_factory=set)
+    priority: int = 0
+
+
+@dataclass
+class RouteStop:
+    appointment: PlannedAppointment
+    travel_minutes: int
+    arrival: datetime
+    start: datetime
+    end: datetime
+
+    def to_dict(self) -> Dict:
+        return {
+            'appointment_id': self.appointment.appointment_id,
+            'address': self.appointment.address,
+            'travel_minutes': self.travel_minutes,
+            'arrival': self.arrival.isoformat(),
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat()
+        }
+
+
+@dataclass
+class CrewRoute:
+    crew: Crew
+    stops: List[RouteStop]
+    travel_minutes: int
+
+    def to_dict(self) -> Dict:
+        return {
+            'crew_id': self.crew.crew_id,
+            'travel_minutes': self.travel_minutes,
+            'stops': [stop.to_dict() for stop in self.stops]
+        }
+
+
+@dataclass
+class DayPlan:
+    routes: Dict[str, CrewRoute]
+    unassigned: List[PlannedAppointment]
+    total_travel_minutes: int
+
+    def to_dict(self) -> Dict:
+        return {
+            'total_travel_minutes': self.total_travel_minutes,
+            'routes': {crew_id: route.to_dict() for crew_id, route in self.routes.items()},
+            'unassigned': [appointment.appointment_id for appointment in self.unassigned]
+        }
+
+
+class RoutePlanner:
+    """
+    Assigns and orders a day's appointments across crews.
+
+    Cheapest feasible insertion builds the routes (highest priority and
+    tightest windows first), then relocate and 2-opt moves are applied until
+    total drive time stops improving. Feasibility means every stop starts
+    inside its window and the crew is back at its depot by shift end.
+    """
+
+    def __init__(self, travel_times: TravelTimeCache, max_improvement_passes: int = 20):
+        self.travel_times = travel_times
+        self.max_improvement_passes = max_improvement_passes
+
+    def plan_day(self, crews: Sequence[Crew], appointments: Sequence[PlannedAppointment]) -> DayPlan:
+        addresses = []
+        for crew in crews:
+            addresses.extend((crew.start_address, crew.end_address or crew.start_address))
+        addresses.extend(appointment.address for appointment in appointments)
+        index = {address: i for i, address in enumerate(dict.fromkeys(addresses))}
+        self._matrix = self.travel_times.matrix(list(index))
+        self._index = index
+
+        routes: Dict[str, List[PlannedAppointment]] = {crew.crew_id: [] for crew in crews}
+        crews_by_id = {crew.crew_id: crew for crew in crews}
+        unassigned = []
+
+        order = sorted(appointments, key=lambda a: (
+            -a.priority, a.latest_start or datetime.max, -a.duration_minutes, a.appointment_id))
+        for appointment in order:
+            best = None
+            for crew in crews:
+                if not appointment.required_skills <= crew.skills:
+                    continue
+                route = routes[crew.crew_id]
+                base = self._route_cost(crew, route)
+                for position in range(len(route) + 1):
+                    candidate = route[:position] + [appointment] + route[position:]
+                    cost = self._route_cost(crew, candidate)
+                    if cost is not None and (best is None or cost - base < best[0]):
+                        best = (cost - base, crew.crew_id, candidate)
+            if best is None:
+                unassigned.append(appointment)
+            else:
+                routes[best[1]] = best[2]
+
+        self._improve(crews_by_id, routes)
+
+        plan_routes = {crew_id: self._build_route(crews_by_id[crew_id], route)
+                       for crew_id, route in routes.items()}
+        total = sum(route.travel_minutes for route in plan_routes.values())
+        logger.info(f"Planned {len(appointments) - len(unassigned)} appointments across {len(crews)} crews, "
+                    f"{total} drive minutes, {len(unassigned)} unassigned")
+        return DayPlan(routes=plan_routes, unassigned=unassigned, total_travel_minutes=total)
+
+    def _travel(self, from_address: str, to_address: str) -> int:
+        return self._matrix[self._index[from_address]][self._index[to_address]]
+
+    def _simulate(self, crew: Crew, route: List[PlannedAppointment]) -> Optional[Tuple[int, List[RouteStop]]]:
+        current_time = crew.shift_start
+        location = crew.start_address
+        travel_total = 0
+        stops = []
+        for appointment in route:
+            travel = self._travel(location, appointment.address)
+            arrival = current_time + timedelta(minutes=travel)
+            start = max(arrival, appointment.earliest_start) if appointment.earliest_start else arrival
+            if appointment.latest_start and start > appointment.latest_start:
+                return None
+            end = start + timedelta(minutes=appointment.duration_minutes)
+            stops.append(RouteStop(appointment, travel, arrival, start, end))
+            travel_total += travel
+            current_time = end
+            location = appointment.address
+
+        if route:
+            return_travel = self._travel(location, crew.end_address or crew.start_address)
+            if current_time + timedelta(minutes=return_travel) > crew.shift_end:
+                return None
+            travel_total += return_travel
+        return travel_total, stops
+
+    def _route_cost(self, crew: Crew, route: List[PlannedAppointment]) -> Optional[int]:
+        result = self._simulate(crew, route)
+        return result[0] if result else None
+
+    def _improve(self, crews_by_id: Dict[str, Crew], routes: Dict[str, List[PlannedAppointment]]):
+        costs = {crew_id: self._route_cost(crews_by_id[crew_id], route) for crew_id, route in routes.items()}
+
+        for _ in range(self.max_improvement_passes):
+            improved = False
+
+            # 2-opt within each route
+            for crew_id, route in routes.items():
+                crew = crews_by_id[crew_id]
+                for i in range(len(route) - 1):
+                    for j in range(i + 1, len(route)):
+                        candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                        cost = self._route_cost(crew, candidate)
+                        if cost is not None and cost < costs[crew_id]:
+                            routes[crew_id], costs[crew_id], route = candidate, cost, candidate
+                            improved = True
+
+            # Relocate single appointments, possibly to another crew
+            for source_id in list(routes):
+                position = 0
+                while position < len(routes[source_id]):
+                    appointment = routes[source_id][position]
+                    source_rest = routes[source_id][:position] + routes[source_id][position + 1:]
+                    source_cost = self._route_cost(crews_by_id[source_id], source_rest)
+                    best = None
+                    for target_id, target_crew in crews_by_id.items():
+                        if not appointment.required_skills <= target_crew.skills:
+                            continue
+                        target = source_rest if target_id == source_id else routes[target_id]
+                        for insert_at in range(len(target) + 1):
+                            candidate = target[:insert_at] + [appointment] + target[insert_at:]
+                            cost = self._route_cost(target_crew, candidate)
+                            if cost is None or source_cost is None:
+                                continue
+                            if target_id == source_id:
+                                delta = cost - costs[source_id]
+                            else:
+                                delta = cost + source_cost - costs[source_id] - costs[target_id]
+                            if delta < 0 and (best is None or delta < best[0]):
+                                best = (delta, target_id, candidate, cost)
+                    if best is None:
+                        position += 1
+                        continue
+                    _, target_id, candidate, cost = best
+                    if target_id != source_id:
+                        routes[source_id], costs[source_id] = source_rest, source_cost
+                    routes[target_id], costs[target_id] = candidate, cost
+                    improved = True
+
+            if not improved:
+                break
+
+    def _build_route(self, crew: Crew, route: List[PlannedAppointment]) -> CrewRoute:
+        travel_total, stops = self._simulate(crew, route)
+        return CrewRoute(crew=crew, stops=stops, travel_minutes=travel_total)
+
+
+# Process-wide travel-time cache so repeated plans reuse geocodes and matrices
+_travel_time_cache = None
+
+
+def get_travel_time_cache() -> TravelTimeCache:
+    global _travel_time_cache
+    if _travel_time_cache is None:
+        _travel_time_cache = TravelTimeCache(provider=create_travel_time_provider())
+    return _travel_time_cache
@@ -3,6 +3,7 @@ from .google_calendar import GoogleCalendarClient
 from .outlook_calendar import OutlookCalendarClient
 from .models import EventMapping
 from .utils import resolve_conflicts
+from ..route_planner import RoutePlanner, get_travel_time_cache
 import os
 
 class SchedulerAgent:
@@ -52,6 +53,10 @@ class SchedulerAgent:
             self._persist_mapping(**mapping)
         return {"synced": True, "conflicts": conflicts}
 
+    def plan_day(self, crews, appointments):
+        # Assign and order a day's appointments across crews in one pass (see RoutePlanner)
+        return RoutePlanner(get_travel_time_cache()).plan_day(crews, appointments)
+
     def _persist_mapping(self, source, ext_event_id, event_data):
         # Map external event ID to internal event data for future updates/deletes
         if self.is_mock_db:
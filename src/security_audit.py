@@ -11,15 +11,101 @@ import os
 import re
 import json
 import logging
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Set, Tuple
+from typing import Dict, List, Any, Optional, Set, Tuple
 import hashlib
 import stat
 
 # Setup security audit logging
 logger = logging.getLogger(__name__)
 
+SCAN_CACHE_VERSION = 1
+SCAN_CACHE_FILENAME = '.security_audit_cache.json'
+
+_NEWLINE = re.compile('\n')
+
+
+def _is_false_positive(match_text: str, content: str, match_start: int) -> bool:
+    """Check if a credential match is likely a false positive"""
+    # Get the line containing the match
+    line_start = content.rfind('\n', 0, match_start) + 1
+    line_end = content.find('\n', match_start)
+    if line_end == -1:
+        line_end = len(content)
+    
+    line = content[line_start:line_end]
+    
+    # Skip comments
+    if line.strip().startswith('#') or line.strip().startswith('//'):
+        return True
+    
+    # Skip variable names without values
+    if '=' not in match_text and ':' not in match_text:
+        return True
+    
+    # Skip obvious examples or placeholders
+    placeholders = ['example', 'placeholder', 'your_key_here', 'xxx', 'yyy', 'zzz']
+    if any(placeholder in match_text.lower() for placeholder in placeholders):
+        return True
+    
+    return False
+
+
+class _ScanRules:
+    """
+    Credential and source-code patterns, applied to a file read once.
+
+    Line numbers come from a newline index built once per file, so each
+    match costs a bisection instead of counting the content before it.
+    """
+    
+    def __init__(self, credential_patterns: Dict[str, re.Pattern], security_patterns: Dict[str, re.Pattern]):
+        self.credential_rules = [('credential', name, pattern) for name, pattern in credential_patterns.items()]
+        self.code_rules = [('code', name, pattern) for name, pattern in security_patterns.items()]
+    
+    def scan(self, content: str, check_code: bool) -> List[Tuple[str, str, int]]:
+        """(kind, pattern name, line number) per finding, grouped by pattern"""
+        rules = self.credential_rules + self.code_rules if check_code else self.credential_rules
+        newlines = [match.start() for match in _NEWLINE.finditer(content)]
+        findings = []
+        
+        for kind, name, pattern in rules:
+            for match in pattern.finditer(content):
+                # Skip if it's just a variable name or comment
+                if kind == 'credential' and _is_false_positive(match.group(0), content, match.start()):
+                    continue
+                findings.append((kind, name, bisect_left(newlines, match.start()) + 1))
+        
+        return findings
+
+
+def _scan_file(rules: _ScanRules, path: str, check_code: bool,
+               known_digest: Optional[str] = None) -> Tuple[str, Optional[List[Tuple[str, str, int]]]]:
+    """Content hash and findings of a file; findings are None when the hash is known"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    if digest == known_digest:
+        return digest, None
+    # As text mode would read it
+    content = raw.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+    return digest, rules.scan(content, check_code)
+
+
+_worker_rules: Optional[_ScanRules] = None
+
+
+def _init_scan_worker(credential_patterns: Dict[str, re.Pattern], security_patterns: Dict[str, re.Pattern]):
+    global _worker_rules
+    _worker_rules = _ScanRules(credential_patterns, security_patterns)
+
+
+def _scan_file_in_worker(path: str, check_code: bool, known_digest: Optional[str]):
+    return _scan_file(_worker_rules, path, check_code, known_digest)
+
 class SecurityVulnerability:
     """Represents a security vulnerability found during audit"""
     
@@ -54,11 +140,22 @@ class SecurityAuditor:
     - Hardcoded secrets
     - OAuth token files in unsafe locations
     - Configuration security issues
+    
+    Source files are scanned once per audit for credentials and code
+    anti-patterns together, across a process pool. Findings are cached by
+    content hash, so files unchanged since the last audit are not scanned.
     """
     
-    def __init__(self, project_root: str = None):
+    def __init__(self, project_root: str = None, cache_path: Optional[str] = None,
+                 max_workers: Optional[int] = None, parallel_threshold: int = 64):
         self.project_root = Path(project_root) if project_root else Path(__file__).parent.parent
         self.vulnerabilities: List[SecurityVulnerability] = []
+        self.cache_path = Path(cache_path) if cache_path else self.project_root / SCAN_CACHE_FILENAME
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Below this many files to scan, a process pool costs more than it saves
+        self.parallel_threshold = parallel_threshold
+        self.scan_stats: Dict[str, int] = {}
+        self._file_findings: Optional[Dict[Path, List[Tuple[str, str, int]]]] = None
         
         # Security patterns to detect
         self.credential_patterns = {
@@ -74,6 +171,14 @@ class SecurityAuditor:
             'password': re.compile(r'(?i)password\s*[=:]\s*["\']([^"\']{8,})["\']', re.MULTILINE)
         }
         
+        # Security anti-patterns in Python source
+        self.security_patterns = {
+            'sql_injection': re.compile(r'(?i)(execute|query)\s*\(\s*["\'].*%s.*["\']', re.MULTILINE),
+            'command_injection': re.compile(r'(?i)(os\.system|subprocess\.call|exec|eval)\s*\(.*input', re.MULTILINE),
+            'hardcoded_url': re.compile(r'https?://[^/\s]+\.(com|org|net|io)', re.MULTILINE),
+            'todo_security': re.compile(r'(?i)#.*TODO.*(?:security|auth|encrypt|password|token)', re.MULTILINE)
+        }
+        
         # File extensions to scan
         self.scannable_extensions = {'.py', '.js', '.json', '.env', '.conf', '.cfg', '.ini', '.yml', '.yaml', '.toml'}
         
@@ -81,7 +186,8 @@ class SecurityAuditor:
         self.high_risk_files = {'README.md', 'requirements.txt', 'package.json', 'Dockerfile'}
         
         # Directories to exclude from scanning
-        self.excluded_dirs = {'node_modules', '.git', '__pycache__', '.venv', 'venv', 'dist', 'build'}
+        # (backups holds copies of the tree)
+        self.excluded_dirs = {'node_modules', '.git', '__pycache__', '.venv', 'venv', 'dist', 'build', 'backups'}
         
         logger.info(f"SecurityAuditor initialized for project: {self.project_root}")
     
@@ -99,6 +205,7 @@ class SecurityAuditor:
         
         # Clear previous vulnerabilities
         self.vulnerabilities = []
+        self._file_findings = None
         
         # Run all audit checks
         self._scan_for_exposed_credentials()
@@ -119,37 +226,125 @@ class SecurityAuditor:
         """Scan for exposed credentials in source files"""
         logger.info("Scanning for exposed credentials")
         
-        for file_path in self._get_scannable_files():
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
+        for file_path, findings in self._get_file_findings().items():
+            for kind, cred_type, line_number in findings:
+                if kind != 'credential':
+                    continue
                 
-                # Check each credential pattern
-                for cred_type, pattern in self.credential_patterns.items():
-                    matches = pattern.finditer(content)
-                    
-                    for match in matches:
-                        line_number = content[:match.start()].count('\n') + 1
-                        
-                        # Skip if it's just a variable name or comment
-                        if self._is_false_positive(match.group(0), content, match.start()):
-                            continue
-                        
-                        severity = self._determine_severity(cred_type, file_path)
-                        
-                        vuln = SecurityVulnerability(
-                            vuln_type=f"exposed_{cred_type}",
-                            severity=severity,
-                            file_path=str(file_path.relative_to(self.project_root)),
-                            line_number=line_number,
-                            description=f"Potential {cred_type} found in source code",
-                            recommendation=f"Move {cred_type} to environment variables or secure credential store"
-                        )
-                        
-                        self.vulnerabilities.append(vuln)
-                        
-            except Exception as e:
+                severity = self._determine_severity(cred_type, file_path)
+                
+                vuln = SecurityVulnerability(
+                    vuln_type=f"exposed_{cred_type}",
+                    severity=severity,
+                    file_path=str(file_path.relative_to(self.project_root)),
+                    line_number=line_number,
+                    description=f"Potential {cred_type} found in source code",
+                    recommendation=f"Move {cred_type} to environment variables or secure credential store"
+                )
+                
+                self.vulnerabilities.append(vuln)
+    
+    def _get_file_findings(self) -> Dict[Path, List[Tuple[str, str, int]]]:
+        """Findings per scannable file for this audit, scanning only files the cache cannot answer"""
+        if self._file_findings is not None:
+            return self._file_findings
+        
+        rules_fingerprint = self._rules_fingerprint()
+        cache = self._load_scan_cache(rules_fingerprint)
+        cached_files = cache['files']
+        
+        findings: Dict[Path, List[Tuple[str, str, int]]] = {}
+        pending = []
+        entries = {}
+        for file_path in sorted(self._get_scannable_files()):
+            relative = str(file_path.relative_to(self.project_root))
+            try:
+                file_stat = file_path.stat()
+            except OSError as e:
                 logger.warning(f"Error scanning file {file_path}: {e}")
+                continue
+            entry = cached_files.get(relative)
+            if entry and entry['mtime_ns'] == file_stat.st_mtime_ns and entry['size'] == file_stat.st_size:
+                findings[file_path] = [tuple(finding) for finding in entry['findings']]
+                entries[relative] = entry
+                continue
+            pending.append((file_path, relative, file_stat, entry))
+        
+        results = self._scan_pending_files(pending)
+        scanned = 0
+        for (file_path, relative, file_stat, entry), result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Error scanning file {file_path}: {result}")
+                continue
+            digest, file_findings = result
+            if file_findings is None:
+                # Touched but unchanged
+                file_findings = [tuple(finding) for finding in entry['findings']]
+            else:
+                scanned += 1
+            findings[file_path] = file_findings
+            entries[relative] = {'sha256': digest, 'mtime_ns': file_stat.st_mtime_ns,
+                                 'size': file_stat.st_size, 'findings': file_findings}
+        
+        self.scan_stats = {'files': len(findings), 'scanned': scanned, 'cached': len(findings) - scanned}
+        logger.info(f"Scanned {scanned} of {len(findings)} files ({len(findings) - scanned} unchanged)")
+        # Entries of deleted files are dropped
+        self._save_scan_cache({'version': SCAN_CACHE_VERSION, 'rules': rules_fingerprint, 'files': entries})
+        self._file_findings = findings
+        return findings
+    
+    def _scan_pending_files(self, pending: List[Tuple[Path, str, os.stat_result, Optional[Dict]]]) -> List[Any]:
+        """(digest, findings) or the exception, per pending file, in order"""
+        jobs = [(str(file_path), file_path.suffix == '.py', entry['sha256'] if entry else None)
+                for file_path, _, _, entry in pending]
+        
+        if self.max_workers > 1 and len(jobs) >= self.parallel_threshold:
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_scan_worker,
+                                         initargs=(self.credential_patterns, self.security_patterns)) as executor:
+                    futures = [executor.submit(_scan_file_in_worker, *job) for job in jobs]
+                    return [future.exception() or future.result() for future in futures]
+            except Exception as e:
+                logger.warning(f"Process pool unavailable, scanning in-process: {e}")
+        
+        rules = _ScanRules(self.credential_patterns, self.security_patterns)
+        results = []
+        for job in jobs:
+            try:
+                results.append(_scan_file(rules, *job))
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    def _rules_fingerprint(self) -> str:
+        """Changes whenever cached findings could differ"""
+        rules = [[kind, name, pattern.pattern, pattern.flags]
+                 for kind, patterns in (('credential', self.credential_patterns), ('code', self.security_patterns))
+                 for name, pattern in patterns.items()]
+        return hashlib.sha256(json.dumps(rules).encode('utf-8')).hexdigest()
+    
+    def _load_scan_cache(self, rules_fingerprint: str) -> Dict[str, Any]:
+        empty = {'version': SCAN_CACHE_VERSION, 'rules': rules_fingerprint, 'files': {}}
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            return empty
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable scan cache {self.cache_path}: {e}")
+            return empty
+        if cache.get('version') != SCAN_CACHE_VERSION or cache.get('rules') != rules_fingerprint:
+            return empty
+        return cache
+    
+    def _save_scan_cache(self, cache: Dict[str, Any]):
+        temp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(cache, f)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"Failed to save scan cache: {e}")
     
     def _check_file_permissions(self):
         """Check for insecure file permissions"""
@@ -288,50 +483,35 @@ class SecurityAuditor:
         """Scan source code for security anti-patterns"""
         logger.info("Scanning source code for security issues")
         
-        # Security anti-patterns
-        security_patterns = {
-            'sql_injection': re.compile(r'(?i)(execute|query)\s*\(\s*["\'].*%s.*["\']', re.MULTILINE),
-            'command_injection': re.compile(r'(?i)(os\.system|subprocess\.call|exec|eval)\s*\(.*input', re.MULTILINE),
-            'hardcoded_url': re.compile(r'https?://[^/\s]+\.(com|org|net|io)', re.MULTILINE),
-            'todo_security': re.compile(r'(?i)#.*TODO.*(?:security|auth|encrypt|password|token)', re.MULTILINE)
-        }
-        
-        for file_path in self._get_scannable_files():
-            if file_path.suffix == '.py':  # Focus on Python files
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                    
-                    for pattern_name, pattern in security_patterns.items():
-                        matches = pattern.finditer(content)
-                        
-                        for match in matches:
-                            line_number = content[:match.start()].count('\n') + 1
-                            
-                            severity = 'medium' if pattern_name == 'todo_security' else 'low'
-                            
-                            vuln = SecurityVulnerability(
-                                vuln_type=pattern_name,
-                                severity=severity,
-                                file_path=str(file_path.relative_to(self.project_root)),
-                                line_number=line_number,
-                                description=f"Potential {pattern_name.replace('_', ' ')} detected",
-                                recommendation="Review code for security implications"
-                            )
-                            
-                            self.vulnerabilities.append(vuln)
-                    
-                except Exception as e:
-                    logger.warning(f"Error scanning source file {file_path}: {e}")
+        for file_path, findings in self._get_file_findings().items():
+            for kind, pattern_name, line_number in findings:
+                if kind != 'code':
+                    continue
+                
+                severity = 'medium' if pattern_name == 'todo_security' else 'low'
+                
+                vuln = SecurityVulnerability(
+                    vuln_type=pattern_name,
+                    severity=severity,
+                    file_path=str(file_path.relative_to(self.project_root)),
+                    line_number=line_number,
+                    description=f"Potential {pattern_name.replace('_', ' ')} detected",
+                    recommendation="Review code for security implications"
+                )
+                
+                self.vulnerabilities.append(vuln)
     
     def _get_scannable_files(self) -> List[Path]:
         """Get list of files to scan"""
         files = []
         
-        for file_path in self.project_root.rglob('*'):
-            if file_path.is_file():
-                # Skip excluded directories
-                if any(excluded in file_path.parts for excluded in self.excluded_dirs):
+        for root, dirs, filenames in os.walk(self.project_root):
+            # Skip excluded directories without descending into them
+            dirs[:] = [d for d in dirs if d not in self.excluded_dirs]
+            
+            for filename in filenames:
+                file_path = Path(root) / filename
+                if file_path == self.cache_path:
                     continue
                 
                 # Include files with scannable extensions
@@ -339,35 +519,14 @@ class SecurityAuditor:
                     files.append(file_path)
                 
                 # Include high-risk files regardless of extension
-                elif file_path.name in self.high_risk_files:
+                elif filename in self.high_risk_files:
                     files.append(file_path)
         
         return files
     
     def _is_false_positive(self, match_text: str, content: str, match_start: int) -> bool:
         """Check if a credential match is likely a false positive"""
-        # Get the line containing the match
-        line_start = content.rfind('\n', 0, match_start) + 1
-        line_end = content.find('\n', match_start)
-        if line_end == -1:
-            line_end = len(content)
-        
-        line = content[line_start:line_end]
-        
-        # Skip comments
-        if line.strip().startswith('#') or line.strip().startswith('//'):
-            return True
-        
-        # Skip variable names without values
-        if '=' not in match_text and ':' not in match_text:
-            return True
-        
-        # Skip obvious examples or placeholders
-        placeholders = ['example', 'placeholder', 'your_key_here', 'xxx', 'yyy', 'zzz']
-        if any(placeholder in match_text.lower() for placeholder in placeholders):
-            return True
-        
-        return False
+        return _is_false_positive(match_text, content, match_start)
     
     def _determine_severity(self, cred_type: str, file_path: Path) -> str:
         """Determine vulnerability severity based on credential type and location"""
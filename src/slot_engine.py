@@ -0,0 +1,99 @@
+"""
+Slot Engine - Interval arithmetic for appointment slot search
+Shared by CalendarClient.suggest_alternative_slots and SMSAppointmentBooking.
+
+Busy periods are buffered, sorted and merged once; free start times inside each
+allowed window are then found with a single sweep, so the cost is
+O(busy log busy + windows + candidates) instead of candidates x busy.
+"""
+
+import heapq
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+
+def merge_intervals(intervals: Iterable[Interval], buffer: timedelta = timedelta(0)) -> List[Interval]:
+    """Widen each interval by `buffer` on both sides, then sort and merge overlaps"""
+    merged: List[List[datetime]] = []
+    for start, end in sorted((start - buffer, end + buffer) for start, end in intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def top_scored(candidates: Iterable[datetime], score_fn: Callable[[datetime], float],
+               k: int) -> List[Tuple[float, datetime]]:
+    """The k highest-scoring candidates as (score, start), earliest first on ties"""
+    scored = [(score_fn(candidate), candidate) for candidate in candidates]
+    return heapq.nsmallest(k, scored, key=lambda item: (-item[0], item[1]))
+
+
+class SlotEngine:
+    """
+    Free-slot search over one calendar's busy periods.
+
+    A candidate start `t` is free when [t, t + duration) does not overlap any
+    buffered busy period. Candidates lie on a grid of `step_minutes` anchored
+    at each window's first start.
+    """
+
+    def __init__(self, busy_periods: Iterable[Interval], buffer_minutes: int = 0):
+        self.buffer = timedelta(minutes=buffer_minutes)
+        self.busy = merge_intervals(busy_periods, self.buffer)
+        self._busy_ends = [end for _, end in self.busy]
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        index = bisect_right(self._busy_ends, start)
+        return index == len(self.busy) or self.busy[index][0] >= end
+
+    def free_gaps(self, window_start: datetime, window_end: datetime) -> List[Interval]:
+        """Complement of the merged busy periods within [window_start, window_end)"""
+        gaps = []
+        cursor = window_start
+        for busy_start, busy_end in self.busy[bisect_right(self._busy_ends, window_start):]:
+            if busy_start >= window_end:
+                break
+            if busy_start > cursor:
+                gaps.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < window_end:
+            gaps.append((cursor, window_end))
+        return gaps
+
+    def candidate_starts(self, start_windows: Iterable[Interval], duration_minutes: int,
+                         step_minutes: int = 30) -> List[datetime]:
+        """
+        Free grid-aligned start times, in order.
+
+        Each window is (first_start, latest_start), both inclusive; callers fold
+        business hours and end-of-day limits into the window.
+        """
+        duration = timedelta(minutes=duration_minutes)
+        step = timedelta(minutes=step_minutes)
+        busy = self.busy
+        busy_count = len(busy)
+        results: List[datetime] = []
+
+        for first_start, latest_start in sorted(start_windows):
+            index = bisect_right(self._busy_ends, first_start)
+            current = first_start
+            while current <= latest_start:
+                while index < busy_count and busy[index][1] <= current:
+                    index += 1
+                if index == busy_count or current + duration <= busy[index][0]:
+                    # Every grid point up to the next busy period (less the duration) is free
+                    run_end = latest_start if index == busy_count else min(latest_start, busy[index][0] - duration)
+                    count = (run_end - current) // step + 1
+                    results.extend(current + step * offset for offset in range(count))
+                    current += step * count
+                else:
+                    # Jump to the first grid point at or after the conflicting period's end
+                    current += step * -(-(busy[index][1] - current) // step)
+
+        return results
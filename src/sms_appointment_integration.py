@@ -8,8 +8,11 @@ import re
 import logging
 from dataclasses import dataclass
 from enum import Enum
+import pytz
 
 from src.calendar_client import CalendarClient
+from src.calendar_busy_cache import parse_utc
+from src.slot_engine import SlotEngine
 from src.sms_conversation_manager import ConversationManager
 from src.datetime_utils import parse_natural_datetime
 
@@ -43,11 +46,16 @@ class AppointmentRequest:
     status: AppointmentStatus
 
 class SMSAppointmentBooking:
-    """Handles appointment booking through SMS with calendar integration"""
+    """Handles appointment booking through SMS with calendar integration
+
+    Slots are naive datetimes in the business timezone; the calendar's busy
+    periods (naive UTC) are converted into it before slots are matched.
+    """
     
-    def __init__(self, calendar_client: CalendarClient = None):
+    def __init__(self, calendar_client: CalendarClient = None, timezone: str = 'America/New_York'):
         """Initialize with calendar and conversation managers"""
         self.calendar = calendar_client or CalendarClient()
+        self.timezone = pytz.timezone(timezone)
         self.conversation_manager = ConversationManager()
         
         # Service duration estimates (in minutes)
@@ -194,45 +202,71 @@ class SMSAppointmentBooking:
             self.service_durations['default']
         )
         
-        # Get busy times from calendar
-        start_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        # Get busy times from calendar, which takes and returns UTC
+        start_date = self._local_now().replace(hour=0, minute=0, second=0, microsecond=0)
         end_date = start_date + timedelta(days=days_ahead)
         
         try:
-            busy_times = self.calendar.get_busy_times(start_date, end_date)
+            busy_times = self.calendar.get_busy_times(self._to_utc(start_date), self._to_utc(end_date))
         except Exception as e:
             logger.error(f"Failed to get busy times from calendar: {e}")
             busy_times = []
         
-        # Generate potential slots
-        slots = []
-        current_date = start_date
+        busy_periods = []
+        for busy_period in busy_times:
+            busy_start = busy_period.get('start')
+            busy_end = busy_period.get('end')
+            if isinstance(busy_start, str):
+                busy_start = parse_utc(busy_start)
+            if isinstance(busy_end, str):
+                busy_end = parse_utc(busy_end)
+            busy_periods.append((self._to_local(busy_start), self._to_local(busy_end)))
         
-        while current_date <= end_date:
-            # Skip past dates
-            if current_date.date() < datetime.now().date():
-                current_date += timedelta(days=1)
-                continue
-                
-            # Generate slots for this day
-            day_slots = self._generate_day_slots(
-                current_date, 
-                service_duration, 
-                busy_times,
-                appointment_request
-            )
-            slots.extend(day_slots)
-            current_date += timedelta(days=1)
+        engine = SlotEngine(busy_periods)
+        booking_windows = []
+        for day_offset in range(days_ahead + 1):
+            window = self._booking_window(start_date + timedelta(days=day_offset), appointment_request)
+            if window:
+                booking_windows.append(window)
         
-        # Sort by date and return top matches
-        slots.sort(key=lambda x: x.datetime)
-        return slots[:10]  # Return top 10 options
-    
-    def _generate_day_slots(self, date: datetime, duration_minutes: int, 
-                           busy_times: List[Dict], request: AppointmentRequest) -> List[AppointmentSlot]:
-        """Generate available slots for a specific day"""
+        # Candidates come back in time order, so the first 10 reasonable ones are the top matches
         slots = []
+        for slot_time in engine.candidate_starts(booking_windows, service_duration, step_minutes=60):
+            if not self._is_reasonable_time(slot_time, appointment_request.urgency):
+                continue
+            slots.append(AppointmentSlot(
+                datetime=slot_time,
+                duration_minutes=service_duration,
+                available=True,
+                display_text=self._format_slot_display(slot_time, service_duration),
+                slot_id=f"{slot_time.strftime('%Y%m%d_%H%M')}"
+            ))
+            if len(slots) == 10:
+                break
         
+        return slots
+    
+    def _local_now(self) -> datetime:
+        """Current wall-clock time in the business timezone, naive"""
+        return datetime.now(self.timezone).replace(tzinfo=None)
+    
+    def _to_utc(self, local: datetime) -> datetime:
+        """Naive business-local datetime to naive UTC"""
+        return self.timezone.localize(local).astimezone(pytz.utc).replace(tzinfo=None)
+    
+    def _to_local(self, value: datetime) -> datetime:
+        """Naive UTC (or aware) datetime to naive business-local"""
+        if value.tzinfo is None:
+            value = pytz.utc.localize(value)
+        return value.astimezone(self.timezone).replace(tzinfo=None)
+    
+    def _slot_interval(self, slot: AppointmentSlot) -> Tuple[datetime, datetime]:
+        """A slot's start and end as aware datetimes in the business timezone"""
+        end = slot.datetime + timedelta(minutes=slot.duration_minutes)
+        return self.timezone.localize(slot.datetime), self.timezone.localize(end)
+    
+    def _booking_window(self, date: datetime, request: AppointmentRequest) -> Optional[Tuple[datetime, datetime]]:
+        """Range of hourly start times offered on a day, or None if the day is skipped"""
         # Business hours (8 AM to 6 PM by default)
         start_hour = 8
         end_hour = 18
@@ -249,54 +283,15 @@ class SMSAppointmentBooking:
         # Skip weekends unless specifically requested
         if date.weekday() >= 5:  # Saturday or Sunday
             if 'weekend' not in request.preferred_times:
-                return slots
-        
-        # Generate hourly slots
-        current_time = date.replace(hour=start_hour, minute=0)
-        end_time = date.replace(hour=end_hour, minute=0)
+                return None
         
-        while current_time < end_time:
-            # Check if slot conflicts with busy times
-            slot_end = current_time + timedelta(minutes=duration_minutes)
-            
-            if not self._conflicts_with_busy_times(current_time, slot_end, busy_times):
-                # Check if it's a reasonable time (not too early if same day)
-                if self._is_reasonable_time(current_time, request.urgency):
-                    slot = AppointmentSlot(
-                        datetime=current_time,
-                        duration_minutes=duration_minutes,
-                        available=True,
-                        display_text=self._format_slot_display(current_time, duration_minutes),
-                        slot_id=f"{current_time.strftime('%Y%m%d_%H%M')}"
-                    )
-                    slots.append(slot)
-            
-            # Move to next hour
-            current_time += timedelta(hours=1)
-        
-        return slots
-    
-    def _conflicts_with_busy_times(self, start_time: datetime, end_time: datetime, 
-                                 busy_times: List[Dict]) -> bool:
-        """Check if proposed slot conflicts with existing appointments"""
-        for busy_period in busy_times:
-            busy_start = busy_period.get('start')
-            busy_end = busy_period.get('end')
-            
-            if isinstance(busy_start, str):
-                busy_start = datetime.fromisoformat(busy_start.replace('Z', '+00:00'))
-            if isinstance(busy_end, str):
-                busy_end = datetime.fromisoformat(busy_end.replace('Z', '+00:00'))
-            
-            # Check for overlap
-            if start_time < busy_end and end_time > busy_start:
-                return True
-        
-        return False
+        # Slots may start any time before the end hour
+        return (date.replace(hour=start_hour, minute=0),
+                date.replace(hour=end_hour, minute=0) - timedelta(microseconds=1))
     
     def _is_reasonable_time(self, slot_time: datetime, urgency: str) -> bool:
         """Check if the slot time is reasonable given current time and urgency"""
-        now = datetime.now()
+        now = self._local_now()
         
         # For same-day appointments
         if slot_time.date() == now.date():
@@ -315,9 +310,10 @@ class SMSAppointmentBooking:
         duration_str = f"{duration_minutes // 60}h" if duration_minutes >= 60 else f"{duration_minutes}min"
         
         # Make it conversational
-        if slot_time.date() == datetime.now().date():
+        today = self._local_now().date()
+        if slot_time.date() == today:
             return f"Today at {time_str} ({duration_str})"
-        elif slot_time.date() == (datetime.now() + timedelta(days=1)).date():
+        elif slot_time.date() == today + timedelta(days=1):
             return f"Tomorrow at {time_str} ({duration_str})"
         else:
             return f"{day_name}, {date_str} at {time_str} ({duration_str})"
@@ -359,22 +355,23 @@ class SMSAppointmentBooking:
             Confirmation details including event ID
         """
         try:
-            # Create calendar event
-            event_details = {
-                'summary': f"{service_details.get('service_type', 'Service')} - {customer_phone}",
-                'description': (
+            # Create calendar event; slot times are business-local, the calendar needs their offset
+            start_time, end_time = self._slot_interval(slot)
+            attendees = [service_details.get('customer_email')] if service_details.get('customer_email') else []
+            event = self.calendar.create_event(
+                f"{service_details.get('service_type', 'Service')} - {customer_phone}",
+                start_time.isoformat(),
+                end_time.isoformat(),
+                attendees=attendees,
+                description=(
                     f"Customer: {customer_phone}\n"
                     f"Service: {service_details.get('service_type', 'General')}\n"
                     f"Notes: {service_details.get('notes', 'None')}\n"
                     f"Urgency: {service_details.get('urgency', 'Normal')}\n"
                     f"Booked via SMS"
-                ),
-                'start_time': slot.datetime,
-                'end_time': slot.datetime + timedelta(minutes=slot.duration_minutes),
-                'attendees': [service_details.get('customer_email')] if service_details.get('customer_email') else []
-            }
-            
-            event_id = self.calendar.create_event(event_details)
+                )
+            )
+            event_id = event.get('id') if event else None
             
             # Update conversation state
             conversation_context = {
@@ -430,13 +427,11 @@ class SMSAppointmentBooking:
             Reschedule confirmation details
         """
         try:
-            # Update calendar event
+            # Update calendar event; aware datetimes, which update_event sends with their offset
+            start_time, end_time = self._slot_interval(new_slot)
             updated_event = self.calendar.update_event(
                 current_event_id,
-                {
-                    'start_time': new_slot.datetime,
-                    'end_time': new_slot.datetime + timedelta(minutes=new_slot.duration_minutes)
-                }
+                {'start_time': start_time, 'end_time': end_time}
             )
             
             # Update conversation state
@@ -7,10 +7,14 @@ import json
 import re
 import random
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from enum import Enum
 from datetime import datetime
 
+from .text_matching import AhoCorasickMatcher
+
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
 class TemplateCategory(Enum):
     """Template categories for organization"""
     GREETING = "greeting"
@@ -23,6 +27,33 @@ class TemplateCategory(Enum):
     PAYMENT = "payment"
     GENERAL = "general"
 
+class CompiledTemplate:
+    """Template text pre-split into literal segments and variable slots"""
+
+    __slots__ = ("source", "segments", "slots", "slot_names")
+
+    def __init__(self, source: str):
+        self.source = source
+        # Even positions are literal text, odd positions are variable names
+        self.segments: List[str] = PLACEHOLDER_PATTERN.split(source)
+        self.slots: Tuple[Tuple[int, str], ...] = tuple(
+            (index, self.segments[index]) for index in range(1, len(self.segments), 2)
+        )
+        self.slot_names = frozenset(name for _, name in self.slots)
+
+    def render(self, variables: Dict[str, Any]) -> Tuple[str, bool]:
+        """Render with the given variables; returns (text, had_missing_variables)"""
+        parts = list(self.segments)
+        missing = False
+        for index, name in self.slots:
+            if name in variables:
+                parts[index] = str(variables[name])
+            else:
+                parts[index] = ""
+                missing = True
+        # Collapse whitespace the same way as re.sub(r'\s+', ' ', text).strip()
+        return " ".join("".join(parts).split()), missing
+
 class SMSTemplateSystem:
     """Manages SMS templates with variable substitution and intent-based selection"""
     
@@ -33,9 +64,13 @@ class SMSTemplateSystem:
         
         # Load templates
         self.templates = self._load_templates()
+        self._compiled_templates: Dict[str, CompiledTemplate] = {}
+        for name in self.templates:
+            self._compile_template(name)
         
         # Quick reply patterns
         self.quick_replies = self._load_quick_replies()
+        self._build_quick_reply_matcher()
         
         # Intent to template mapping
         self.intent_templates = self._build_intent_mapping()
@@ -264,6 +299,31 @@ class SMSTemplateSystem:
         """Get a specific template by name"""
         return self.templates.get(template_name)
     
+    def _compile_template(self, template_name: str) -> Optional[CompiledTemplate]:
+        """Compile (or recompile) a template into segments and slots"""
+        template = self.templates.get(template_name)
+        if not template:
+            self._compiled_templates.pop(template_name, None)
+            return None
+        
+        compiled = CompiledTemplate(template.get("template", ""))
+        self._compiled_templates[template_name] = compiled
+        return compiled
+    
+    def _get_compiled_template(self, template_name: str, template: Dict[str, Any]) -> CompiledTemplate:
+        """Return the compiled form, recompiling if the template text was edited in place"""
+        compiled = self._compiled_templates.get(template_name)
+        if compiled is None or compiled.source != template["template"]:
+            compiled = self._compile_template(template_name)
+        return compiled
+    
+    def _build_quick_reply_matcher(self):
+        """Compile all quick reply patterns into a single automaton"""
+        self._quick_reply_matcher = AhoCorasickMatcher.from_label_map(self.quick_replies)
+        self._quick_reply_priority = {
+            reply_type: rank for rank, reply_type in enumerate(self.quick_replies)
+        }
+    
     def fill_template(self, template_name: str, variables: Dict[str, Any] = None,
                      use_fallback: bool = True) -> str:
         """Fill template with variables"""
@@ -275,27 +335,14 @@ class SMSTemplateSystem:
             raise ValueError(f"Template '{template_name}' not found")
         
         try:
-            # Get template text
-            template_text = template["template"]
-            
-            # Replace variables
-            for var, value in variables.items():
-                placeholder = f"{{{var}}}"
-                template_text = template_text.replace(placeholder, str(value))
-            
-            # Check for unfilled variables
-            missing_vars = re.findall(r'\{(\w+)\}', template_text)
+            # Single pass over the precompiled segments; missing slots render empty
+            template_text, missing_vars = self._get_compiled_template(
+                template_name, template
+            ).render(variables)
             
             if missing_vars and use_fallback and "fallback" in template:
                 # Use fallback if variables are missing
                 return template["fallback"]
-            elif missing_vars:
-                # Fill with empty string or raise error
-                for var in missing_vars:
-                    template_text = template_text.replace(f"{{{var}}}", "")
-            
-            # Clean up extra spaces
-            template_text = re.sub(r'\s+', ' ', template_text).strip()
             
             return template_text
             
@@ -309,12 +356,8 @@ class SMSTemplateSystem:
         """Classify message as a quick reply type"""
         message_clean = message.lower().strip()
         
-        # Check each quick reply category
-        for reply_type, patterns in self.quick_replies.items():
-            if any(pattern in message_clean for pattern in patterns):
-                return reply_type
-        
-        return None
+        # One automaton pass; ties resolve to the earliest category as before
+        return self._quick_reply_matcher.first_label(message_clean, self._quick_reply_priority)
     
     def get_template_for_intent(self, intent: str, variables: Dict[str, Any] = None,
                               prefer_specific: bool = True) -> str:
@@ -460,6 +503,7 @@ class SMSTemplateSystem:
                 "variables": variables or [],
                 "fallback": fallback
             }
+            self._compile_template(name)
             self._save_templates()
             return True
         except Exception as e:
@@ -473,6 +517,7 @@ class SMSTemplateSystem:
                 return False
             
             self.templates[name].update(kwargs)
+            self._compile_template(name)
             self._save_templates()
             return True
         except Exception as e:
@@ -486,6 +531,7 @@ class SMSTemplateSystem:
                 return False
             
             del self.templates[name]
+            self._compiled_templates.pop(name, None)
             self._save_templates()
             return True
         except Exception as e:
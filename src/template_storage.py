@@ -5,15 +5,21 @@ Manages SMS templates with version control and persistence
 
 import json
 import logging
+import os
+import re
+import tempfile
+from collections import Counter, defaultdict, deque
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Deque, Dict, Iterator, List, Optional, Any, Set, Tuple
 import hashlib
-import shutil
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
 logger = logging.getLogger(__name__)
 
+# Versions per template kept in memory; older ones are read from the log on demand
+MAX_RECENT_VERSIONS = 10
+
 @dataclass
 class TemplateVersion:
     """Represents a template version"""
@@ -22,10 +28,35 @@ class TemplateVersion:
     user: str
     changes: Dict[str, Any]
     checksum: str
+    previous_checksum: Optional[str] = None
+
+def _atomic_write_json(path: Path, data: Any) -> None:
+    """Write JSON to a temp file next to the target and rename it into place"""
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
 class TemplateStorage:
     """
-    Enhanced template storage system with version control and persistence
+    Enhanced template storage system with version control and persistence.
+
+    Storage layout (next to storage_path):
+        template_objects/<checksum>.json  - each distinct template body, written once
+        template_manifest.json            - {name: checksum} for the current templates
+        template_versions.jsonl           - append-only version log
+
+    Only the most recent versions of each template are held in memory; the
+    full history is read from the log when asked for. A legacy
+    sms_templates.json / template_versions.json pair is imported on first
+    load and left untouched.
     """
     
     def __init__(self, storage_path: str = "templates/sms_templates.json"):
@@ -33,21 +64,32 @@ class TemplateStorage:
         Initialize template storage
         
         Args:
-            storage_path: Path to the JSON file for storing templates
+            storage_path: Path to the legacy JSON templates file; the
+                content-addressed store lives in the same directory
         """
         self.storage_path = Path(storage_path)
         self.backup_dir = self.storage_path.parent / "backups"
         self.version_file = self.storage_path.parent / "template_versions.json"
+        self.objects_dir = self.storage_path.parent / "template_objects"
+        self.manifest_file = self.storage_path.parent / "template_manifest.json"
+        self.version_log_file = self.storage_path.parent / "template_versions.jsonl"
         
         # Ensure directories exist
         self.storage_path.parent.mkdir(parents=True, exist_ok=True)
         self.backup_dir.mkdir(parents=True, exist_ok=True)
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
         
         # Initialize storage
         self.templates = {}
-        self.versions = {}
+        self.versions: Dict[str, Deque[TemplateVersion]] = {}
+        self._version_counts: Counter = Counter()
+        self._checksums: Dict[str, str] = {}
+        self._category_counts: Counter = Counter()
+        self._search_fields: Dict[str, Tuple[str, str, str, str, Tuple[str, ...]]] = {}
+        self._trigram_index: Dict[str, Set[str]] = defaultdict(set)
         self._load_templates()
         self._load_versions()
+        self._rebuild_index()
         
         logger.info(f"Template storage initialized at {self.storage_path}")
     
@@ -56,13 +98,44 @@ class TemplateStorage:
         content = json.dumps(data, sort_keys=True)
         return hashlib.md5(content.encode()).hexdigest()
     
+    def _object_path(self, checksum: str) -> Path:
+        return self.objects_dir / f"{checksum}.json"
+    
+    def _store_object(self, data: Dict) -> str:
+        """Store a template body by checksum; identical bodies are only written once"""
+        checksum = self._generate_checksum(data)
+        object_path = self._object_path(checksum)
+        if not object_path.exists():
+            _atomic_write_json(object_path, data)
+        return checksum
+    
+    def _read_object(self, checksum: str) -> Optional[Dict]:
+        """Read a stored template body by checksum"""
+        object_path = self._object_path(checksum)
+        if not object_path.exists():
+            return None
+        with open(object_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
     def _load_templates(self) -> None:
-        """Load templates from JSON file"""
+        """Load current templates from the manifest, migrating the legacy file if needed"""
         try:
-            if self.storage_path.exists():
+            if self.manifest_file.exists():
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                for name, checksum in manifest.items():
+                    template = self._read_object(checksum)
+                    if template is None:
+                        logger.error(f"Missing object {checksum} for template '{name}'")
+                        continue
+                    self.templates[name] = template
+                    self._checksums[name] = checksum
+                logger.info(f"Loaded {len(self.templates)} templates from {self.manifest_file}")
+            elif self.storage_path.exists():
                 with open(self.storage_path, 'r', encoding='utf-8') as f:
                     self.templates = json.load(f)
-                logger.info(f"Loaded {len(self.templates)} templates from {self.storage_path}")
+                self._save_templates()
+                logger.info(f"Migrated {len(self.templates)} templates from {self.storage_path}")
             else:
                 # Initialize with default templates
                 self.templates = self._get_default_templates()
@@ -73,65 +146,123 @@ class TemplateStorage:
             self.templates = self._get_default_templates()
     
     def _load_versions(self) -> None:
-        """Load version history from JSON file"""
+        """Load version history from the append-only log, migrating the legacy file if needed"""
         try:
-            if self.version_file.exists():
+            if self.version_log_file.exists():
+                for template_name, version in self._read_version_log():
+                    self._index_version(template_name, version)
+                logger.info(f"Loaded version history for {len(self._version_counts)} templates")
+            elif self.version_file.exists():
                 with open(self.version_file, 'r', encoding='utf-8') as f:
                     version_data = json.load(f)
-                    self.versions = {
-                        template_name: [
-                            TemplateVersion(**v) for v in versions
-                        ] for template_name, versions in version_data.items()
-                    }
-                logger.info(f"Loaded version history for {len(self.versions)} templates")
-            else:
-                self.versions = {}
+                for template_name, versions in version_data.items():
+                    for v in versions:
+                        version = TemplateVersion(**v)
+                        self._index_version(template_name, version)
+                        self._append_version(template_name, version)
+                logger.info(f"Migrated version history for {len(self._version_counts)} templates")
         except Exception as e:
             logger.error(f"Error loading versions: {e}", exc_info=True)
             self.versions = {}
+            self._version_counts = Counter()
     
     def _save_templates(self) -> None:
-        """Save templates to JSON file with backup"""
+        """
+        Persist the current templates. Only bodies not already in the object
+        store are written, followed by an atomic rewrite of the small manifest.
+        """
         try:
-            # Create backup before saving
-            if self.storage_path.exists():
-                backup_filename = f"sms_templates_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                backup_path = self.backup_dir / backup_filename
-                shutil.copy2(self.storage_path, backup_path)
-                logger.debug(f"Created backup at {backup_path}")
+            manifest = {}
+            for name, template in self.templates.items():
+                checksum = self._checksums.get(name)
+                if checksum is None:
+                    checksum = self._store_object(template)
+                    self._checksums[name] = checksum
+                manifest[name] = checksum
+            
+            for name in list(self._checksums):
+                if name not in self.templates:
+                    del self._checksums[name]
             
-            # Save current templates
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(self.templates, f, indent=2, ensure_ascii=False)
+            _atomic_write_json(self.manifest_file, manifest)
             
-            logger.info(f"Saved {len(self.templates)} templates to {self.storage_path}")
+            logger.info(f"Saved {len(self.templates)} templates to {self.manifest_file}")
             
         except Exception as e:
             logger.error(f"Error saving templates: {e}", exc_info=True)
             raise
     
-    def _save_versions(self) -> None:
-        """Save version history to JSON file"""
-        try:
-            version_data = {
-                template_name: [
-                    {
-                        'version': v.version,
-                        'timestamp': v.timestamp,
-                        'user': v.user,
-                        'changes': v.changes,
-                        'checksum': v.checksum
-                    } for v in versions
-                ] for template_name, versions in self.versions.items()
-            }
-            
-            with open(self.version_file, 'w', encoding='utf-8') as f:
-                json.dump(version_data, f, indent=2, ensure_ascii=False)
-                
-            logger.debug("Saved version history")
-            
-        except Exception as e:
-            logger.error(f"Error saving versions: {e}", exc_info=True)
+    def _append_version(self, template_name: str, version: TemplateVersion) -> None:
+        """Append a single version entry to the version log"""
+        entry = {'template': template_name}
+        entry.update(asdict(version))
+        with open(self.version_log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    
+    def _read_version_log(self, template_name: Optional[str] = None) -> Iterator[Tuple[str, TemplateVersion]]:
+        """Stream (template, version) entries from the version log, optionally for one template"""
+        if not self.version_log_file.exists():
+            return
+        with open(self.version_log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                name = entry.pop('template')
+                if template_name is None or name == template_name:
+                    yield name, TemplateVersion(**entry)
+    
+    def _index_version(self, template_name: str, version: TemplateVersion) -> None:
+        """Count a version and keep it among the template's recent ones"""
+        self.versions.setdefault(template_name, deque(maxlen=MAX_RECENT_VERSIONS)).append(version)
+        self._version_counts[template_name] += 1
+    
+    def _index_template(self, name: str, template: Dict[str, Any]) -> None:
+        """Add a template to the category counts and search index"""
+        self._category_counts[template.get('category', 'uncategorized')] += 1
+        
+        fields = (
+            name.lower(),
+            template.get('template', '').lower(),
+            template.get('category', '').lower(),
+            template.get('description', '').lower(),
+            tuple(var.lower() for var in template.get('variables', []))
+        )
+        self._search_fields[name] = fields
+        for text in fields[:4] + fields[4]:
+            for trigram in self._trigrams(text):
+                self._trigram_index[trigram].add(name)
+    
+    def _unindex_template(self, name: str) -> None:
+        """Remove a template from the category counts and search index"""
+        template = self.templates.get(name)
+        if template is not None:
+            category = template.get('category', 'uncategorized')
+            self._category_counts[category] -= 1
+            if self._category_counts[category] <= 0:
+                del self._category_counts[category]
+        
+        fields = self._search_fields.pop(name, None)
+        if fields:
+            for text in fields[:4] + fields[4]:
+                for trigram in self._trigrams(text):
+                    names = self._trigram_index.get(trigram)
+                    if names:
+                        names.discard(name)
+                        if not names:
+                            del self._trigram_index[trigram]
+    
+    def _rebuild_index(self) -> None:
+        """Rebuild the in-memory search index from self.templates"""
+        self._category_counts = Counter()
+        self._search_fields = {}
+        self._trigram_index = defaultdict(set)
+        for name, template in self.templates.items():
+            self._index_template(name, template)
+    
+    @staticmethod
+    def _trigrams(text: str) -> Set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
     
     def _get_default_templates(self) -> Dict[str, Dict]:
         """Return default SMS templates for all intent types"""
@@ -394,25 +525,23 @@ class TemplateStorage:
                         'new': new_template.get(key)
                     }
             
+            # Snapshots of both sides live in the object store so any version can be restored
+            previous_checksum = self._checksums.get(template_name) or self._store_object(old_template)
+            checksum = self._store_object(new_template)
+            
             # Create version entry
             version = TemplateVersion(
-                version=f"v{len(self.versions.get(template_name, [])) + 1}",
+                version=f"v{self._version_counts[template_name] + 1}",
                 timestamp=datetime.now().isoformat(),
                 user=user,
                 changes=changes,
-                checksum=self._generate_checksum(new_template)
+                checksum=checksum,
+                previous_checksum=previous_checksum
             )
             
-            # Add to version history
-            if template_name not in self.versions:
-                self.versions[template_name] = []
-            self.versions[template_name].append(version)
-            
-            # Keep only last 10 versions per template
-            if len(self.versions[template_name]) > 10:
-                self.versions[template_name] = self.versions[template_name][-10:]
-            
-            self._save_versions()
+            # Append to version history; the log is never rewritten on save
+            self._index_version(template_name, version)
+            self._append_version(template_name, version)
             logger.info(f"Created version {version.version} for template '{template_name}'")
             
         except Exception as e:
@@ -450,8 +579,11 @@ class TemplateStorage:
             if old_template:
                 self._create_version(name, old_template, new_template, user)
             
-            # Update template
+            # Update template and its index entries
+            self._unindex_template(name)
             self.templates[name] = new_template
+            self._checksums[name] = self._store_object(new_template)
+            self._index_template(name, new_template)
             self._save_templates()
             
             logger.info(f"Successfully saved template '{name}' by user '{user}'")
@@ -509,6 +641,7 @@ class TemplateStorage:
                 
                 self._create_version(name, self.templates[name], deleted_template, user)
                 
+                self._unindex_template(name)
                 del self.templates[name]
                 self._save_templates()
                 
@@ -523,8 +656,16 @@ class TemplateStorage:
             return False
     
     def get_template_versions(self, name: str) -> List[TemplateVersion]:
-        """Get version history for a template"""
-        return self.versions.get(name, [])
+        """Get the full version history for a template, read from the version log"""
+        return [version for _, version in self._read_version_log(name)]
+    
+    def _find_version(self, name: str, version: str) -> Optional[TemplateVersion]:
+        """A version of a template, from the recent ones or else the version log"""
+        for candidate in self.versions.get(name, ()):
+            if candidate.version == version:
+                return candidate
+        return next((candidate for _, candidate in self._read_version_log(name)
+                     if candidate.version == version), None)
     
     def rollback_template(self, name: str, version: str, user: str = "system") -> bool:
         """
@@ -539,22 +680,27 @@ class TemplateStorage:
             bool: True if rollback successful
         """
         try:
-            versions = self.versions.get(name, [])
-            target_version = None
-            
-            for v in versions:
-                if v.version == version:
-                    target_version = v
-                    break
+            target_version = self._find_version(name, version)
             
             if not target_version:
                 logger.error(f"Version {version} not found for template {name}")
                 return False
             
-            # Get the template state at that version by applying changes in reverse
-            # This is a simplified implementation - in production you might store full snapshots
-            logger.warning(f"Rollback for template '{name}' to version '{version}' requested but not fully implemented")
-            return False
+            snapshot = self._read_object(target_version.checksum)
+            if snapshot is None:
+                # Versions migrated from the legacy history have no stored snapshot
+                logger.error(f"No snapshot stored for version {version} of template {name}")
+                return False
+            
+            if 'deleted_at' in snapshot:
+                # Rolling back to a deletion entry restores the template as it was before deletion
+                snapshot = {k: v for k, v in snapshot.items() if k not in ('deleted_at', 'deleted_by')}
+            
+            if not self.save_template(name, snapshot, user):
+                return False
+            
+            logger.info(f"Rolled back template '{name}' to version '{version}'")
+            return True
             
         except Exception as e:
             logger.error(f"Error rolling back template '{name}' to version '{version}': {e}", exc_info=True)
@@ -562,20 +708,13 @@ class TemplateStorage:
     
     def list_categories(self) -> List[str]:
         """List all template categories"""
-        categories = set()
-        for template in self.templates.values():
-            categories.add(template.get('category', 'uncategorized'))
-        return sorted(categories)
+        return sorted(self._category_counts)
     
     def get_template_stats(self) -> Dict[str, Any]:
         """Get statistics about stored templates"""
-        categories = {}
+        categories = dict(self._category_counts)
         total_templates = len(self.templates)
-        total_versions = sum(len(versions) for versions in self.versions.values())
-        
-        for template in self.templates.values():
-            category = template.get('category', 'uncategorized')
-            categories[category] = categories.get(category, 0) + 1
+        total_versions = sum(self._version_counts.values())
         
         return {
             'total_templates': total_templates,
@@ -595,39 +734,53 @@ class TemplateStorage:
         results = []
         query_lower = query.lower()
         
-        for name, template in self.templates.items():
+        # Narrow candidates with the trigram index; short queries check every template
+        if len(query_lower) >= 3:
+            candidates = None
+            for trigram in self._trigrams(query_lower):
+                names = self._trigram_index.get(trigram)
+                if not names:
+                    return []
+                candidates = set(names) if candidates is None else candidates & names
+                if not candidates:
+                    return []
+        else:
+            candidates = self._search_fields.keys()
+        
+        for name in candidates:
+            name_l, template_l, category_l, description_l, variables_l = self._search_fields[name]
             score = 0
             
             # Check name match
-            if query_lower in name.lower():
+            if query_lower in name_l:
                 score += 10
             
             # Check template content match
-            if query_lower in template.get('template', '').lower():
+            if query_lower in template_l:
                 score += 5
             
             # Check category match
-            if query_lower in template.get('category', '').lower():
+            if query_lower in category_l:
                 score += 3
             
             # Check description match
-            if query_lower in template.get('description', '').lower():
+            if query_lower in description_l:
                 score += 2
             
             # Check variables match
-            for var in template.get('variables', []):
-                if query_lower in var.lower():
+            for var in variables_l:
+                if query_lower in var:
                     score += 1
             
             if score > 0:
                 results.append({
                     'name': name,
-                    'template': template,
+                    'template': self.templates[name],
                     'relevance_score': score
                 })
         
-        # Sort by relevance
-        results.sort(key=lambda x: x['relevance_score'], reverse=True)
+        # Sort by relevance, then name for a stable order across index updates
+        results.sort(key=lambda x: (-x['relevance_score'], x['name']))
         return results
     
     def validate_template(self, template_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -664,7 +817,6 @@ class TemplateStorage:
             declared_vars = set(template_data['variables'])
             
             # Find variables used in template
-            import re
             used_vars = set(re.findall(r'\{(\w+)\}', template_text))
             
             # Check for undeclared variables
@@ -701,17 +853,15 @@ class TemplateStorage:
             }
             
             if include_versions:
-                export_data['versions'] = {
-                    template_name: [
-                        {
-                            'version': v.version,
-                            'timestamp': v.timestamp,
-                            'user': v.user,
-                            'changes': v.changes,
-                            'checksum': v.checksum
-                        } for v in versions
-                    ] for template_name, versions in self.versions.items()
-                }
+                export_data['versions'] = {}
+                for template_name, v in self._read_version_log():
+                    export_data['versions'].setdefault(template_name, []).append({
+                        'version': v.version,
+                        'timestamp': v.timestamp,
+                        'user': v.user,
+                        'changes': v.changes,
+                        'checksum': v.checksum
+                    })
             
             with open(export_path, 'w', encoding='utf-8') as f:
                 json.dump(export_data, f, indent=2, ensure_ascii=False)
@@ -744,6 +894,7 @@ class TemplateStorage:
             if not merge:
                 # Replace all templates
                 self.templates = {}
+                self._rebuild_index()
             
             # Import templates
             for name, template_data in imported_templates.items():
@@ -758,7 +909,8 @@ class TemplateStorage:
     
     def cleanup_old_backups(self, keep_days: int = 30) -> int:
         """
-        Clean up old backup files
+        Clean up old backup files left by the legacy full-copy backups.
+        Template history now lives in the object store and is not affected.
         
         Args:
             keep_days: Number of days to keep backups
@@ -785,9 +937,12 @@ class TemplateStorage:
             return 0
 
 
-# Global instance for easy access
-template_storage = TemplateStorage()
+# Global instance, created on first use so importing this module touches no files
+_template_storage: Optional[TemplateStorage] = None
 
 def get_template_storage() -> TemplateStorage:
-    """Get the global template storage instance"""
-    return template_storage
\ No newline at end of file
+    """Get the global template storage instance, loading (and migrating) it on first use"""
+    global _template_storage
+    if _template_storage is None:
+        _template_storage = TemplateStorage()
+    return _template_storage
\ No newline at end of file
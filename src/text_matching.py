@@ -0,0 +1,147 @@
+"""
+Text Matching - Multi-pattern substring matching for message classification
+Builds an Aho-Corasick automaton once so a message is scanned in a single pass
+no matter how many keyword patterns are registered.
+"""
+
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class AhoCorasickMatcher:
+    """
+    Aho-Corasick automaton mapping keyword patterns to labels.
+
+    Patterns are matched as plain substrings (the same semantics as
+    `pattern in text`). Each pattern may carry several labels, and a label may
+    have many patterns.
+    """
+
+    def __init__(self, patterns: Optional[Dict[str, Iterable[Hashable]]] = None,
+                 case_insensitive: bool = True):
+        self.case_insensitive = case_insensitive
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[Hashable, ...]] = [()]
+        self._delta: List[Dict[str, int]] = [{}]
+        self._compiled = True
+
+        if patterns:
+            for pattern, labels in patterns.items():
+                self.add_pattern(pattern, labels)
+            self.build()
+
+    @classmethod
+    def from_label_map(cls, label_patterns: Dict[Hashable, Iterable[str]],
+                       case_insensitive: bool = True) -> 'AhoCorasickMatcher':
+        """Build a matcher from a {label: [patterns]} mapping"""
+        matcher = cls(case_insensitive=case_insensitive)
+        for label, patterns in label_patterns.items():
+            for pattern in patterns:
+                matcher.add_pattern(pattern, (label,))
+        matcher.build()
+        return matcher
+
+    def add_pattern(self, pattern: str, labels: Iterable[Hashable]):
+        """Add a pattern to the trie; call build() before matching"""
+        if not pattern:
+            return
+        if self.case_insensitive:
+            pattern = pattern.lower()
+
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[node][char] = next_node
+            node = next_node
+
+        existing = self._output[node]
+        self._output[node] = existing + tuple(label for label in labels if label not in existing)
+        self._compiled = False
+
+    def build(self):
+        """
+        Compute failure links, merge outputs along them and flatten the trie
+        into a full transition table so matching is one dict lookup per char.
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        delta: List[Dict[str, int]] = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            queue.append(child)
+
+        # BFS order guarantees a node's failure target is complete before the node
+        while queue:
+            node = queue.popleft()
+            fallback_row = delta[fail[node]]
+            row = dict(fallback_row)
+            for char, child in goto[node].items():
+                fail[child] = fallback_row.get(char, 0) if node else 0
+                if fail[child] == child:
+                    fail[child] = 0
+                inherited = output[fail[child]]
+                if inherited:
+                    merged = output[child]
+                    output[child] = merged + tuple(label for label in inherited if label not in merged)
+                row[char] = child
+                queue.append(child)
+            delta[node] = row
+
+        self._delta = delta
+        self._compiled = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, Hashable]]:
+        """Yield (end_index, label) for every pattern occurrence in text"""
+        if not self._compiled:
+            self.build()
+        if self.case_insensitive:
+            text = text.lower()
+
+        delta = self._delta
+        output = self._output
+        node = 0
+        for index, char in enumerate(text):
+            node = delta[node].get(char, 0)
+            if output[node]:
+                for label in output[node]:
+                    yield index, label
+
+    def find_labels(self, text: str) -> Set[Hashable]:
+        """Return the set of labels whose patterns occur in text"""
+        return {label for _, label in self.iter_matches(text)}
+
+    def first_label(self, text: str, priority: Dict[Hashable, int]) -> Optional[Hashable]:
+        """
+        Return the matched label with the lowest priority value, stopping early
+        once the highest-priority label has been seen.
+        """
+        if not self._compiled:
+            self.build()
+        if self.case_insensitive:
+            text = text.lower()
+
+        delta = self._delta
+        output = self._output
+        best = None
+        best_rank = len(priority)
+        node = 0
+        for char in text:
+            node = delta[node].get(char, 0)
+            if output[node]:
+                for label in output[node]:
+                    rank = priority.get(label, best_rank)
+                    if rank < best_rank:
+                        best, best_rank = label, rank
+                if best_rank == 0:
+                    break
+        return best
@@ -7,7 +7,8 @@ Features:
 - Automatic refresh before expiry with configurable thresholds
 - Comprehensive error handling for expired/invalid tokens  
 - Email notification system for refresh failures
-- Background monitoring and proactive refresh
+- Background refresh scheduled on each token's expiry (min-heap of deadlines)
+- In-memory per-account credential cache with single-flight refresh
 - Thread-safe operations with proper locking
 - Graceful degradation and retry mechanisms
 """
@@ -17,9 +18,14 @@ import json
 import logging
 import threading
 import time
+import math
+import heapq
+import itertools
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, Optional, Any, List, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Any, List, Callable, Iterator, Tuple
 from pathlib import Path
 import hashlib
 import base64
@@ -51,15 +57,108 @@ class TokenExpiredError(TokenManagerError):
     """Exception raised when token is expired and cannot be refreshed"""
     pass
 
+@dataclass
+class _CachedCredentials:
+    """Credentials held in memory for one account, valid for use until refresh_at"""
+    creds: Credentials
+    token_data: Dict[str, Any]
+    refresh_at: float  # Epoch seconds from which _needs_refresh holds
+
+
+@dataclass
+class _AccountState:
+    """Per-account lock; loads counts completed disk loads and refreshes, forced_loads the forced ones"""
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    loads: int = 0
+    forced_loads: int = 0
+
+
+class RefreshSchedule:
+    """
+    Next-refresh deadline of every account, in a min-heap
+    
+    Finding the due accounts costs O(log n) per due account and nothing for
+    the rest. Rescheduling pushes a new node and leaves the old one behind;
+    pops skip nodes whose deadline is no longer the account's current one.
+    """
+    
+    def __init__(self, time_fn: Callable[[], float] = time.time):
+        self._time = time_fn
+        self._heap: List[Tuple[float, int, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+    
+    def schedule(self, profile_key: str, deadline: float):
+        """Set (or move) the account's next refresh; an infinite deadline unschedules it"""
+        with self._condition:
+            if math.isinf(deadline):
+                self._deadlines.pop(profile_key, None)
+                return
+            self._deadlines[profile_key] = deadline
+            heapq.heappush(self._heap, (deadline, next(self._sequence), profile_key))
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._compact()
+            if self._peek() == deadline:
+                self._condition.notify_all()
+    
+    def unschedule(self, profile_key: str):
+        with self._condition:
+            self._deadlines.pop(profile_key, None)
+    
+    def next_deadline(self) -> Optional[float]:
+        with self._condition:
+            return self._peek()
+    
+    def deadline(self, profile_key: str) -> Optional[float]:
+        return self._deadlines.get(profile_key)
+    
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """Remove and return the accounts whose deadline has passed, earliest first"""
+        now = self._time() if now is None else now
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, profile_key = heapq.heappop(self._heap)
+                if self._deadlines.get(profile_key) == deadline:
+                    del self._deadlines[profile_key]
+                    due.append(profile_key)
+        return due
+    
+    def wait(self, max_wait: float = 3600):
+        """Block until the earliest deadline, an earlier one is scheduled, or max_wait passes"""
+        with self._condition:
+            deadline = self._peek()
+            timeout = max_wait if deadline is None else min(max_wait, deadline - self._time())
+            if timeout > 0:
+                self._condition.wait(timeout)
+    
+    def _peek(self) -> Optional[float]:
+        while self._heap:
+            deadline, _, profile_key = self._heap[0]
+            if self._deadlines.get(profile_key) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+    
+    def _compact(self):
+        self._heap = [node for node in self._heap if self._deadlines.get(node[2]) == node[0]]
+        heapq.heapify(self._heap)
+    
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+
 class EnhancedTokenManager:
     """
     Enhanced OAuth token management system with automatic refresh and notifications
     
     Features:
-    - Automatic token refresh 24 hours before expiry
+    - Access tokens refreshed shortly before expiry, refresh tokens before their 7-day expiry
+    - Per-account credential cache; a refresh only blocks callers for the same account
     - Comprehensive error handling with retry logic
     - Email notifications for critical failures
-    - Background monitoring thread
+    - Background refresh of each token just ahead of its expiry
     - Thread-safe operations
     - Graceful degradation modes
     """
@@ -70,14 +169,21 @@ class EnhancedTokenManager:
         self.credentials_dir = self.project_root
         
         # Token refresh settings
-        self.refresh_threshold = timedelta(hours=24)  # Refresh 24 hours before expiry
+        self.expiry_margin = timedelta(minutes=5)  # Refresh access tokens 5 minutes before expiry
+        self.refresh_threshold = timedelta(hours=24)  # Refresh 24 hours before the token age limit
         self.emergency_threshold = timedelta(hours=2)  # Emergency refresh threshold
         self.max_token_age = timedelta(days=6)  # Refresh tokens before 7-day expiry
         self.retry_attempts = 3
         self.retry_delay = 30  # seconds
+        self.refresh_lead = timedelta(minutes=1)  # Background refresh this long before requests would refresh
+        self.failure_retry_delay = timedelta(hours=1)  # Next background attempt after a failed refresh
+        self.refresh_workers = 4
         
-        # Thread safety
+        # Thread safety: _lock only guards the per-account state table
         self._lock = threading.RLock()
+        self._accounts: Dict[str, _AccountState] = {}
+        self._credentials_cache: Dict[str, _CachedCredentials] = {}
+        self._refresh_schedule = RefreshSchedule()
         self._refresh_in_progress = set()
         self._failed_refreshes = {}
         
@@ -195,6 +301,21 @@ class EnhancedTokenManager:
         except Exception as e:
             logger.error(f"Failed to save token: {e}", exc_info=True)
             raise TokenManagerError(f"Token save failed: {e}")
+        finally:
+            self._credentials_cache.pop(f"{profile_name}:{email_address}", None)
+        
+        return self._unpack_token_file(enhanced_data)
+    
+    @staticmethod
+    def _unpack_token_file(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Token data from the new file format, with its metadata under _metadata"""
+        token_data = data['token_data']
+        token_data['_metadata'] = {
+            'created_at': data.get('created_at'),
+            'last_refresh': data.get('last_refresh'),
+            'refresh_count': data.get('refresh_count', 0)
+        }
+        return token_data
     
     def _load_token_data(self, profile_name: str, email_address: str) -> Optional[Dict[str, Any]]:
         """Load token data with integrity checking"""
@@ -217,12 +338,7 @@ class EnhancedTokenManager:
             # Handle both new and legacy formats
             if 'token_data' in data:
                 # New format
-                token_data = data['token_data']
-                token_data['_metadata'] = {
-                    'created_at': data.get('created_at'),
-                    'last_refresh': data.get('last_refresh'),
-                    'refresh_count': data.get('refresh_count', 0)
-                }
+                token_data = self._unpack_token_file(data)
             else:
                 # Legacy format
                 token_data = data
@@ -242,6 +358,11 @@ class EnhancedTokenManager:
         """
         Get valid OAuth credentials with automatic refresh
         
+        Credentials are cached per account until they need a refresh, so most
+        calls are a dictionary lookup. Loading and refreshing hold only that
+        account's lock: concurrent callers for the same account wait for one
+        refresh and share its result, other accounts are not blocked.
+        
         Args:
             profile_name: OAuth profile name
             email_address: Email address for the credentials
@@ -250,91 +371,139 @@ class EnhancedTokenManager:
         Returns:
             Valid Credentials object or None if unable to obtain
         """
-        with self._lock:
-            profile_key = f"{profile_name}:{email_address}"
-            
-            # Check if refresh is already in progress
-            if profile_key in self._refresh_in_progress:
-                logger.info(f"Refresh in progress for {profile_key}, waiting...")
-                # Wait for refresh to complete
-                while profile_key in self._refresh_in_progress:
-                    time.sleep(1)
-            
-            if profile_name not in self.profiles:
-                logger.error(f"Unknown profile: {profile_name}")
-                raise TokenManagerError(f"Unknown profile: {profile_name}")
-            
-            profile = self.profiles[profile_name]
+        profile_key = f"{profile_name}:{email_address}"
+        
+        if not force_refresh:
+            cached = self._credentials_cache.get(profile_key)
+            if cached is not None and time.time() < cached.refresh_at:
+                return cached.creds
+        
+        if profile_name not in self.profiles:
+            logger.error(f"Unknown profile: {profile_name}")
+            raise TokenManagerError(f"Unknown profile: {profile_name}")
+        
+        account = self._get_account_state(profile_key)
+        loads_seen = account.forced_loads if force_refresh else account.loads
+        
+        with account.lock:
+            # Another caller loaded or refreshed this account while we waited: share its result.
+            # A forced refresh only shares another forced one, not a load that found the token valid
+            if (account.forced_loads if force_refresh else account.loads) != loads_seen:
+                cached = self._credentials_cache.get(profile_key)
+                if cached is not None and cached.creds.valid:
+                    return cached.creds
+                return None
             
-            # Load existing token
-            token_data = self._load_token_data(profile_name, email_address)
+            if not force_refresh:
+                cached = self._credentials_cache.get(profile_key)
+                if cached is not None and time.time() < cached.refresh_at:
+                    return cached.creds
             
-            if token_data:
-                try:
-                    # Create credentials from token data
-                    creds = Credentials(
-                        token=token_data.get('token'),
-                        refresh_token=token_data.get('refresh_token'),
-                        token_uri=token_data.get('token_uri'),
-                        client_id=token_data.get('client_id'),
-                        client_secret=token_data.get('client_secret'),
-                        scopes=token_data.get('scopes')
-                    )
-                    
-                    # Set expiry if available
-                    if token_data.get('expiry'):
-                        if isinstance(token_data['expiry'], str):
-                            creds.expiry = datetime.fromisoformat(token_data['expiry'].replace('Z', '+00:00'))
-                        elif isinstance(token_data['expiry'], (int, float)):
-                            creds.expiry = datetime.fromtimestamp(token_data['expiry'])
-                    
-                    # Check if refresh is needed
-                    needs_refresh = force_refresh or self._needs_refresh(creds, token_data)
-                    
-                    if needs_refresh:
-                        logger.info(f"Token needs refresh for {profile_key}")
-                        creds = self._refresh_credentials_with_retry(creds, profile_name, email_address)
+            try:
+                return self._load_credentials(profile_name, email_address, force_refresh)
+            finally:
+                account.loads += 1
+                if force_refresh:
+                    account.forced_loads += 1
+    
+    def _get_account_state(self, profile_key: str) -> _AccountState:
+        account = self._accounts.get(profile_key)
+        if account is None:
+            with self._lock:
+                account = self._accounts.setdefault(profile_key, _AccountState())
+        return account
+    
+    def _load_credentials(self, profile_name: str, email_address: str, force_refresh: bool) -> Optional[Credentials]:
+        """Load credentials from disk, refresh them if needed and cache them (account lock held)"""
+        profile_key = f"{profile_name}:{email_address}"
+        
+        # Load existing token
+        token_data = self._load_token_data(profile_name, email_address)
+        
+        if token_data:
+            try:
+                creds = self._build_credentials(token_data)
+                
+                # Check if refresh is needed
+                needs_refresh = force_refresh or self._needs_refresh(creds, token_data)
+                
+                if needs_refresh:
+                    logger.info(f"Token needs refresh for {profile_key}")
+                    creds = self._refresh_credentials_with_retry(creds, profile_name, email_address)
+                elif creds.valid:
+                    self._cache_credentials(profile_key, creds, token_data)
+                
+                if creds and creds.valid:
+                    logger.debug(f"Valid credentials obtained for {profile_key}")
+                    return creds
+                else:
+                    logger.warning(f"Invalid credentials for {profile_key}")
                     
-                    if creds and creds.valid:
-                        logger.debug(f"Valid credentials obtained for {profile_key}")
-                        return creds
-                    else:
-                        logger.warning(f"Invalid credentials for {profile_key}")
-                        
-                except Exception as e:
-                    logger.error(f"Error creating credentials for {profile_key}: {e}", exc_info=True)
-            
-            # No valid token available
-            logger.warning(f"No valid token available for {profile_key}")
-            self._notify_token_failure(profile_name, email_address, "No valid token available")
-            return None
+            except Exception as e:
+                logger.error(f"Error creating credentials for {profile_key}: {e}", exc_info=True)
+        
+        # No valid token available
+        self._credentials_cache.pop(profile_key, None)
+        if token_data:
+            self._refresh_schedule.schedule(profile_key, time.time() + self.failure_retry_delay.total_seconds())
+        logger.warning(f"No valid token available for {profile_key}")
+        self._notify_token_failure(profile_name, email_address, "No valid token available")
+        return None
+    
+    def _build_credentials(self, token_data: Dict[str, Any]) -> Credentials:
+        """Credentials from stored token data, with expiry as naive UTC like google-auth"""
+        creds = Credentials(
+            token=token_data.get('token'),
+            refresh_token=token_data.get('refresh_token'),
+            token_uri=token_data.get('token_uri'),
+            client_id=token_data.get('client_id'),
+            client_secret=token_data.get('client_secret'),
+            scopes=token_data.get('scopes')
+        )
+        
+        expiry = token_data.get('expiry')
+        if isinstance(expiry, str):
+            expiry = datetime.fromisoformat(expiry.replace('Z', '+00:00'))
+            if expiry.tzinfo is not None:
+                expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
+            creds.expiry = expiry
+        elif isinstance(expiry, (int, float)):
+            creds.expiry = datetime.fromtimestamp(expiry, timezone.utc).replace(tzinfo=None)
+        
+        return creds
+    
+    def _cache_credentials(self, profile_key: str, creds: Credentials, token_data: Dict[str, Any]):
+        refresh_at = self._refresh_deadline(creds, token_data)
+        self._credentials_cache[profile_key] = _CachedCredentials(creds, token_data, refresh_at)
+        self._refresh_schedule.schedule(profile_key, refresh_at - self.refresh_lead.total_seconds())
     
     def _needs_refresh(self, creds: Credentials, token_data: Dict[str, Any]) -> bool:
         """Enhanced check for token refresh needs"""
+        return time.time() >= self._refresh_deadline(creds, token_data)
+    
+    def _refresh_deadline(self, creds: Credentials, token_data: Dict[str, Any]) -> float:
+        """Epoch time from which the credentials need a refresh"""
         # Always refresh if invalid or expired
         if not creds.valid or creds.expired:
-            return True
+            return 0.0
+        
+        deadlines = []
         
-        # Check expiry time against threshold
+        # Access token expiry, less the margin
         if creds.expiry:
-            time_until_expiry = creds.expiry - datetime.utcnow()
-            if time_until_expiry <= self.refresh_threshold:
-                logger.info(f"Token expires in {time_until_expiry}, refreshing proactively")
-                return True
+            expiry = creds.expiry.replace(tzinfo=timezone.utc) if creds.expiry.tzinfo is None else creds.expiry
+            deadlines.append(expiry.timestamp() - self.expiry_margin.total_seconds())
         
-        # Check token age from metadata
+        # Token age from metadata
         metadata = token_data.get('_metadata', {})
         if metadata.get('created_at'):
             try:
                 created_at = datetime.fromisoformat(metadata['created_at'])
-                age = datetime.now() - created_at
-                if age >= self.max_token_age - self.refresh_threshold:
-                    logger.info(f"Token age {age} exceeds threshold, refreshing")
-                    return True
+                deadlines.append((created_at + self.max_token_age - self.refresh_threshold).timestamp())
             except Exception as e:
                 logger.warning(f"Error parsing token creation date: {e}")
         
-        return False
+        return min(deadlines, default=math.inf)
     
     def _refresh_credentials_with_retry(self, creds: Credentials, profile_name: str, email_address: str) -> Optional[Credentials]:
         """Refresh credentials with retry logic and error handling"""
@@ -362,7 +531,8 @@ class EnhancedTokenManager:
                         'expiry': creds.expiry.isoformat() if creds.expiry else None
                     }
                     
-                    self._save_token_data(profile_name, email_address, token_data)
+                    saved_data = self._save_token_data(profile_name, email_address, token_data)
+                    self._cache_credentials(profile_key, creds, saved_data)
                     
                     # Clear failed refresh tracking
                     if profile_key in self._failed_refreshes:
@@ -455,106 +625,89 @@ Karen AI System
             logger.error(f"Failed to prepare notification email: {e}")
     
     def _start_background_monitor(self):
-        """Start background thread to monitor and refresh tokens"""
+        """Start background thread that refreshes each token as its deadline comes up"""
         def monitor():
             logger.info("Token background monitor started")
-            while True:
-                try:
-                    self._monitor_all_tokens()
-                    time.sleep(1800)  # Check every 30 minutes
-                except Exception as e:
-                    logger.error(f"Token monitor error: {e}", exc_info=True)
-                    time.sleep(300)  # Wait 5 minutes before retry
+            self._schedule_all_tokens()
+            with ThreadPoolExecutor(max_workers=self.refresh_workers, thread_name_prefix="TokenRefresh") as pool:
+                while True:
+                    try:
+                        for profile_key in self._refresh_schedule.pop_due():
+                            pool.submit(self._background_refresh, profile_key)
+                        self._refresh_schedule.wait()
+                    except Exception as e:
+                        logger.error(f"Token monitor error: {e}", exc_info=True)
+                        time.sleep(300)  # Wait 5 minutes before retry
         
         monitor_thread = threading.Thread(target=monitor, daemon=True, name="TokenMonitor")
         monitor_thread.start()
     
-    def _monitor_all_tokens(self):
-        """Monitor all stored tokens for refresh needs"""
+    def _iter_token_files(self) -> Iterator[Tuple[str, str, Path]]:
+        """(profile, email, path) of every stored token file of a known profile"""
         if not self.tokens_dir.exists():
             return
+        for token_file in self.tokens_dir.glob("gmail_token_*.json"):
+            # Format: gmail_token_{email}_{profile}.json; profile names contain underscores too
+            name = token_file.stem[len("gmail_token_"):]
+            for profile_name in self.profiles:
+                if name.endswith(f"_{profile_name}"):
+                    email_part = name[:-len(profile_name) - 1]  # Reconstruct email
+                    email_address = email_part.replace('_at_', '@').replace('_dot_', '.')
+                    yield profile_name, email_address, token_file
+                    break
+    
+    def _schedule_all_tokens(self):
+        """Load every stored token once at startup and schedule its refresh"""
+        scheduled_count = 0
         
-        monitored_count = 0
-        refreshed_count = 0
-        
-        for token_file in self.tokens_dir.glob("*.json"):
-            if token_file.name.startswith("gmail_token_"):
-                try:
-                    # Parse filename to get profile and email
-                    # Format: gmail_token_{email}_{profile}.json
-                    parts = token_file.stem.split('_')
-                    if len(parts) >= 4:
-                        email_part = '_'.join(parts[2:-1])  # Reconstruct email
-                        email_address = email_part.replace('_at_', '@').replace('_dot_', '.')
-                        profile_name = parts[-1]
-                        
-                        # Check if this profile should auto-refresh
-                        if profile_name in self.profiles and self.profiles[profile_name].get('auto_refresh', True):
-                            profile_key = f"{profile_name}:{email_address}"
-                            
-                            # Skip if refresh is already in progress or recently failed
-                            if (profile_key not in self._refresh_in_progress and 
-                                profile_key not in self._failed_refreshes):
-                                
-                                # Load and check token
-                                token_data = self._load_token_data(profile_name, email_address)
-                                if token_data:
-                                    try:
-                                        creds = Credentials(
-                                            token=token_data.get('token'),
-                                            refresh_token=token_data.get('refresh_token'),
-                                            token_uri=token_data.get('token_uri'),
-                                            client_id=token_data.get('client_id'),
-                                            client_secret=token_data.get('client_secret'),
-                                            scopes=token_data.get('scopes')
-                                        )
-                                        
-                                        if token_data.get('expiry'):
-                                            if isinstance(token_data['expiry'], str):
-                                                creds.expiry = datetime.fromisoformat(token_data['expiry'].replace('Z', '+00:00'))
-                                            elif isinstance(token_data['expiry'], (int, float)):
-                                                creds.expiry = datetime.fromtimestamp(token_data['expiry'])
-                                        
-                                        if self._needs_refresh(creds, token_data):
-                                            logger.info(f"Background refresh triggered for {profile_key}")
-                                            refreshed_creds = self._refresh_credentials_with_retry(creds, profile_name, email_address)
-                                            if refreshed_creds:
-                                                refreshed_count += 1
-                                        
-                                        monitored_count += 1
-                                        
-                                    except Exception as e:
-                                        logger.warning(f"Error monitoring token {profile_key}: {e}")
-                                
-                except Exception as e:
-                    logger.warning(f"Error processing token file {token_file}: {e}")
+        for profile_name, email_address, token_file in self._iter_token_files():
+            if not self.profiles.get(profile_name, {}).get('auto_refresh', False):
+                continue
+            profile_key = f"{profile_name}:{email_address}"
+            try:
+                token_data = self._load_token_data(profile_name, email_address)
+                if not token_data:
+                    continue
+                creds = self._build_credentials(token_data)
+                if creds.valid:
+                    self._cache_credentials(profile_key, creds, token_data)
+                else:
+                    self._refresh_schedule.schedule(profile_key, time.time())
+                scheduled_count += 1
+            except Exception as e:
+                logger.warning(f"Error scheduling token refresh for {token_file}: {e}")
         
-        if monitored_count > 0:
-            logger.debug(f"Token monitor cycle: {monitored_count} tokens monitored, {refreshed_count} refreshed")
+        logger.info(f"Token refresh scheduled for {scheduled_count} tokens")
+    
+    def _background_refresh(self, profile_key: str) -> bool:
+        """Refresh one token whose deadline has come up; a failure reschedules a later attempt"""
+        profile_name, email_address = profile_key.split(':', 1)
+        if not self.profiles.get(profile_name, {}).get('auto_refresh', False):
+            return False
+        try:
+            logger.info(f"Background refresh triggered for {profile_key}")
+            # Through get_credentials, under the account lock, so requests share it
+            return self.get_credentials(profile_name, email_address, force_refresh=True) is not None
+        except Exception as e:
+            logger.warning(f"Error refreshing token {profile_key}: {e}")
+            self._refresh_schedule.schedule(profile_key, time.time() + self.failure_retry_delay.total_seconds())
+            return False
     
     def force_refresh_all(self) -> Dict[str, bool]:
         """Force refresh all tokens (useful for testing or maintenance)"""
         results = {}
         
-        for token_file in self.tokens_dir.glob("*.json"):
-            if token_file.name.startswith("gmail_token_"):
-                try:
-                    # Parse filename
-                    parts = token_file.stem.split('_')
-                    if len(parts) >= 4:
-                        email_part = '_'.join(parts[2:-1])
-                        email_address = email_part.replace('_at_', '@').replace('_dot_', '.')
-                        profile_name = parts[-1]
-                        
-                        profile_key = f"{profile_name}:{email_address}"
-                        
-                        # Attempt refresh
-                        creds = self.get_credentials(profile_name, email_address, force_refresh=True)
-                        results[profile_key] = creds is not None
-                        
-                except Exception as e:
-                    logger.error(f"Error force refreshing {token_file}: {e}")
-                    results[str(token_file)] = False
+        for profile_name, email_address, token_file in self._iter_token_files():
+            try:
+                profile_key = f"{profile_name}:{email_address}"
+                
+                # Attempt refresh
+                creds = self.get_credentials(profile_name, email_address, force_refresh=True)
+                results[profile_key] = creds is not None
+                
+            except Exception as e:
+                logger.error(f"Error force refreshing {token_file}: {e}")
+                results[str(token_file)] = False
         
         return results
     
@@ -562,58 +715,39 @@ Karen AI System
         """Get status of all managed tokens"""
         status_list = []
         
-        for token_file in self.tokens_dir.glob("*.json"):
-            if token_file.name.startswith("gmail_token_"):
-                try:
-                    # Parse filename
-                    parts = token_file.stem.split('_')
-                    if len(parts) >= 4:
-                        email_part = '_'.join(parts[2:-1])
-                        email_address = email_part.replace('_at_', '@').replace('_dot_', '.')
-                        profile_name = parts[-1]
+        for profile_name, email_address, token_file in self._iter_token_files():
+            try:
+                token_data = self._load_token_data(profile_name, email_address)
+                if token_data:
+                    next_refresh = self._refresh_schedule.deadline(f"{profile_name}:{email_address}")
+                    status = {
+                        'profile': profile_name,
+                        'email': email_address,
+                        'file': str(token_file),
+                        'created_at': token_data.get('_metadata', {}).get('created_at'),
+                        'last_refresh': token_data.get('_metadata', {}).get('last_refresh'),
+                        'refresh_count': token_data.get('_metadata', {}).get('refresh_count', 0),
+                        'has_refresh_token': bool(token_data.get('refresh_token')),
+                        'expiry': token_data.get('expiry'),
+                        'next_scheduled_refresh': datetime.fromtimestamp(next_refresh).isoformat() if next_refresh else None,
+                        'needs_refresh': False,
+                        'valid': False
+                    }
+                    
+                    # Check current validity
+                    try:
+                        creds = self._build_credentials(token_data)
                         
-                        token_data = self._load_token_data(profile_name, email_address)
-                        if token_data:
-                            status = {
-                                'profile': profile_name,
-                                'email': email_address,
-                                'file': str(token_file),
-                                'created_at': token_data.get('_metadata', {}).get('created_at'),
-                                'last_refresh': token_data.get('_metadata', {}).get('last_refresh'),
-                                'refresh_count': token_data.get('_metadata', {}).get('refresh_count', 0),
-                                'has_refresh_token': bool(token_data.get('refresh_token')),
-                                'expiry': token_data.get('expiry'),
-                                'needs_refresh': False,
-                                'valid': False
-                            }
-                            
-                            # Check current validity
-                            try:
-                                creds = Credentials(
-                                    token=token_data.get('token'),
-                                    refresh_token=token_data.get('refresh_token'),
-                                    token_uri=token_data.get('token_uri'),
-                                    client_id=token_data.get('client_id'),
-                                    client_secret=token_data.get('client_secret'),
-                                    scopes=token_data.get('scopes')
-                                )
-                                
-                                if token_data.get('expiry'):
-                                    if isinstance(token_data['expiry'], str):
-                                        creds.expiry = datetime.fromisoformat(token_data['expiry'].replace('Z', '+00:00'))
-                                    elif isinstance(token_data['expiry'], (int, float)):
-                                        creds.expiry = datetime.fromtimestamp(token_data['expiry'])
-                                
-                                status['valid'] = creds.valid
-                                status['needs_refresh'] = self._needs_refresh(creds, token_data)
-                                
-                            except Exception as e:
-                                logger.warning(f"Error checking credentials for {profile_name}:{email_address}: {e}")
-                            
-                            status_list.append(status)
-                            
-                except Exception as e:
-                    logger.error(f"Error processing token file {token_file}: {e}")
+                        status['valid'] = creds.valid
+                        status['needs_refresh'] = self._needs_refresh(creds, token_data)
+                        
+                    except Exception as e:
+                        logger.warning(f"Error checking credentials for {profile_name}:{email_address}: {e}")
+                    
+                    status_list.append(status)
+                    
+            except Exception as e:
+                logger.error(f"Error processing token file {token_file}: {e}")
         
         return status_list
     
@@ -0,0 +1,244 @@
+"""
+Transcription Pipeline - Shared audio buffer and concurrent engine racing
+Used by VoiceTranscriptionHandler for voicemail transcription.
+
+The recording is downloaded once into an AudioBuffer that every engine reads,
+either as bytes or as a single temp file for file-based APIs. Engines run
+concurrently: the first result at or above the confidence threshold wins and
+the others are cancelled, otherwise the most confident result is kept. Long
+WAV recordings are split into chunks that are transcribed with a bounded
+lookahead and yielded in order, so the first text is available before the
+whole recording has been processed.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import wave
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+EngineFn = Callable[['AudioBuffer'], Awaitable[Dict[str, Any]]]
+
+
+def empty_result(engine: str = 'none') -> Dict[str, Any]:
+    return {'text': '', 'confidence': 0.0, 'engine': engine}
+
+
+class AudioBuffer:
+    """
+    One recording shared by every transcription engine.
+
+    Content is either given up front or fetched on first read through `loader`;
+    concurrent readers share a single download. `as_file()` writes at most one
+    temp file, removed by `cleanup()`.
+    """
+
+    def __init__(self, content: Optional[bytes] = None,
+                 loader: Optional[Callable[[], Awaitable[bytes]]] = None,
+                 suffix: str = '.wav', offset_seconds: float = 0.0):
+        if content is None and loader is None:
+            raise ValueError("AudioBuffer needs content or a loader")
+        self._content = content
+        self._loader = loader
+        self._load_task: Optional[asyncio.Future] = None
+        self._temp_path: Optional[str] = None
+        self.suffix = suffix
+        self.offset_seconds = offset_seconds
+
+    async def read(self) -> bytes:
+        if self._content is None:
+            if self._load_task is None:
+                self._load_task = asyncio.ensure_future(self._loader())
+            # Shielded so a cancelled engine does not abort the shared download
+            self._content = await asyncio.shield(self._load_task)
+        return self._content
+
+    async def as_file(self) -> str:
+        content = await self.read()
+        if self._temp_path is None:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=self.suffix) as temp_file:
+                temp_file.write(content)
+                self._temp_path = temp_file.name
+        return self._temp_path
+
+    def cleanup(self):
+        if self._load_task is not None and not self._load_task.done():
+            self._load_task.cancel()
+        if self._temp_path:
+            try:
+                os.unlink(self._temp_path)
+            except OSError:
+                pass
+            self._temp_path = None
+
+    def wav_info(self) -> Optional[Tuple[int, float]]:
+        """(sample_rate, duration_seconds) for loaded WAV content, else None"""
+        content = self._content
+        if not content or content[:4] != b'RIFF' or content[8:12] != b'WAVE':
+            return None
+        try:
+            with wave.open(io.BytesIO(content)) as reader:
+                rate = reader.getframerate()
+                return rate, reader.getnframes() / float(rate)
+        except (wave.Error, EOFError):
+            return None
+
+    async def split(self, chunk_seconds: float) -> List['AudioBuffer']:
+        """
+        Split WAV content into consecutive chunks of at most `chunk_seconds`.
+        Other formats, and recordings that fit in one chunk, come back whole.
+        """
+        content = await self.read()
+        info = self.wav_info()
+        if info is None or chunk_seconds <= 0 or info[1] <= chunk_seconds:
+            return [self]
+
+        chunks = []
+        with wave.open(io.BytesIO(content)) as reader:
+            params = reader.getparams()
+            frames_per_chunk = max(1, int(params.framerate * chunk_seconds))
+            offset_frames = 0
+            while True:
+                frames = reader.readframes(frames_per_chunk)
+                if not frames:
+                    break
+                out = io.BytesIO()
+                with wave.open(out, 'wb') as writer:
+                    writer.setparams(params)
+                    writer.writeframes(frames)
+                chunks.append(AudioBuffer(out.getvalue(), suffix='.wav',
+                                          offset_seconds=self.offset_seconds + offset_frames / params.framerate))
+                offset_frames += len(frames) // (params.sampwidth * params.nchannels)
+        return chunks
+
+
+async def race_transcriptions(engines: Sequence[Tuple[str, EngineFn]], audio: AudioBuffer,
+                              confidence_threshold: float = 0.7,
+                              timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Run every engine concurrently on the same audio.
+
+    Returns as soon as a finished engine meets `confidence_threshold` (earlier
+    engines in `engines` win ties among finished results) and cancels the rest.
+    If none does, or `timeout` expires, the most confident finished result is
+    returned. A failing engine counts as an empty result.
+    """
+    if not engines:
+        return empty_result()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout else None
+    tasks = {asyncio.ensure_future(fn(audio)): index for index, (_, fn) in enumerate(engines)}
+    pending = set(tasks)
+    results: Dict[int, Dict[str, Any]] = {}
+
+    try:
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=remaining,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"Transcription race timed out waiting on {len(pending)} engine(s)")
+                break
+            for task in done:
+                index = tasks[task]
+                try:
+                    results[index] = task.result()
+                except Exception as e:
+                    logger.warning(f"Transcription engine {engines[index][0]} failed: {e}")
+                    results[index] = empty_result(f"{engines[index][0]}_failed")
+
+            winners = [index for index, result in results.items()
+                       if result.get('confidence', 0.0) >= confidence_threshold]
+            if winners:
+                return results[min(winners)]
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if not results:
+        return empty_result('timeout')
+    best = max(results, key=lambda index: (results[index].get('confidence', 0.0), -index))
+    return results[best]
+
+
+async def transcribe_chunks(chunks: Sequence[AudioBuffer], transcribe_fn: EngineFn,
+                            lookahead: int = 2) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield each chunk's result in order, tagged with 'offset_seconds'.
+    Up to `lookahead` chunks are transcribed concurrently ahead of the consumer.
+    """
+    upcoming = iter(chunks)
+    in_flight: deque = deque()
+
+    def schedule_next() -> bool:
+        chunk = next(upcoming, None)
+        if chunk is None:
+            return False
+        in_flight.append((chunk, asyncio.ensure_future(transcribe_fn(chunk))))
+        return True
+
+    for _ in range(max(1, lookahead)):
+        if not schedule_next():
+            break
+
+    try:
+        while in_flight:
+            chunk, task = in_flight.popleft()
+            result = await task
+            schedule_next()
+            yield {**result, 'offset_seconds': chunk.offset_seconds}
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+
+
+def combine_chunk_results(results: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Join chunk transcripts; confidence is the mean over chunks that produced text"""
+    spoken = [result for result in results if result.get('text')]
+    if not spoken:
+        return empty_result(results[0].get('engine', 'none') if results else 'none')
+    engines = sorted({result.get('engine', 'none') for result in spoken})
+    return {
+        'text': ' '.join(result['text'].strip() for result in spoken),
+        'confidence': sum(result.get('confidence', 0.0) for result in spoken) / len(spoken),
+        'engine': '+'.join(engines),
+        'chunks': len(results)
+    }
+
+
+class FakeTranscriptionEngine:
+    """
+    Network-free engine for tests and latency benchmarks.
+    `text` may be a string or a callable taking the AudioBuffer.
+    """
+
+    def __init__(self, name: str, text: Any = '', confidence: float = 0.9,
+                 latency: float = 0.0, fail: bool = False):
+        self.name = name
+        self.text = text
+        self.confidence = confidence
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, audio: AudioBuffer) -> Dict[str, Any]:
+        self.calls += 1
+        await audio.read()
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} unavailable")
+        text = self.text(audio) if callable(self.text) else self.text
+        return {'text': text, 'confidence': self.confidence if text else 0.0, 'engine': self.name}
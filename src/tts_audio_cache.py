@@ -0,0 +1,260 @@
+"""
+TTS Audio Cache - Content-addressed synthesized audio with an LRU byte budget
+Used by ElevenLabsVoiceHandler.
+
+Audio is written once, under a name derived from the synthesis request, via a
+temp file in the cache directory renamed into place. An in-memory index
+(ordered oldest-used first) answers lookups without touching the filesystem and
+evicts least recently used files once the byte budget is exceeded; pinned
+entries (static prompt segments) are never evicted or aged out, and their keys
+are kept in a small sidecar file so they stay pinned across restarts.
+Concurrent requests for the same key share one generation.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PINS_FILENAME = 'pinned.json'
+
+
+@dataclass
+class _CacheEntry:
+    path: str
+    size: int
+    created_at: float
+    pinned: bool = False
+
+
+def content_key(*parts: Any) -> str:
+    """Stable key for a synthesis request (text, voice, model, settings, format...)"""
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class TTSAudioCache:
+    """
+    On-disk audio cache with an in-memory LRU index.
+
+    Files present at startup are indexed once (oldest modification first);
+    afterwards only writes and evictions touch the disk.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 500 * 1024 * 1024,
+                 max_age_seconds: Optional[float] = None, suffix: str = '.mp3',
+                 time_fn: Callable[[], float] = time.time):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.suffix = suffix
+        self._time = time_fn
+
+        self._index: 'OrderedDict[str, _CacheEntry]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self.bytes_written = 0
+
+        self._load_index()
+
+    def _load_index(self):
+        pinned = self._load_pins()
+        entries = []
+        for path in self.cache_dir.glob(f'*{self.suffix}*'):
+            if not path.is_file():
+                continue
+            if path.name.endswith('.tmp'):
+                # Interrupted write from a previous run
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.name[:-len(self.suffix)], str(path), stat.st_size))
+
+        for mtime, key, path, size in sorted(entries):
+            self._index[key] = _CacheEntry(path, size, mtime, key in pinned)
+            self.total_bytes += size
+        self._evict_to_budget()
+
+        if self._index:
+            logger.info(f"TTS cache indexed {len(self._index)} files "
+                        f"({self.total_bytes / (1024 * 1024):.1f} MB) in {self.cache_dir}")
+
+    def _load_pins(self) -> set:
+        try:
+            with open(self.cache_dir / PINS_FILENAME, 'r', encoding='utf-8') as handle:
+                return set(json.load(handle))
+        except FileNotFoundError:
+            return set()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read pinned TTS keys, pre-generation will pin them again: {e}")
+            return set()
+
+    def _save_pins(self):
+        """Rewrite the pinned keys sidecar; only called when the pinned set changes"""
+        path = self.cache_dir / PINS_FILENAME
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as handle:
+                json.dump(sorted(key for key, entry in self._index.items() if entry.pinned), handle)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save pinned TTS keys: {e}")
+
+    def _pin(self, entry: _CacheEntry):
+        if not entry.pinned:
+            entry.pinned = True
+            self._save_pins()
+
+    def path_for(self, key: str) -> str:
+        return str(self.cache_dir / f"{key}{self.suffix}")
+
+    def get(self, key: str, pin: bool = False) -> Optional[str]:
+        """Path of the cached audio for `key`, refreshing its LRU position"""
+        entry = self._index.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if (not entry.pinned and self.max_age_seconds is not None
+                and self._time() - entry.created_at > self.max_age_seconds):
+            self.remove(key)
+            self.misses += 1
+            return None
+        if pin:
+            self._pin(entry)
+        self._index.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += entry.size
+        return entry.path
+
+    def put(self, key: str, data: bytes, pinned: bool = False) -> str:
+        """Write `data` once to its final path and index it"""
+        path = self.path_for(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as handle:
+            handle.write(data)
+        os.replace(temp_path, path)
+
+        previous = self._index.pop(key, None)
+        if previous:
+            self.total_bytes -= previous.size
+        self._index[key] = _CacheEntry(path, len(data), self._time(), pinned)
+        self.total_bytes += len(data)
+        self.bytes_written += len(data)
+        if pinned != bool(previous and previous.pinned):
+            self._save_pins()
+        self._evict_to_budget(keep=key)
+        return path
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[Optional[bytes]]],
+                              pinned: bool = False) -> Optional[str]:
+        """
+        Cached path for `key`, generating it on a miss. Callers arriving while
+        a generation for the same key is in flight wait for that result.
+        """
+        cached = self.get(key, pin=pinned)
+        if cached:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.misses -= 1
+            self.deduplicated += 1
+            path = await asyncio.shield(inflight)
+            if path and pinned and key in self._index:
+                self._pin(self._index[key])
+            return path
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await generate()
+            path = self.put(key, data, pinned) if data else None
+            future.set_result(path)
+            return path
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark retrieved so a lone caller does not warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def remove(self, key: str) -> bool:
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return False
+        self.total_bytes -= entry.size
+        try:
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+        if entry.pinned:
+            self._save_pins()
+        return True
+
+    def evict_older_than(self, seconds: float) -> int:
+        cutoff = self._time() - seconds
+        stale = [key for key, entry in self._index.items() if not entry.pinned and entry.created_at < cutoff]
+        for key in stale:
+            self.remove(key)
+        return len(stale)
+
+    def _evict_to_budget(self, keep: Optional[str] = None):
+        excess = self.total_bytes - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for key, entry in self._index.items():
+            if excess <= 0:
+                break
+            if entry.pinned or key == keep:
+                continue
+            victims.append(key)
+            excess -= entry.size
+        for key in victims:
+            self.remove(key)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.deduplicated
+        return {
+            'entries': len(self._index),
+            'pinned': sum(1 for entry in self._index.values() if entry.pinned),
+            'size_bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'deduplicated': self.deduplicated,
+            'hit_rate': (self.hits + self.deduplicated) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'bytes_saved': self.bytes_saved,
+            'bytes_written': self.bytes_written
+        }
+
+
+_caches: Dict[str, TTSAudioCache] = {}
+
+
+def get_tts_audio_cache(cache_dir: Path, **kwargs) -> TTSAudioCache:
+    """Shared cache per directory, so short-lived handlers keep one index"""
+    resolved = str(Path(cache_dir).resolve())
+    if resolved not in _caches:
+        _caches[resolved] = TTSAudioCache(Path(cache_dir), **kwargs)
+    return _caches[resolved]
@@ -0,0 +1,86 @@
+"""
+TwiML Templates - Precompiled TwiML documents with per-call fields
+Used by VoiceIVRSystem and VoiceWebhookHandler.
+
+Almost every TwiML response is fixed once the branch it takes is known
+(business hours or not, which menu, which prompts have premium audio), so
+each branch is built with the regular VoiceResponse builder once and kept as
+UTF-8 chunks. Values that genuinely vary per call are passed to the builder
+as field markers and substituted, XML-escaped, when the template is
+rendered. Rendering is a join over bytes; no element tree is built.
+"""
+
+import re
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+from xml.sax.saxutils import escape
+
+# Private-use characters: never produced by TwiML builders or escaped by them
+_FIELD_START = '\ue000'
+_FIELD_END = '\ue001'
+_FIELD_PATTERN = re.compile(f"{_FIELD_START}(\\w+){_FIELD_END}")
+
+# Escaping as ElementTree serializes the builders' output
+_ATTRIBUTE_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#09;'}
+_TEXT_ENTITIES: Dict[str, str] = {}
+
+
+def field(name: str) -> str:
+    """Marker for a per-call value, to pass to a builder in place of the value"""
+    return f"{_FIELD_START}{name}{_FIELD_END}"
+
+
+class TwiMLTemplate:
+    """A TwiML document split into static chunks around its fields"""
+
+    def __init__(self, twiml: Any):
+        parts = _FIELD_PATTERN.split(str(twiml))
+        # parts alternates static text and field names: text, name, text, ...
+        self.chunks: Tuple[bytes, ...] = tuple(part.encode('utf-8') for part in parts[::2])
+        self.fields: Tuple[str, ...] = tuple(parts[1::2])
+        # A field is inside a tag (an attribute value) if its chunk left a tag open
+        self._entities = tuple(
+            _ATTRIBUTE_ENTITIES if part.rfind('<') > part.rfind('>') else _TEXT_ENTITIES
+            for part in parts[:-1:2]
+        )
+        self._static = self.chunks[0] if not self.fields else None
+
+    def render(self, **values: Any) -> bytes:
+        if self._static is not None:
+            return self._static
+        chunks = self.chunks
+        output: List[bytes] = [chunks[0]]
+        for index, name in enumerate(self.fields, 1):
+            output.append(escape(str(values[name]), self._entities[index - 1]).encode('utf-8'))
+            output.append(chunks[index])
+        return b''.join(output)
+
+
+class TwiMLTemplateCache:
+    """Templates by variant key, each compiled on first use"""
+
+    def __init__(self, max_templates: int = 512):
+        self.max_templates = max_templates
+        self._templates: Dict[Hashable, TwiMLTemplate] = {}
+
+    def get(self, key: Hashable, build: Callable[..., Any], *field_names: str) -> TwiMLTemplate:
+        """Template for `key`; `build` receives a marker for each of `field_names`"""
+        template = self._templates.get(key)
+        if template is None:
+            if len(self._templates) >= self.max_templates:
+                self._templates.clear()
+            template = TwiMLTemplate(build(**{name: field(name) for name in field_names}))
+            self._templates[key] = template
+        return template
+
+    def render(self, key: Hashable, build: Callable[..., Any], **values: Any) -> bytes:
+        """
+        Render the `key` variant of `build`'s output with `values`.
+        `key` must capture everything else the output depends on.
+        """
+        return self.get(key, build, *values).render(**values)
+
+    def clear(self):
+        self._templates.clear()
+
+    def __len__(self) -> int:
+        return len(self._templates)
@@ -112,12 +112,19 @@ class CallTracker:
     - Customer journey tracking
     - Cost analysis
     - Quality monitoring
+    
+    Calls are indexed by start time in a sorted set (and per caller), so
+    retention, history and summaries read ranges of the index with pipelined
+    hash reads instead of scanning every call key.
     """
     
-    def __init__(self, redis_host: str = 'localhost', redis_port: int = 6379, redis_db: int = 0):
+    BATCH_SIZE = 1000
+    
+    def __init__(self, redis_host: str = 'localhost', redis_port: int = 6379, redis_db: int = 0,
+                 redis_client: Optional[redis.Redis] = None):
         # Initialize Redis connection
         try:
-            self.redis_client = redis.Redis(
+            self.redis_client = redis_client or redis.Redis(
                 host=redis_host,
                 port=redis_port,
                 db=redis_db,
@@ -139,6 +146,13 @@ class CallTracker:
         self.QUEUE_PREFIX = "queue:"
         self.CUSTOMER_PREFIX = "customer:"
         self.ANALYTICS_PREFIX = "analytics:"
+        self.CALLS_BY_START = "calls:by_start"  # sorted set: call_sid -> start epoch
+        self.CUSTOMER_CALLS_PREFIX = "customer_calls:"  # per-caller sorted sets
+        self.CALL_CALLERS = "calls:caller"  # hash: call_sid -> caller's history key suffix, outlives call records
+        
+        self.call_ttl_seconds = int(os.getenv('CALL_RECORD_TTL_SECONDS', '86400'))
+        self.customer_history_ttl_seconds = 86400 * 90
+        self.customer_history_max_calls = 20
         
         # Performance thresholds
         self.quality_thresholds = {
@@ -186,19 +200,17 @@ class CallTracker:
                 start_time=datetime.now()
             )
             
-            # Store in Redis
+            # Store record, time index, active set, daily stats and caller history in one round trip
             call_key = f"{self.CALL_PREFIX}{call_sid}"
-            self.redis_client.hset(call_key, mapping=call_record.to_dict())
-            self.redis_client.expire(call_key, 86400)  # Expire after 24 hours
-            
-            # Add to active calls
-            self.redis_client.sadd(self.ACTIVE_CALLS_SET, call_sid)
-            
-            # Update daily stats
-            self._increment_daily_stat('total_calls')
-            
-            # Track customer call history
-            self._update_customer_history(caller_id, call_sid)
+            started = call_record.start_time.timestamp()
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(call_key, mapping=self._encode_mapping(call_record.to_dict()))
+            pipe.expire(call_key, self.call_ttl_seconds)
+            pipe.zadd(self.CALLS_BY_START, {call_sid: started})
+            pipe.sadd(self.ACTIVE_CALLS_SET, call_sid)
+            self._increment_daily_stat('total_calls', pipe=pipe)
+            self._update_customer_history(caller_id, call_sid, started, pipe=pipe)
+            pipe.execute()
             
             logger.info(f"Started tracking call: {call_sid}")
             return call_record
@@ -246,7 +258,7 @@ class CallTracker:
                 self.redis_client.srem(self.ACTIVE_CALLS_SET, call_sid)
             
             # Apply updates
-            self.redis_client.hset(call_key, mapping=updates)
+            self.redis_client.hset(call_key, mapping=self._encode_mapping(updates))
             
             logger.debug(f"Updated call {call_sid} status to {status.value}")
             
@@ -301,7 +313,7 @@ class CallTracker:
                     updates['priority_level'] = 'emergency'
                     self._increment_daily_stat('emergency_calls')
             
-            self.redis_client.hset(call_key, mapping=updates)
+            self.redis_client.hset(call_key, mapping=self._encode_mapping(updates))
             
             # Update voicemail stats if this was a voicemail
             if recording_duration > 0:
@@ -326,7 +338,7 @@ class CallTracker:
                 self._add_to_daily_stat('customer_satisfaction_sum', satisfaction_score)
                 self._increment_daily_stat('customer_satisfaction_count')
             
-            self.redis_client.hset(call_key, mapping=updates)
+            self.redis_client.hset(call_key, mapping=self._encode_mapping(updates))
             
             # Track outcome analytics
             outcome_key = f"{self.ANALYTICS_PREFIX}outcomes"
@@ -345,25 +357,45 @@ class CallTracker:
             if not call_data:
                 return None
             
-            # Parse JSON fields
-            if 'menu_path' in call_data:
-                try:
-                    call_data['menu_path'] = json.loads(call_data['menu_path'])
-                except:
-                    pass
-            
-            if 'keywords' in call_data:
-                try:
-                    call_data['keywords'] = json.loads(call_data['keywords'])
-                except:
-                    pass
-            
-            return call_data
+            return self._parse_call_data(call_data)
             
         except Exception as e:
             logger.error(f"Failed to get call details for {call_sid}: {e}")
             return None
     
+    def _parse_call_data(self, call_data: Dict[str, str]) -> Dict[str, Any]:
+        """Decode JSON fields of a stored call hash"""
+        for field in ('menu_path', 'keywords'):
+            if field in call_data:
+                try:
+                    call_data[field] = json.loads(call_data[field])
+                except (TypeError, ValueError):
+                    pass
+        return call_data
+    
+    def _get_call_details_batch(self, call_sids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Pipelined HGETALL for many calls; None where the record has expired"""
+        results = []
+        for offset in range(0, len(call_sids), self.BATCH_SIZE):
+            pipe = self.redis_client.pipeline(transaction=False)
+            for call_sid in call_sids[offset:offset + self.BATCH_SIZE]:
+                pipe.hgetall(f"{self.CALL_PREFIX}{call_sid}")
+            results.extend(self._parse_call_data(data) if data else None for data in pipe.execute())
+        return results
+    
+    def get_calls_between(self, start: datetime, end: datetime,
+                          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Stored calls that started in [start, end], oldest first"""
+        try:
+            call_sids = self.redis_client.zrangebyscore(
+                self.CALLS_BY_START, start.timestamp(), end.timestamp(),
+                start=0 if limit else None, num=limit
+            )
+            return [call for call in self._get_call_details_batch(call_sids) if call]
+        except Exception as e:
+            logger.error(f"Failed to get calls between {start} and {end}: {e}")
+            return []
+    
     def get_active_calls(self) -> List[str]:
         """Get list of currently active calls"""
         try:
@@ -387,50 +419,58 @@ class CallTracker:
                 date = datetime.now().strftime('%Y-%m-%d')
             
             daily_key = f"{self.DAILY_STATS_PREFIX}{date}"
-            stats = self.redis_client.hgetall(daily_key)
-            
-            if not stats:
-                return {}
-            
-            # Convert numeric fields
-            numeric_fields = ['total_calls', 'answered_calls', 'missed_calls', 'voicemails', 
-                            'emergency_calls', 'total_duration', 'customer_satisfaction_sum', 
-                            'customer_satisfaction_count']
-            
-            for field in numeric_fields:
-                if field in stats:
-                    stats[field] = int(stats[field])
-            
-            # Calculate derived metrics
-            if stats.get('total_calls', 0) > 0:
-                stats['answer_rate'] = round(stats['answered_calls'] / stats['total_calls'] * 100, 2)
-                stats['miss_rate'] = round(stats['missed_calls'] / stats['total_calls'] * 100, 2)
-            
-            if stats.get('answered_calls', 0) > 0:
-                stats['average_duration'] = round(stats['total_duration'] / stats['answered_calls'], 2)
-            
-            if stats.get('customer_satisfaction_count', 0) > 0:
-                stats['average_satisfaction'] = round(
-                    stats['customer_satisfaction_sum'] / stats['customer_satisfaction_count'], 2
-                )
-            
-            return stats
+            return self._parse_daily_stats(self.redis_client.hgetall(daily_key))
             
         except Exception as e:
             logger.error(f"Failed to get daily stats for {date}: {e}")
             return {}
     
+    def _parse_daily_stats(self, stats: Dict[str, str]) -> Dict[str, Any]:
+        """Convert a stored daily stats hash and add derived rates"""
+        if not stats:
+            return {}
+        
+        # Convert numeric fields
+        numeric_fields = ['total_calls', 'answered_calls', 'missed_calls', 'voicemails', 
+                          'emergency_calls', 'total_duration', 'customer_satisfaction_sum', 
+                          'customer_satisfaction_count']
+        
+        for field in numeric_fields:
+            if field in stats:
+                stats[field] = int(stats[field])
+        
+        # Calculate derived metrics
+        if stats.get('total_calls', 0) > 0:
+            stats['answer_rate'] = round(stats['answered_calls'] / stats['total_calls'] * 100, 2)
+            stats['miss_rate'] = round(stats['missed_calls'] / stats['total_calls'] * 100, 2)
+        
+        if stats.get('answered_calls', 0) > 0:
+            stats['average_duration'] = round(stats['total_duration'] / stats['answered_calls'], 2)
+        
+        if stats.get('customer_satisfaction_count', 0) > 0:
+            stats['average_satisfaction'] = round(
+                stats['customer_satisfaction_sum'] / stats['customer_satisfaction_count'], 2
+            )
+        
+        return stats
+    
     def get_customer_call_history(self, caller_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get call history for a specific customer"""
         try:
-            customer_key = f"{self.CUSTOMER_PREFIX}{self._hash_phone(caller_id)}"
-            call_sids = self.redis_client.lrange(customer_key, 0, limit - 1)
+            customer_key = f"{self.CUSTOMER_CALLS_PREFIX}{self._hash_phone(caller_id)}"
+            call_sids = self.redis_client.zrevrange(customer_key, 0, limit - 1)
             
             history = []
-            for call_sid in call_sids:
-                call_data = self.get_call_details(call_sid)
+            expired = []
+            for call_sid, call_data in zip(call_sids, self._get_call_details_batch(call_sids)):
                 if call_data:
                     history.append(call_data)
+                else:
+                    expired.append(call_sid)
+            
+            # Drop index entries whose call record has already expired
+            if expired:
+                self.redis_client.zrem(customer_key, *expired)
             
             return history
             
@@ -461,13 +501,17 @@ class CallTracker:
                 'customer_satisfaction': 0
             }
             
-            # Aggregate daily stats
+            # Aggregate daily stats, fetched in one round trip
             total_satisfaction_sum = 0
             total_satisfaction_count = 0
             
-            for i in range(days):
-                date = (start_date + timedelta(days=i)).strftime('%Y-%m-%d')
-                daily_stats = self.get_daily_stats(date)
+            dates = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+            pipe = self.redis_client.pipeline(transaction=False)
+            for date in dates:
+                pipe.hgetall(f"{self.DAILY_STATS_PREFIX}{date}")
+            
+            for date, raw_stats in zip(dates, pipe.execute()):
+                daily_stats = self._parse_daily_stats(raw_stats)
                 
                 if daily_stats:
                     summary['total_calls'] += daily_stats.get('total_calls', 0)
@@ -498,13 +542,15 @@ class CallTracker:
                     total_satisfaction_sum / total_satisfaction_count, 2
                 )
             
-            # Get menu usage
-            menu_key = f"{self.ANALYTICS_PREFIX}menu_usage"
-            summary['menu_usage'] = self.redis_client.hgetall(menu_key)
+            # Get menu usage and outcomes
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hgetall(f"{self.ANALYTICS_PREFIX}menu_usage")
+            pipe.hgetall(f"{self.ANALYTICS_PREFIX}outcomes")
+            summary['menu_usage'], summary['outcomes'] = pipe.execute()
             
-            # Get outcomes
-            outcome_key = f"{self.ANALYTICS_PREFIX}outcomes"
-            summary['outcomes'] = self.redis_client.hgetall(outcome_key)
+            # Peak hours and quality from the calls stored in the period
+            summary['peak_hours'], summary['call_quality_distribution'] = \
+                self._summarize_indexed_calls(start_date, end_date)
             
             return summary
             
@@ -512,6 +558,43 @@ class CallTracker:
             logger.error(f"Failed to generate analytics summary: {e}")
             return {}
     
+    def _summarize_indexed_calls(self, start: datetime, end: datetime) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Calls per hour of day and per quality band, read in batches from the time index"""
+        peak_hours: Counter = Counter()
+        quality: Counter = Counter()
+        
+        # Rank range of the period, then fixed-size rank slices (no LIMIT offset rescans)
+        first_rank = self.redis_client.zcount(self.CALLS_BY_START, '-inf', f"({start.timestamp()}")
+        last_rank = first_rank + self.redis_client.zcount(
+            self.CALLS_BY_START, start.timestamp(), end.timestamp()) - 1
+        
+        for rank in range(first_rank, last_rank + 1, self.BATCH_SIZE):
+            call_sids = self.redis_client.zrange(
+                self.CALLS_BY_START, rank, min(rank + self.BATCH_SIZE - 1, last_rank)
+            )
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            for call_sid in call_sids:
+                pipe.hmget(f"{self.CALL_PREFIX}{call_sid}", 'start_time', 'call_quality')
+            
+            for start_time, call_quality in pipe.execute():
+                if not start_time:
+                    continue
+                try:
+                    peak_hours[f"{datetime.fromisoformat(start_time).hour:02d}:00"] += 1
+                except ValueError:
+                    pass
+                if call_quality not in (None, ''):
+                    quality[self._quality_band(float(call_quality))] += 1
+        
+        return dict(sorted(peak_hours.items())), dict(quality)
+    
+    def _quality_band(self, score: float) -> str:
+        for band, threshold in sorted(self.quality_thresholds.items(), key=lambda item: -item[1]):
+            if score >= threshold:
+                return band
+        return 'poor'
+    
     def get_queue_metrics(self) -> Dict[str, Any]:
         """Get real-time queue metrics"""
         try:
@@ -531,44 +614,100 @@ class CallTracker:
             logger.error(f"Failed to get queue metrics: {e}")
             return {}
     
-    def cleanup_old_data(self, days_to_keep: int = 30):
-        """Clean up old call data to prevent Redis from growing too large"""
+    def cleanup_old_data(self, days_to_keep: int = 30) -> int:
+        """
+        Clean up old call data to prevent Redis from growing too large.
+        
+        Reads expired call ids from the start-time index in bounded batches and
+        deletes records and index entries with one pipeline per batch.
+        """
+        removed = 0
         try:
-            cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-            
-            # Find old call keys
-            pattern = f"{self.CALL_PREFIX}*"
-            old_keys = []
+            cutoff = (datetime.now() - timedelta(days=days_to_keep)).timestamp()
             
-            for key in self.redis_client.scan_iter(match=pattern):
-                call_data = self.redis_client.hget(key, 'start_time')
-                if call_data:
-                    try:
-                        start_time = datetime.fromisoformat(call_data)
-                        if start_time < cutoff_date:
-                            old_keys.append(key)
-                    except:
-                        # If we can't parse the date, consider it old
-                        old_keys.append(key)
-            
-            # Delete old keys in batches
-            if old_keys:
-                pipe = self.redis_client.pipeline()
-                for key in old_keys:
-                    pipe.delete(key)
-                pipe.execute()
+            while True:
+                call_sids = self.redis_client.zrangebyscore(
+                    self.CALLS_BY_START, '-inf', cutoff, start=0, num=self.BATCH_SIZE
+                )
+                if not call_sids:
+                    break
+                
+                # Callers of this batch, to prune their history indexes too. Call records
+                # expire long before this, so callers come from the side hash; only calls
+                # indexed before it existed fall back to the record
+                phone_hashes = self.redis_client.hmget(self.CALL_CALLERS, call_sids)
+                unknown = [call_sid for call_sid, phone_hash in zip(call_sids, phone_hashes) if not phone_hash]
+                callers = {phone_hash for phone_hash in phone_hashes if phone_hash}
+                if unknown:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    for call_sid in unknown:
+                        pipe.hget(f"{self.CALL_PREFIX}{call_sid}", 'caller_id')
+                    callers.update(self._hash_phone(caller_id) for caller_id in pipe.execute() if caller_id)
                 
-                logger.info(f"Cleaned up {len(old_keys)} old call records")
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.delete(*(f"{self.CALL_PREFIX}{call_sid}" for call_sid in call_sids))
+                pipe.zrem(self.CALLS_BY_START, *call_sids)
+                pipe.hdel(self.CALL_CALLERS, *call_sids)
+                for phone_hash in callers:
+                    pipe.zremrangebyscore(f"{self.CUSTOMER_CALLS_PREFIX}{phone_hash}", '-inf', cutoff)
+                pipe.execute()
+                removed += len(call_sids)
+            
+            if removed:
+                logger.info(f"Cleaned up {removed} old call records")
             
         except Exception as e:
             logger.error(f"Failed to cleanup old data: {e}")
+        
+        return removed
+    
+    def rebuild_call_index(self) -> int:
+        """
+        Index call records stored before the start-time index existed.
+        One SCAN over call keys; run once after upgrading.
+        """
+        indexed = 0
+        keys = []
+        
+        def flush():
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.hmget(key, 'start_time', 'caller_id')
+            fields = pipe.execute()
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            count = 0
+            for key, (start_time, caller_id) in zip(keys, fields):
+                try:
+                    started = datetime.fromisoformat(start_time).timestamp()
+                except (TypeError, ValueError):
+                    continue
+                call_sid = key[len(self.CALL_PREFIX):]
+                pipe.zadd(self.CALLS_BY_START, {call_sid: started})
+                if caller_id:
+                    self._update_customer_history(caller_id, call_sid, started, pipe=pipe)
+                count += 1
+            pipe.execute()
+            keys.clear()
+            return count
+        
+        for key in self.redis_client.scan_iter(match=f"{self.CALL_PREFIX}*", count=self.BATCH_SIZE):
+            keys.append(key)
+            if len(keys) >= self.BATCH_SIZE:
+                indexed += flush()
+        if keys:
+            indexed += flush()
+        
+        logger.info(f"Indexed {indexed} call records by start time")
+        return indexed
     
-    def _increment_daily_stat(self, stat_name: str, amount: int = 1):
-        """Increment a daily statistic"""
+    def _increment_daily_stat(self, stat_name: str, amount: int = 1, pipe=None):
+        """Increment a daily statistic, optionally queued on a pipeline"""
+        client = pipe if pipe is not None else self.redis_client
         today = datetime.now().strftime('%Y-%m-%d')
         daily_key = f"{self.DAILY_STATS_PREFIX}{today}"
-        self.redis_client.hincrby(daily_key, stat_name, amount)
-        self.redis_client.expire(daily_key, 86400 * 30)
+        client.hincrby(daily_key, stat_name, amount)
+        client.expire(daily_key, 86400 * 30)
     
     def _add_to_daily_stat(self, stat_name: str, value: int):
         """Add value to a daily statistic"""
@@ -577,12 +716,29 @@ class CallTracker:
         self.redis_client.hincrby(daily_key, stat_name, value)
         self.redis_client.expire(daily_key, 86400 * 30)
     
-    def _update_customer_history(self, caller_id: str, call_sid: str):
-        """Update customer call history"""
-        customer_key = f"{self.CUSTOMER_PREFIX}{self._hash_phone(caller_id)}"
-        self.redis_client.lpush(customer_key, call_sid)
-        self.redis_client.ltrim(customer_key, 0, 19)  # Keep last 20 calls
-        self.redis_client.expire(customer_key, 86400 * 90)  # Keep for 90 days
+    def _update_customer_history(self, caller_id: str, call_sid: str, started: float, pipe=None):
+        """Update customer call history, optionally queued on a pipeline"""
+        client = pipe if pipe is not None else self.redis_client
+        phone_hash = self._hash_phone(caller_id)
+        customer_key = f"{self.CUSTOMER_CALLS_PREFIX}{phone_hash}"
+        client.hset(self.CALL_CALLERS, call_sid, phone_hash)
+        client.zadd(customer_key, {call_sid: started})
+        client.zremrangebyrank(customer_key, 0, -(self.customer_history_max_calls + 1))  # Keep last 20 calls
+        client.expire(customer_key, self.customer_history_ttl_seconds)  # Keep for 90 days
+    
+    @staticmethod
+    def _encode_mapping(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Redis-safe hash fields: drop None, JSON-encode containers, stringify bools"""
+        encoded = {}
+        for field, value in data.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value)
+            elif isinstance(value, bool):
+                value = str(value)
+            encoded[field] = value
+        return encoded
     
     def _hash_phone(self, phone: str) -> str:
         """Hash phone number for privacy"""
@@ -640,8 +796,8 @@ def add_call_tracking_endpoints(app, call_tracker: CallTracker):
     @app.post("/voice/analytics/cleanup")
     async def cleanup_old_data(days_to_keep: int = 30):
         """Clean up old call data"""
-        call_tracker.cleanup_old_data(days_to_keep)
-        return {"status": "cleanup_completed"}
+        removed = call_tracker.cleanup_old_data(days_to_keep)
+        return {"status": "cleanup_completed", "removed": removed}
 
 if __name__ == "__main__":
     # Test the call tracker
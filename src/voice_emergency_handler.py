@@ -8,16 +8,18 @@ Author: Phone Engineer Agent
 
 import os
 import re
-import json
 import logging
+import time
 import redis
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Set, Tuple, Any
 from dataclasses import dataclass
 from enum import Enum
 import asyncio
 import aiohttp
 
+from .emergency_dispatch import EmergencyDispatchQueue, RollingCallWindow
+
 logger = logging.getLogger(__name__)
 
 class UrgencyLevel(Enum):
@@ -49,6 +51,7 @@ class EmergencyAssessment:
     estimated_response_time: int  # minutes
     requires_immediate_dispatch: bool
     safety_concerns: List[str]
+    urgency_score: float = 0.0  # Raw score behind urgency_level, orders the dispatch queue
 
 class EmergencyHandler:
     """
@@ -64,10 +67,15 @@ class EmergencyHandler:
     - Emergency services escalation
     """
     
-    def __init__(self):
+    # Workload inputs are re-read at most this often during a call surge
+    WORKLOAD_REFRESH_SECONDS = 1.0
+    MAX_CAPACITY = 20
+    RECENT_CALLS_LIMIT = 10
+    
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
         # Initialize Redis for emergency tracking
         try:
-            self.redis_client = redis.Redis(
+            self.redis_client = redis_client or redis.Redis(
                 host=os.getenv('REDIS_HOST', 'localhost'),
                 port=int(os.getenv('REDIS_PORT', 6379)),
                 db=int(os.getenv('REDIS_DB', 2)),  # Dedicated DB for emergencies
@@ -144,9 +152,20 @@ class EmergencyHandler:
             'multiple properties'
         ]
         
+        # Precompiled once; assess_urgency runs for every inbound call
+        self._compiled_patterns = [
+            (category, config, [re.compile(pattern, re.IGNORECASE) for pattern in config['patterns']])
+            for category, config in self.emergency_patterns.items()
+        ]
+        
         # Load priority customers from configuration
         self.priority_customers = self._load_priority_customers()
         
+        # Shared dispatch queue and per-caller 24 hour call windows
+        self.dispatch_queue = EmergencyDispatchQueue(self.redis_client)
+        self.recent_calls = RollingCallWindow(window_seconds=24 * 3600, redis_client=self.redis_client)
+        self._workload_cache: Optional[Tuple[float, float]] = None
+        
         # Emergency contact configuration
         self.emergency_contacts = {
             'primary_dispatcher': os.getenv('PRIMARY_DISPATCHER_PHONE', '+15551234567'),
@@ -205,9 +224,9 @@ class EmergencyHandler:
             # Analyze transcription for emergency patterns
             transcription_lower = transcription.lower()
             
-            for category, config in self.emergency_patterns.items():
-                for pattern in config['patterns']:
-                    matches = re.findall(pattern, transcription_lower, re.IGNORECASE)
+            for category, config, patterns in self._compiled_patterns:
+                for pattern in patterns:
+                    matches = pattern.findall(transcription_lower)
                     if matches:
                         urgency_score = max(urgency_score, config['weight'])
                         trigger_keywords.extend(matches)
@@ -255,11 +274,13 @@ class EmergencyHandler:
                 recommended_action=recommended_action,
                 estimated_response_time=estimated_response_time,
                 requires_immediate_dispatch=requires_immediate_dispatch,
-                safety_concerns=safety_concerns
+                safety_concerns=safety_concerns,
+                urgency_score=urgency_score
             )
             
             # Log assessment
             self._log_emergency_assessment(caller_id, assessment, transcription)
+            self._record_call(caller_id, assessment, call_context)
             
             logger.info(f"Emergency assessment: {urgency_level.name} for {caller_id}")
             return assessment
@@ -609,17 +630,16 @@ class EmergencyHandler:
     async def _add_to_priority_queue(self, call_sid: str, assessment: EmergencyAssessment):
         """Add call to priority queue"""
         try:
-            if self.redis_client:
-                queue_data = {
-                    'call_sid': call_sid,
+            self.dispatch_queue.push(
+                call_sid,
+                assessment.urgency_score or float(assessment.urgency_level.value),
+                {
                     'urgency_level': assessment.urgency_level.value,
-                    'timestamp': datetime.now().isoformat(),
+                    'emergency_type': assessment.emergency_type.value if assessment.emergency_type else None,
                     'estimated_response_time': assessment.estimated_response_time
                 }
-                
-                # Use sorted set for priority ordering
-                priority_score = assessment.urgency_level.value * 1000 + int(datetime.now().timestamp())
-                self.redis_client.zadd('priority_queue', {json.dumps(queue_data): priority_score})
+            )
+            self._workload_cache = None
             
             logger.info(f"Added call {call_sid} to priority queue with urgency {assessment.urgency_level.name}")
             
@@ -640,36 +660,74 @@ class EmergencyHandler:
         """Schedule standard service appointment"""
         return datetime.now() + timedelta(hours=24)  # Next business day
     
+    def next_dispatch(self) -> Optional[Dict[str, Any]]:
+        """Take the most urgent queued call (highest score, then longest waiting)"""
+        try:
+            entry = self.dispatch_queue.pop()
+            self._workload_cache = None
+            return entry
+        except Exception as e:
+            logger.error(f"Failed to pop priority queue: {e}")
+            return None
+    
+    def remove_from_priority_queue(self, call_sid: str) -> bool:
+        """Drop a queued call that was answered or abandoned"""
+        try:
+            removed = self.dispatch_queue.remove(call_sid)
+            self._workload_cache = None
+            return removed
+        except Exception as e:
+            logger.error(f"Failed to remove {call_sid} from priority queue: {e}")
+            return False
+    
     # Helper methods
-    def _load_priority_customers(self) -> List[str]:
+    def _load_priority_customers(self) -> Set[str]:
         """Load priority customers from configuration"""
+        # This would load from database
+        # For now, sample data plus any numbers registered in Redis
+        customers = {
+            '+15551234567',  # VIP customer
+            '+15551234568',  # Commercial account
+        }
         try:
-            # This would load from database
-            # For now, return sample data
-            return [
-                '+15551234567',  # VIP customer
-                '+15551234568',  # Commercial account
-            ]
+            if self.redis_client:
+                customers.update(self.redis_client.smembers('priority_customers'))
         except Exception as e:
             logger.error(f"Failed to load priority customers: {e}")
-            return []
+        return customers
+    
+    def add_priority_customer(self, caller_id: str):
+        self.priority_customers.add(caller_id)
+        if self.redis_client:
+            try:
+                self.redis_client.sadd('priority_customers', caller_id)
+            except Exception as e:
+                logger.error(f"Failed to store priority customer: {e}")
     
     def _is_priority_customer(self, caller_id: str) -> bool:
         """Check if caller is a priority customer"""
         return caller_id in self.priority_customers
     
     def _get_recent_calls(self, caller_id: str, hours: int = 24) -> List[Dict]:
-        """Get recent calls for caller"""
+        """Get recent calls for caller, oldest first (at most RECENT_CALLS_LIMIT)"""
         try:
-            if self.redis_client:
-                # This would query call history
-                # For now, return empty list
-                return []
-            return []
+            # The window holds 24 hours; shorter spans filter its newest entries
+            cutoff = time.time() - hours * 3600
+            calls = self.recent_calls.recent(caller_id, limit=self.RECENT_CALLS_LIMIT)
+            return [call for call in calls if call['timestamp'] > cutoff]
         except Exception as e:
             logger.error(f"Failed to get recent calls: {e}")
             return []
     
+    def _record_call(self, caller_id: str, assessment: EmergencyAssessment, call_context: Dict):
+        try:
+            self.recent_calls.record(caller_id, {
+                'call_sid': call_context.get('call_sid'),
+                'urgency_level': assessment.urgency_level.value
+            })
+        except Exception as e:
+            logger.error(f"Failed to record call for {caller_id}: {e}")
+    
     def _is_escalating_issue(self, recent_calls: List[Dict]) -> bool:
         """Check if issue is escalating based on call pattern"""
         if len(recent_calls) < 2:
@@ -715,18 +773,25 @@ class EmergencyHandler:
     def _get_current_workload(self) -> float:
         """Get current system workload (0-1)"""
         try:
+            now = time.monotonic()
+            if self._workload_cache and now - self._workload_cache[0] < self.WORKLOAD_REFRESH_SECONDS:
+                return self._workload_cache[1]
+            
             if self.redis_client:
-                # Count active calls and queue depth
-                active_calls = self.redis_client.scard('active_calls') or 0
-                queue_depth = self.redis_client.zcard('priority_queue') or 0
+                # Count active calls and queue depth in one round trip (both O(1))
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.scard('active_calls')
+                pipe.zcard(EmergencyDispatchQueue.QUEUE_KEY)
+                active_calls, queue_depth = pipe.execute()
                 
                 # Simple workload calculation
-                total_load = active_calls + queue_depth
-                max_capacity = 20  # Configurable
-                
-                return min(1.0, total_load / max_capacity)
+                total_load = (active_calls or 0) + (queue_depth or 0)
+                workload = min(1.0, total_load / self.MAX_CAPACITY)
+            else:
+                workload = 0.5  # Default moderate load
             
-            return 0.5  # Default moderate load
+            self._workload_cache = (now, workload)
+            return workload
             
         except Exception as e:
             logger.error(f"Failed to get current workload: {e}")
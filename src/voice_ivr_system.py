@@ -9,12 +9,14 @@ Author: Phone Engineer Agent
 import os
 import json
 import logging
-from datetime import datetime
 from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from enum import Enum
 from twilio.twiml.voice_response import VoiceResponse, Gather, Say, Play
 
+from .call_context_store import create_call_context_store
+from .twiml_templates import TwiMLTemplateCache
+
 logger = logging.getLogger(__name__)
 
 class MenuOption(Enum):
@@ -57,6 +59,13 @@ class CallContext:
             self.previous_menus = []
         if self.customer_data is None:
             self.customer_data = {}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CallContext':
+        return cls(**data)
 
 class VoiceIVRSystem:
     """
@@ -68,9 +77,22 @@ class VoiceIVRSystem:
     - Smart routing based on caller history
     """
     
-    def __init__(self):
+    def __init__(self, context_store=None):
         self.company_name = "757 Handy"
-        self.call_contexts: Dict[str, CallContext] = {}
+        
+        # Call contexts expire after a period without caller input.
+        # Set IVR_CONTEXT_REDIS_URL to let any webhook worker continue a call.
+        if context_store is None:
+            context_store = create_call_context_store(
+                serialize=CallContext.to_dict,
+                deserialize=CallContext.from_dict,
+                redis_url=os.getenv('IVR_CONTEXT_REDIS_URL'),
+                idle_ttl_seconds=float(os.getenv('IVR_CONTEXT_TTL_SECONDS', 60 * 60))
+            )
+        self.call_contexts = context_store
+        
+        # TwiML for each menu step, compiled once
+        self.twiml_templates = TwiMLTemplateCache()
         
         # Professional voice prompts
         self.prompts = {
@@ -188,9 +210,11 @@ class VoiceIVRSystem:
     
     def get_call_context(self, call_sid: str, caller_id: str) -> CallContext:
         """Get or create call context for tracking"""
-        if call_sid not in self.call_contexts:
-            self.call_contexts[call_sid] = CallContext(call_sid, caller_id)
-        return self.call_contexts[call_sid]
+        context = self.call_contexts.get(call_sid)
+        if context is None:
+            context = CallContext(call_sid, caller_id)
+            self.call_contexts.save(call_sid, context)
+        return context
     
     def process_input(self, call_sid: str, caller_id: str, digits: str = None, 
                      speech_result: str = None, current_menu: str = 'main') -> Dict[str, Any]:
@@ -198,7 +222,7 @@ class VoiceIVRSystem:
         Process caller input (DTMF or speech) and return appropriate action
         
         Returns:
-            Dict with 'action', 'target', 'twiml_response', and 'context'
+            Dict with 'action', 'target', 'twiml' (rendered bytes), and 'context'
         """
         context = self.get_call_context(call_sid, caller_id)
         context.current_menu = current_menu
@@ -217,16 +241,28 @@ class VoiceIVRSystem:
             option = menu_config['options'][selection]
             context.attempts = 0  # Reset attempts on valid input
             
-            return {
+            if option['action'] == 'submenu':
+                # Navigate to submenu
+                context.previous_menus.append(context.current_menu)
+                context.current_menu = option['target']
+            
+            result = {
                 'action': option['action'],
                 'target': option['target'],
                 'selection': selection,
                 'context': context,
-                'twiml_response': self._generate_action_response(option, context)
+                'twiml': self.twiml_templates.render(
+                    ('action', option['action'], option['target']),
+                    lambda: self._generate_action_response(option)
+                )
             }
         else:
             # Invalid input handling
-            return self._handle_invalid_input(context, menu_config)
+            result = self._handle_invalid_input(context)
+        
+        # Persist menu position and attempts; also refreshes the call's TTL
+        self.call_contexts.save(call_sid, context)
+        return result
     
     def _determine_selection(self, digits: str, speech_result: str, menu_config: Dict) -> Optional[str]:
         """Determine menu selection from DTMF digits or speech"""
@@ -250,59 +286,57 @@ class VoiceIVRSystem:
         
         return None
     
-    def _handle_invalid_input(self, context: CallContext, menu_config: Dict) -> Dict[str, Any]:
+    def _handle_invalid_input(self, context: CallContext) -> Dict[str, Any]:
         """Handle invalid input with progressive assistance"""
+        too_many_attempts = context.attempts >= 3
+        first_attempt = context.attempts == 1
+        twiml = self.twiml_templates.render(
+            ('invalid', context.current_menu, too_many_attempts, first_attempt),
+            lambda: self._invalid_input_response(context.current_menu, too_many_attempts, first_attempt)
+        )
         
-        if context.attempts >= 3:
+        return {
+            'action': 'transfer' if too_many_attempts else 'retry',
+            'target': 'operator' if too_many_attempts else context.current_menu,
+            'selection': None,
+            'context': context,
+            'twiml': twiml
+        }
+    
+    def _invalid_input_response(self, menu_name: str, too_many_attempts: bool, first_attempt: bool) -> VoiceResponse:
+        response = VoiceResponse()
+        
+        if too_many_attempts:
             # Too many attempts - transfer to human
-            response = VoiceResponse()
             response.say(self.prompts['too_many_attempts'].text, 
                         voice=self.prompts['too_many_attempts'].voice)
-            
-            return {
-                'action': 'transfer',
-                'target': 'operator',
-                'selection': None,
-                'context': context,
-                'twiml_response': response
-            }
+            return response
+        
+        # Repeat menu with helpful guidance
+        if first_attempt:
+            response.say(self.prompts['invalid_input'].text, 
+                       voice=self.prompts['invalid_input'].voice)
         else:
-            # Repeat menu with helpful guidance
-            response = VoiceResponse()
-            
-            if context.attempts == 1:
-                response.say(self.prompts['invalid_input'].text, 
-                           voice=self.prompts['invalid_input'].voice)
-            else:
-                response.say("Let me try that again. You can either press a number on your keypad or speak your choice clearly.", 
-                           voice='Polly.Joanna')
-            
-            # Add the menu with enhanced guidance
-            gather = self._create_menu_gather(context.current_menu, enhanced=True)
-            response.append(gather)
-            
-            # Fallback to operator
-            response.say("If you're still having trouble, please hold and I'll connect you with an operator.", 
+            response.say("Let me try that again. You can either press a number on your keypad or speak your choice clearly.", 
                        voice='Polly.Joanna')
-            response.redirect('/voice/transfer-to-operator')
-            
-            return {
-                'action': 'retry',
-                'target': context.current_menu,
-                'selection': None,
-                'context': context,
-                'twiml_response': response
-            }
+        
+        # Add the menu with enhanced guidance
+        gather = self._create_menu_gather(menu_name, enhanced=True)
+        response.append(gather)
+        
+        # Fallback to operator
+        response.say("If you're still having trouble, please hold and I'll connect you with an operator.", 
+                   voice='Polly.Joanna')
+        response.redirect('/voice/transfer-to-operator')
+        
+        return response
     
-    def _generate_action_response(self, option: Dict, context: CallContext) -> VoiceResponse:
+    def _generate_action_response(self, option: Dict) -> VoiceResponse:
         """Generate appropriate TwiML response for the selected action"""
         response = VoiceResponse()
         
         if option['action'] == 'submenu':
-            # Navigate to submenu
-            context.previous_menus.append(context.current_menu)
-            context.current_menu = option['target']
-            
+            # Play the submenu the caller navigated to
             menu_config = self.menus[option['target']]
             response.say(menu_config['prompt'].text, voice=menu_config['prompt'].voice)
             
@@ -354,9 +388,17 @@ class VoiceIVRSystem:
         
         return gather
     
+    def render_main_menu_twiml(self, call_sid: str, caller_id: str) -> bytes:
+        """Main menu TwiML as rendered bytes, from the precompiled template"""
+        self.get_call_context(call_sid, caller_id)
+        return self.twiml_templates.render(('main_menu',), self._main_menu_response)
+    
     def generate_main_menu_twiml(self, call_sid: str, caller_id: str) -> VoiceResponse:
         """Generate the main menu TwiML response"""
-        context = self.get_call_context(call_sid, caller_id)
+        self.get_call_context(call_sid, caller_id)
+        return self._main_menu_response()
+    
+    def _main_menu_response(self) -> VoiceResponse:
         response = VoiceResponse()
         
         # Welcome message
@@ -374,6 +416,9 @@ class VoiceIVRSystem:
         
         return response
     
+    def render_hours_info(self) -> bytes:
+        return self.twiml_templates.render(('hours_info',), self.generate_hours_info)
+    
     def generate_hours_info(self) -> VoiceResponse:
         """Generate business hours and location information"""
         response = VoiceResponse()
@@ -407,19 +452,20 @@ class VoiceIVRSystem:
     
     def get_call_analytics(self) -> Dict[str, Any]:
         """Get analytics on call patterns and menu usage"""
+        contexts = self.call_contexts.contexts()
         analytics = {
-            'total_calls': len(self.call_contexts),
+            'total_calls': len(contexts),
             'menu_selections': {},
             'completion_rates': {},
             'average_attempts': 0,
             'most_popular_options': []
         }
         
-        if not self.call_contexts:
+        if not contexts:
             return analytics
         
         total_attempts = 0
-        for context in self.call_contexts.values():
+        for context in contexts:
             total_attempts += context.attempts
             
             # Track menu usage
@@ -428,7 +474,7 @@ class VoiceIVRSystem:
                     analytics['menu_selections'][menu] = 0
                 analytics['menu_selections'][menu] += 1
         
-        analytics['average_attempts'] = total_attempts / len(self.call_contexts)
+        analytics['average_attempts'] = total_attempts / len(contexts)
         
         # Most popular menu selections
         sorted_menus = sorted(analytics['menu_selections'].items(), 
@@ -437,21 +483,13 @@ class VoiceIVRSystem:
         
         return analytics
     
-    def cleanup_old_contexts(self, hours: int = 24):
-        """Clean up old call contexts to prevent memory leaks"""
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        
-        old_contexts = []
-        for call_sid, context in self.call_contexts.items():
-            # Assuming context has a timestamp (would need to add this)
-            # For now, just limit total contexts
-            if len(self.call_contexts) > 1000:
-                old_contexts.append(call_sid)
-        
-        for call_sid in old_contexts[:500]:  # Remove oldest half
-            del self.call_contexts[call_sid]
+    def cleanup_old_contexts(self, hours: Optional[float] = None) -> int:
+        """Drop contexts of calls idle longer than `hours` (default: the store's TTL)"""
+        idle_ttl_seconds = hours * 3600 if hours is not None else None
+        removed = self.call_contexts.evict_expired(idle_ttl_seconds=idle_ttl_seconds)
         
-        logger.info(f"Cleaned up {len(old_contexts)} old call contexts")
+        logger.info(f"Cleaned up {removed} old call contexts")
+        return removed
 
 if __name__ == "__main__":
     # Test the IVR system
@@ -19,6 +19,9 @@ from enum import Enum
 import re
 import statistics
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from .quality_lexicon import RuleSet
 
 logger = logging.getLogger(__name__)
 
@@ -96,6 +99,84 @@ class QualityMetrics:
     compliance_violations: List[str]
     coaching_opportunities: List[str]
 
+# Lexical rules. Phrases are matched as substrings of the lowercased text, so
+# entries written with capitals never match; they are kept for parity with
+# the original per-method checks.
+CATEGORY_KEYWORDS = {
+    CallCategory.EMERGENCY_RESPONSE: ['emergency', 'urgent', 'flood', 'fire', 'gas leak'],
+    CallCategory.COMPLAINT_HANDLING: ['complaint', 'unhappy', 'disappointed', 'frustrated', 'problem with'],
+    CallCategory.APPOINTMENT_SCHEDULING: ['appointment', 'schedule', 'booking', 'when can you come'],
+    CallCategory.SALES_INQUIRY: ['quote', 'estimate', 'price', 'cost', 'how much'],
+    CallCategory.TECHNICAL_SUPPORT: ['how to', 'broken', 'not working', 'fix', 'repair'],
+}
+
+TRANSCRIPT_RULES = {
+    'dead_air': ['[pause]', '[silence]', '...', '[dead air]'],
+    'filler_words': ['um', 'uh', 'like', 'you know', 'so', 'well', 'actually'],
+    'accuracy': ['let me check', 'according to', 'our records show', 'I can confirm', 'verified', 'accurate'],
+    'inaccuracy': ['I think', 'maybe', 'probably', 'I guess', 'not sure', 'might be'],
+    'empathy': [
+        'I understand', 'I can imagine', 'I appreciate',
+        'I\'m sorry', 'that must be', 'I hear you',
+        'I know how', 'frustrating', 'concerning'
+    ],
+    'hold': ['hold', 'please wait', 'one moment', 'checking'],
+    'hold_explanation': ['checking with', 'looking up', 'verifying'],
+    'privacy_verification': ['can you verify', 'confirm your', 'for security'],
+    'safety_emergency': ['emergency', 'gas', 'electrical', 'flood'],
+    'safety_response': ['safety', 'turn off', 'shut off', 'danger', 'hazard'],
+    'pricing': ['price', 'cost', 'charge', 'fee'],
+    'pricing_estimate': ['estimate', 'quote', 'assessment', 'schedule'],
+    'resolution': ['resolved', 'scheduled', 'taken care of', 'all set', 'problem solved'],
+    'callback': ['call you back', 'follow up', 'check and call'],
+    'escalation': ['supervisor', 'manager', 'escalate', 'transfer'],
+    'sentiment_negative': [
+        'frustrated', 'disappointed', 'unhappy', 'angry',
+        'terrible', 'awful', 'worst', 'unacceptable'
+    ],
+    'sentiment_positive': [
+        'satisfied', 'happy', 'pleased', 'excellent',
+        'great', 'wonderful', 'perfect', 'amazing'
+    ],
+}
+
+# Scored against the first agent turn and the last two agent turns
+GREETING_RULES = {
+    'greeting_company': ['757 handy', 'company'],
+    'greeting_agent': ['karen', 'my name', 'this is'],
+    'greeting_offer': ['help', 'assist', 'serve'],
+}
+
+CLOSING_RULES = {
+    'closing_thanks': ['thank', 'appreciate'],
+    'closing_more_help': ['anything else', 'other questions'],
+    'closing_farewell': ['have a great', 'wonderful day'],
+    'closing_follow_up': ['follow up', 'call back', 'contact'],
+}
+
+QUALITY_METRICS_TTL_SECONDS = 2592000  # 30 day retention
+BATCH_MIN_CALLS_PER_WORKER = 50
+
+def _hold_time_score(has_hold: bool, has_explanation: bool) -> float:
+    if not has_hold:
+        return 1.0  # No hold time needed
+    if has_explanation:
+        return 0.8  # Good hold management
+    return 0.5  # Hold without explanation
+
+def _complaint_risk_score(negative_count: int, positive_count: int) -> float:
+    risk_score = 0.1  # Base risk
+    risk_score += negative_count * 0.2
+    risk_score -= positive_count * 0.1
+    return max(0.0, min(1.0, risk_score))
+
+def _stepped_score(base: float, step: float, matched: List[str]) -> float:
+    """Add `step` once per matched phrase, in rule order, as the per-method loops do"""
+    score = base
+    for _ in matched:
+        score += step
+    return score
+
 class VoiceQualityAssurance:
     """
     Comprehensive voice quality assurance system
@@ -111,20 +192,22 @@ class VoiceQualityAssurance:
     - Real-time quality alerts
     """
     
-    def __init__(self):
-        # Initialize Redis for QA data storage
-        try:
-            self.redis_client = redis.Redis(
-                host=os.getenv('REDIS_HOST', 'localhost'),
-                port=int(os.getenv('REDIS_PORT', 6379)),
-                db=int(os.getenv('REDIS_DB', 3)),  # Dedicated DB for QA
-                decode_responses=True
-            )
-            self.redis_client.ping()
-            logger.info("QA Redis connection established")
-        except Exception as e:
-            logger.warning(f"Redis connection failed, using memory storage: {e}")
-            self.redis_client = None
+    def __init__(self, redis_client: Optional[redis.Redis] = None, use_redis: bool = True):
+        # Initialize Redis for QA data storage (batch scoring workers run without it)
+        self.redis_client = None
+        if use_redis:
+            try:
+                self.redis_client = redis_client or redis.Redis(
+                    host=os.getenv('REDIS_HOST', 'localhost'),
+                    port=int(os.getenv('REDIS_PORT', 6379)),
+                    db=int(os.getenv('REDIS_DB', 3)),  # Dedicated DB for QA
+                    decode_responses=True
+                )
+                self.redis_client.ping()
+                logger.info("QA Redis connection established")
+            except Exception as e:
+                logger.warning(f"Redis connection failed, using memory storage: {e}")
+                self.redis_client = None
         
         # Quality standards and thresholds
         self.quality_standards = {
@@ -193,8 +276,27 @@ class VoiceQualityAssurance:
             'brand_adherence': 0.15
         }
         
+        self.compile_lexical_rules()
+        
         logger.info("VoiceQualityAssurance initialized with comprehensive analysis")
     
+    def compile_lexical_rules(self):
+        """
+        Compile every transcript phrase rule, including the brand voice
+        criteria, into one matcher. Call again after changing the criteria.
+        """
+        tone_keywords = self.brand_voice_criteria['tone_keywords']
+        rules = {f"category:{category.value}": keywords for category, keywords in CATEGORY_KEYWORDS.items()}
+        rules.update(TRANSCRIPT_RULES)
+        rules.update({
+            'brand_positive': tone_keywords['positive'],
+            'brand_empathetic': tone_keywords['empathetic'],
+            'brand_professional': tone_keywords['professional'],
+            'brand_avoid': tone_keywords['avoid'],
+            'brand_positioning': [phrase.lower() for phrase in self.brand_voice_criteria['company_positioning']],
+        })
+        self.transcript_rules = RuleSet(rules)
+    
     async def analyze_call_recording(self, call_data: Dict[str, Any]) -> QualityMetrics:
         """
         Comprehensive call recording analysis
@@ -214,94 +316,10 @@ class VoiceQualityAssurance:
         try:
             logger.info(f"Starting quality analysis for call {call_data.get('call_sid')}")
             
-            # Initialize analysis components
-            transcription = call_data.get('transcription', '')
-            recording_url = call_data.get('recording_url', '')
-            
-            # Determine call category
-            category = self._categorize_call(transcription, call_data)
-            
-            # Analyze transcription
-            conversation_analysis = await self._analyze_conversation(transcription)
-            
             # Analyze audio quality (if recording available)
-            audio_analysis = await self._analyze_audio_quality(recording_url)
-            
-            # Check compliance
-            compliance_analysis = self._check_compliance(transcription, call_data)
-            
-            # Evaluate brand adherence
-            brand_analysis = self._evaluate_brand_adherence(transcription)
-            
-            # Assess customer experience
-            customer_experience = self._assess_customer_experience(transcription, call_data)
+            audio_analysis = await self._analyze_audio_quality(call_data.get('recording_url', ''))
             
-            # Calculate quality scores
-            quality_scores = self._calculate_quality_scores(
-                conversation_analysis, brand_analysis, customer_experience, compliance_analysis
-            )
-            
-            # Generate training recommendations
-            training_analysis = self._generate_training_recommendations(
-                conversation_analysis, brand_analysis, compliance_analysis
-            )
-            
-            # Create quality metrics object
-            quality_metrics = QualityMetrics(
-                call_sid=call_data.get('call_sid', ''),
-                agent_id=call_data.get('agent_id'),
-                timestamp=datetime.now(),
-                call_duration=call_data.get('call_duration', 0),
-                category=category,
-                
-                # Overall scores
-                overall_quality=quality_scores['overall'],
-                professionalism=quality_scores['professionalism'],
-                communication_clarity=quality_scores['communication_clarity'],
-                problem_resolution=quality_scores['problem_resolution'],
-                customer_satisfaction=quality_scores['customer_satisfaction'],
-                brand_adherence=quality_scores['brand_adherence'],
-                
-                # Specific metrics
-                greeting_quality=conversation_analysis['greeting_quality'],
-                closing_quality=conversation_analysis['closing_quality'],
-                hold_time_management=conversation_analysis['hold_time_management'],
-                information_accuracy=conversation_analysis['information_accuracy'],
-                empathy_demonstrated=conversation_analysis['empathy_score'],
-                
-                # Compliance
-                privacy_compliance=compliance_analysis['privacy_compliance'],
-                safety_protocols_followed=compliance_analysis['safety_protocols'],
-                company_policies_followed=compliance_analysis['company_policies'],
-                
-                # Technical quality
-                audio_quality=audio_analysis['quality_score'],
-                background_noise=audio_analysis['noise_level'],
-                voice_clarity=audio_analysis['clarity_score'],
-                technical_issues=audio_analysis['issues'],
-                
-                # Conversation metrics
-                talk_time_ratio=conversation_analysis['talk_time_ratio'],
-                interruptions=conversation_analysis['interruptions'],
-                dead_air_duration=conversation_analysis['dead_air'],
-                filler_words_count=conversation_analysis['filler_words'],
-                
-                # Outcomes
-                first_call_resolution=customer_experience['first_call_resolution'],
-                callback_required=customer_experience['callback_required'],
-                escalation_needed=customer_experience['escalation_needed'],
-                customer_complaint_risk=customer_experience['complaint_risk'],
-                
-                # Training
-                strengths=training_analysis['strengths'],
-                improvement_areas=training_analysis['improvement_areas'],
-                training_recommendations=training_analysis['recommendations'],
-                
-                # Flags
-                quality_flags=self._identify_quality_flags(conversation_analysis, compliance_analysis),
-                compliance_violations=compliance_analysis['violations'],
-                coaching_opportunities=training_analysis['coaching_opportunities']
-            )
+            quality_metrics = self.score_call(call_data, audio_analysis)
             
             # Store analysis results
             await self._store_quality_metrics(quality_metrics)
@@ -317,34 +335,241 @@ class VoiceQualityAssurance:
             # Return minimal metrics with error flag
             return self._create_error_metrics(call_data, str(e))
     
-    def _categorize_call(self, transcription: str, call_data: Dict) -> CallCategory:
-        """Categorize call based on content and context"""
+    async def analyze_calls_batch(self, calls: List[Dict[str, Any]],
+                                  max_workers: Optional[int] = None) -> List[QualityMetrics]:
+        """
+        Score a batch of recordings (e.g. a day's calls) across a process pool
+        and store the results with one bulk write. Batches too small to be
+        worth spreading over processes are scored in-process.
+        """
+        if not calls:
+            return []
+        
+        workers = min(max_workers or os.cpu_count() or 1, len(calls) // BATCH_MIN_CALLS_PER_WORKER)
+        if workers > 1:
+            results = await asyncio.to_thread(self._score_calls_in_pool, calls, workers)
+        else:
+            results = [self._score_call_or_error(call) for call in calls]
+        
+        await self._store_quality_metrics(*results)
+        for quality_metrics in results:
+            await self._check_quality_alerts(quality_metrics)
+        
+        logger.info(f"Batch quality analysis completed for {len(results)} calls ({max(workers, 1)} workers)")
+        return results
+    
+    def _score_calls_in_pool(self, calls: List[Dict[str, Any]], workers: int) -> List[QualityMetrics]:
+        settings = (self.brand_voice_criteria, self.scoring_weights)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring_worker,
+                                 initargs=settings) as executor:
+            chunksize = max(1, len(calls) // (workers * 4))
+            return list(executor.map(_score_call_in_worker, calls, chunksize=chunksize))
+    
+    def _score_call_or_error(self, call_data: Dict[str, Any]) -> QualityMetrics:
+        try:
+            return self.score_call(call_data)
+        except Exception as e:
+            logger.error(f"Failed to score call {call_data.get('call_sid')}: {e}")
+            return self._create_error_metrics(call_data, str(e))
+    
+    def score_call(self, call_data: Dict[str, Any],
+                   audio_analysis: Optional[Dict[str, Any]] = None) -> QualityMetrics:
+        """Score one call from its transcription without storing it or raising alerts"""
+        if audio_analysis is None:
+            audio_analysis = self._audio_quality_for(call_data.get('recording_url', ''))
+        
+        analysis = self._analyze_transcription(call_data.get('transcription', ''))
+        conversation_analysis = analysis['conversation']
+        compliance_analysis = analysis['compliance']
+        brand_analysis = analysis['brand']
+        customer_experience = analysis['customer_experience']
+        
+        # Calculate quality scores
+        quality_scores = self._calculate_quality_scores(
+            conversation_analysis, brand_analysis, customer_experience, compliance_analysis
+        )
+        
+        # Generate training recommendations
+        training_analysis = self._generate_training_recommendations(
+            conversation_analysis, brand_analysis, compliance_analysis
+        )
+        
+        return QualityMetrics(
+            call_sid=call_data.get('call_sid', ''),
+            agent_id=call_data.get('agent_id'),
+            timestamp=self._call_timestamp(call_data),
+            call_duration=call_data.get('call_duration', 0),
+            category=analysis['category'],
+            
+            # Overall scores
+            overall_quality=quality_scores['overall'],
+            professionalism=quality_scores['professionalism'],
+            communication_clarity=quality_scores['communication_clarity'],
+            problem_resolution=quality_scores['problem_resolution'],
+            customer_satisfaction=quality_scores['customer_satisfaction'],
+            brand_adherence=quality_scores['brand_adherence'],
+            
+            # Specific metrics
+            greeting_quality=conversation_analysis['greeting_quality'],
+            closing_quality=conversation_analysis['closing_quality'],
+            hold_time_management=conversation_analysis['hold_time_management'],
+            information_accuracy=conversation_analysis['information_accuracy'],
+            empathy_demonstrated=conversation_analysis['empathy_score'],
+            
+            # Compliance
+            privacy_compliance=compliance_analysis['privacy_compliance'],
+            safety_protocols_followed=compliance_analysis['safety_protocols'],
+            company_policies_followed=compliance_analysis['company_policies'],
+            
+            # Technical quality
+            audio_quality=audio_analysis['quality_score'],
+            background_noise=audio_analysis['noise_level'],
+            voice_clarity=audio_analysis['clarity_score'],
+            technical_issues=audio_analysis['issues'],
+            
+            # Conversation metrics
+            talk_time_ratio=conversation_analysis['talk_time_ratio'],
+            interruptions=conversation_analysis['interruptions'],
+            dead_air_duration=conversation_analysis['dead_air'],
+            filler_words_count=conversation_analysis['filler_words'],
+            
+            # Outcomes
+            first_call_resolution=customer_experience['first_call_resolution'],
+            callback_required=customer_experience['callback_required'],
+            escalation_needed=customer_experience['escalation_needed'],
+            customer_complaint_risk=customer_experience['complaint_risk'],
+            
+            # Training
+            strengths=training_analysis['strengths'],
+            improvement_areas=training_analysis['improvement_areas'],
+            training_recommendations=training_analysis['recommendations'],
+            
+            # Flags
+            quality_flags=self._identify_quality_flags(conversation_analysis, compliance_analysis),
+            compliance_violations=compliance_analysis['violations'],
+            coaching_opportunities=training_analysis['coaching_opportunities']
+        )
+    
+    @staticmethod
+    def _call_timestamp(call_data: Dict[str, Any]) -> datetime:
+        """Recording time when supplied (batch runs over past calls), else now"""
+        timestamp = call_data.get('timestamp')
+        if isinstance(timestamp, datetime):
+            return timestamp
+        if isinstance(timestamp, str):
+            return datetime.fromisoformat(timestamp)
+        return datetime.now()
+    
+    def _analyze_transcription(self, transcription: str) -> Dict[str, Any]:
+        """
+        All lexical analysis in one pass: the transcription is lowercased and
+        split into turns once, and every transcript rule is read from a single
+        scan of the compiled matcher. Results match the per-rule methods
+        (_categorize_call, _analyze_conversation, _check_compliance,
+        _evaluate_brand_adherence, _assess_customer_experience).
+        """
         transcription_lower = transcription.lower()
+        hits = self.transcript_rules.scan(transcription_lower)
+        
+        category = CallCategory.CUSTOMER_SERVICE
+        for candidate in CATEGORY_KEYWORDS:
+            if hits.any(f"category:{candidate.value}"):
+                category = candidate
+                break
+        
+        segments = self._parse_conversation_segments(transcription)
+        agent_turns = [s['content'] for s in segments if s['speaker'] == 'agent']
+        
+        # Turns are short; plain substring checks beat a matcher setup there
+        greeting_quality = 0.0
+        if agent_turns:
+            greeting = agent_turns[0].lower()
+            greeting_quality = min(1.0, sum(weight for rule, weight in (
+                ('greeting_company', 0.3), ('greeting_agent', 0.3), ('greeting_offer', 0.4)
+            ) if any(phrase in greeting for phrase in GREETING_RULES[rule])))
         
-        # Emergency indicators
-        emergency_keywords = ['emergency', 'urgent', 'flood', 'fire', 'gas leak']
-        if any(keyword in transcription_lower for keyword in emergency_keywords):
-            return CallCategory.EMERGENCY_RESPONSE
+        closing_quality = 0.0
+        if len(agent_turns) >= 2:
+            closing = ' '.join(agent_turns[-2:]).lower()
+            closing_quality = min(1.0, sum(weight for rule, weight in (
+                ('closing_thanks', 0.3), ('closing_more_help', 0.3),
+                ('closing_farewell', 0.2), ('closing_follow_up', 0.2)
+            ) if any(phrase in closing for phrase in CLOSING_RULES[rule])))
         
-        # Complaint indicators
-        complaint_keywords = ['complaint', 'unhappy', 'disappointed', 'frustrated', 'problem with']
-        if any(keyword in transcription_lower for keyword in complaint_keywords):
-            return CallCategory.COMPLAINT_HANDLING
+        accuracy = _stepped_score(0.7, 0.1, hits.matched('accuracy'))
+        accuracy = _stepped_score(accuracy, -0.1, hits.matched('inaccuracy'))
+        
+        conversation = {
+            'greeting_quality': greeting_quality,
+            'closing_quality': closing_quality,
+            'talk_time_ratio': self._calculate_talk_time_ratio(segments),
+            'interruptions': self._count_interruptions(segments),
+            'dead_air': float(hits.total('dead_air')) * 3.0,
+            'filler_words': hits.total('filler_words'),
+            'information_accuracy': max(0.0, min(1.0, accuracy)),
+            'empathy_score': min(1.0, _stepped_score(0.0, 0.15, hits.matched('empathy'))),
+            'hold_time_management': _hold_time_score(hits.any('hold'), hits.any('hold_explanation')),
+            'segments': segments
+        }
+        
+        privacy_compliance = hits.any('privacy_verification')
+        safety_protocols = not hits.any('safety_emergency') or hits.any('safety_response')
+        company_policies = not hits.any('pricing') or hits.any('pricing_estimate')
+        violations = []
+        if not privacy_compliance:
+            violations.append("Privacy policy violation detected")
+        if not safety_protocols:
+            violations.append("Safety protocol not followed")
+        if not company_policies:
+            violations.append("Company policy deviation detected")
+        compliance = {
+            'privacy_compliance': privacy_compliance,
+            'safety_protocols': safety_protocols,
+            'company_policies': company_policies,
+            'violations': violations
+        }
+        
+        positive_score = _stepped_score(0.0, 0.2, hits.matched('brand_positive'))
+        empathy_score = _stepped_score(0.0, 0.2, hits.matched('brand_empathetic'))
+        professional_score = _stepped_score(0.0, 0.2, hits.matched('brand_professional'))
+        avoid_penalty = _stepped_score(0.0, 0.3, hits.matched('brand_avoid'))
+        positioning_score = _stepped_score(0.0, 0.25, hits.matched('brand_positioning'))
+        brand = {
+            'overall_score': max(0.0, min(1.0,
+                (positive_score + empathy_score + professional_score + positioning_score) / 4 - avoid_penalty
+            )),
+            'positive_tone': min(1.0, positive_score),
+            'empathy': min(1.0, empathy_score),
+            'professionalism': min(1.0, professional_score),
+            'positioning': min(1.0, positioning_score),
+            'avoid_words_used': avoid_penalty > 0
+        }
         
-        # Scheduling indicators
-        scheduling_keywords = ['appointment', 'schedule', 'booking', 'when can you come']
-        if any(keyword in transcription_lower for keyword in scheduling_keywords):
-            return CallCategory.APPOINTMENT_SCHEDULING
+        customer_experience = {
+            'first_call_resolution': hits.any('resolution'),
+            'callback_required': hits.any('callback'),
+            'escalation_needed': hits.any('escalation'),
+            'complaint_risk': _complaint_risk_score(
+                len(hits.matched('sentiment_negative')), len(hits.matched('sentiment_positive'))
+            )
+        }
         
-        # Sales indicators
-        sales_keywords = ['quote', 'estimate', 'price', 'cost', 'how much']
-        if any(keyword in transcription_lower for keyword in sales_keywords):
-            return CallCategory.SALES_INQUIRY
+        return {
+            'category': category,
+            'conversation': conversation,
+            'compliance': compliance,
+            'brand': brand,
+            'customer_experience': customer_experience
+        }
+    
+    def _categorize_call(self, transcription: str, call_data: Dict) -> CallCategory:
+        """Categorize call based on content and context"""
+        transcription_lower = transcription.lower()
         
-        # Technical support indicators
-        tech_keywords = ['how to', 'broken', 'not working', 'fix', 'repair']
-        if any(keyword in transcription_lower for keyword in tech_keywords):
-            return CallCategory.TECHNICAL_SUPPORT
+        # First matching category wins: emergency, complaint, scheduling, sales, technical
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            if any(keyword in transcription_lower for keyword in keywords):
+                return category
         
         return CallCategory.CUSTOMER_SERVICE
     
@@ -439,13 +664,13 @@ class VoiceQualityAssurance:
             # Check for required elements
             required_elements = self.quality_standards['greeting_required_elements']
             
-            if any(element in first_greeting for element in ['757 handy', 'company']):
+            if any(element in first_greeting for element in GREETING_RULES['greeting_company']):
                 score += 0.3  # Company name
             
-            if any(element in first_greeting for element in ['karen', 'my name', 'this is']):
+            if any(element in first_greeting for element in GREETING_RULES['greeting_agent']):
                 score += 0.3  # Agent identification
             
-            if any(element in first_greeting for element in ['help', 'assist', 'serve']):
+            if any(element in first_greeting for element in GREETING_RULES['greeting_offer']):
                 score += 0.4  # Helpful offer
             
             return min(1.0, score)
@@ -466,16 +691,16 @@ class VoiceQualityAssurance:
             score = 0.0
             
             # Check for closing elements
-            if any(word in closing_content for word in ['thank', 'appreciate']):
+            if any(word in closing_content for word in CLOSING_RULES['closing_thanks']):
                 score += 0.3
             
-            if any(word in closing_content for word in ['anything else', 'other questions']):
+            if any(word in closing_content for word in CLOSING_RULES['closing_more_help']):
                 score += 0.3
             
-            if any(word in closing_content for word in ['have a great', 'wonderful day']):
+            if any(word in closing_content for word in CLOSING_RULES['closing_farewell']):
                 score += 0.2
             
-            if any(word in closing_content for word in ['follow up', 'call back', 'contact']):
+            if any(word in closing_content for word in CLOSING_RULES['closing_follow_up']):
                 score += 0.2
             
             return min(1.0, score)
@@ -522,10 +747,9 @@ class VoiceQualityAssurance:
         """Analyze dead air duration"""
         try:
             # Look for indicators of dead air
-            dead_air_indicators = ['[pause]', '[silence]', '...', '[dead air]']
             total_dead_air = 0.0
             
-            for indicator in dead_air_indicators:
+            for indicator in TRANSCRIPT_RULES['dead_air']:
                 count = transcription.lower().count(indicator.lower())
                 total_dead_air += count * 3.0  # Estimate 3 seconds per indicator
             
@@ -538,11 +762,10 @@ class VoiceQualityAssurance:
     def _count_filler_words(self, transcription: str) -> int:
         """Count filler words in agent speech"""
         try:
-            filler_words = ['um', 'uh', 'like', 'you know', 'so', 'well', 'actually']
             transcription_lower = transcription.lower()
             
             total_count = 0
-            for filler in filler_words:
+            for filler in TRANSCRIPT_RULES['filler_words']:
                 total_count += transcription_lower.count(filler)
             
             return total_count
@@ -554,26 +777,15 @@ class VoiceQualityAssurance:
     def _assess_information_accuracy(self, transcription: str) -> float:
         """Assess accuracy of information provided"""
         try:
-            # Look for indicators of accurate information
-            accuracy_indicators = [
-                'let me check', 'according to', 'our records show',
-                'I can confirm', 'verified', 'accurate'
-            ]
-            
-            inaccuracy_indicators = [
-                'I think', 'maybe', 'probably', 'I guess',
-                'not sure', 'might be'
-            ]
-            
             transcription_lower = transcription.lower()
             
             accuracy_score = 0.7  # Base score
             
-            for indicator in accuracy_indicators:
+            for indicator in TRANSCRIPT_RULES['accuracy']:
                 if indicator in transcription_lower:
                     accuracy_score += 0.1
             
-            for indicator in inaccuracy_indicators:
+            for indicator in TRANSCRIPT_RULES['inaccuracy']:
                 if indicator in transcription_lower:
                     accuracy_score -= 0.1
             
@@ -586,16 +798,10 @@ class VoiceQualityAssurance:
     def _analyze_empathy(self, transcription: str) -> float:
         """Analyze demonstrated empathy"""
         try:
-            empathy_phrases = [
-                'I understand', 'I can imagine', 'I appreciate',
-                'I\'m sorry', 'that must be', 'I hear you',
-                'I know how', 'frustrating', 'concerning'
-            ]
-            
             transcription_lower = transcription.lower()
             empathy_score = 0.0
             
-            for phrase in empathy_phrases:
+            for phrase in TRANSCRIPT_RULES['empathy']:
                 if phrase in transcription_lower:
                     empathy_score += 0.15
             
@@ -608,23 +814,12 @@ class VoiceQualityAssurance:
     def _analyze_hold_time_management(self, transcription: str) -> float:
         """Analyze hold time management"""
         try:
-            hold_indicators = ['hold', 'please wait', 'one moment', 'checking']
-            explanation_indicators = ['checking with', 'looking up', 'verifying']
-            
             transcription_lower = transcription.lower()
             
-            has_hold = any(indicator in transcription_lower for indicator in hold_indicators)
-            has_explanation = any(indicator in transcription_lower for indicator in explanation_indicators)
+            has_hold = any(indicator in transcription_lower for indicator in TRANSCRIPT_RULES['hold'])
+            has_explanation = any(indicator in transcription_lower for indicator in TRANSCRIPT_RULES['hold_explanation'])
             
-            if not has_hold:
-                return 1.0  # No hold time needed
-            
-            if has_hold and has_explanation:
-                return 0.8  # Good hold management
-            elif has_hold:
-                return 0.5  # Hold without explanation
-            
-            return 1.0
+            return _hold_time_score(has_hold, has_explanation)
             
         except Exception as e:
             logger.error(f"Error analyzing hold time management: {e}")
@@ -632,6 +827,9 @@ class VoiceQualityAssurance:
     
     async def _analyze_audio_quality(self, recording_url: str) -> Dict[str, Any]:
         """Analyze technical audio quality"""
+        return self._audio_quality_for(recording_url)
+    
+    def _audio_quality_for(self, recording_url: str) -> Dict[str, Any]:
         try:
             if not recording_url:
                 return self._get_default_audio_analysis()
@@ -688,38 +886,33 @@ class VoiceQualityAssurance:
     def _check_privacy_compliance(self, transcription: str) -> bool:
         """Check privacy compliance"""
         # Look for proper identity verification
-        verification_phrases = ['can you verify', 'confirm your', 'for security']
         transcription_lower = transcription.lower()
         
-        return any(phrase in transcription_lower for phrase in verification_phrases)
+        return any(phrase in transcription_lower for phrase in TRANSCRIPT_RULES['privacy_verification'])
     
     def _check_safety_protocols(self, transcription: str) -> bool:
         """Check if safety protocols were followed"""
         # Look for safety warnings when appropriate
-        safety_phrases = ['safety', 'turn off', 'shut off', 'danger', 'hazard']
         transcription_lower = transcription.lower()
         
         # If emergency keywords present, check for safety response
-        emergency_keywords = ['emergency', 'gas', 'electrical', 'flood']
-        has_emergency = any(keyword in transcription_lower for keyword in emergency_keywords)
+        has_emergency = any(keyword in transcription_lower for keyword in TRANSCRIPT_RULES['safety_emergency'])
         
         if has_emergency:
-            return any(phrase in transcription_lower for phrase in safety_phrases)
+            return any(phrase in transcription_lower for phrase in TRANSCRIPT_RULES['safety_response'])
         
         return True  # No emergency, no safety protocol needed
     
     def _check_company_policies(self, transcription: str) -> bool:
         """Check adherence to company policies"""
         # Check for proper pricing discussion
-        pricing_keywords = ['price', 'cost', 'charge', 'fee']
         transcription_lower = transcription.lower()
         
-        has_pricing_discussion = any(keyword in transcription_lower for keyword in pricing_keywords)
+        has_pricing_discussion = any(keyword in transcription_lower for keyword in TRANSCRIPT_RULES['pricing'])
         
         if has_pricing_discussion:
             # Should mention estimates or scheduling
-            estimate_phrases = ['estimate', 'quote', 'assessment', 'schedule']
-            return any(phrase in transcription_lower for phrase in estimate_phrases)
+            return any(phrase in transcription_lower for phrase in TRANSCRIPT_RULES['pricing_estimate'])
         
         return True
     
@@ -785,22 +978,16 @@ class VoiceQualityAssurance:
     def _assess_customer_experience(self, transcription: str, call_data: Dict) -> Dict[str, Any]:
         """Assess overall customer experience"""
         try:
-            # Determine first call resolution
-            fcr_indicators = [
-                'resolved', 'scheduled', 'taken care of',
-                'all set', 'problem solved'
-            ]
             transcription_lower = transcription.lower()
             
-            first_call_resolution = any(indicator in transcription_lower for indicator in fcr_indicators)
+            # Determine first call resolution
+            first_call_resolution = any(indicator in transcription_lower for indicator in TRANSCRIPT_RULES['resolution'])
             
             # Check if callback required
-            callback_indicators = ['call you back', 'follow up', 'check and call']
-            callback_required = any(indicator in transcription_lower for indicator in callback_indicators)
+            callback_required = any(indicator in transcription_lower for indicator in TRANSCRIPT_RULES['callback'])
             
             # Check for escalation
-            escalation_indicators = ['supervisor', 'manager', 'escalate', 'transfer']
-            escalation_needed = any(indicator in transcription_lower for indicator in escalation_indicators)
+            escalation_needed = any(indicator in transcription_lower for indicator in TRANSCRIPT_RULES['escalation'])
             
             # Assess complaint risk
             complaint_risk = self._assess_complaint_risk(transcription)
@@ -824,27 +1011,12 @@ class VoiceQualityAssurance:
     def _assess_complaint_risk(self, transcription: str) -> float:
         """Assess risk of customer complaint"""
         try:
-            negative_indicators = [
-                'frustrated', 'disappointed', 'unhappy', 'angry',
-                'terrible', 'awful', 'worst', 'unacceptable'
-            ]
-            
-            positive_indicators = [
-                'satisfied', 'happy', 'pleased', 'excellent',
-                'great', 'wonderful', 'perfect', 'amazing'
-            ]
-            
             transcription_lower = transcription.lower()
             
-            negative_count = sum(1 for indicator in negative_indicators if indicator in transcription_lower)
-            positive_count = sum(1 for indicator in positive_indicators if indicator in transcription_lower)
+            negative_count = sum(1 for indicator in TRANSCRIPT_RULES['sentiment_negative'] if indicator in transcription_lower)
+            positive_count = sum(1 for indicator in TRANSCRIPT_RULES['sentiment_positive'] if indicator in transcription_lower)
             
-            # Calculate risk score
-            risk_score = 0.1  # Base risk
-            risk_score += negative_count * 0.2
-            risk_score -= positive_count * 0.1
-            
-            return max(0.0, min(1.0, risk_score))
+            return _complaint_risk_score(negative_count, positive_count)
             
         except Exception as e:
             logger.error(f"Error assessing complaint risk: {e}")
@@ -1016,35 +1188,101 @@ class VoiceQualityAssurance:
         
         return flags
     
-    async def _store_quality_metrics(self, quality_metrics: QualityMetrics):
-        """Store quality metrics for reporting and analysis"""
+    async def _store_quality_metrics(self, *metrics_batch: QualityMetrics):
+        """
+        Store quality metrics for reporting and analysis. Any number of calls
+        is written in one pipeline, together with the per-day (and per-agent)
+        aggregates generate_quality_report reads. Re-scoring a call replaces
+        its earlier contribution to the aggregates instead of adding to it.
+        """
         try:
-            if self.redis_client:
-                metrics_data = asdict(quality_metrics)
-                
-                # Convert datetime and enum values for storage
-                metrics_data['timestamp'] = quality_metrics.timestamp.isoformat()
-                metrics_data['category'] = quality_metrics.category.value
+            if self.redis_client and metrics_batch:
+                latest = {quality_metrics.call_sid: quality_metrics for quality_metrics in metrics_batch}
+                read = self.redis_client.pipeline(transaction=False)
+                for call_sid in latest:
+                    read.hgetall(f"quality_metrics:{call_sid}")
+                previous = read.execute()
                 
-                for field in ['overall_quality', 'professionalism', 'communication_clarity', 
-                             'problem_resolution', 'customer_satisfaction', 'brand_adherence']:
-                    metrics_data[field] = getattr(quality_metrics, field).value
+                pipe = self.redis_client.pipeline(transaction=False)
+                deltas: Dict[str, Dict[str, int]] = {}
+                for quality_metrics, stored in zip(latest.values(), previous):
+                    # Store in Redis
+                    metrics_key = f"quality_metrics:{quality_metrics.call_sid}"
+                    mapping = self._metrics_mapping(quality_metrics)
+                    pipe.hset(metrics_key, mapping=mapping)
+                    pipe.expire(metrics_key, QUALITY_METRICS_TTL_SECONDS)
+                    
+                    # Add to time-series for reporting
+                    day_key = quality_metrics.timestamp.strftime('%Y-%m-%d')
+                    if not stored:
+                        pipe.lpush(f"daily_quality:{day_key}", quality_metrics.call_sid)
+                        pipe.expire(f"daily_quality:{day_key}", QUALITY_METRICS_TTL_SECONDS)
+                    
+                    self._add_to_daily_stats(deltas, mapping, 1)
+                    if stored:
+                        self._add_to_daily_stats(deltas, stored, -1)
                 
-                # Store in Redis
-                metrics_key = f"quality_metrics:{quality_metrics.call_sid}"
-                self.redis_client.hset(metrics_key, mapping=metrics_data)
-                self.redis_client.expire(metrics_key, 2592000)  # 30 day retention
-                
-                # Add to time-series for reporting
-                day_key = quality_metrics.timestamp.strftime('%Y-%m-%d')
-                self.redis_client.lpush(f"daily_quality:{day_key}", quality_metrics.call_sid)
-                self.redis_client.expire(f"daily_quality:{day_key}", 2592000)
-            
-            logger.info(f"Quality metrics stored for call {quality_metrics.call_sid}")
+                for stats_key, counts in deltas.items():
+                    for field, amount in counts.items():
+                        if amount:
+                            pipe.hincrby(stats_key, field, amount)
+                    pipe.expire(stats_key, QUALITY_METRICS_TTL_SECONDS)
+                pipe.execute()
+            
+            if len(metrics_batch) == 1:
+                logger.info(f"Quality metrics stored for call {metrics_batch[0].call_sid}")
+            else:
+                logger.info(f"Quality metrics stored for {len(metrics_batch)} calls")
             
         except Exception as e:
             logger.error(f"Failed to store quality metrics: {e}")
     
+    @staticmethod
+    def _metrics_mapping(quality_metrics: QualityMetrics) -> Dict[str, Any]:
+        """Redis-safe hash fields: enums by value, lists as JSON, bools as strings"""
+        metrics_data = {}
+        for field, value in asdict(quality_metrics).items():
+            if value is None:
+                continue
+            if isinstance(value, Enum):
+                value = value.value
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, list):
+                value = json.dumps(value)
+            elif isinstance(value, bool):
+                value = str(value)
+            metrics_data[field] = value
+        return metrics_data
+    
+    @staticmethod
+    def _daily_stats_key(day: str, agent_id: Optional[str] = None) -> str:
+        return f"quality_daily_stats:{day}:agent:{agent_id}" if agent_id else f"quality_daily_stats:{day}"
+    
+    @classmethod
+    def _add_to_daily_stats(cls, deltas: Dict[str, Dict[str, int]], mapping: Dict[str, Any], sign: int):
+        """Add (or with sign=-1 remove) one call's stored metrics to its day and agent aggregates"""
+        day_key = datetime.fromisoformat(mapping['timestamp']).strftime('%Y-%m-%d')
+        stats_keys = [cls._daily_stats_key(day_key)]
+        if mapping.get('agent_id'):
+            stats_keys.append(cls._daily_stats_key(day_key, mapping['agent_id']))
+        
+        overall = int(mapping['overall_quality'])
+        counts = {'total_calls': 1, 'overall_score_sum': overall, f"overall:{QualityScore(overall).name}": 1}
+        if all(mapping.get(field) == 'True' for field in
+               ('privacy_compliance', 'safety_protocols_followed', 'company_policies_followed')):
+            counts['compliant_calls'] = 1
+        if mapping.get('first_call_resolution') == 'True':
+            counts['first_call_resolutions'] = 1
+        for prefix, field in (('flag', 'quality_flags'), ('improvement', 'improvement_areas')):
+            for name in json.loads(mapping.get(field, '[]')):
+                counts[f"{prefix}:{name}"] = counts.get(f"{prefix}:{name}", 0) + 1
+        
+        for stats_key in stats_keys:
+            totals = deltas.setdefault(stats_key, {})
+            for field, amount in counts.items():
+                totals[field] = totals.get(field, 0) + sign * amount
+    
     async def _check_quality_alerts(self, quality_metrics: QualityMetrics):
         """Check for quality alerts requiring immediate attention"""
         try:
@@ -1187,28 +1425,91 @@ class VoiceQualityAssurance:
     # Reporting and analytics methods
     async def generate_quality_report(self, time_range: str = '24h', 
                                     agent_id: Optional[str] = None) -> Dict[str, Any]:
-        """Generate comprehensive quality report"""
+        """
+        Generate comprehensive quality report from the daily aggregates kept
+        by _store_quality_metrics. `time_range` is a count of hours or days
+        ('24h', '7d', '30d'); every calendar day it touches is included.
+        """
         try:
-            # This would implement detailed quality reporting
-            # For now, return structure
+            match = re.fullmatch(r'(\d+)([hd])', time_range.strip().lower())
+            if not match:
+                raise ValueError(f"Unsupported time range: {time_range}")
+            amount, unit = int(match.group(1)), match.group(2)
+            now = datetime.now()
+            first_day = (now - (timedelta(hours=amount) if unit == 'h' else timedelta(days=amount))).date()
+            days = [(first_day + timedelta(days=offset)).strftime('%Y-%m-%d')
+                    for offset in range((now.date() - first_day).days + 1)]
+            
+            daily_stats = []
+            if self.redis_client:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for day in days:
+                    pipe.hgetall(self._daily_stats_key(day, agent_id))
+                daily_stats = pipe.execute()
+            
+            total_calls = score_sum = compliant = resolved = 0
+            distribution: Dict[str, int] = {}
+            issues: Dict[str, int] = {}
+            improvement_areas: Dict[str, int] = {}
+            daily_average: Dict[str, float] = {}
+            daily_calls: Dict[str, int] = {}
+            for day, stats in zip(days, daily_stats):
+                calls = int(stats.get('total_calls', 0))
+                if not calls:
+                    continue
+                total_calls += calls
+                score_sum += int(stats.get('overall_score_sum', 0))
+                compliant += int(stats.get('compliant_calls', 0))
+                resolved += int(stats.get('first_call_resolutions', 0))
+                daily_calls[day] = calls
+                daily_average[day] = round(int(stats.get('overall_score_sum', 0)) / calls, 2)
+                for field, value in stats.items():
+                    prefix, _, name = field.partition(':')
+                    target = {'overall': distribution, 'flag': issues, 'improvement': improvement_areas}.get(prefix)
+                    # Re-scored calls can leave a bucket at zero
+                    if target is not None and name and int(value):
+                        target[name] = target.get(name, 0) + int(value)
+            
             return {
                 'time_range': time_range,
                 'agent_id': agent_id,
                 'summary': {
-                    'total_calls_analyzed': 0,
-                    'average_quality_score': 0.0,
-                    'quality_distribution': {},
-                    'compliance_rate': 0.0
+                    'total_calls_analyzed': total_calls,
+                    'average_quality_score': round(score_sum / total_calls, 2) if total_calls else 0.0,
+                    'quality_distribution': distribution,
+                    'compliance_rate': compliant / total_calls if total_calls else 0.0,
+                    'first_call_resolution_rate': resolved / total_calls if total_calls else 0.0
+                },
+                'trends': {
+                    'daily_average_quality': daily_average,
+                    'daily_calls': daily_calls
                 },
-                'trends': {},
-                'top_issues': [],
-                'recommendations': []
+                'top_issues': [
+                    {'flag': flag, 'count': count}
+                    for flag, count in sorted(issues.items(), key=lambda item: -item[1])[:5]
+                ],
+                'recommendations': [
+                    area for area, _ in sorted(improvement_areas.items(), key=lambda item: -item[1])[:5]
+                ]
             }
             
         except Exception as e:
             logger.error(f"Failed to generate quality report: {e}")
             return {'error': str(e)}
 
+# Batch scoring workers: one analyzer per process, built from the parent's settings
+_worker_qa: Optional[VoiceQualityAssurance] = None
+
+def _init_scoring_worker(brand_voice_criteria: Dict[str, Any], scoring_weights: Dict[str, float]):
+    global _worker_qa
+    _worker_qa = VoiceQualityAssurance(use_redis=False)
+    _worker_qa.brand_voice_criteria = brand_voice_criteria
+    _worker_qa.scoring_weights = scoring_weights
+    _worker_qa.compile_lexical_rules()
+
+def _score_call_in_worker(call_data: Dict[str, Any]) -> QualityMetrics:
+    return _worker_qa._score_call_or_error(call_data)
+
 if __name__ == "__main__":
     # Test the quality assurance system
     import asyncio
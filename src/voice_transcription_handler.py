@@ -13,7 +13,8 @@ import logging
 import asyncio
 import aiohttp
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, AsyncIterator
+from urllib.parse import urlparse
 from dataclasses import dataclass, asdict
 from enum import Enum
 import speech_recognition as sr
@@ -23,6 +24,9 @@ import openai
 # Email and SMS notification imports
 from .email_client import EmailClient
 from .sms_client import SMSClient
+from .transcription_pipeline import (
+    AudioBuffer, combine_chunk_results, empty_result, race_transcriptions, transcribe_chunks
+)
 
 logger = logging.getLogger(__name__)
 
@@ -74,6 +78,7 @@ class VoiceTranscriptionHandler:
     """
     Advanced transcription system with:
     - Multiple transcription engines (Google Cloud Speech, OpenAI Whisper)
+      raced concurrently on one shared download, chunked for long voicemails
     - Emergency keyword detection
     - Smart categorization and routing
     - Priority-based notifications
@@ -101,6 +106,13 @@ class VoiceTranscriptionHandler:
         except Exception as e:
             logger.warning(f"OpenAI not available: {e}")
         
+        # Engine racing and streaming settings
+        self.confidence_threshold = float(os.getenv('TRANSCRIPTION_CONFIDENCE_THRESHOLD', '0.7'))
+        self.engine_timeout_seconds = float(os.getenv('TRANSCRIPTION_ENGINE_TIMEOUT', '90'))
+        self.streaming_chunk_seconds = int(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', '45'))
+        self.streaming_lookahead = int(os.getenv('TRANSCRIPTION_CHUNK_LOOKAHEAD', '2'))
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        
         # Initialize notification systems
         self.email_client = EmailClient(
             email_address=os.getenv('ADMIN_EMAIL_ADDRESS', 'admin@757handy.com')
@@ -171,7 +183,7 @@ class VoiceTranscriptionHandler:
             )
             
             # Download and transcribe audio
-            transcription_result = await self._transcribe_audio(recording_url)
+            transcription_result = await self._transcribe_audio(recording_url, duration)
             voicemail.transcription = transcription_result['text']
             voicemail.confidence = transcription_result['confidence']
             
@@ -203,51 +215,96 @@ class VoiceTranscriptionHandler:
             await self._send_error_notification(call_sid, str(e))
             raise
     
-    async def _transcribe_audio(self, recording_url: str) -> Dict[str, Any]:
+    async def _transcribe_audio(self, recording_url: str, duration: int = 0) -> Dict[str, Any]:
         """
-        Transcribe audio using multiple engines for best accuracy
+        Transcribe audio using multiple engines for best accuracy.
+        
+        The recording is downloaded once and shared; Google and Whisper race
+        concurrently (see transcription_pipeline.race_transcriptions) and
+        speech_recognition is only tried if neither is usable. Recordings
+        longer than one streaming chunk are transcribed chunk by chunk.
         """
-        transcription_result = {
-            'text': '',
-            'confidence': 0.0,
-            'engine': 'none'
-        }
+        transcription_result = empty_result()
+        audio = self._audio_buffer(recording_url)
         
         try:
-            # Try Google Cloud Speech first (most accurate for phone calls)
-            if self.google_speech_client:
-                result = await self._transcribe_with_google(recording_url)
-                if result['confidence'] > 0.7:
-                    return result
-                transcription_result = result
+            if self.streaming_chunk_seconds and duration > self.streaming_chunk_seconds:
+                chunk_results = [result async for result in self.stream_transcription(recording_url, audio)]
+                return combine_chunk_results(chunk_results)
             
-            # Fallback to OpenAI Whisper
-            if self.openai_client:
-                result = await self._transcribe_with_whisper(recording_url)
-                if result['confidence'] > transcription_result['confidence']:
-                    transcription_result = result
-            
-            # Ultimate fallback to speech_recognition library
-            if transcription_result['confidence'] < 0.5:
-                result = await self._transcribe_with_sr(recording_url)
-                if result['confidence'] > transcription_result['confidence']:
-                    transcription_result = result
+            transcription_result = await self._race_engines(recording_url, audio)
             
         except Exception as e:
             logger.error(f"Transcription failed: {e}")
+        finally:
+            audio.cleanup()
         
         return transcription_result
     
-    async def _transcribe_with_google(self, recording_url: str) -> Dict[str, Any]:
+    async def stream_transcription(self, recording_url: str,
+                                   audio: Optional[AudioBuffer] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield transcription results chunk by chunk, in order, as they complete.
+        Each result carries 'offset_seconds' into the recording.
+        """
+        owns_audio = audio is None
+        audio = audio or self._audio_buffer(recording_url)
+        chunks: List[AudioBuffer] = []
+        try:
+            chunks = await audio.split(self.streaming_chunk_seconds)
+            async for result in transcribe_chunks(
+                    chunks, lambda chunk: self._race_engines(recording_url, chunk),
+                    lookahead=self.streaming_lookahead):
+                logger.debug(f"Partial transcription at {result['offset_seconds']:.0f}s "
+                             f"({result.get('engine')}): {result.get('text', '')[:60]}")
+                yield result
+        finally:
+            for chunk in chunks:
+                chunk.cleanup()
+            if owns_audio:
+                audio.cleanup()
+    
+    async def _race_engines(self, recording_url: str, audio: AudioBuffer) -> Dict[str, Any]:
+        """Race the configured engines on one buffer, falling back to speech_recognition"""
+        engines = []
+        if self.google_speech_client:
+            engines.append(('google', lambda buffer: self._transcribe_with_google(recording_url, buffer)))
+        if self.openai_client:
+            engines.append(('whisper', lambda buffer: self._transcribe_with_whisper(recording_url, buffer)))
+        
+        transcription_result = await race_transcriptions(
+            engines, audio, self.confidence_threshold, timeout=self.engine_timeout_seconds
+        )
+        
+        # Ultimate fallback to speech_recognition library
+        if transcription_result['confidence'] < 0.5:
+            result = await self._transcribe_with_sr(recording_url, audio)
+            if result['confidence'] > transcription_result['confidence']:
+                transcription_result = result
+        
+        return transcription_result
+    
+    def _audio_buffer(self, recording_url: str) -> AudioBuffer:
+        """Lazily-downloaded buffer shared by every engine for one recording"""
+        suffix = os.path.splitext(urlparse(recording_url).path)[1] or '.wav'
+        return AudioBuffer(loader=lambda: self._download_audio(recording_url), suffix=suffix)
+    
+    async def _transcribe_with_google(self, recording_url: str,
+                                      audio: Optional[AudioBuffer] = None) -> Dict[str, Any]:
         """Transcribe using Google Cloud Speech-to-Text"""
         try:
-            # Download audio
-            audio_content = await self._download_audio(recording_url)
+            # Download audio unless a shared buffer was provided
+            audio_content = await audio.read() if audio else await self._download_audio(recording_url)
+            wav_info = audio.wav_info() if audio else None
             
             # Configure recognition
+            if wav_info:
+                encoding, sample_rate = speech.RecognitionConfig.AudioEncoding.LINEAR16, wav_info[0]
+            else:
+                encoding, sample_rate = speech.RecognitionConfig.AudioEncoding.MP3, 8000  # Phone quality
             config = speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.MP3,
-                sample_rate_hertz=8000,  # Phone quality
+                encoding=encoding,
+                sample_rate_hertz=sample_rate,
                 language_code="en-US",
                 enable_automatic_punctuation=True,
                 enable_word_confidence=True,
@@ -255,18 +312,21 @@ class VoiceTranscriptionHandler:
                 use_enhanced=True
             )
             
-            audio = speech.RecognitionAudio(content=audio_content)
+            recognition_audio = speech.RecognitionAudio(content=audio_content)
             
-            # Perform transcription
-            response = self.google_speech_client.recognize(config=config, audio=audio)
+            # Perform transcription off the event loop so other engines can run
+            response = await asyncio.to_thread(
+                self.google_speech_client.recognize, config=config, audio=recognition_audio
+            )
             
             if response.results:
-                result = response.results[0]
-                confidence = result.alternatives[0].confidence if result.alternatives[0].confidence else 0.8
+                # Longer audio comes back as several consecutive results
+                alternatives = [result.alternatives[0] for result in response.results if result.alternatives]
+                confidences = [alt.confidence if alt.confidence else 0.8 for alt in alternatives]
                 
                 return {
-                    'text': result.alternatives[0].transcript,
-                    'confidence': confidence,
+                    'text': ' '.join(alt.transcript.strip() for alt in alternatives),
+                    'confidence': sum(confidences) / len(confidences),
                     'engine': 'google'
                 }
         
@@ -275,22 +335,25 @@ class VoiceTranscriptionHandler:
         
         return {'text': '', 'confidence': 0.0, 'engine': 'google_failed'}
     
-    async def _transcribe_with_whisper(self, recording_url: str) -> Dict[str, Any]:
+    async def _transcribe_with_whisper(self, recording_url: str,
+                                       audio: Optional[AudioBuffer] = None) -> Dict[str, Any]:
         """Transcribe using OpenAI Whisper"""
         try:
-            # Download audio
-            audio_file_path = await self._download_audio_to_file(recording_url)
+            # Shared buffers own their temp file; otherwise download to a throwaway one
+            audio_file_path = await audio.as_file() if audio else await self._download_audio_to_file(recording_url)
             
             # Transcribe with Whisper
-            with open(audio_file_path, 'rb') as audio_file:
-                transcript = self.openai_client.Audio.transcribe(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="verbose_json"
-                )
-            
-            # Clean up temp file
-            os.unlink(audio_file_path)
+            try:
+                with open(audio_file_path, 'rb') as audio_file:
+                    transcript = await asyncio.to_thread(
+                        self.openai_client.Audio.transcribe,
+                        model="whisper-1",
+                        file=audio_file,
+                        response_format="verbose_json"
+                    )
+            finally:
+                if not audio:
+                    os.unlink(audio_file_path)
             
             # Estimate confidence based on Whisper's behavior
             confidence = 0.85 if len(transcript.text) > 10 else 0.6
@@ -306,25 +369,24 @@ class VoiceTranscriptionHandler:
         
         return {'text': '', 'confidence': 0.0, 'engine': 'whisper_failed'}
     
-    async def _transcribe_with_sr(self, recording_url: str) -> Dict[str, Any]:
+    async def _transcribe_with_sr(self, recording_url: str,
+                                  audio: Optional[AudioBuffer] = None) -> Dict[str, Any]:
         """Transcribe using speech_recognition library (fallback)"""
         try:
-            import speech_recognition as sr
-            
-            # Download audio
-            audio_file_path = await self._download_audio_to_file(recording_url)
+            audio_file_path = await audio.as_file() if audio else await self._download_audio_to_file(recording_url)
             
-            # Initialize recognizer
-            r = sr.Recognizer()
+            def recognize() -> str:
+                r = sr.Recognizer()
+                with sr.AudioFile(audio_file_path) as source:
+                    recorded = r.record(source)
+                # Try Google Web Speech API
+                return r.recognize_google(recorded)
             
-            with sr.AudioFile(audio_file_path) as source:
-                audio = r.record(source)
-            
-            # Try Google Web Speech API
-            text = r.recognize_google(audio)
-            
-            # Clean up temp file
-            os.unlink(audio_file_path)
+            try:
+                text = await asyncio.to_thread(recognize)
+            finally:
+                if not audio:
+                    os.unlink(audio_file_path)
             
             return {
                 'text': text,
@@ -337,14 +399,29 @@ class VoiceTranscriptionHandler:
         
         return {'text': '', 'confidence': 0.0, 'engine': 'sr_failed'}
     
+    async def _get_http_session(self) -> aiohttp.ClientSession:
+        """Pooled HTTP session reused across recording downloads"""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=120)
+            )
+        return self._http_session
+    
+    async def close(self):
+        """Release the pooled HTTP session"""
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+    
     async def _download_audio(self, recording_url: str) -> bytes:
         """Download audio content"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(recording_url) as response:
-                if response.status == 200:
-                    return await response.read()
-                else:
-                    raise Exception(f"Failed to download audio: {response.status}")
+        session = await self._get_http_session()
+        async with session.get(recording_url) as response:
+            if response.status == 200:
+                return await response.read()
+            else:
+                raise Exception(f"Failed to download audio: {response.status}")
     
     async def _download_audio_to_file(self, recording_url: str) -> str:
         """Download audio to temporary file"""
@@ -8,74 +8,142 @@ Author: Phone Engineer Agent
 
 import os
 import json
+import time
 import logging
-import redis
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Any
+from typing import Callable, Dict, Optional, Any, Set, Tuple
 from fastapi import FastAPI, Request, Form, HTTPException, Depends
 from fastapi.responses import Response
 from twilio.twiml.voice_response import VoiceResponse, Gather, Say, Record, Dial
-from twilio.rest import Client as TwilioClient
 import asyncio
 
-from .business_hours_manager import BusinessHoursManager
-from .voice_ivr_system import VoiceIVRSystem
-from .voice_transcription_handler import VoiceTranscriptionHandler
-from .calendar_client import CalendarClient
-from .elevenlabs_voice_handler import ElevenLabsVoiceHandler, EmotionStyle, enhance_twiml_with_elevenlabs
-from .voice_call_analytics import VoiceCallAnalytics
-from .voice_emergency_handler import EmergencyHandler, EmergencyAssessment
-from .voice_quality_assurance import VoiceQualityAssurance
+from .twiml_templates import TwiMLTemplateCache
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# Subsystem factories. Imports live inside them so that importing this module
+# stays cheap and nothing heavier than FastAPI runs before the first call.
+def _create_twilio_client():
+    from twilio.rest import Client as TwilioClient
+    return TwilioClient(
+        os.getenv('TWILIO_ACCOUNT_SID'),
+        os.getenv('TWILIO_AUTH_TOKEN')
+    )
+
+def _create_business_hours():
+    from .business_hours_manager import BusinessHoursManager
+    return BusinessHoursManager()
+
+def _create_ivr_system():
+    from .voice_ivr_system import VoiceIVRSystem
+    return VoiceIVRSystem()
+
+def _create_transcription_handler():
+    from .voice_transcription_handler import VoiceTranscriptionHandler
+    return VoiceTranscriptionHandler()
+
+def _create_analytics():
+    from .voice_call_analytics import VoiceCallAnalytics
+    return VoiceCallAnalytics()
+
+def _create_emergency_handler():
+    from .voice_emergency_handler import EmergencyHandler
+    return EmergencyHandler()
+
+def _create_quality_assurance():
+    from .voice_quality_assurance import VoiceQualityAssurance
+    return VoiceQualityAssurance()
+
+def _create_elevenlabs_handler():
+    try:
+        from .elevenlabs_voice_handler import get_elevenlabs_voice_handler
+        handler = get_elevenlabs_voice_handler()
+        logger.info("ElevenLabs voice system initialized")
+        return handler
+    except Exception as e:
+        logger.warning(f"ElevenLabs not available, using fallback TTS: {e}")
+        return None
+
+def _create_redis_client():
+    """Async client over a bounded pool; callers wait for a free connection instead of failing"""
+    import redis.asyncio as aioredis
+    pool = aioredis.BlockingConnectionPool(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=int(os.getenv('REDIS_DB', 0)),
+        max_connections=int(os.getenv('VOICE_REDIS_MAX_CONNECTIONS', 50)),
+        timeout=2,
+        socket_connect_timeout=1,
+        socket_timeout=1,
+        decode_responses=True
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+class _Subsystem:
+    """Handler attribute built by `factory` on first access, exactly once across threads"""
+    
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+    
+    def __get__(self, handler, owner=None):
+        if handler is None:
+            return self
+        return handler._build_subsystem(self.name)
+
+
 class VoiceWebhookHandler:
     """
     Premium voice call handling system for 757 Handy
     Creates professional customer experience with intelligent routing
+    
+    Subsystems are built on first use (or by start() in the background), and
+    every webhook reaches Redis through a pooled asyncio client, so answering
+    a call never blocks the event loop on I/O or on a subsystem starting up.
     """
     
-    def __init__(self):
-        # Initialize Twilio client
-        self.twilio_client = TwilioClient(
-            os.getenv('TWILIO_ACCOUNT_SID'),
-            os.getenv('TWILIO_AUTH_TOKEN')
-        )
-        
-        # Initialize Redis for call tracking
-        try:
-            self.redis_client = redis.Redis(
-                host=os.getenv('REDIS_HOST', 'localhost'),
-                port=int(os.getenv('REDIS_PORT', 6379)),
-                db=int(os.getenv('REDIS_DB', 0)),
-                decode_responses=True
-            )
-            self.redis_client.ping()  # Test connection
-            logger.info("Redis connection established for call tracking")
-        except Exception as e:
-            logger.warning(f"Redis connection failed, using memory storage: {e}")
+    twilio_client = _Subsystem(_create_twilio_client)
+    business_hours = _Subsystem(_create_business_hours)
+    ivr_system = _Subsystem(_create_ivr_system)
+    transcription_handler = _Subsystem(_create_transcription_handler)
+    analytics = _Subsystem(_create_analytics)
+    emergency_handler = _Subsystem(_create_emergency_handler)
+    quality_assurance = _Subsystem(_create_quality_assurance)
+    elevenlabs_handler = _Subsystem(_create_elevenlabs_handler)
+    
+    # Built by start() so the first calls find them ready
+    WARM_SUBSYSTEMS = ('business_hours', 'elevenlabs_handler', 'emergency_handler', 'analytics',
+                       'ivr_system', 'transcription_handler', 'quality_assurance', 'twilio_client')
+    REDIS_RETRY_SECONDS = 30
+    MAX_VOICE_AUDIO_URLS = 256
+    
+    def __init__(self, redis_client=None, use_redis: bool = True):
+        self._subsystem_lock = threading.Lock()
+        
+        # Redis for call tracking; connections are opened on first use
+        if redis_client is not None:
+            self.redis_client = redis_client
+        elif use_redis:
+            self.redis_client = _create_redis_client()
+        else:
             self.redis_client = None
+        self._redis_retry_at = 0.0
+        self._business_hours_compiled = False
         
-        # Initialize subsystems
-        self.business_hours = BusinessHoursManager()
-        self.ivr_system = VoiceIVRSystem()
-        self.transcription_handler = VoiceTranscriptionHandler()
+        # ElevenLabs audio URLs by (context, text), filled in the background;
+        # the version changes whenever a prompt's audio changes
+        self._voice_audio_urls: Dict[Tuple[str, str], str] = {}
+        self._voice_audio_version = 0
+        self._background_tasks: Set[asyncio.Task] = set()
         
-        # Initialize analytics and quality systems
-        self.analytics = VoiceCallAnalytics()
-        self.emergency_handler = EmergencyHandler()
-        self.quality_assurance = VoiceQualityAssurance()
-        
-        # Initialize ElevenLabs for premium voice quality
-        try:
-            self.elevenlabs_handler = ElevenLabsVoiceHandler()
-            self.use_elevenlabs = True
-            logger.info("ElevenLabs voice system initialized")
-        except Exception as e:
-            logger.warning(f"ElevenLabs not available, using fallback TTS: {e}")
-            self.elevenlabs_handler = None
-            self.use_elevenlabs = False
+        # Responses compiled once per variant; see render_twiml()
+        self.twiml_templates = TwiMLTemplateCache()
         
         # Configuration
         self.company_name = "757 Handy"
@@ -85,15 +153,95 @@ class VoiceWebhookHandler:
         
         logger.info("VoiceWebhookHandler initialized for premium call experience with full analytics")
     
+    def _build_subsystem(self, name: str):
+        with self._subsystem_lock:
+            if name not in self.__dict__:
+                # Stored on the instance, so later lookups bypass the descriptor
+                self.__dict__[name] = getattr(type(self), name).factory()
+            return self.__dict__[name]
+    
+    def subsystem_ready(self, name: str) -> bool:
+        return name in self.__dict__
+    
+    async def get_subsystem(self, name: str):
+        """Subsystem for use on the event loop; building it happens in a worker thread"""
+        if name in self.__dict__:
+            return self.__dict__[name]
+        return await asyncio.to_thread(self._build_subsystem, name)
+    
+    @property
+    def use_elevenlabs(self) -> bool:
+        return self.elevenlabs_handler is not None
+    
+    async def start(self):
+        """Warm subsystems, the business hours timeline and static prompts without holding up calls"""
+        for name in self.WARM_SUBSYSTEMS:
+            try:
+                await self.get_subsystem(name)
+            except Exception as e:
+                logger.error(f"Failed to start voice subsystem {name}: {e}")
+        
+        try:
+            await self.is_business_hours()
+        except Exception as e:
+            logger.error(f"Failed to compile business hours: {e}")
+        
+        # Rendering the static prompts queues their premium audio
+        if self.use_elevenlabs:
+            self.generate_welcome_message(True, '')
+            self.generate_welcome_message(False, '')
+            self.generate_main_menu()
+        logger.info("Voice subsystems started")
+    
+    async def close(self):
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self.subsystem_ready('elevenlabs_handler') and self.elevenlabs_handler is not None:
+            await self.elevenlabs_handler.close_session()
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.aclose()
+            except Exception as e:
+                logger.debug(f"Error closing Redis pool: {e}")
+    
+    def _spawn(self, coroutine) -> asyncio.Task:
+        # Keep a reference so pending tasks are not garbage collected
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+    
+    async def is_business_hours(self) -> bool:
+        """BusinessHoursManager.is_open(), off the loop until its timeline is compiled"""
+        if self._business_hours_compiled:
+            # Bisect over the compiled timeline
+            return self.business_hours.is_open()
+        is_open = await asyncio.to_thread(lambda: self.business_hours.is_open())
+        self._business_hours_compiled = True
+        return is_open
+    
+    def _redis(self):
+        """Async Redis client, or None while it is unavailable"""
+        if self.redis_client is None or time.monotonic() < self._redis_retry_at:
+            return None
+        return self.redis_client
+    
+    def _redis_failed(self, action: str, error: Exception):
+        # Back off so a Redis outage doesn't cost every call a connect timeout
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+        logger.error(f"Failed to {action}, pausing Redis for {self.REDIS_RETRY_SECONDS}s: {error}")
+    
     async def process_call_with_analytics(self, call_sid: str, caller_id: str, 
                                         transcription: str = "", call_context: Dict = None) -> Dict:
         """Process call with comprehensive analytics and emergency detection"""
         try:
             call_context = call_context or {}
+            emergency_handler = await self.get_subsystem('emergency_handler')
+            analytics = await self.get_subsystem('analytics')
             
-            # Emergency assessment
-            emergency_assessment = self.emergency_handler.assess_urgency(
-                transcription, caller_id, call_context
+            # Emergency assessment (sync Redis inside, so off the loop)
+            emergency_assessment = await asyncio.to_thread(
+                emergency_handler.assess_urgency, transcription, caller_id, call_context
             )
             
             # Log call for analytics
@@ -107,12 +255,12 @@ class VoiceWebhookHandler:
                 **call_context
             }
             
-            self.analytics.log_call(call_data)
+            await asyncio.to_thread(analytics.log_call, call_data)
             
             # Handle emergency routing if needed
             routing_result = None
             if emergency_assessment.requires_immediate_dispatch:
-                routing_result = await self.emergency_handler.route_emergency_call(
+                routing_result = await emergency_handler.route_emergency_call(
                     emergency_assessment, call_sid, caller_id
                 )
                 logger.warning(f"Emergency routing triggered for {call_sid}: {emergency_assessment.urgency_level.name}")
@@ -145,7 +293,8 @@ class VoiceWebhookHandler:
                 'customer_data': {}
             }
             
-            quality_metrics = await self.quality_assurance.analyze_call_recording(call_data)
+            quality_assurance = await self.get_subsystem('quality_assurance')
+            quality_metrics = await quality_assurance.analyze_call_recording(call_data)
             
             logger.info(f"Quality analysis completed for {call_sid}: {quality_metrics.overall_quality.name}")
             return {
@@ -161,55 +310,109 @@ class VoiceWebhookHandler:
                 'error': str(e)
             }
     
-    def track_call(self, call_sid: str, caller_id: str, status: str, data: Dict[str, Any] = None):
+    async def track_call(self, call_sid: str, caller_id: str, status: str, data: Dict[str, Any] = None):
         """Track call in Redis for analytics and queue management"""
+        redis_client = self._redis()
+        if redis_client is None:
+            return
         try:
-            if self.redis_client:
-                call_data = {
-                    'call_sid': call_sid,
-                    'caller_id': caller_id,
-                    'status': status,
-                    'timestamp': datetime.now().isoformat(),
-                    'data': json.dumps(data or {})
-                }
-                
-                # Store call data
-                self.redis_client.hset(f"call:{call_sid}", mapping=call_data)
-                self.redis_client.expire(f"call:{call_sid}", 86400)  # 24 hour TTL
-                
-                # Track active calls
-                if status in ['ringing', 'in-progress']:
-                    self.redis_client.sadd('active_calls', call_sid)
-                elif status in ['completed', 'busy', 'no-answer', 'canceled']:
-                    self.redis_client.srem('active_calls', call_sid)
-                
-                logger.debug(f"Call tracked: {call_sid} - {status}")
+            call_data = {
+                'call_sid': call_sid,
+                'caller_id': caller_id,
+                'status': status,
+                'timestamp': datetime.now().isoformat(),
+                'data': json.dumps(data or {})
+            }
+            
+            # Store call data and track active calls in one round trip
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hset(f"call:{call_sid}", mapping=call_data)
+            pipe.expire(f"call:{call_sid}", 86400)  # 24 hour TTL
+            if status in ['ringing', 'in-progress']:
+                pipe.sadd('active_calls', call_sid)
+            elif status in ['completed', 'busy', 'no-answer', 'canceled']:
+                pipe.srem('active_calls', call_sid)
+            await pipe.execute()
+            
+            logger.debug(f"Call tracked: {call_sid} - {status}")
         except Exception as e:
-            logger.error(f"Failed to track call {call_sid}: {e}")
+            self._redis_failed(f"track call {call_sid}", e)
     
-    def get_active_call_count(self) -> int:
+    async def get_active_call_count(self) -> int:
         """Get number of active calls for queue management"""
+        redis_client = self._redis()
+        if redis_client is None:
+            return 0
         try:
-            if self.redis_client:
-                return self.redis_client.scard('active_calls')
+            return await redis_client.scard('active_calls')
         except Exception as e:
-            logger.error(f"Failed to get active call count: {e}")
+            self._redis_failed("get active call count", e)
         return 0
     
     def _add_voice_to_response(self, response: VoiceResponse, text: str, 
-                              context: str = 'general', emotion: str = None):
-        """Add voice to TwiML response using ElevenLabs or fallback"""
+                              context: str = 'general', emotion: str = None,
+                              template: str = None, variables: Dict[str, str] = None):
+        """
+        Add voice to TwiML response using ElevenLabs or fallback.
+        Pass the `template` and `variables` behind `text` so ElevenLabs can
+        stitch cached segments instead of synthesizing the whole sentence.
+        
+        Only audio that is already available is played; otherwise Polly reads
+        the text this time and the ElevenLabs audio is fetched in the background.
+        """
         try:
-            if self.use_elevenlabs and self.elevenlabs_handler:
-                enhance_twiml_with_elevenlabs(response, text, context)
-            else:
-                # Fallback to Polly
-                response.say(text, voice='Polly.Joanna', language='en-US')
+            if self.subsystem_ready('elevenlabs_handler') and self.use_elevenlabs:
+                audio_url = self._voice_audio_urls.get((context, text))
+                if audio_url:
+                    response.play(audio_url)
+                    return
+                self._prefetch_voice_audio(text, context, emotion, template, variables)
+            # Fallback to Polly
+            response.say(text, voice='Polly.Joanna', language='en-US')
         except Exception as e:
             logger.error(f"Error adding voice to response: {e}")
             # Always fallback to basic say
             response.say(text, voice='Polly.Joanna', language='en-US')
     
+    def _prefetch_voice_audio(self, text: str, context: str, emotion: str = None,
+                              template: str = None, variables: Dict[str, str] = None):
+        key = (context, text)
+        if key in self._voice_audio_urls or len(self._voice_audio_urls) >= self.MAX_VOICE_AUDIO_URLS:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Not serving requests, nothing to warm
+        # Placeholder stops concurrent calls from fetching the same audio
+        self._voice_audio_urls[key] = ''
+        self._spawn(self._fetch_voice_audio(key, text, context, emotion, template, variables))
+    
+    async def _fetch_voice_audio(self, key: Tuple[str, str], text: str, context: str, emotion: str,
+                                 template: str, variables: Dict[str, str]):
+        from .elevenlabs_voice_handler import get_elevenlabs_audio_url
+        audio_url = None
+        try:
+            audio_url = await get_elevenlabs_audio_url(text, context, emotion, template=template, variables=variables)
+        except Exception as e:
+            logger.error(f"Failed to prefetch ElevenLabs audio for {context}: {e}")
+        if audio_url:
+            self._voice_audio_urls[key] = audio_url
+            logger.info(f"ElevenLabs audio ready for context: {context}")
+        else:
+            # Let a later call retry
+            self._voice_audio_urls.pop(key, None)
+        # Recompile responses so they play the audio (or retry the fetch)
+        self._voice_audio_version += 1
+    
+    def render_twiml(self, key: Tuple, build: Callable[..., VoiceResponse], **values) -> bytes:
+        """
+        TwiML bytes for `build`'s output from a template compiled once per variant.
+        `key` identifies the branch taken; `values` are per-call fields that
+        `build` receives as markers. Prompt audio is part of every variant.
+        """
+        variant = (self.subsystem_ready('elevenlabs_handler'), self._voice_audio_version) + tuple(key)
+        return self.twiml_templates.render(variant, build, **values)
+    
     def generate_welcome_message(self, is_business_hours: bool, caller_id: str) -> VoiceResponse:
         """Generate professional welcome message with personalization"""
         response = VoiceResponse()
@@ -227,6 +430,15 @@ class VoiceWebhookHandler:
         
         return response
     
+    def generate_incoming_call(self, is_business_hours: bool) -> VoiceResponse:
+        """Welcome followed by the main menu, or by the after-hours flow"""
+        response = self.generate_welcome_message(is_business_hours, '')
+        if is_business_hours:
+            response.append(self.generate_main_menu())
+        else:
+            response.append(self.generate_after_hours_flow())
+        return response
+    
     def generate_main_menu(self) -> VoiceResponse:
         """Generate the main IVR menu with speech and DTMF input"""
         response = VoiceResponse()
@@ -253,10 +465,7 @@ class VoiceWebhookHandler:
         )
         
         # Use ElevenLabs for premium menu experience
-        if self.use_elevenlabs and self.elevenlabs_handler:
-            enhance_twiml_with_elevenlabs(gather, menu_text, 'menu')
-        else:
-            gather.say(menu_text, voice='Polly.Joanna', language='en-US')
+        self._add_voice_to_response(gather, menu_text, 'menu')
         response.append(gather)
         
         # If no input, redirect to customer service
@@ -266,25 +475,6 @@ class VoiceWebhookHandler:
         
         return response
     
-    def generate_queue_message(self, estimated_wait: int) -> VoiceResponse:
-        """Generate professional queue message with wait time"""
-        response = VoiceResponse()
-        
-        if estimated_wait <= 2:
-            wait_msg = "We'll be with you in just a moment."
-        elif estimated_wait <= 5:
-            wait_msg = f"Your estimated wait time is approximately {estimated_wait} minutes."
-        else:
-            wait_msg = "We're experiencing higher than normal call volume. You can choose to hold, or leave a voicemail and we'll call you back within the hour."
-        
-        response.say(f"Please hold while we connect you with our next available representative. {wait_msg}", 
-                    voice='Polly.Joanna')
-        
-        # Play hold music
-        response.play('https://your-domain.com/audio/hold-music.mp3')
-        
-        return response
-    
     def generate_after_hours_flow(self) -> VoiceResponse:
         """Generate after-hours call flow with emergency option"""
         response = VoiceResponse()
@@ -375,6 +565,43 @@ class VoiceWebhookHandler:
         
         return response
     
+    def render_voicemail_flow(self, message_type: str = 'general') -> bytes:
+        if message_type == 'emergency':
+            return self.render_twiml(('voicemail', 'emergency'), lambda: self.generate_voicemail_flow('emergency'))
+        # Any other type only changes the recording callback URL
+        return self.render_twiml(('voicemail',), self.generate_voicemail_flow, message_type=message_type)
+    
+    def generate_invalid_selection(self) -> VoiceResponse:
+        response = VoiceResponse()
+        response.say("I didn't understand your selection. Let me repeat the menu.", 
+                    voice='Polly.Joanna')
+        response.append(self.generate_main_menu())
+        return response
+    
+    def generate_emergency_with_fee(self) -> VoiceResponse:
+        response = VoiceResponse()
+        response.say("Emergency service includes a service call fee. Let me connect you now.", 
+                    voice='Polly.Joanna')
+        response.append(self.generate_emergency_flow())
+        return response
+    
+    def generate_voicemail_received(self, is_emergency: bool) -> VoiceResponse:
+        """Thank the caller once their voicemail is recorded"""
+        response = VoiceResponse()
+        if is_emergency:
+            self._add_voice_to_response(
+                response, 
+                "Thank you for your emergency message. We'll call you back within 15 minutes.",
+                'emergency', 'urgent'
+            )
+        else:
+            self._add_voice_to_response(
+                response,
+                "Thank you for your message. We'll return your call within 4 hours during business days. Have a great day!",
+                'thank_you', 'friendly'
+            )
+        return response
+    
     def generate_voicemail_flow(self, message_type: str = 'general') -> VoiceResponse:
         """Generate voicemail recording flow"""
         response = VoiceResponse()
@@ -410,12 +637,17 @@ class VoiceWebhookHandler:
         
         return response
     
-    def generate_transfer_to_human(self, department: str = 'general') -> VoiceResponse:
-        """Generate transfer to human representative"""
+    def render_transfer_to_human(self, department: str = 'general', active_calls: int = 0) -> bytes:
+        # Beyond the queue threshold the wait estimate is capped, so the response no longer varies
+        queue_depth = min(active_calls, 6)
+        return self.render_twiml(('transfer', department, queue_depth),
+                                 lambda: self.generate_transfer_to_human(department, queue_depth))
+    
+    def generate_transfer_to_human(self, department: str = 'general', active_calls: int = 0) -> VoiceResponse:
+        """Generate transfer to human representative; `active_calls` from get_active_call_count()"""
         response = VoiceResponse()
         
         # Get queue information
-        active_calls = self.get_active_call_count()
         estimated_wait = min(active_calls * 2, 10)  # Max 10 minute estimate
         
         if active_calls > 5:  # Queue management
@@ -427,10 +659,15 @@ class VoiceWebhookHandler:
                 numDigits=1
             )
             
-            gather.say(f"All our representatives are currently helping other customers. "
-                      f"Your estimated wait time is {estimated_wait} minutes. "
-                      f"Press 1 to hold, or press 2 to leave a voicemail for a callback within 2 hours.", 
-                      voice='Polly.Joanna')
+            self._add_voice_to_response(gather, "All our representatives are currently helping other customers.",
+                                        'queue', 'empathetic')
+            # Only the minutes vary, so the premium voice is stitched from cached segments
+            template = "Your estimated wait time is approximately {minutes} minutes."
+            variables = {'minutes': str(estimated_wait)}
+            self._add_voice_to_response(gather, template.format(**variables), 'queue',
+                                        template=template, variables=variables)
+            self._add_voice_to_response(gather, "Press 1 to hold, or press 2 to leave a voicemail "
+                                        "for a callback within 2 hours.", 'queue')
             response.append(gather)
             
             # Default to queue
@@ -451,9 +688,18 @@ class VoiceWebhookHandler:
         return response
 
 # FastAPI application setup
-app = FastAPI(title="757 Handy Voice System", version="1.0.0")
 voice_handler = VoiceWebhookHandler()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so calls are answered from the first moment
+    startup = asyncio.create_task(voice_handler.start())
+    yield
+    startup.cancel()
+    await voice_handler.close()
+
+app = FastAPI(title="757 Handy Voice System", version="1.0.0", lifespan=lifespan)
+
 @app.post("/voice/incoming")
 async def handle_incoming_call(
     request: Request,
@@ -466,23 +712,19 @@ async def handle_incoming_call(
     try:
         logger.info(f"Incoming call: {CallSid} from {From}")
         
-        # Track the call
-        voice_handler.track_call(CallSid, From, CallStatus)
-        
-        # Check business hours
-        is_business_hours = voice_handler.business_hours.is_open()
+        # Track the call and check business hours concurrently
+        _, is_business_hours = await asyncio.gather(
+            voice_handler.track_call(CallSid, From, CallStatus),
+            voice_handler.is_business_hours()
+        )
         
-        # Generate welcome and route appropriately
-        if is_business_hours:
-            # Welcome + Main Menu
-            response = voice_handler.generate_welcome_message(True, From)
-            response.append(voice_handler.generate_main_menu())
-        else:
-            # After hours flow
-            response = voice_handler.generate_welcome_message(False, From)
-            response.append(voice_handler.generate_after_hours_flow())
+        # Welcome + main menu, or the after-hours flow
+        twiml = voice_handler.render_twiml(
+            ('incoming', is_business_hours),
+            lambda: voice_handler.generate_incoming_call(is_business_hours)
+        )
         
-        return Response(content=str(response), media_type="application/xml")
+        return Response(content=twiml, media_type="application/xml")
         
     except Exception as e:
         logger.error(f"Error handling incoming call {CallSid}: {e}")
@@ -526,32 +768,29 @@ async def handle_menu_selection(
         
         # Route based on selection
         if selection == '1':
-            response = voice_handler.generate_appointment_flow()
+            twiml = voice_handler.render_twiml(('appointment',), voice_handler.generate_appointment_flow)
         elif selection == '2':
-            response = voice_handler.generate_quote_flow()
+            twiml = voice_handler.render_twiml(('quote',), voice_handler.generate_quote_flow)
         elif selection == '3':
-            response = voice_handler.generate_emergency_flow()
+            twiml = voice_handler.render_twiml(('emergency',), voice_handler.generate_emergency_flow)
         elif selection == '4':
-            response = voice_handler.generate_transfer_to_human('support')
+            twiml = voice_handler.render_transfer_to_human('support', await voice_handler.get_active_call_count())
         elif selection == '5':
-            response = voice_handler.generate_transfer_to_human('billing')
+            twiml = voice_handler.render_transfer_to_human('billing', await voice_handler.get_active_call_count())
         elif selection == '9':
-            response = voice_handler.generate_main_menu()
+            twiml = voice_handler.render_twiml(('main_menu',), voice_handler.generate_main_menu)
         else:
             # Invalid selection
-            response = VoiceResponse()
-            response.say("I didn't understand your selection. Let me repeat the menu.", 
-                        voice='Polly.Joanna')
-            response.append(voice_handler.generate_main_menu())
+            twiml = voice_handler.render_twiml(('invalid_selection',), voice_handler.generate_invalid_selection)
         
-        return Response(content=str(response), media_type="application/xml")
+        return Response(content=twiml, media_type="application/xml")
         
     except Exception as e:
         logger.error(f"Error handling menu selection for {CallSid}: {e}")
         
         # Fallback to human
-        response = voice_handler.generate_transfer_to_human()
-        return Response(content=str(response), media_type="application/xml")
+        twiml = voice_handler.render_transfer_to_human('general', await voice_handler.get_active_call_count())
+        return Response(content=twiml, media_type="application/xml")
 
 @app.post("/voice/handle-after-hours")
 async def handle_after_hours(
@@ -566,23 +805,20 @@ async def handle_after_hours(
         
         if selection == '1':
             # Emergency routing
-            response = voice_handler.generate_emergency_flow()
+            twiml = voice_handler.render_twiml(('emergency',), voice_handler.generate_emergency_flow)
         elif selection == '3':
             # Emergency service (with fee)
-            response = VoiceResponse()
-            response.say("Emergency service includes a service call fee. Let me connect you now.", 
-                        voice='Polly.Joanna')
-            response.append(voice_handler.generate_emergency_flow())
+            twiml = voice_handler.render_twiml(('emergency_with_fee',), voice_handler.generate_emergency_with_fee)
         else:
             # Regular voicemail
-            response = voice_handler.generate_voicemail_flow()
+            twiml = voice_handler.render_voicemail_flow()
         
-        return Response(content=str(response), media_type="application/xml")
+        return Response(content=twiml, media_type="application/xml")
         
     except Exception as e:
         logger.error(f"Error handling after-hours call {CallSid}: {e}")
-        response = voice_handler.generate_voicemail_flow()
-        return Response(content=str(response), media_type="application/xml")
+        twiml = voice_handler.render_voicemail_flow()
+        return Response(content=twiml, media_type="application/xml")
 
 @app.post("/voice/voicemail-complete")
 async def voicemail_complete(
@@ -598,7 +834,8 @@ async def voicemail_complete(
         logger.info(f"Voicemail completed for {CallSid}: {RecordingUrl} ({RecordingDuration}s)")
         
         # Process the voicemail and get transcription
-        transcription_result = await voice_handler.transcription_handler.process_voicemail(
+        transcription_handler = await voice_handler.get_subsystem('transcription_handler')
+        transcription_result = await transcription_handler.process_voicemail(
             CallSid, RecordingUrl, int(RecordingDuration), message_type
         )
         
@@ -620,28 +857,20 @@ async def voicemail_complete(
             logger.critical(f"EMERGENCY VOICEMAIL DETECTED: {CallSid} - Level {emergency_assessment.urgency_level.name}")
             message_type = 'emergency'  # Upgrade message type
         
-        # Analyze call quality for voicemail handling
+        # Analyze call quality for voicemail handling; the caller doesn't wait for it
         if transcription:
-            quality_result = await voice_handler.analyze_call_quality(
+            voice_handler._spawn(voice_handler.analyze_call_quality(
                 CallSid, RecordingUrl, transcription, 'voicemail_system'
-            )
+            ))
         
         # Generate appropriate response based on urgency
-        response = VoiceResponse()
-        if message_type == 'emergency' or (emergency_assessment and emergency_assessment.urgency_level.value >= 4):
-            voice_handler._add_voice_to_response(
-                response, 
-                "Thank you for your emergency message. We'll call you back within 15 minutes.",
-                'emergency', 'urgent'
-            )
-        else:
-            voice_handler._add_voice_to_response(
-                response,
-                "Thank you for your message. We'll return your call within 4 hours during business days. Have a great day!",
-                'thank_you', 'friendly'
-            )
+        is_emergency = message_type == 'emergency' or bool(emergency_assessment and emergency_assessment.urgency_level.value >= 4)
+        twiml = voice_handler.render_twiml(
+            ('voicemail_received', is_emergency),
+            lambda: voice_handler.generate_voicemail_received(is_emergency)
+        )
         
-        return Response(content=str(response), media_type="application/xml")
+        return Response(content=twiml, media_type="application/xml")
         
     except Exception as e:
         logger.error(f"Error processing voicemail for {CallSid}: {e}")
@@ -663,7 +892,7 @@ async def call_status_callback(
         logger.info(f"Call status update: {CallSid} - {CallStatus}")
         
         # Update call tracking
-        voice_handler.track_call(CallSid, From, CallStatus, {
+        await voice_handler.track_call(CallSid, From, CallStatus, {
             'duration': CallDuration,
             'to': To
         })
@@ -679,7 +908,8 @@ async def call_status_callback(
 async def get_analytics_dashboard():
     """Get real-time analytics dashboard"""
     try:
-        dashboard_data = voice_handler.analytics.get_real_time_dashboard()
+        analytics = await voice_handler.get_subsystem('analytics')
+        dashboard_data = await asyncio.to_thread(analytics.get_real_time_dashboard)
         return {"success": True, "data": dashboard_data}
     except Exception as e:
         logger.error(f"Error getting analytics dashboard: {e}")
@@ -689,7 +919,8 @@ async def get_analytics_dashboard():
 async def get_call_metrics(time_range: str = "24h"):
     """Get call metrics for specified time range"""
     try:
-        metrics = voice_handler.analytics.generate_call_metrics(time_range)
+        analytics = await voice_handler.get_subsystem('analytics')
+        metrics = await asyncio.to_thread(analytics.generate_call_metrics, time_range)
         return {"success": True, "data": metrics}
     except Exception as e:
         logger.error(f"Error getting call metrics: {e}")
@@ -699,7 +930,8 @@ async def get_call_metrics(time_range: str = "24h"):
 async def get_customer_history(caller_id: str):
     """Get customer interaction history"""
     try:
-        history = voice_handler.analytics.get_customer_history(caller_id)
+        analytics = await voice_handler.get_subsystem('analytics')
+        history = await asyncio.to_thread(analytics.get_customer_history, caller_id)
         return {"success": True, "data": history}
     except Exception as e:
         logger.error(f"Error getting customer history: {e}")
@@ -709,7 +941,8 @@ async def get_customer_history(caller_id: str):
 async def get_quality_report(time_range: str = "24h", agent_id: str = None):
     """Get quality assurance report"""
     try:
-        report = await voice_handler.quality_assurance.generate_quality_report(time_range, agent_id)
+        quality_assurance = await voice_handler.get_subsystem('quality_assurance')
+        report = await quality_assurance.generate_quality_report(time_range, agent_id)
         return {"success": True, "data": report}
     except Exception as e:
         logger.error(f"Error getting quality report: {e}")
@@ -736,7 +969,9 @@ async def assess_emergency_endpoint(request: Request):
     """Manually assess emergency level for transcription"""
     try:
         data = await request.json()
-        assessment = voice_handler.emergency_handler.assess_urgency(
+        emergency_handler = await voice_handler.get_subsystem('emergency_handler')
+        assessment = await asyncio.to_thread(
+            emergency_handler.assess_urgency,
             data.get('transcription', ''),
             data.get('caller_id', ''),
             data.get('context', {})
@@ -765,13 +1000,15 @@ async def health_check():
     """Health check for voice system with comprehensive status"""
     try:
         # Get system health metrics
-        active_calls = voice_handler.get_active_call_count()
-        dashboard_data = voice_handler.analytics.get_real_time_dashboard()
+        active_calls = await voice_handler.get_active_call_count()
+        analytics = await voice_handler.get_subsystem('analytics')
+        dashboard_data = await asyncio.to_thread(analytics.get_real_time_dashboard)
+        use_elevenlabs = (await voice_handler.get_subsystem('elevenlabs_handler')) is not None
         
         # Check subsystem health
         subsystem_health = {
-            "elevenlabs": voice_handler.use_elevenlabs,
-            "redis": voice_handler.redis_client is not None,
+            "elevenlabs": use_elevenlabs,
+            "redis": voice_handler._redis() is not None,
             "analytics": True,
             "emergency_handler": True,
             "quality_assurance": True
@@ -789,7 +1026,7 @@ async def health_check():
             "subsystems": subsystem_health,
             "real_time_metrics": dashboard_data,
             "features": {
-                "premium_voice": voice_handler.use_elevenlabs,
+                "premium_voice": use_elevenlabs,
                 "emergency_detection": True,
                 "quality_assurance": True,
                 "analytics": True,
@@ -34,7 +34,7 @@ timeout /t 2 /nobreak >nul
 
 REM Start Celery Worker
 echo ⚙️  Starting Celery Worker...
-start "Karen Celery Worker" /MIN python -m celery -A src.celery_app:celery_app worker -l DEBUG --pool=solo --without-heartbeat --without-gossip --without-mingle
+start "Karen Celery Worker" /MIN python -m celery -A src.celery_app:celery_app worker -Q realtime,email,batch,celery -l DEBUG --pool=solo --without-heartbeat --without-gossip --without-mingle
 
 REM Wait a moment for Worker to start  
 timeout /t 3 /nobreak >nul
@@ -0,0 +1,78 @@
+import io
+import os
+import wave
+
+import pytest
+
+from src.audio_stitching import concat_audio, segment_texts, split_template
+
+
+def make_wav(frames):
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(16000)
+        writer.writeframes(frames)
+    return out.getvalue()
+
+
+def test_templates_split_into_static_and_variable_segments():
+    template = "{time_greeting}, {customer_name}! Thank you for calling 757 Handy."
+    assert split_template(template) == [
+        ('time_greeting', True), (', ', False), ('customer_name', True),
+        ('! Thank you for calling 757 Handy.', False),
+    ]
+    assert segment_texts(template, {'time_greeting': 'Good morning', 'customer_name': 'Sam'}) == [
+        ('Good morning', True), ('Sam', True), ('Thank you for calling 757 Handy.', False),
+    ]
+
+
+def test_concat_without_reencoding():
+    id3 = b'ID3\x04\x00\x00\x00\x00\x00\x05hello'
+    frames_a, frames_b = b'\xff\xfb\x90\x00' * 3, b'\xff\xfb\x90\x01' * 2
+    tag = b'TAG' + b'\x00' * 125
+    assert concat_audio([id3 + frames_a, frames_b + tag], 'mp3_44100_128') == frames_a + frames_b
+
+    joined = concat_audio([make_wav(b'\x01\x00' * 10), make_wav(b'\x02\x00' * 5)], 'wav')
+    with wave.open(io.BytesIO(joined)) as reader:
+        assert reader.getnframes() == 15 and reader.getframerate() == 16000
+
+    assert concat_audio([b'ab', b'cd'], 'pcm_16000') == b'abcd'
+
+
+@pytest.mark.asyncio
+async def test_stitched_greetings_only_synthesize_new_names(tmp_path, monkeypatch):
+    from src.elevenlabs_voice_handler import ElevenLabsVoiceHandler
+
+    handler = ElevenLabsVoiceHandler(api_key="test", cache_dir=str(tmp_path))
+    synthesized = []
+
+    async def fake_generate(text, voice_profile, emotion=None):
+        synthesized.append(text)
+        return f"[{text}]".encode()
+
+    monkeypatch.setattr(handler, '_generate_audio', fake_generate)
+    await handler.pre_generate_common_phrases()
+    synthesized.clear()
+
+    first = await handler.get_personalized_greeting('Dana', 'morning')
+    second = await handler.get_personalized_greeting('Lee', 'morning')
+    repeat = await handler.get_personalized_greeting('Dana', 'morning')
+
+    assert synthesized == ['Dana', 'Lee']
+    assert repeat == first
+    with open(second, 'rb') as audio:
+        assert audio.read() == b'[Good morning][Lee][Thank you for calling 757 Handy.]'
+
+    # Static segments survive LRU pressure; the per-caller composites do not
+    handler.audio_cache.max_bytes = 0
+    handler.audio_cache.put('filler', b'x' * 1000)
+    assert not os.path.exists(first) and not os.path.exists(second)
+    stats = handler.audio_cache.get_stats()
+    assert stats['entries'] == stats['pinned'] + 1
+
+    synthesized.clear()
+    await handler.generate_dynamic_message(
+        "Your appointment is scheduled for {day} at {time}.", {'day': 'Friday', 'time': '2:30 PM'}, 'appointment')
+    assert synthesized == []
@@ -0,0 +1,99 @@
+import random
+import time as time_module
+from datetime import datetime, time, timedelta
+
+import pytest
+
+pytest.importorskip("pytz")
+pytest.importorskip("holidays")
+
+from src.business_hours_manager import (
+    BusinessHours, BusinessHoursManager, DayType, ServiceLevel, SpecialDay
+)
+
+
+def legacy_is_open(manager, check_time):
+    """Reference: the original per-call special day / holiday / weekly lookup"""
+    local_time = manager._to_local(check_time)
+    date_str = local_time.strftime('%Y-%m-%d')
+    if date_str in manager.special_days:
+        return manager.special_days[date_str].hours.is_open_at(local_time.time())
+    if local_time.date() in manager.us_holidays:
+        return False
+    hours = manager._get_adjusted_hours(local_time, local_time.weekday())
+    return hours.is_open_at(local_time.time())
+
+
+@pytest.fixture
+def manager():
+    manager = BusinessHoursManager()
+    # Overnight Sunday emergency desk exercises the midnight split
+    manager.update_weekly_hours(6, BusinessHours(time(22, 0), time(2, 0), ServiceLevel.EMERGENCY_ONLY))
+    return manager
+
+
+def sample_times(count=5000, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    return [start + timedelta(minutes=rng.randrange(0, 365 * 24 * 60)) for _ in range(count)]
+
+
+def test_is_open_matches_legacy_lookup(manager):
+    for check_time in sample_times():
+        assert manager.is_open(check_time) == legacy_is_open(manager, check_time), check_time
+
+
+def test_boundaries_and_holidays(manager):
+    monday = datetime(2025, 6, 2)
+    assert not manager.is_open(monday.replace(hour=7, minute=59))
+    assert manager.is_open(monday.replace(hour=8))
+    assert manager.is_open(monday.replace(hour=18))
+    assert not manager.is_open(monday.replace(hour=18, minute=1))
+    assert not manager.is_open(datetime(2025, 7, 4, 12))  # Independence Day
+
+
+def test_next_opening_and_closing(manager):
+    # Friday evening after close -> Saturday summer hours open at 8
+    opening = manager._get_next_opening(manager._to_local(datetime(2025, 6, 6, 19)))
+    assert opening == {'time': '08:00 AM', 'date': '2025-06-07', 'day': 'Saturday',
+                       'is_today': False, 'is_tomorrow': True}
+
+    # Saturday before July 4th weekend is a normal day; the holiday itself is skipped
+    opening = manager._get_next_opening(manager._to_local(datetime(2025, 7, 3, 19)))
+    assert opening['date'] == '2025-07-05'
+
+    closing = manager._get_next_closing(manager._to_local(datetime(2025, 6, 2, 10)))
+    assert closing == {'time': '06:00 PM', 'date': '2025-06-02', 'day': 'Monday', 'is_today': True}
+
+    # Sunday's overnight hours cover Sunday's date only, so the desk closes at midnight
+    closing = manager._get_next_closing(manager._to_local(datetime(2025, 6, 1, 23)))
+    assert closing['date'] == '2025-06-01' and closing['time'] == '11:59 PM'
+
+    # ...and after a closed Saturday evening it is open again from midnight
+    opening = manager._get_next_opening(manager._to_local(datetime(2025, 6, 7, 20)))
+    assert opening['date'] == '2025-06-08' and opening['time'] == '12:00 AM'
+
+
+def test_schedule_changes_rebuild_timeline(manager):
+    tuesday_noon = datetime(2025, 6, 3, 12)
+    assert manager.is_open(tuesday_noon)
+
+    manager.add_special_day(SpecialDay(datetime(2025, 6, 3), DayType.CLOSED,
+                                       BusinessHours(service_level=ServiceLevel.EMERGENCY_ONLY), "Staff training"))
+    assert not manager.is_open(tuesday_noon)
+
+    manager.remove_special_day(datetime(2025, 6, 3))
+    manager.update_weekly_hours(1, BusinessHours(time(13, 0), time(17, 0)))
+    assert not manager.is_open(tuesday_noon)
+    assert manager.is_open(tuesday_noon.replace(hour=13))
+
+
+def test_classify_business_hours_batch(manager):
+    timestamps = sample_times(20000, seed=11)
+    start = time_module.perf_counter()
+    flags = manager.classify_business_hours(timestamps)
+    elapsed = time_module.perf_counter() - start
+
+    assert flags == [legacy_is_open(manager, t) for t in timestamps]
+    assert manager.classify_business_hours([]) == []
+    print(f"\nClassified {len(timestamps)} timestamps in {elapsed * 1000:.1f}ms")
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+from src.calendar_busy_cache import BusyIntervalCache, event_busy_interval
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+NOW = datetime(2025, 6, 2, 9, 0, tzinfo=timezone.utc).timestamp()
+
+
+def event(event_id, start, end, **extra):
+    return {'id': event_id, 'start': {'dateTime': start}, 'end': {'dateTime': end}, **extra}
+
+
+def loaded_cache(clock, events):
+    cache = BusyIntervalCache(window_days=30, max_staleness_seconds=60, time_fn=clock)
+    window = cache.window_for(datetime(2025, 6, 2), datetime(2025, 6, 3))
+    cache.load_full('primary', events, 'token-1', *window)
+    return cache
+
+
+def test_busy_slots_are_merged_and_clipped_like_freebusy():
+    cache = loaded_cache(FakeClock(NOW), [
+        event('a', '2025-06-02T10:00:00Z', '2025-06-02T11:00:00Z'),
+        event('b', '2025-06-02T10:30:00-04:00', '2025-06-02T15:00:00-04:00'),
+        event('c', '2025-06-03T09:00:00Z', '2025-06-03T10:00:00Z', transparency='transparent'),
+        event('d', '2025-06-04T09:00:00Z', '2025-06-04T10:00:00Z'),
+    ])
+
+    slots = cache.busy_slots('primary', datetime(2025, 6, 2, 10, 30), datetime(2025, 6, 3, 12))
+    assert slots == [
+        {'start': '2025-06-02T10:30:00Z', 'end': '2025-06-02T11:00:00Z'},
+        {'start': '2025-06-02T14:30:00Z', 'end': '2025-06-02T19:00:00Z'},
+    ]
+
+
+def test_incremental_changes_and_write_through():
+    cache = loaded_cache(FakeClock(NOW), [event('a', '2025-06-02T10:00:00Z', '2025-06-02T11:00:00Z')])
+    day = (datetime(2025, 6, 2), datetime(2025, 6, 3))
+
+    cache.apply_changes('primary', [
+        {'id': 'a', 'status': 'cancelled'},
+        event('b', '2025-06-02T13:00:00Z', '2025-06-02T14:00:00Z'),
+    ], 'token-2')
+    assert cache.sync_token('primary') == 'token-2'
+    assert cache.busy_slots('primary', *day) == [{'start': '2025-06-02T13:00:00Z', 'end': '2025-06-02T14:00:00Z'}]
+
+    cache.record_event('primary', event('b', '2025-06-02T16:00:00Z', '2025-06-02T17:00:00Z'))
+    assert cache.busy_slots('primary', *day) == [{'start': '2025-06-02T16:00:00Z', 'end': '2025-06-02T17:00:00Z'}]
+
+    cache.remove_event('primary', 'b')
+    assert cache.busy_slots('primary', *day) == []
+
+
+def test_staleness_and_window_bounds():
+    clock = FakeClock(NOW)
+    cache = loaded_cache(clock, [])
+
+    assert cache.covers('primary', datetime(2025, 6, 5), datetime(2025, 6, 6))
+    assert cache.is_fresh('primary')
+    clock.now += 61
+    assert not cache.is_fresh('primary')
+
+    cache.apply_changes('primary', [], 'token-2')
+    assert cache.is_fresh('primary')
+    cache.invalidate('primary')
+    assert not cache.is_fresh('primary')
+
+    assert cache.window_for(datetime(2025, 6, 1), datetime(2025, 6, 2)) is None
+    assert cache.window_for(datetime(2025, 6, 2), datetime(2025, 8, 1)) is None
+
+
+def test_declined_and_all_day_events():
+    declined = event('x', '2025-06-02T10:00:00Z', '2025-06-02T11:00:00Z',
+                     attendees=[{'email': 'me@example.com', 'self': True, 'responseStatus': 'declined'}])
+    all_day = {'id': 'y', 'start': {'date': '2025-06-02'}, 'end': {'date': '2025-06-03'}}
+
+    assert event_busy_interval(declined) is None
+    assert event_busy_interval(all_day) == (datetime(2025, 6, 2), datetime(2025, 6, 3))
@@ -0,0 +1,93 @@
+import pytest
+
+pytest.importorskip("twilio")
+
+from src.call_context_store import CallContextStore, RedisCallContextStore
+from src.voice_ivr_system import CallContext, VoiceIVRSystem
+
+
+class FakeClock:
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def redis_backends():
+    backends = ['memory']
+    try:
+        import fakeredis  # noqa: F401
+        backends.append('redis')
+    except ImportError:
+        pass
+    return backends
+
+
+@pytest.fixture(params=redis_backends())
+def make_store(request):
+    """Factory for stores sharing one clock and, for Redis, one server"""
+    clock = FakeClock()
+    if request.param == 'memory':
+        store = CallContextStore(idle_ttl_seconds=600, time_fn=clock)
+        return clock, lambda: store
+
+    import fakeredis
+    server = fakeredis.FakeServer()
+
+    def redis_store():
+        client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        return RedisCallContextStore(client, CallContext.to_dict, CallContext.from_dict,
+                                     idle_ttl_seconds=600, time_fn=clock)
+    return clock, redis_store
+
+
+def test_contexts_expire_by_last_activity(make_store):
+    clock, make = make_store
+    store = make()
+    store.save("CA-live", CallContext("CA-live", "+15550001"))
+    store.save("CA-done", CallContext("CA-done", "+15550002"))
+
+    clock.advance(400)
+    store.save("CA-live", store.get("CA-live"))
+    clock.advance(300)
+
+    assert store.get("CA-done") is None
+    assert store.get("CA-live").caller_id == "+15550001"
+    assert [context.call_sid for context in store.contexts()] == ["CA-live"]
+    assert len(store) == 1
+
+
+def test_live_calls_survive_a_busy_day():
+    clock = FakeClock()
+    store = CallContextStore(idle_ttl_seconds=600, time_fn=clock)
+    store.save("CA-long-call", CallContext("CA-long-call", "+15550001"))
+    for i in range(3000):
+        clock.advance(1)
+        store.save(f"CA{i}", CallContext(f"CA{i}", "+15550002"))
+        if i % 300 == 0:
+            store.save("CA-long-call", store.get("CA-long-call"))
+
+    # Only calls idle for the TTL are gone, however many there were
+    assert store.get("CA-long-call") is not None
+    assert len(store) == 601 + 1
+    assert store.evicted_contexts == 3000 + 1 - 602
+
+
+def test_ivr_menu_flow_continues_on_another_worker(make_store):
+    clock, make = make_store
+    first_worker = VoiceIVRSystem(context_store=make())
+    second_worker = VoiceIVRSystem(context_store=make())
+
+    first_worker.process_input("CA1", "+15550001", digits="1", current_menu="main")
+    first_worker.process_input("CA1", "+15550001", digits="7", current_menu="scheduling")
+    context = second_worker.get_call_context("CA1", "+15550001")
+    assert context.previous_menus == ["main"]
+    assert (context.current_menu, context.attempts) == ("scheduling", 1)
+
+    clock.advance(601)
+    assert first_worker.cleanup_old_contexts() == 1
+    assert first_worker.get_call_analytics()['total_calls'] == 0
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from src.celery_queues import (
+    BATCH_QUEUE, EMAIL_QUEUE, ENQUEUED_AT_HEADER, LATENCY_CLASSES, LEGACY_QUEUE, REALTIME_QUEUE,
+    TASK_QUEUES, QueueMonitor, QueueStats, WaitTimeScaler, latency_class_for, stamp_enqueued_at
+)
+
+
+class FakeClock:
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+def publish(client, queue, task, enqueued_at=None):
+    """Push a message the way kombu's Redis transport does"""
+    headers = {'task': task}
+    if enqueued_at is not None:
+        headers[ENQUEUED_AT_HEADER] = enqueued_at
+    client.lpush(queue, json.dumps({'body': '', 'headers': headers, 'properties': {}}))
+
+
+def test_sms_and_voice_are_realtime_and_unrouted_tasks_are_batch():
+    for task in ('sms_event_handler_task', 'voice_event_handler_task', 'process_sms_with_llm',
+                 'send_karen_sms_reply', 'notify_admin_sms_emergency'):
+        assert TASK_QUEUES[task] == REALTIME_QUEUE
+    assert TASK_QUEUES['check_emails_task'] == EMAIL_QUEUE
+    assert 'memory_maintenance_task' not in TASK_QUEUES
+
+    assert latency_class_for([REALTIME_QUEUE]).name == REALTIME_QUEUE
+    assert latency_class_for([BATCH_QUEUE, LEGACY_QUEUE]).name == BATCH_QUEUE
+    assert latency_class_for(['email', 'batch']).name == EMAIL_QUEUE
+
+
+def test_publish_headers_are_stamped():
+    headers = {'task': 'check_sms_task'}
+    stamp_enqueued_at(headers=headers, body=None)
+    assert isinstance(headers[ENQUEUED_AT_HEADER], float)
+
+
+def test_monitor_reports_depth_and_oldest_wait_of_every_queue():
+    client = fakeredis.FakeRedis()
+    clock = FakeClock()
+    publish(client, REALTIME_QUEUE, 'process_sms_with_llm', clock.now - 5)
+    publish(client, REALTIME_QUEUE, 'process_sms_with_llm', clock.now - 1)
+    publish(client, BATCH_QUEUE, 'memory_maintenance_task', clock.now - 900)
+    publish(client, LEGACY_QUEUE, 'check_emails_task')  # Published before routing existed
+
+    stats = QueueMonitor(client, time_fn=clock).sample()
+
+    assert set(stats) == {REALTIME_QUEUE, EMAIL_QUEUE, BATCH_QUEUE, LEGACY_QUEUE}
+    assert (stats[REALTIME_QUEUE].depth, stats[REALTIME_QUEUE].oldest_wait_seconds) == (2, 5)
+    assert stats[BATCH_QUEUE].oldest_wait_seconds == 900
+    assert (stats[EMAIL_QUEUE].depth, stats[EMAIL_QUEUE].oldest_wait_seconds) == (0, None)
+    assert (stats[LEGACY_QUEUE].depth, stats[LEGACY_QUEUE].oldest_wait_seconds) == (1, None)
+
+
+def test_scaler_grows_with_overshoot_and_shrinks_only_after_calm():
+    clock = FakeClock()
+    scaler = WaitTimeScaler(LATENCY_CLASSES[REALTIME_QUEUE], scale_down_after_seconds=60, time_fn=clock)
+    backlog = [QueueStats(REALTIME_QUEUE, 40, 6.0)]
+    empty = [QueueStats(REALTIME_QUEUE, 0, None)]
+
+    # Three times the 2s target: grow by 2x the current pool, within max
+    assert scaler.desired_concurrency(2, backlog, busy=2) == 6
+    assert scaler.desired_concurrency(6, backlog, busy=6) == 8
+    assert scaler.desired_concurrency(4, [QueueStats(REALTIME_QUEUE, 3, 1.0)], busy=4) == 4
+
+    assert scaler.desired_concurrency(8, empty, busy=1) == 8
+    clock.now += 59
+    assert scaler.desired_concurrency(8, empty, busy=1) == 8
+    clock.now += 1
+    assert scaler.desired_concurrency(8, empty, busy=1) == 7
+    # A burst in between restarts the calm period
+    assert scaler.desired_concurrency(7, [QueueStats(REALTIME_QUEUE, 2, 0.5)], busy=7) == 7
+    clock.now += 30
+    assert scaler.desired_concurrency(7, empty, busy=0) == 7
+    clock.now += 120
+    assert scaler.desired_concurrency(2, empty, busy=0) == 2  # Never below min
+
+
+def test_realtime_wait_recovers_while_batch_backlog_stays():
+    """Simulated two minutes: SMS burst and a batch backlog on one local Redis broker"""
+    client = fakeredis.FakeRedis()
+    clock = FakeClock()
+    monitor = QueueMonitor(client, time_fn=clock)
+    scalers = {name: WaitTimeScaler(LATENCY_CLASSES[name], time_fn=clock) for name in (REALTIME_QUEUE, BATCH_QUEUE)}
+    pools = {REALTIME_QUEUE: 2, BATCH_QUEUE: 1}
+    service_seconds = {REALTIME_QUEUE: 0.5, BATCH_QUEUE: 120}
+
+    for _ in range(200):
+        publish(client, BATCH_QUEUE, 'qa_tests_runner_task', clock.now)
+
+    progress = {queue: 0.0 for queue in pools}
+    realtime_waits = []
+    for second in range(120):
+        if second < 60:
+            for _ in range(12):  # 12 SMS/s needs 6 processes at 0.5s each
+                publish(client, REALTIME_QUEUE, 'process_sms_with_llm', clock.now)
+        clock.now += 1
+        for queue, pool in pools.items():
+            # Partly finished tasks carry over to the next second
+            progress[queue] += pool / service_seconds[queue]
+            finished, progress[queue] = divmod(progress[queue], 1)
+            for _ in range(int(finished)):
+                client.rpop(queue)
+
+        stats = monitor.sample()
+        realtime_waits.append(stats[REALTIME_QUEUE].oldest_wait_seconds or 0.0)
+        for queue, scaler in scalers.items():
+            classes = LATENCY_CLASSES[queue].queues
+            pools[queue] = scaler.desired_concurrency(pools[queue], [stats[q] for q in classes], busy=pools[queue])
+
+    assert max(realtime_waits[:10]) > LATENCY_CLASSES[REALTIME_QUEUE].target_wait_seconds
+    assert max(realtime_waits[20:60]) <= LATENCY_CLASSES[REALTIME_QUEUE].target_wait_seconds
+    # Batch work waits within its own target, on its own pool
+    assert pools[BATCH_QUEUE] == LATENCY_CLASSES[BATCH_QUEUE].min_concurrency
+    assert client.llen(BATCH_QUEUE) > 190
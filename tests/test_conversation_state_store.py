@@ -0,0 +1,165 @@
+import gc
+import time
+from dataclasses import asdict, dataclass
+
+import pytest
+
+from src.conversation_state_store import ConversationStateStore, RedisConversationStateStore, RollingCounter
+
+
+class FakeClock:
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def test_history_is_bounded_per_contact():
+    store = ConversationStateStore(max_messages_per_contact=3, time_fn=FakeClock())
+    for i in range(10):
+        store.add_message("+15550001", f"msg {i}", "sms", "general")
+
+    assert store.get_history("+15550001") == ["msg 7", "msg 8", "msg 9"]
+    assert store.get_history("+15550002") == []
+
+
+def test_idle_contacts_expire_and_counters_survive():
+    clock = FakeClock()
+    store = ConversationStateStore(idle_ttl_seconds=60, time_fn=clock)
+    store.add_message("a", "hi", "sms", "general")
+    store.add_message("b", "help", "email", "emergency")
+
+    clock.advance(30)
+    store.add_message("a", "still here", "sms", "general")
+    clock.advance(45)
+
+    assert store.get_history("b") == []
+    assert store.get_history("a") == ["hi", "still here"]
+    stats = store.get_stats()
+    assert stats['active_conversations'] == 1
+    assert stats['total_messages'] == 3
+    assert stats['channel_counts'] == {'sms': 2, 'email': 1}
+    assert stats['type_counts'] == {'general': 2, 'emergency': 1}
+
+
+def test_contact_cap_evicts_least_recently_active():
+    store = ConversationStateStore(max_contacts=2, time_fn=FakeClock())
+    store.add_message("a", 1, "sms", "general")
+    store.add_message("b", 2, "sms", "general")
+    store.add_message("a", 3, "sms", "general")
+    store.add_message("c", 4, "sms", "general")
+
+    assert store.get_history("b") == []
+    assert store.get_history("a") == [1, 3]
+    assert store.active_count() == 2
+
+
+@dataclass
+class Message:
+    body: str
+    channel: str
+
+
+def redis_store(client, **kwargs):
+    return RedisConversationStateStore(client, asdict, lambda data: Message(**data), **kwargs)
+
+
+def test_redis_store_round_trips_bounded_history_across_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    clock = FakeClock()
+    first, second = (redis_store(fakeredis.FakeRedis(server=server), max_messages_per_contact=3, time_fn=clock)
+                     for _ in range(2))
+
+    for i in range(5):
+        first.add_message("+15550001", Message(f"msg {i}", "sms"), "sms", "general")
+        clock.advance(30)
+    second.add_message("+15550002", Message("quote please", "email"), "email", "quote")
+
+    assert second.get_history("+15550001") == [Message(f"msg {i}", "sms") for i in (2, 3, 4)]
+    assert first.get_history("+15550003") == []
+    stats = first.get_stats()
+    assert stats['total_messages'] == 6 and stats['active_conversations'] == 2
+    assert stats['channel_counts'] == {'sms': 5, 'email': 1}
+    assert stats['type_counts'] == {'general': 5, 'quote': 1}
+    # Minute buckets: every message was inside the last hour
+    assert stats['messages_last_hour'] == 6
+
+
+def test_redis_store_evicts_idle_contacts():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    clock = FakeClock()
+    store = redis_store(client, idle_ttl_seconds=60, time_fn=clock)
+    store.add_message("a", Message("hi", "sms"), "sms", "general")
+    store.add_message("b", Message("help", "sms"), "sms", "emergency")
+    assert client.ttl(store._conversation_key("a")) == 60
+
+    clock.advance(30)
+    store.add_message("a", Message("still here", "sms"), "sms", "general")
+    clock.advance(45)
+
+    # The activity index drops idle contacts without waiting for the key TTL
+    assert store.evict_idle() == 1
+    assert store.active_count() == 1
+    assert client.zrange(store._activity_key, 0, -1) == [b"a"]
+
+
+def test_redis_conversation_expires_with_its_key_ttl():
+    fakeredis = pytest.importorskip("fakeredis")
+    store = redis_store(fakeredis.FakeRedis(), idle_ttl_seconds=1)
+    store.add_message("a", Message("hi", "sms"), "sms", "general")
+    assert store.get_history("a") == [Message("hi", "sms")]
+
+    time.sleep(1.1)
+    assert store.get_history("a") == []
+    assert store.active_count() == 0
+    assert store.get_stats()['total_messages'] == 1
+
+
+def test_rolling_counter_drops_old_buckets():
+    clock = FakeClock()
+    counter = RollingCounter(window_seconds=300, bucket_seconds=60, time_fn=clock)
+    for _ in range(5):
+        counter.increment()
+        clock.advance(60)
+
+    assert counter.total() == 4
+    clock.advance(600)
+    assert counter.total() == 0
+
+
+@pytest.mark.performance
+def test_million_message_soak_keeps_rss_flat():
+    """Push 1M synthetic messages through the store; RSS must plateau after warmup"""
+    psutil = pytest.importorskip("psutil")
+    process = psutil.Process()
+
+    clock = FakeClock()
+    store = ConversationStateStore(idle_ttl_seconds=3600, time_fn=clock)
+    channels = ("sms", "email", "phone")
+    types = ("general", "appointment", "quote", "emergency")
+
+    def push(start, count):
+        for i in range(start, start + count):
+            # ~20k new contacts per hour of synthetic traffic, each touched a few times
+            store.add_message(f"+1555{(i // 4) % 10_000_000:07d}", f"message body {i}",
+                              channels[i % 3], types[i % 4])
+            clock.advance(0.05)
+
+    push(0, 200_000)
+    gc.collect()
+    warm_rss = process.memory_info().rss
+    warm_contacts = store.active_count()
+
+    push(200_000, 800_000)
+    gc.collect()
+    final_rss = process.memory_info().rss
+
+    assert store.total_messages == 1_000_000
+    assert store.active_count() <= warm_contacts * 1.05
+    assert final_rss - warm_rss < 16 * 1024 * 1024
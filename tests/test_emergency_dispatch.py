@@ -0,0 +1,111 @@
+import random
+import time
+
+import pytest
+
+from src.emergency_dispatch import EmergencyDispatchQueue, RollingCallWindow
+
+
+def redis_backends():
+    backends = [None]
+    try:
+        import fakeredis
+        backends.append(lambda: fakeredis.FakeRedis(decode_responses=True))
+    except ImportError:
+        pass
+    return backends
+
+
+@pytest.fixture(params=redis_backends(), ids=lambda backend: 'memory' if backend is None else 'redis')
+def redis_client(request):
+    return request.param() if request.param else None
+
+
+def test_queue_orders_by_urgency_then_arrival(redis_client):
+    queue = EmergencyDispatchQueue(redis_client)
+    queue.push("CA-leak", 3.0, arrived_at=100.0)
+    queue.push("CA-fire", 5.5, {'emergency_type': 'safety_hazard'}, arrived_at=102.0)
+    queue.push("CA-heat", 4.0, arrived_at=101.0)
+    queue.push("CA-flood", 5.5, arrived_at=101.5)
+    queue.push("CA-drip", 3.0, arrived_at=99.0)
+
+    # Re-prioritized and abandoned calls
+    queue.push("CA-leak", 4.5, arrived_at=100.0)
+    assert queue.remove("CA-heat")
+    assert len(queue) == 4
+
+    assert queue.peek()['call_sid'] == "CA-flood"
+    order = [queue.pop()['call_sid'] for _ in range(4)]
+    assert order == ["CA-flood", "CA-fire", "CA-leak", "CA-drip"]
+    assert queue.pop() is None and len(queue) == 0
+
+
+def test_call_window_rolls_and_caps(redis_client):
+    now = [1000.0]
+    window = RollingCallWindow(window_seconds=60, max_calls=3, redis_client=redis_client, time_fn=lambda: now[0])
+    for i in range(5):
+        window.record("+15550001", {'urgency_level': i}, at=now[0] + i)
+    assert [call['urgency_level'] for call in window.recent("+15550001")] == [2, 3, 4]
+    assert [call['urgency_level'] for call in window.recent("+15550001", limit=2)] == [3, 4]
+
+    now[0] += 62
+    assert [call['urgency_level'] for call in window.recent("+15550001")] == [3, 4]
+    now[0] += 3
+    assert window.recent("+15550001") == []
+
+
+@pytest.mark.asyncio
+async def test_handler_uses_caller_windows_and_dispatches_by_urgency(redis_client):
+    from src.voice_emergency_handler import EmergencyHandler, UrgencyLevel
+
+    handler = EmergencyHandler(redis_client=redis_client)
+    handler.add_priority_customer("+15559990000")
+    assert handler._is_priority_customer("+15559990000")
+
+    caller = "+15550002"
+    first = handler.assess_urgency("I have a leak", caller)
+    for _ in range(2):
+        handler.assess_urgency("I have a leak", caller)
+    assert len(handler._get_recent_calls(caller)) == 3
+    # A fourth call inside 24 hours counts as "Multiple recent calls"
+    assert handler.assess_urgency("I have a leak", caller).urgency_score == first.urgency_score + 0.5
+
+    medium = handler.assess_urgency("my sink is clogged", "+15550003")
+    high = handler.assess_urgency("burst pipe in the basement", "+15550004")
+    await handler._add_to_priority_queue("CA-medium", medium)
+    await handler._add_to_priority_queue("CA-high", high)
+    assert high.urgency_level.value >= UrgencyLevel.HIGH.value
+
+    assert handler.next_dispatch()['call_sid'] == "CA-high"
+    assert handler.remove_from_priority_queue("CA-medium")
+    assert handler.next_dispatch() is None
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+def test_storm_surge_dispatch(redis_client):
+    queue = EmergencyDispatchQueue(redis_client)
+    rng = random.Random(5)
+    calls = [(f"CA{i}", round(rng.uniform(1, 7), 2), 1000.0 + i) for i in range(2000)]
+
+    start = time.perf_counter()
+    for call_sid, score, arrived_at in calls:
+        queue.push(call_sid, score, arrived_at=arrived_at)
+    served = [queue.pop() for _ in range(len(calls))]
+    elapsed = time.perf_counter() - start
+
+    print(f"\n2000 queued calls pushed and served in {elapsed * 1000:.0f}ms")
+    keys = [(-entry['urgency_score'], entry['arrived_at']) for entry in served]
+    assert keys == sorted(keys)
+
+
+def test_priority_customers_survive_a_redis_failure():
+    fakeredis = pytest.importorskip("fakeredis")
+    from src.voice_emergency_handler import EmergencyHandler
+
+    class FailingRedis(fakeredis.FakeRedis):
+        def smembers(self, name):
+            raise ConnectionError("redis down")
+
+    handler = EmergencyHandler(redis_client=FailingRedis(decode_responses=True))
+    assert handler._is_priority_customer("+15551234567")
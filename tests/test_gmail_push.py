@@ -0,0 +1,295 @@
+import base64
+import json
+import queue
+import random
+import statistics
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from src import gmail_push
+from src.gmail_push import (
+    GmailNotification, GmailPushDispatcher, GmailPushState, GmailWatchManager, decode_notification,
+    parse_push_envelope, process_mailbox_push
+)
+
+ADDRESS = 'hello@757handy.com'
+WEEK_MS = 7 * 24 * 3600 * 1000
+
+
+class FakeClock:
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+class Call:
+    def __init__(self, fn):
+        self.execute = fn
+
+
+class HistoryGone(Exception):
+    """googleapiclient HttpError surface: a 404 for a startHistoryId Gmail no longer keeps"""
+
+    class resp:
+        status = 404
+
+
+class FakeGmail:
+    """One mailbox's history, with users().watch and users().history().list in the API client's shape"""
+
+    def __init__(self, address=ADDRESS, publish=None, time_fn=time.time):
+        self.address = address
+        self.publish = publish or (lambda notification: None)
+        self.time_fn = time_fn
+        self.history_id = 1000
+        self.oldest_history_id = 0
+        self.records = []
+        self.inbox = {}
+        self.lock = threading.Lock()
+        self.history_calls = 0
+        self.watch_calls = []
+
+    def _record(self, kind, message_id):
+        with self.lock:
+            self.history_id += 1
+            self.records.append((self.history_id, kind, message_id))
+            history_id = self.history_id
+        data = json.dumps({'emailAddress': self.address, 'historyId': history_id}).encode()
+        self.publish({'message': {'data': base64.b64encode(data).decode(), 'messageId': str(history_id)},
+                      'subscription': 'projects/p/subscriptions/gmail-push'})
+
+    def deliver(self, message_id):
+        with self.lock:
+            self.inbox[message_id] = {'arrived_at': time.perf_counter(), 'processed': False}
+        self._record('messageAdded', message_id)
+
+    def add_label(self, message_id):
+        with self.lock:
+            self.inbox[message_id]['processed'] = True
+        self._record('labelAdded', message_id)
+
+    def users(self):
+        return self
+
+    def history(self):
+        return self
+
+    def list(self, userId, startHistoryId, historyTypes=None, labelId=None, pageToken=None):
+        def execute():
+            self.history_calls += 1
+            if startHistoryId < self.oldest_history_id:
+                raise HistoryGone()
+            with self.lock:
+                added = [{'id': str(h), 'messagesAdded': [{'message': {'id': m, 'labelIds': ['INBOX']}}]}
+                         for h, kind, m in self.records if h > startHistoryId and kind == historyTypes]
+                return {'history': added, 'historyId': str(self.history_id)}
+        return Call(execute)
+
+    def watch(self, userId, body):
+        def execute():
+            self.watch_calls.append(body)
+            return {'historyId': str(self.history_id), 'expiration': str(int(self.time_fn() * 1000) + WEEK_MS)}
+        return Call(execute)
+
+
+def envelope(address, history_id):
+    data = json.dumps({'emailAddress': address, 'historyId': history_id}).encode()
+    return {'message': {'data': base64.b64encode(data).decode(), 'messageId': '42'}}
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def state(request):
+    return GmailPushState(fakeredis.FakeRedis() if request.param == 'redis' else None)
+
+
+def test_notifications_decode_from_push_and_pull_messages():
+    assert parse_push_envelope(envelope('Hello@757handy.com', 1234)) == GmailNotification(ADDRESS, 1234, '42')
+    assert decode_notification(b'{"emailAddress": "hello@757handy.com", "historyId": "99"}').history_id == 99
+    for bad in ({}, {'message': {'data': 'not base64!'}}, envelope('x', 'abc')):
+        with pytest.raises(ValueError):
+            parse_push_envelope(bad)
+
+
+def test_notification_bursts_queue_one_run_per_mailbox(state):
+    queued = []
+    dispatcher = GmailPushDispatcher(state, lambda *args: queued.append(args), [ADDRESS, 'karen@example.com'])
+
+    for history_id in range(1001, 1006):
+        dispatcher.handle(GmailNotification(ADDRESS, history_id))
+    dispatcher.handle(GmailNotification('karen@example.com', 7))
+    dispatcher.handle(GmailNotification('stranger@example.com', 8))
+    assert queued == [(ADDRESS, 1001), ('karen@example.com', 7)]
+
+    # Once the run starts, a newer notification queues a follow-up; an old one does not
+    state.clear_pending(ADDRESS)
+    state.advance_history_id(ADDRESS, 1005)
+    assert not dispatcher.handle(GmailNotification(ADDRESS, 1004))
+    assert dispatcher.handle(GmailNotification(ADDRESS, 1006))
+    assert queued[-1] == (ADDRESS, 1006)
+
+
+def test_run_skips_the_fetch_when_no_message_reached_the_inbox(state):
+    gmail = FakeGmail()
+    gmail.deliver('m1')
+    state.advance_history_id(ADDRESS, 1000)
+    fetches, requeues = [], []
+
+    def run(history_id):
+        return process_mailbox_push(ADDRESS, history_id, gmail, lambda: fetches.append(history_id), state,
+                                    requeue=lambda: requeues.append(history_id))
+
+    assert run(1001) == 'processed'
+    gmail.add_label('m1')  # Our own label change notifies too
+    assert run(1002) == 'skipped'
+    assert fetches == [1001] and state.history_id(ADDRESS) == 1002
+
+    # A poll holds the mailbox: the run is requeued and stays the queued one
+    assert state.mark_pending(ADDRESS)
+    assert state.begin_processing(ADDRESS)
+    assert run(1003) == 'busy' and requeues == [1003]
+    assert not state.mark_pending(ADDRESS)
+    state.end_processing(ADDRESS)
+
+    # History expired on Gmail's side: fetch rather than miss mail
+    gmail.oldest_history_id = 5000
+    gmail.add_label('m1')
+    assert run(1003) == 'processed' and fetches == [1001, 1003]
+
+
+def test_watch_is_registered_and_renewed_a_day_ahead(state):
+    clock = FakeClock()
+    gmail = FakeGmail(time_fn=clock)
+    watches = GmailWatchManager(state, 'projects/p/topics/gmail-push', time_fn=clock)
+
+    assert watches.ensure_watch(ADDRESS, gmail)
+    assert gmail.watch_calls == [{'topicName': 'projects/p/topics/gmail-push', 'labelIds': ['INBOX'],
+                                  'labelFilterBehavior': 'INCLUDE'}]
+    assert state.history_id(ADDRESS) == 1000
+    assert state.watch_expiration(ADDRESS) == clock.now + WEEK_MS / 1000
+
+    clock.now += 5 * 24 * 3600
+    assert not watches.ensure_watch(ADDRESS, gmail)
+    clock.now += 24 * 3600 + 1
+    assert watches.ensure_watch(ADDRESS, gmail)
+    assert len(gmail.watch_calls) == 2
+
+
+def test_push_endpoint_checks_token_and_dispatches(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    handled, loop_threads = [], []
+
+    def handle(notification):
+        handled.append(notification)
+        loop_threads.append(threading.current_thread())
+
+    monkeypatch.setenv('GMAIL_PUSH_VERIFICATION_TOKEN', 'secret-token')
+    monkeypatch.setattr(gmail_push, 'get_push_dispatcher',
+                        lambda: type('Dispatcher', (), {'handle': staticmethod(handle)})())
+    app = FastAPI()
+    app.include_router(gmail_push.router)
+    client = TestClient(app)
+
+    assert client.post('/gmail/push?token=wrong', json=envelope(ADDRESS, 5)).status_code == 403
+    assert client.post('/gmail/push?token=secret-token', json={'message': {}}).status_code == 204
+    assert client.post('/gmail/push?token=secret-token', json=envelope(ADDRESS, 5)).status_code == 204
+    assert handled == [GmailNotification(ADDRESS, 5, '42')]
+    # Blocking Redis and broker calls run in the threadpool, not on the event loop
+    assert loop_threads[0].name.startswith('AnyIO worker thread')
+
+
+def test_publisher_app_is_built_once(monkeypatch):
+    apps, sent = [], []
+
+    class FakeCelery:
+        def __init__(self, name, broker=None):
+            apps.append(name)
+
+        def send_task(self, name, args, queue, headers):
+            sent.append((name, args, queue))
+
+    monkeypatch.setattr(gmail_push, 'Celery', FakeCelery)
+    monkeypatch.setattr(gmail_push, 'CELERY_AVAILABLE', True)
+    monkeypatch.setattr(gmail_push, '_publisher_app', None)
+    gmail_push._send_push_task(ADDRESS, 5)
+    gmail_push._send_push_task(ADDRESS, 6)
+
+    assert apps == ['gmail_push']
+    assert sent == [('process_gmail_push_task', [ADDRESS, 5], 'email'), ('process_gmail_push_task', [ADDRESS, 6], 'email')]
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+def test_new_mail_is_processed_within_seconds_of_arrival():
+    """An hour of mail compressed into three seconds: fake Pub/Sub delivery, two email workers"""
+    rng = random.Random(11)
+    hour = 3.0
+    arrivals = sorted(rng.uniform(0, hour) for _ in range(12))
+
+    state = GmailPushState(fakeredis.FakeRedis())
+    tasks = queue.Queue()
+    dispatcher = GmailPushDispatcher(state, lambda *args: tasks.put(args), [ADDRESS])
+
+    def publish(push_envelope):
+        # Pub/Sub push delivery takes tens of milliseconds
+        delay = rng.uniform(0.02, 0.15)
+        threading.Timer(delay, lambda: dispatcher.handle(parse_push_envelope(push_envelope))).start()
+
+    gmail = FakeGmail(publish=publish)
+    state.advance_history_id(ADDRESS, gmail.history_id)
+    waits, fetches = [], []
+
+    def process_mailbox():
+        started = time.perf_counter()
+        with gmail.lock:
+            new = [m for m, message in gmail.inbox.items() if not message['processed']]
+            waits.extend(started - gmail.inbox[m]['arrived_at'] for m in new)
+        fetches.append(len(new))
+        for message_id in new:
+            time.sleep(0.03)  # Reply drafted and sent
+            gmail.add_label(message_id)
+
+    def worker():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            email_address, history_id = task
+            process_mailbox_push(email_address, history_id, gmail, process_mailbox, state,
+                                 requeue=lambda: threading.Timer(0.05, tasks.put, args=(task,)).start())
+
+    workers = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in workers:
+        thread.start()
+    start = time.perf_counter()
+    for index, offset in enumerate(arrivals):
+        time.sleep(max(0.0, start + offset - time.perf_counter()))
+        gmail.deliver(f"m{index}")
+    time.sleep(1.0)
+    for _ in workers:
+        tasks.put(None)
+    for thread in workers:
+        thread.join()
+
+    # The same arrivals, spread over a real hour, under the two-minute poll
+    arrivals_in_hour = [offset * 3600 / hour for offset in arrivals]
+    polls = list(range(120, 3601, 120))
+    poll_waits = [next(p for p in polls if p >= arrival) - arrival for arrival in arrivals_in_hour]
+    empty_polls = sum(1 for p in polls if not any(p - 120 < a <= p for a in arrivals_in_hour))
+    # Push: empty fetches plus the four 15-minute safety polls, all assumed empty
+    push_empty = fetches.count(0) + 4
+
+    print(f"\n12 emails: push median wait {statistics.median(waits) * 1000:.0f}ms "
+          f"({len(fetches)} fetches, {fetches.count(0)} empty); two-minute poll median wait "
+          f"{statistics.median(poll_waits):.0f}s, {empty_polls} of {len(polls)} polls empty")
+    assert len(waits) == len(arrivals)  # Every email processed, and only once
+    assert statistics.median(waits) < 5
+    assert gmail.history_calls > len(fetches)  # Label-change notifications ended without a fetch
+    assert push_empty * 3 <= empty_polls
@@ -22,3 +22,28 @@ def test_faq_learning():
     agent.learn_from_interaction('c1', interaction)
     faqs = agent.list_faqs()
     assert any(faq.question == 'How long does a sink repair take?' for faq in faqs)
+
+def test_search_knowledge_ranks_and_tracks_updates():
+    agent = KnowledgeBaseAgent(user_role='admin')
+    agent.add_procedure(Procedure(id='p1', name='Fix Sink', description='Fix leaking kitchen sink', estimated_time_minutes=60, required_tools=['wrench'], price=120.0))
+    agent.add_procedure(Procedure(id='p2', name='Patch Drywall', description='Patch holes near the sink cabinet', estimated_time_minutes=90, required_tools=['knife'], price=150.0))
+    agent.add_procedure(Procedure(id='p3', name='Paint Fence', description='Paint a wooden fence', estimated_time_minutes=240, required_tools=['brush'], price=400.0))
+
+    results = agent.search_knowledge('leaking sinks')
+    assert [r['id'] for r in results] == ['p1', 'p2']
+    assert results[0]['relevance_score'] > results[1]['relevance_score']
+
+    agent.update_procedure('p3', {'description': 'Paint fence and fix sink drain'})
+    assert 'p3' in [r['id'] for r in agent.search_knowledge('drain')]
+
+    agent.delete_procedure('p1')
+    assert 'p1' not in [r['id'] for r in agent.search_knowledge('sink')]
+
+def test_learned_faqs_are_searchable_and_deduplicated():
+    agent = KnowledgeBaseAgent(user_role='admin')
+    agent.learn_from_interaction('c1', {'question': 'What does a water heater flush cost?'})
+    agent.learn_from_interaction('c2', {'question': 'what does a water heater flush cost?'})
+    assert len(agent.list_faqs()) == 1
+
+    results = agent.search_knowledge('water heater', limit=5)
+    assert len(results) == 1 and results[0]['type'] == 'faq'
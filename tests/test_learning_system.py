@@ -0,0 +1,59 @@
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src.learning_system import LearningSystem, WriteBehindPersistence
+
+
+@pytest.fixture
+def learning_system(tmp_path):
+    with patch('src.learning_system.AgentCommunication'):
+        system = LearningSystem(flush_interval=60.0, flush_every=1000)
+    system.patterns_dir = tmp_path / 'patterns'
+    system.improvements_dir = tmp_path / 'improvements'
+    system.patterns_dir.mkdir()
+    system.improvements_dir.mkdir()
+    yield system
+    system.close()
+
+
+def test_task_completion_does_not_write_synchronously(learning_system):
+    learning_system.analyze_task_completion('t1', 'agent_a', True, 12.0, {'task_type': 'email'})
+
+    assert not (learning_system.patterns_dir / 'task_patterns.json').exists()
+    assert learning_system._persistence.pending == 1
+
+    learning_system.flush_learning_data()
+    data = json.loads((learning_system.patterns_dir / 'task_patterns.json').read_text())
+    assert 'agent_task_agent_a_email' in data
+    assert learning_system._persistence.pending == 0
+
+
+def test_histories_are_bounded_with_running_average(learning_system):
+    total = LearningSystem.PERFORMANCE_HISTORY_SIZE + 250
+    for i in range(total):
+        learning_system.analyze_task_completion(f't{i}', 'agent_a', True, float(i), {})
+
+    assert len(learning_system.performance_history) == LearningSystem.PERFORMANCE_HISTORY_SIZE
+    expected = sum(range(250, total)) / LearningSystem.PERFORMANCE_HISTORY_SIZE
+    health = learning_system._calculate_system_health()
+    assert health['avg_completion_time_minutes'] == pytest.approx(expected)
+
+
+def test_write_behind_flushes_after_batch_size(tmp_path):
+    flushed = []
+    persistence = WriteBehindPersistence(flushed.append, flush_interval=60.0, max_pending=3)
+    try:
+        persistence.mark_dirty('task_patterns')
+        persistence.mark_dirty('failure_patterns')
+        assert flushed == []
+        persistence.mark_dirty('task_patterns')
+
+        deadline = time.time() + 2.0
+        while not flushed and time.time() < deadline:
+            time.sleep(0.01)
+        assert flushed == [{'task_patterns', 'failure_patterns'}]
+    finally:
+        persistence.close()
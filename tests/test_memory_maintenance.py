@@ -0,0 +1,186 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.memory_maintenance import CollectionMaintainer, MaintenancePolicy
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+class FakeCollection:
+    """Chroma collection API over a dict, squared L2 distances, insertion order"""
+
+    name = 'conversations'
+
+    def __init__(self):
+        self.records = {}
+        self.largest_page = 0
+        self.largest_window = 0
+
+    def add(self, record_id, embedding, **metadata):
+        self.records[record_id] = (list(embedding), metadata)
+
+    def count(self):
+        return len(self.records)
+
+    def get(self, ids=None, limit=None, offset=0, include=()):
+        if ids is not None:
+            items = [(record_id, self.records[record_id]) for record_id in ids if record_id in self.records]
+        else:
+            items = list(self.records.items())[offset:offset + limit if limit else None]
+            self.largest_window = max(self.largest_window, len(items))
+        if 'embeddings' in include:
+            self.largest_page = max(self.largest_page, len(items))
+        return {
+            'ids': [record_id for record_id, _ in items],
+            'embeddings': [embedding for _, (embedding, _) in items],
+            'metadatas': [dict(metadata) for _, (_, metadata) in items],
+        }
+
+    def query(self, query_embeddings, n_results, include=()):
+        results = {'ids': [], 'distances': [], 'metadatas': []}
+        for query in query_embeddings:
+            nearest = sorted(
+                (sum((a - b) ** 2 for a, b in zip(query, embedding)), record_id, metadata)
+                for record_id, (embedding, metadata) in self.records.items()
+            )[:n_results]
+            results['ids'].append([record_id for _, record_id, _ in nearest])
+            results['distances'].append([distance for distance, _, _ in nearest])
+            results['metadatas'].append([dict(metadata) for _, _, metadata in nearest])
+        return results
+
+    def update(self, ids, metadatas):
+        for record_id, metadata in zip(ids, metadatas):
+            embedding, _ = self.records[record_id]
+            self.records[record_id] = (embedding, metadata)
+
+    def delete(self, ids):
+        for record_id in ids:
+            del self.records[record_id]
+
+
+def days_ago(days):
+    return (NOW - timedelta(days=days)).isoformat()
+
+
+def maintainer(collection, **policy):
+    policy.setdefault('latency_probes', 0)
+    return CollectionMaintainer(collection, MaintenancePolicy(**policy), time_fn=NOW.timestamp)
+
+
+def test_near_duplicates_merge_into_oldest_in_scope():
+    collection = FakeCollection()
+    collection.add('a1', [1.0, 0.0], conversation_id='c1', timestamp=days_ago(3))
+    collection.add('a2', [1.0, 0.01], conversation_id='c1', timestamp=days_ago(2))
+    collection.add('a3', [0.99, 0.0], conversation_id='c1', timestamp=days_ago(1))
+    # Same text in another conversation, and a different turn in the same one
+    collection.add('b1', [1.0, 0.0], conversation_id='c2', timestamp=days_ago(1))
+    collection.add('a4', [0.0, 1.0], conversation_id='c1', timestamp=days_ago(1))
+
+    report = maintainer(collection).run()
+
+    assert sorted(collection.records) == ['a1', 'a4', 'b1']
+    survivor = collection.records['a1'][1]
+    assert survivor['duplicate_count'] == 2
+    assert survivor['last_seen'] == days_ago(1)
+    assert (report.duplicates_removed, report.survivors_merged, report.records_reclaimed) == (2, 1, 2)
+
+
+def test_records_without_scope_are_never_merged():
+    collection = FakeCollection()
+    collection.add('n1', [1.0, 0.0], timestamp=days_ago(3))
+    collection.add('n2', [1.0, 0.0], timestamp=days_ago(2))
+    collection.add('a1', [1.0, 0.0], conversation_id='c1', timestamp=days_ago(1))
+
+    report = maintainer(collection).run()
+
+    assert sorted(collection.records) == ['a1', 'n1', 'n2']
+    assert report.duplicates_removed == 0
+
+
+def test_retention_prunes_expired_and_never_merges_into_them():
+    collection = FakeCollection()
+    collection.add('old', [1.0, 0.0], conversation_id='c1', timestamp=days_ago(400))
+    collection.add('recent', [1.0, 0.0], conversation_id='c1', timestamp=days_ago(10))
+    collection.add('undated', [0.0, 1.0], conversation_id='c1')
+
+    report = maintainer(collection, retention_days=365).run()
+
+    assert sorted(collection.records) == ['recent', 'undated']
+    assert 'duplicate_count' not in collection.records['recent'][1]
+    assert (report.expired_removed, report.duplicates_removed) == (1, 0)
+
+
+def test_paging_is_bounded_and_visits_every_record():
+    rng = random.Random(7)
+    collection = FakeCollection()
+    originals = []
+    for i in range(120):
+        embedding = [rng.uniform(-1, 1) for _ in range(4)]
+        originals.append(embedding)
+        collection.add(f"turn{i}", embedding, conversation_id=f"c{i % 3}", timestamp=days_ago(30 + i % 7))
+    # Re-sent turns land on later pages than the originals they duplicate
+    for i in range(0, 120, 4):
+        collection.add(f"resent{i}", [value + 0.001 for value in originals[i]],
+                       conversation_id=f"c{i % 3}", timestamp=days_ago(1))
+    for i in range(0, 120, 10):
+        collection.add(f"stale{i}", originals[i], conversation_id=f"c{i % 3}", timestamp=days_ago(500))
+
+    report = maintainer(collection, page_size=25, retention_days=365).run()
+
+    assert collection.largest_page <= 25 and collection.largest_window <= 25
+    assert report.scanned == report.records_before == 120 + 30 + 12
+    assert (report.duplicates_removed, report.expired_removed) == (30, 12)
+    assert report.records_after == collection.count() == 120
+    assert all(not record_id.startswith(('resent', 'stale')) for record_id in collection.records)
+
+
+def test_report_measures_query_latency():
+    collection = FakeCollection()
+    for i in range(40):
+        collection.add(f"turn{i}", [1.0, 0.0], conversation_id='c1', timestamp=days_ago(i + 1))
+
+    report = maintainer(collection, latency_probes=5).run()
+
+    assert report.records_after == 1
+    assert report.query_latency_before_ms is not None and report.query_latency_after_ms is not None
+    data = report.to_dict()
+    assert data['records_reclaimed'] == 39
+    assert 'query_latency_improvement_pct' in data
+
+
+def test_maintains_a_persistent_chroma_collection(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    from chromadb.config import Settings
+
+    from src.memory_maintenance import maintain_persistent_collection
+
+    client = chromadb.PersistentClient(path=str(tmp_path),
+                                       settings=Settings(anonymized_telemetry=False, allow_reset=True))
+    collection = client.create_collection('conversations', embedding_function=None)
+    rng = random.Random(3)
+    originals = [[rng.uniform(-1, 1) for _ in range(8)] for _ in range(60)]
+    ids, embeddings, metadatas = [], [], []
+    for i, embedding in enumerate(originals):
+        ids.append(f"turn{i}")
+        embeddings.append(embedding)
+        metadatas.append({'conversation_id': f"c{i % 3}", 'timestamp': days_ago(30)})
+    for i in range(0, 60, 5):
+        ids.append(f"resent{i}")
+        embeddings.append([value + 0.001 for value in originals[i]])
+        metadatas.append({'conversation_id': f"c{i % 3}", 'timestamp': days_ago(1)})
+    ids.append('stale')
+    embeddings.append([5.0] * 8)
+    metadatas.append({'conversation_id': 'c0', 'timestamp': days_ago(500)})
+    collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas)
+
+    policy = MaintenancePolicy(page_size=16, latency_probes=3, retention_days=365)
+    report = maintain_persistent_collection(str(tmp_path), 'conversations', policy)
+
+    assert report.scanned == report.records_before == 73
+    assert (report.duplicates_removed, report.expired_removed, report.survivors_merged) == (12, 1, 12)
+    remaining = client.get_collection('conversations').get(include=['metadatas'])
+    assert sorted(remaining['ids']) == sorted(f"turn{i}" for i in range(60))
+    merged = dict(zip(remaining['ids'], remaining['metadatas']))['turn0']
+    assert merged['duplicate_count'] == 1 and merged['last_seen'] == days_ago(1)
@@ -0,0 +1,108 @@
+import itertools
+from datetime import datetime
+
+import pytest
+
+from src.route_planner import (
+    Crew, LocalTravelProvider, PlannedAppointment, RoutePlanner, TravelTimeCache
+)
+
+# Depots and job sites laid out along two lines east and north of the shop
+COORDINATES = {
+    "Shop, Norfolk VA": (36.85, -76.29),
+    **{f"{i} East Rd, Norfolk VA": (36.85, -76.29 + 0.02 * i) for i in range(1, 6)},
+    **{f"{i} North Ave, Norfolk VA": (36.85 + 0.02 * i, -76.29) for i in range(1, 6)},
+}
+
+DAY = datetime(2025, 6, 2)
+
+
+def make_crew(crew_id, **kwargs):
+    return Crew(crew_id, "Shop, Norfolk VA", DAY.replace(hour=8), DAY.replace(hour=18), **kwargs)
+
+
+def make_appointments(addresses, duration=60):
+    return [PlannedAppointment(f"job-{i}", address, duration) for i, address in enumerate(addresses)]
+
+
+@pytest.fixture
+def provider():
+    return LocalTravelProvider(COORDINATES)
+
+
+@pytest.fixture
+def planner(provider):
+    return RoutePlanner(TravelTimeCache(provider=provider, fallback_fn=lambda a, b: 30))
+
+
+def test_matrix_is_fetched_once_and_cached(provider):
+    cache = TravelTimeCache(provider=provider)
+    addresses = list(COORDINATES)
+
+    first = cache.matrix(addresses)
+    # Every ordered pair once, never an address to itself
+    assert provider.elements_requested == len(addresses) * (len(addresses) - 1)
+    assert all(first[i][i] == 0 for i in range(len(addresses)))
+
+    # Address formatting differences hit the same cache entries
+    requests = provider.matrix_requests
+    assert cache.travel_time("  1 east rd,norfolk va", "shop, NORFOLK VA") == first[1][0]
+    assert cache.matrix(addresses[:4]) == [row[:4] for row in first[:4]]
+    assert provider.matrix_requests == requests
+    assert cache.hits == 2
+
+
+def test_single_pair_costs_one_element_without_geocoding(provider, monkeypatch):
+    cache = TravelTimeCache(provider=provider)
+    monkeypatch.setattr(provider, 'geocode', lambda address: pytest.fail("geocoded a single pair"))
+
+    minutes = cache.travel_time("1 East Rd, Norfolk VA", "Shop, Norfolk VA")
+    assert minutes > 0
+    assert (provider.matrix_requests, provider.elements_requested) == (1, 1)
+    assert cache.travel_time("Shop, Norfolk VA", "shop, norfolk va") == 0
+    assert provider.elements_requested == 1
+
+
+def test_unknown_addresses_use_fallback(provider):
+    cache = TravelTimeCache(provider=provider, fallback_fn=lambda a, b: 42)
+    assert cache.travel_time("Shop, Norfolk VA", "Somewhere unknown") == 42
+
+
+def test_crews_split_by_direction(planner):
+    east = [f"{i} East Rd, Norfolk VA" for i in range(1, 6)]
+    north = [f"{i} North Ave, Norfolk VA" for i in range(1, 6)]
+    plan = planner.plan_day([make_crew("a"), make_crew("b")], make_appointments(east + north, duration=90))
+
+    assert plan.unassigned == []
+    routes = [{stop.appointment.address for stop in route.stops} for route in plan.routes.values()]
+    assert sorted(routes, key=len) == sorted([set(east), set(north)], key=len)
+    for route in plan.routes.values():
+        assert all(a.end <= b.arrival for a, b in zip(route.stops, route.stops[1:]))
+
+
+def test_single_crew_route_is_optimal(planner):
+    addresses = ["3 East Rd, Norfolk VA", "1 East Rd, Norfolk VA", "5 East Rd, Norfolk VA",
+                 "2 North Ave, Norfolk VA", "4 East Rd, Norfolk VA"]
+    crew = make_crew("solo")
+    plan = planner.plan_day([crew], make_appointments(addresses, duration=30))
+
+    best = min(planner._route_cost(crew, list(order))
+               for order in itertools.permutations(make_appointments(addresses, duration=30)))
+    assert plan.total_travel_minutes == best
+
+
+def test_skills_windows_and_shift_limits(planner):
+    crews = [make_crew("general"), make_crew("electric", skills={"electrical"})]
+    appointments = [
+        PlannedAppointment("panel", "5 North Ave, Norfolk VA", 120, required_skills={"electrical"}),
+        PlannedAppointment("late", "1 East Rd, Norfolk VA", 60, earliest_start=DAY.replace(hour=15)),
+        PlannedAppointment("huge", "2 East Rd, Norfolk VA", 11 * 60),
+    ]
+    plan = planner.plan_day(crews, appointments)
+
+    assert [stop.appointment.appointment_id for stop in plan.routes["electric"].stops][0] == "panel"
+    late_stop = next(stop for route in plan.routes.values() for stop in route.stops
+                     if stop.appointment.appointment_id == "late")
+    assert late_stop.start == DAY.replace(hour=15)
+    assert [a.appointment_id for a in plan.unassigned] == ["huge"]
+    assert plan.to_dict()["unassigned"] == ["huge"]
@@ -0,0 +1,107 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.slot_engine import SlotEngine, merge_intervals, top_scored
+
+
+def brute_force_starts(busy, windows, duration_minutes, step_minutes, buffer_minutes):
+    """Reference: the original check of every grid candidate against every busy period"""
+    duration = timedelta(minutes=duration_minutes)
+    step = timedelta(minutes=step_minutes)
+    buffer = timedelta(minutes=buffer_minutes)
+    starts = []
+    for first, latest in sorted(windows):
+        current = first
+        while current <= latest:
+            if not any(current < end + buffer and current + duration > start - buffer for start, end in busy):
+                starts.append(current)
+            current += step
+    return starts
+
+
+def dense_month(rng, start, days=30, bookings_per_day=8):
+    busy = []
+    for day in range(days):
+        day_start = start + timedelta(days=day, hours=7)
+        for _ in range(bookings_per_day):
+            booking_start = day_start + timedelta(minutes=15 * rng.randrange(0, 44))
+            busy.append((booking_start, booking_start + timedelta(minutes=rng.choice((30, 45, 60, 90, 120)))))
+    return busy
+
+
+def business_windows(start, days, duration_minutes, buffer_minutes):
+    return [(start + timedelta(days=d, hours=8),
+             start + timedelta(days=d, hours=17) - timedelta(minutes=duration_minutes + buffer_minutes))
+            for d in range(days)]
+
+
+def test_merge_intervals_applies_buffer_and_merges():
+    base = datetime(2025, 6, 2, 9)
+    merged = merge_intervals([
+        (base + timedelta(hours=2), base + timedelta(hours=3)),
+        (base, base + timedelta(hours=1)),
+        (base + timedelta(minutes=70), base + timedelta(minutes=90)),
+    ], buffer=timedelta(minutes=10))
+    assert merged == [
+        (base - timedelta(minutes=10), base + timedelta(minutes=100)),
+        (base + timedelta(minutes=110), base + timedelta(minutes=190)),
+    ]
+
+
+def test_free_gaps_and_is_free():
+    base = datetime(2025, 6, 2, 8)
+    engine = SlotEngine([(base + timedelta(hours=1), base + timedelta(hours=2))])
+    assert engine.free_gaps(base, base + timedelta(hours=4)) == [
+        (base, base + timedelta(hours=1)),
+        (base + timedelta(hours=2), base + timedelta(hours=4)),
+    ]
+    assert engine.is_free(base, base + timedelta(hours=1))
+    assert not engine.is_free(base + timedelta(minutes=30), base + timedelta(minutes=90))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_candidate_starts_match_brute_force(seed):
+    rng = random.Random(seed)
+    start = datetime(2025, 6, 2)
+    busy = dense_month(rng, start, days=7, bookings_per_day=rng.randrange(1, 10))
+    for duration, step, buffer in ((60, 30, 15), (120, 30, 0), (45, 60, 10)):
+        windows = business_windows(start, 7, duration, buffer)
+        engine = SlotEngine(busy, buffer_minutes=buffer)
+        assert engine.candidate_starts(windows, duration, step) == \
+            brute_force_starts(busy, windows, duration, step, buffer)
+
+
+def test_top_scored_prefers_higher_score_then_earlier():
+    base = datetime(2025, 6, 2, 9)
+    candidates = [base + timedelta(minutes=30 * i) for i in range(6)]
+    preferred = base + timedelta(hours=1)
+    best = top_scored(candidates, lambda c: -abs((c - preferred).total_seconds()), 3)
+    assert [c for _, c in best] == [preferred, preferred - timedelta(minutes=30), preferred + timedelta(minutes=30)]
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+def test_month_of_dense_bookings_benchmark():
+    """Slot search over 30 days of dense bookings for several technicians"""
+    rng = random.Random(42)
+    start = datetime(2025, 6, 2)
+    technicians = {f"tech_{i}": dense_month(rng, start, bookings_per_day=12) for i in range(8)}
+    duration, buffer = 90, 15
+    windows = business_windows(start, 30, duration, buffer)
+
+    t0 = time.perf_counter()
+    legacy = {tech: brute_force_starts(busy, windows, duration, 30, buffer) for tech, busy in technicians.items()}
+    legacy_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    engine = {tech: SlotEngine(busy, buffer).candidate_starts(windows, duration, 30)
+              for tech, busy in technicians.items()}
+    engine_seconds = time.perf_counter() - t0
+
+    print(f"\nSlot search, {len(technicians)} technicians x 30 days: "
+          f"legacy {legacy_seconds * 1000:.1f}ms, engine {engine_seconds * 1000:.1f}ms")
+    assert engine == legacy
+    assert engine_seconds < legacy_seconds
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("googleapiclient.discovery")
+pytz = pytest.importorskip("pytz")
+
+from src import datetime_utils
+from src.calendar_client import CalendarClient
+
+
+class Call:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeEvents:
+    """events().insert/patch of the Calendar API, recording request bodies"""
+
+    def __init__(self):
+        self.bodies = []
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId, body):
+        self.bodies.append(body)
+        return Call({'id': 'evt1', **body})
+
+    def patch(self, calendarId, eventId, body):
+        self.bodies.append(body)
+        return Call({'id': eventId, **body})
+
+
+class NoopBusyCache:
+    def record_event(self, calendar_id, event):
+        pass
+
+
+@pytest.fixture
+def booking(monkeypatch):
+    # The module imports a parser datetime_utils does not provide yet
+    monkeypatch.setattr(datetime_utils, 'parse_natural_datetime', lambda message: None, raising=False)
+    from src import sms_appointment_integration
+
+    monkeypatch.setattr(sms_appointment_integration, 'ConversationManager', lambda: type(
+        'Conversations', (), {'update_conversation_state': lambda self, phone, context: None})())
+    calendar = CalendarClient.__new__(CalendarClient)
+    calendar.service = FakeEvents()
+    calendar.busy_cache = NoopBusyCache()
+    monkeypatch.setattr(calendar, '_ensure_valid_credentials', lambda: True)
+    return sms_appointment_integration, sms_appointment_integration.SMSAppointmentBooking(calendar)
+
+
+def slot(module, start):
+    return module.AppointmentSlot(datetime=start, duration_minutes=90, available=True,
+                                  display_text="Tuesday, July 14 at 9:00 am (1h)", slot_id="s1")
+
+
+def test_booked_and_rescheduled_slots_keep_their_local_time(booking):
+    module, sms_booking = booking
+    # 9:00 and 14:00 in Norfolk: EDT in July, EST in January
+    confirmed = sms_booking.confirm_appointment(slot(module, datetime(2026, 7, 14, 9, 0)), "+17575550100",
+                                                {'service_type': 'plumbing'})
+    moved = sms_booking.reschedule_appointment("+17575550100", "evt1", slot(module, datetime(2027, 1, 12, 14, 0)))
+
+    assert confirmed['success'] and confirmed['event_id'] == 'evt1' and moved['success']
+    created, patched = sms_booking.calendar.service.bodies
+    assert created['start'] == {'dateTime': '2026-07-14T09:00:00-04:00'}
+    assert created['end'] == {'dateTime': '2026-07-14T10:30:00-04:00'}
+    assert patched['start'] == {'dateTime': '2027-01-12T14:00:00-05:00'}
+    assert patched['end'] == {'dateTime': '2027-01-12T15:30:00-05:00'}
+
+
+def test_busy_times_are_matched_in_business_hours(booking):
+    module, sms_booking = booking
+    tomorrow = (datetime.now(pytz.timezone('America/New_York')) + timedelta(days=1)).date()
+    start = pytz.timezone('America/New_York').localize(datetime.combine(tomorrow, datetime.min.time()))
+    # Busy 10:00-18:00 local, reported in naive UTC
+    busy_start = (start + timedelta(hours=10)).astimezone(pytz.utc).replace(tzinfo=None)
+    sms_booking.calendar.get_busy_times = lambda query_start, query_end: [
+        {'start': busy_start, 'end': busy_start + timedelta(hours=8)}]
+    request = module.AppointmentRequest("+17575550100", None, 'general_repair', 'normal', '', ['weekend'],
+                                        module.AppointmentStatus.REQUESTED)
+
+    offered = [s.datetime.hour for s in sms_booking.find_available_slots(request, days_ahead=2)
+               if s.datetime.date() == tomorrow]
+    assert offered == [8, 9]
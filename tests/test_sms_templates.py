@@ -0,0 +1,113 @@
+import re
+import time
+
+import pytest
+
+from src.sms_templates import SMSTemplateSystem
+from src.text_matching import AhoCorasickMatcher
+
+
+def legacy_fill_template(template, variables):
+    """Reference implementation of the original replace/findall/sub renderer"""
+    template_text = template["template"]
+    for var, value in variables.items():
+        template_text = template_text.replace(f"{{{var}}}", str(value))
+    missing_vars = re.findall(r'\{(\w+)\}', template_text)
+    if missing_vars and "fallback" in template:
+        return template["fallback"]
+    for var in missing_vars:
+        template_text = template_text.replace(f"{{{var}}}", "")
+    return re.sub(r'\s+', ' ', template_text).strip()
+
+
+def legacy_classify(quick_replies, message):
+    message_clean = message.lower().strip()
+    for reply_type, patterns in quick_replies.items():
+        if any(pattern in message_clean for pattern in patterns):
+            return reply_type
+    return None
+
+
+SAMPLE_VARIABLES = {
+    "customer_name": "Dana",
+    "service_type": "drywall  repair",
+    "date": "Monday, June 9",
+    "time": "10:00 AM",
+    "address": "12 Main St",
+    "amount": "$150",
+    "phone": "757-555-0100",
+}
+
+SAMPLE_MESSAGES = [
+    "Yes", "nope", "can we reschedule?", "EMERGENCY water everywhere", "thanks!!",
+    "tell me more about pricing", "👍", "I know", "hmm", "  OK  ", "", "please help asap",
+]
+
+
+@pytest.fixture
+def template_system(tmp_path):
+    return SMSTemplateSystem(templates_dir=str(tmp_path))
+
+
+def test_fill_template_matches_legacy_renderer(template_system):
+    for name, template in template_system.templates.items():
+        for variables in (SAMPLE_VARIABLES, {}, {"customer_name": "Lee"}):
+            expected = legacy_fill_template(template, variables)
+            assert template_system.fill_template(name, variables) == expected, name
+
+
+def test_missing_variables_render_empty_without_fallback(template_system):
+    template_system.add_template("bare", "general", "Hi {customer_name},   see you {time}.")
+    assert template_system.fill_template("bare", {"time": "soon"}, use_fallback=False) == "Hi , see you soon."
+
+
+def test_update_template_recompiles(template_system):
+    template_system.add_template("custom", "general", "Hello {customer_name}")
+    assert template_system.fill_template("custom", {"customer_name": "Ana"}) == "Hello Ana"
+
+    template_system.update_template("custom", template="Bye {customer_name}!")
+    assert template_system.fill_template("custom", {"customer_name": "Ana"}) == "Bye Ana!"
+
+    # In-place edits of the dict are picked up as well
+    template_system.templates["custom"]["template"] = "Later {customer_name}"
+    assert template_system.fill_template("custom", {"customer_name": "Ana"}) == "Later Ana"
+
+
+def test_classify_quick_reply_matches_substring_scan(template_system):
+    for message in SAMPLE_MESSAGES:
+        expected = legacy_classify(template_system.quick_replies, message)
+        assert template_system.classify_quick_reply(message) == expected, message
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = AhoCorasickMatcher.from_label_map({"a": ["he", "hers"], "b": ["she"], "c": ["is"]})
+    assert matcher.find_labels("ushers") == {"a", "b"}
+    assert matcher.find_labels("this") == {"c"}
+    assert matcher.find_labels("xyz") == set()
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+def test_sms_burst_benchmark(template_system):
+    """Render and classify 100k messages, comparing against the legacy path"""
+    message_count = 100_000
+    names = list(template_system.templates)
+    messages = [SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)] for i in range(message_count)]
+
+    def timed(step):
+        start = time.perf_counter()
+        for i in range(message_count):
+            step(i)
+        return time.perf_counter() - start
+
+    legacy_render = timed(lambda i: legacy_fill_template(template_system.templates[names[i % len(names)]],
+                                                         SAMPLE_VARIABLES))
+    compiled_render = timed(lambda i: template_system.fill_template(names[i % len(names)], SAMPLE_VARIABLES))
+    legacy_classify_seconds = timed(lambda i: legacy_classify(template_system.quick_replies, messages[i]))
+    compiled_classify = timed(lambda i: template_system.classify_quick_reply(messages[i]))
+
+    print(f"\nSMS burst ({message_count} messages): render legacy {legacy_render:.2f}s, "
+          f"compiled {compiled_render:.2f}s; classify legacy {legacy_classify_seconds:.2f}s, "
+          f"Aho-Corasick {compiled_classify:.2f}s")
+    # Only rendering is asserted: the pure-Python automaton loses to `in` scans on long messages
+    assert compiled_render < legacy_render
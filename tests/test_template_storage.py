@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from src.template_storage import MAX_RECENT_VERSIONS, TemplateStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return TemplateStorage(str(tmp_path / "sms_templates.json"))
+
+
+def test_saves_do_not_copy_full_backups(storage):
+    template = storage.load_template("general_greeting")
+    for i in range(5):
+        template["template"] = f"Hello {{customer_name}} #{i}"
+        assert storage.save_template("general_greeting", template, "tester")
+
+    assert list(storage.backup_dir.iterdir()) == []
+    manifest = json.loads(storage.manifest_file.read_text())
+    assert manifest["general_greeting"] == storage._checksums["general_greeting"]
+    assert len(storage.version_log_file.read_text().splitlines()) == 5
+
+
+def test_identical_bodies_are_stored_once(storage):
+    objects_before = len(list(storage.objects_dir.iterdir()))
+    body = {"template": "Same {x}", "variables": ["x"], "category": "general"}
+
+    first = storage._store_object(body)
+    second = storage._store_object(dict(body))
+
+    assert first == second
+    assert len(list(storage.objects_dir.iterdir())) == objects_before + 1
+
+
+def test_rollback_restores_snapshot(storage):
+    template = storage.load_template("general_greeting")
+    template["template"] = "First {customer_name}"
+    storage.save_template("general_greeting", template)
+    template["template"] = "Second {customer_name}"
+    storage.save_template("general_greeting", template)
+
+    assert storage.rollback_template("general_greeting", "v1")
+    assert storage.load_template("general_greeting")["template"] == "First {customer_name}"
+    assert not storage.rollback_template("general_greeting", "v99")
+
+
+def test_old_versions_are_read_from_the_log(storage):
+    template = storage.load_template("general_greeting")
+    for i in range(MAX_RECENT_VERSIONS + 5):
+        template["template"] = f"Hello {{customer_name}} #{i}"
+        storage.save_template("general_greeting", template)
+
+    assert len(storage.versions["general_greeting"]) == MAX_RECENT_VERSIONS
+    history = storage.get_template_versions("general_greeting")
+    assert [v.version for v in history] == [f"v{i}" for i in range(1, MAX_RECENT_VERSIONS + 6)]
+    assert storage.get_template_stats()["total_versions"] == MAX_RECENT_VERSIONS + 5
+
+    assert storage.rollback_template("general_greeting", "v1")
+    assert storage.load_template("general_greeting")["template"] == "Hello {customer_name} #0"
+
+
+def test_reload_from_manifest_and_version_log(storage, tmp_path):
+    template = storage.load_template("general_greeting")
+    template["template"] = "Reloaded {customer_name}"
+    storage.save_template("general_greeting", template)
+    storage.delete_template("referral_request")
+
+    reloaded = TemplateStorage(str(tmp_path / "sms_templates.json"))
+    assert reloaded.load_template("general_greeting")["template"] == "Reloaded {customer_name}"
+    assert reloaded.load_template("referral_request") is None
+    assert [v.version for v in reloaded.get_template_versions("general_greeting")] == ["v1"]
+
+
+def test_search_index_tracks_updates(storage):
+    assert storage.search_templates("zebra") == []
+
+    template = storage.load_template("need_more_info")
+    template["template"] = "Tell me about the zebra {topic}"
+    template["category"] = "wildlife"
+    storage.save_template("need_more_info", template)
+
+    results = storage.search_templates("zebra")
+    assert [r["name"] for r in results] == ["need_more_info"]
+    assert "wildlife" in storage.list_categories()
+
+    storage.delete_template("need_more_info")
+    assert storage.search_templates("zebra") == []
+    assert "wildlife" not in storage.list_categories()
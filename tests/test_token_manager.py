@@ -0,0 +1,299 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs
+
+import pytest
+
+pytest.importorskip("google.oauth2.credentials")
+
+from src import token_manager
+from src.token_manager import EnhancedTokenManager, RefreshSchedule
+
+PROFILE = 'gmail_monitor'
+
+
+class FakeResponse:
+    def __init__(self, status, payload):
+        self.status = status
+        self.headers = {'content-type': 'application/json'}
+        self.data = json.dumps(payload).encode('utf-8')
+
+
+class FakeTokenEndpoint:
+    """OAuth token endpoint in the shape of google-auth's transport Request, with per-token latency"""
+
+    def __init__(self):
+        self.latency = {}
+        self.rejected = set()
+        self.calls = []
+        self.started = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        refresh_token = parse_qs(body)['refresh_token'][0]
+        with self.lock:
+            self.calls.append(refresh_token)
+        self.started.setdefault(refresh_token, threading.Event()).set()
+        time.sleep(self.latency.get(refresh_token, 0.0))
+        if refresh_token in self.rejected:
+            return FakeResponse(400, {'error': 'invalid_grant', 'error_description': 'Token has been revoked.'})
+        return FakeResponse(200, {'access_token': f"access-{refresh_token}-{len(self.calls)}",
+                                  'expires_in': 3600, 'token_type': 'Bearer'})
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    endpoint = FakeTokenEndpoint()
+    monkeypatch.setattr(token_manager, 'GoogleAuthRequest', lambda: endpoint)
+    return endpoint
+
+
+class FakeClock:
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch, endpoint):
+    monkeypatch.setattr(EnhancedTokenManager, '_start_background_monitor', lambda self: None)
+    manager = EnhancedTokenManager(str(tmp_path))
+    manager.retry_attempts = 1
+    return manager
+
+
+def store_token(manager, email, expires_in):
+    manager._save_token_data(PROFILE, email, {
+        'token': f"access-{email}",
+        'refresh_token': email,
+        'token_uri': 'https://oauth2.example.test/token',
+        'client_id': 'client',
+        'client_secret': 'secret',
+        'scopes': manager.profiles[PROFILE]['scopes'],
+        'expiry': (datetime.utcnow() + expires_in).isoformat(),
+    })
+
+
+def test_valid_credentials_are_served_from_memory(manager, endpoint, monkeypatch):
+    store_token(manager, 'office@example.com', timedelta(hours=1))
+    first = manager.get_credentials(PROFILE, 'office@example.com')
+
+    loads = []
+    original_load = manager._load_token_data
+    monkeypatch.setattr(manager, '_load_token_data', lambda *args: loads.append(args) or original_load(*args))
+    for _ in range(1000):
+        assert manager.get_credentials(PROFILE, 'office@example.com') is first
+
+    # An hour from expiry is no reason to refresh
+    assert loads == [] and endpoint.calls == []
+
+    store_token(manager, 'office@example.com', timedelta(hours=1))
+    assert manager.get_credentials(PROFILE, 'office@example.com') is not first
+    assert len(loads) == 1
+
+
+def test_concurrent_callers_share_one_refresh(manager, endpoint):
+    store_token(manager, 'office@example.com', timedelta(hours=-1))
+    endpoint.latency['office@example.com'] = 0.3
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_credentials(PROFILE, 'office@example.com')))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert endpoint.calls == ['office@example.com']
+    assert len(results) == 8 and all(creds is results[0] and creds.valid for creds in results)
+
+
+def test_failed_refresh_is_shared_and_not_cached(manager, endpoint):
+    store_token(manager, 'revoked@example.com', timedelta(hours=-1))
+    endpoint.rejected.add('revoked@example.com')
+    endpoint.latency['revoked@example.com'] = 0.2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_credentials(PROFILE, 'revoked@example.com')))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [None] * 4
+    assert endpoint.calls == ['revoked@example.com']
+    assert f"{PROFILE}:revoked@example.com" in manager._failed_refreshes
+
+    # Later callers try again
+    assert manager.get_credentials(PROFILE, 'revoked@example.com') is None
+    assert len(endpoint.calls) == 2
+
+
+def test_forced_refresh_does_not_share_an_unforced_load(manager, endpoint):
+    store_token(manager, 'office@example.com', timedelta(hours=-1))
+    endpoint.latency['office@example.com'] = 0.3
+
+    unforced = threading.Thread(target=manager.get_credentials, args=(PROFILE, 'office@example.com'))
+    unforced.start()
+    assert endpoint.started.setdefault('office@example.com', threading.Event()).wait(2)
+
+    # Waiting on an ordinary refresh: a forced caller still gets a token of its own
+    results = []
+    forced = [threading.Thread(target=lambda: results.append(
+        manager.get_credentials(PROFILE, 'office@example.com', force_refresh=True))) for _ in range(3)]
+    for thread in forced:
+        thread.start()
+    for thread in [unforced] + forced:
+        thread.join()
+
+    # ...but concurrent forced callers share one forced refresh
+    assert endpoint.calls == ['office@example.com'] * 2
+    assert all(creds is results[0] and creds.token == 'access-office@example.com-2' for creds in results)
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+def test_slow_refresh_does_not_stall_other_accounts(manager, endpoint):
+    fresh = [f"mailbox{i}@example.com" for i in range(5)]
+    for email in fresh:
+        store_token(manager, email, timedelta(hours=1))
+    store_token(manager, 'slow@example.com', timedelta(hours=-1))
+    store_token(manager, 'expired@example.com', timedelta(hours=-1))
+    endpoint.latency.update({'slow@example.com': 1.5, 'expired@example.com': 0.05})
+
+    slow = threading.Thread(target=manager.get_credentials, args=(PROFILE, 'slow@example.com'))
+    slow.start()
+    assert endpoint.started.setdefault('slow@example.com', threading.Event()).wait(2)
+
+    latencies = {}
+
+    def hammer(email, calls):
+        start = time.perf_counter()
+        for _ in range(calls):
+            assert manager.get_credentials(PROFILE, email).valid
+        latencies[email] = time.perf_counter() - start
+
+    others = [threading.Thread(target=hammer, args=(email, 200)) for email in fresh]
+    others.append(threading.Thread(target=hammer, args=('expired@example.com', 1)))
+    for thread in others:
+        thread.start()
+    for thread in others:
+        thread.join()
+    slow_still_running = slow.is_alive()
+    slow.join()
+
+    print(f"\nwhile a 1.5s refresh ran: 200 calls on each of 5 accounts in at most "
+          f"{max(latencies[email] for email in fresh) * 1000:.1f}ms, "
+          f"another account refreshed in {latencies['expired@example.com'] * 1000:.0f}ms")
+    assert slow_still_running
+    assert max(latencies[email] for email in fresh) < 0.25
+    assert latencies['expired@example.com'] < 0.5
+
+
+def test_schedule_pops_due_accounts_in_deadline_order():
+    clock = FakeClock()
+    schedule = RefreshSchedule(time_fn=clock)
+    schedule.schedule('a', clock.now + 30)
+    schedule.schedule('b', clock.now + 10)
+    schedule.schedule('c', clock.now + 20)
+    schedule.schedule('b', clock.now + 40)  # Refreshed on the request path: moved later
+    schedule.schedule('d', float('inf'))
+
+    assert len(schedule) == 3 and schedule.next_deadline() == clock.now + 20
+    assert schedule.pop_due() == []
+    clock.now += 35
+    assert schedule.pop_due() == ['c', 'a']
+    assert schedule.pop_due(clock.now + 5) == ['b']
+    assert len(schedule) == 0 and schedule.next_deadline() is None
+
+
+def test_schedule_wait_wakes_for_an_earlier_deadline():
+    schedule = RefreshSchedule()
+    schedule.schedule('later', time.time() + 3600)
+    waiter = threading.Thread(target=schedule.wait, args=(10,))
+    start = time.perf_counter()
+    waiter.start()
+    time.sleep(0.05)
+    schedule.schedule('soon', time.time())
+    waiter.join(2)
+    assert not waiter.is_alive() and time.perf_counter() - start < 1
+
+
+def test_only_due_tokens_are_touched(manager, endpoint, monkeypatch):
+    for i in range(300):
+        store_token(manager, f"mailbox{i}@example.com", timedelta(hours=1))
+    due = ['mailbox7@example.com', 'mailbox150@example.com', 'mailbox299@example.com']
+    for email in due:
+        store_token(manager, email, timedelta(hours=-1))
+    manager._schedule_all_tokens()
+    assert len(manager._refresh_schedule) == 300
+
+    loads = []
+    original_load = manager._load_token_data
+    monkeypatch.setattr(manager, '_load_token_data', lambda *args: loads.append(args) or original_load(*args))
+    for profile_key in manager._refresh_schedule.pop_due():
+        assert manager._background_refresh(profile_key)
+
+    assert sorted(endpoint.calls) == sorted(due)
+    assert sorted(email for _, email in loads) == sorted(due)
+    # Rescheduled ahead of the new expiry, and served from memory in the meantime
+    expected = time.time() + 3600 - (manager.expiry_margin + manager.refresh_lead).total_seconds()
+    assert manager._refresh_schedule.deadline(f"{PROFILE}:{due[0]}") == pytest.approx(expected, abs=5)
+    assert manager._refresh_schedule.pop_due() == []
+    assert manager.get_credentials(PROFILE, due[0]).token.startswith(f"access-{due[0]}-")
+    assert len(endpoint.calls) == 3 and len(loads) == 3
+
+
+def test_failed_background_refresh_is_retried_later(manager, endpoint):
+    store_token(manager, 'revoked@example.com', timedelta(hours=-1))
+    endpoint.rejected.add('revoked@example.com')
+    manager._schedule_all_tokens()
+
+    assert manager._refresh_schedule.pop_due() == [f"{PROFILE}:revoked@example.com"]
+    assert not manager._background_refresh(f"{PROFILE}:revoked@example.com")
+    retry_at = manager._refresh_schedule.deadline(f"{PROFILE}:revoked@example.com")
+    assert retry_at == pytest.approx(time.time() + manager.failure_retry_delay.total_seconds(), abs=5)
+
+
+def test_background_monitor_refreshes_just_ahead_of_expiry(tmp_path, endpoint):
+    manager = EnhancedTokenManager(str(tmp_path))
+    # Token is valid for 300s; refresh due in half a second
+    manager.expiry_margin = timedelta(seconds=299.5)
+    manager.refresh_lead = timedelta(0)
+    store_token(manager, 'office@example.com', timedelta(seconds=300))
+    start = time.perf_counter()
+    assert manager.get_credentials(PROFILE, 'office@example.com').token == 'access-office@example.com'
+
+    deadline = time.perf_counter() + 5
+    while not endpoint.calls and time.perf_counter() < deadline:
+        time.sleep(0.02)
+    assert endpoint.calls == ['office@example.com']
+    assert 0.4 < time.perf_counter() - start < 2
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+def test_monitor_wakeup_cost_does_not_grow_with_mailboxes(manager):
+    for i in range(500):
+        store_token(manager, f"mailbox{i}@example.com", timedelta(hours=1))
+
+    start = time.perf_counter()
+    for profile_name, email_address, _ in manager._iter_token_files():
+        manager._build_credentials(manager._load_token_data(profile_name, email_address))
+    sweep_seconds = time.perf_counter() - start
+
+    manager._schedule_all_tokens()
+    start = time.perf_counter()
+    for _ in range(1000):
+        assert manager._refresh_schedule.pop_due() == []
+    wakeup_seconds = (time.perf_counter() - start) / 1000
+
+    print(f"\n500 mailboxes: full sweep {sweep_seconds * 1000:.1f}ms, scheduler wakeup {wakeup_seconds * 1e6:.1f}us")
+    assert wakeup_seconds * 100 < sweep_seconds
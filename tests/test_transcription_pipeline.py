@@ -0,0 +1,126 @@
+import asyncio
+import io
+import os
+import time
+import wave
+
+import pytest
+
+from src.transcription_pipeline import (
+    AudioBuffer, FakeTranscriptionEngine, combine_chunk_results, race_transcriptions, transcribe_chunks
+)
+
+
+def make_wav(seconds, rate=8000):
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(b'\x00\x01' * int(rate * seconds))
+    return out.getvalue()
+
+
+def counting_loader(content, delay=0.0):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return content
+    return load, calls
+
+
+@pytest.mark.asyncio
+async def test_race_returns_first_confident_engine_and_cancels_the_rest():
+    load, downloads = counting_loader(b'audio', delay=0.01)
+    audio = AudioBuffer(loader=load)
+    slow = FakeTranscriptionEngine('google', 'slow but sure', confidence=0.95, latency=1.0)
+    fast = FakeTranscriptionEngine('whisper', 'quick answer', confidence=0.85, latency=0.01)
+
+    start = time.perf_counter()
+    result = await race_transcriptions([('google', slow), ('whisper', fast)], audio, 0.7)
+
+    assert result['engine'] == 'whisper'
+    assert time.perf_counter() - start < 0.5
+    assert slow.cancelled == 1
+    assert len(downloads) == 1
+
+
+@pytest.mark.asyncio
+async def test_race_keeps_best_result_below_threshold_and_survives_failures():
+    audio = AudioBuffer(b'audio')
+    engines = [
+        ('google', FakeTranscriptionEngine('google', fail=True)),
+        ('whisper', FakeTranscriptionEngine('whisper', 'mumbled', confidence=0.6, latency=0.02)),
+        ('other', FakeTranscriptionEngine('other', 'worse', confidence=0.4)),
+    ]
+    result = await race_transcriptions(engines, audio, 0.7)
+    assert result == {'text': 'mumbled', 'confidence': 0.6, 'engine': 'whisper'}
+
+    timed_out = await race_transcriptions(
+        [('stuck', FakeTranscriptionEngine('stuck', 'never', latency=5))], audio, 0.7, timeout=0.05)
+    assert timed_out['engine'] == 'timeout'
+
+
+@pytest.mark.asyncio
+async def test_shared_temp_file_is_written_once_and_cleaned_up():
+    audio = AudioBuffer(b'audio', suffix='.mp3')
+    path = await audio.as_file()
+    assert await audio.as_file() == path and path.endswith('.mp3')
+    audio.cleanup()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.asyncio
+async def test_long_wav_is_streamed_in_order_with_early_first_chunk():
+    audio = AudioBuffer(make_wav(100))
+    chunks = await audio.split(30)
+    assert [round(chunk.offset_seconds) for chunk in chunks] == [0, 30, 60, 90]
+    assert [round(chunk.wav_info()[1]) for chunk in chunks] == [30, 30, 30, 10]
+
+    engine = FakeTranscriptionEngine('fake', lambda chunk: f"part {chunk.offset_seconds:.0f}", latency=0.1)
+    start = time.perf_counter()
+    arrivals, results = [], []
+    async for result in transcribe_chunks(chunks, engine, lookahead=2):
+        arrivals.append(time.perf_counter() - start)
+        results.append(result)
+
+    assert [result['text'] for result in results] == ['part 0', 'part 30', 'part 60', 'part 90']
+    # First text arrives early; two chunks in flight beat one-at-a-time
+    assert arrivals[0] < arrivals[-1] * 0.75
+    assert arrivals[-1] < 0.35
+    combined = combine_chunk_results(results)
+    assert combined['text'] == 'part 0 part 30 part 60 part 90' and combined['chunks'] == 4
+
+    # Non-WAV or short audio is not split
+    mp3 = AudioBuffer(b'ID3mp3data', suffix='.mp3')
+    assert await mp3.split(30) == [mp3]
+    short = AudioBuffer(make_wav(5))
+    assert await short.split(30) == [short]
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_racing_latency_benchmark():
+    """Sequential fallback chain vs concurrent race with network-free engines"""
+    def engines():
+        return [('google', FakeTranscriptionEngine('google', 'unclear', confidence=0.5, latency=0.15)),
+                ('whisper', FakeTranscriptionEngine('whisper', 'clear message', confidence=0.85, latency=0.1))]
+
+    start = time.perf_counter()
+    best = None
+    for _, engine in engines():
+        result = await engine(AudioBuffer(b'audio'))
+        if best is None or result['confidence'] > best['confidence']:
+            best = result
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    raced = await race_transcriptions(engines(), AudioBuffer(b'audio'), 0.7)
+    concurrent = time.perf_counter() - start
+
+    print(f"\nTranscription: sequential {sequential * 1000:.0f}ms, raced {concurrent * 1000:.0f}ms")
+    assert raced == best
+    assert concurrent < sequential
@@ -0,0 +1,125 @@
+import asyncio
+import os
+
+import pytest
+
+from src.tts_audio_cache import TTSAudioCache, content_key
+
+
+def test_lru_eviction_keeps_within_byte_budget(tmp_path):
+    cache = TTSAudioCache(tmp_path, max_bytes=250)
+    for name in ('a', 'b', 'c'):
+        cache.put(name, b'x' * 100)
+
+    # 'a' was evicted; touching 'b' makes 'c' the next victim
+    assert cache.get('a') is None
+    assert cache.get('b')
+    cache.put('d', b'y' * 100)
+
+    assert cache.get('c') is None
+    assert {name for name in ('b', 'd') if cache.get(name)} == {'b', 'd'}
+    assert cache.total_bytes == 200
+    assert sorted(os.listdir(tmp_path)) == ['b.mp3', 'd.mp3']
+    assert cache.get_stats()['evictions'] == 2
+
+
+def test_index_is_rebuilt_from_disk_and_ages_out(tmp_path):
+    now = [1000.0]
+    cache = TTSAudioCache(tmp_path, time_fn=lambda: now[0])
+    key = content_key("Hello", "voice", "model")
+    path = cache.put(key, b'audio')
+    (tmp_path / 'stale.mp3.123.tmp').write_bytes(b'partial')
+
+    reloaded = TTSAudioCache(tmp_path, max_age_seconds=60, time_fn=lambda: now[0])
+    assert reloaded.get(key) == path
+    assert not (tmp_path / 'stale.mp3.123.tmp').exists()
+
+    reloaded._index[key].created_at = now[0] - 120
+    assert reloaded.get(key) is None
+    assert not os.path.exists(path)
+
+
+def test_pins_survive_a_restart(tmp_path):
+    now = [1000.0]
+    cache = TTSAudioCache(tmp_path, time_fn=lambda: now[0])
+    cache.put('segment', b's' * 100, pinned=True)
+    cache.put('reply', b'r' * 100)
+    cache.get('reply', pin=True)
+    cache.put('other', b'o' * 100)
+    cache.remove('reply')
+
+    now[0] += 1000
+    reloaded = TTSAudioCache(tmp_path, max_bytes=150, max_age_seconds=60, time_fn=lambda: now[0])
+    assert reloaded.get('segment')
+    assert reloaded.get('other') is None
+    assert reloaded.get_stats()['pinned'] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_generation(tmp_path):
+    cache = TTSAudioCache(tmp_path)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b'audio'
+
+    paths = await asyncio.gather(*(cache.get_or_generate('k', generate) for _ in range(5)))
+    assert len(set(paths)) == 1 and len(calls) == 1
+    assert await cache.get_or_generate('k', generate) == paths[0]
+
+    stats = cache.get_stats()
+    assert (stats['misses'], stats['deduplicated'], stats['hits']) == (1, 4, 1)
+    assert stats['bytes_saved'] == len(b'audio')
+
+
+@pytest.mark.asyncio
+async def test_prefetched_ivr_prompts_hit_cache(tmp_path, monkeypatch):
+    from src.elevenlabs_voice_handler import ElevenLabsVoiceHandler
+
+    handler = ElevenLabsVoiceHandler(api_key="test", cache_dir=str(tmp_path))
+    synthesized = []
+
+    async def fake_generate(text, voice_profile, emotion=None):
+        synthesized.append(text)
+        return f"mp3:{text}".encode()
+
+    monkeypatch.setattr(handler, '_generate_audio', fake_generate)
+    summary = await handler.pre_generate_common_phrases()
+    assert summary['rendered'] == summary['total'] == len(synthesized)
+
+    prompts = [
+        handler.get_voice_for_menu_option('plumbing services', '1'),
+        handler.get_voice_for_menu_option('billing questions', 5),
+        handler.get_personalized_greeting(time_of_day='evening'),
+        handler.get_personalized_greeting(),
+        handler.generate_voice_for_context(handler.common_phrases['transferring'], 'general'),
+    ]
+    assert all(await asyncio.gather(*prompts))
+    assert len(synthesized) == summary['total']
+
+    stats = handler.get_usage_stats()
+    assert stats['cache_hits'] == 5
+    assert stats['bytes_saved'] > 0 and stats['cost_saved_estimate'] > 0
+
+
+@pytest.mark.asyncio
+async def test_audio_urls_reuse_one_handler(tmp_path, monkeypatch):
+    import src.elevenlabs_voice_handler as elevenlabs
+
+    monkeypatch.setenv('ELEVENLABS_API_KEY', 'test')
+    monkeypatch.setenv('ELEVENLABS_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(elevenlabs, '_shared_voice_handler', None)
+
+    async def fake_generate(self, text, voice_profile, emotion=None):
+        return f"mp3:{text}".encode()
+
+    monkeypatch.setattr(elevenlabs.ElevenLabsVoiceHandler, '_generate_audio', fake_generate)
+    first = await elevenlabs.get_elevenlabs_audio_url("Please hold.", 'queue')
+    handler = elevenlabs._shared_voice_handler
+    second = await elevenlabs.get_elevenlabs_audio_url("Please hold.", 'queue')
+
+    assert first == second and first.endswith('.mp3')
+    assert elevenlabs._shared_voice_handler is handler
+    assert handler.get_usage_stats()['cache_hits'] == 1
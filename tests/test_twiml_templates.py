@@ -0,0 +1,145 @@
+import time
+
+import pytest
+
+pytest.importorskip("twilio")
+
+from twilio.twiml.voice_response import VoiceResponse
+
+from src.twiml_templates import TwiMLTemplate, TwiMLTemplateCache, field
+from src.voice_ivr_system import VoiceIVRSystem
+
+
+def twiml_bytes(response):
+    return str(response).encode('utf-8')
+
+
+@pytest.fixture
+def ivr():
+    return VoiceIVRSystem()
+
+
+@pytest.fixture
+def voice_handler():
+    pytest.importorskip("fastapi")
+    from src.voice_webhook_handler import VoiceWebhookHandler
+    return VoiceWebhookHandler(use_redis=False)
+
+
+def test_fields_are_escaped_like_the_builder():
+    def build(action):
+        response = VoiceResponse()
+        response.say("Leave a message after the tone.", voice='Polly.Joanna')
+        response.redirect(action)
+        response.play(action)
+        return response
+
+    template = TwiMLTemplate(build(field('action')))
+    assert template.fields == ('action', 'action')
+    for action in ['/voice/voicemail?type=general', '/voice/a?x=1&y="2"<3>\n', 'é/日本']:
+        assert template.render(action=action) == twiml_bytes(build(action))
+
+
+def test_cache_compiles_each_variant_once():
+    builds = []
+
+    def build(**fields):
+        builds.append(fields)
+        response = VoiceResponse()
+        response.say("Hello")
+        return response
+
+    cache = TwiMLTemplateCache(max_templates=2)
+    for _ in range(3):
+        cache.render(('a',), build)
+        cache.render(('b',), build)
+    assert len(builds) == 2 and len(cache) == 2
+
+    cache.render(('c',), build)
+    assert len(cache) == 1
+
+
+def test_ivr_menu_steps_match_builders(ivr):
+    for menu_name, menu in ivr.menus.items():
+        for digits, option in menu['options'].items():
+            result = ivr.process_input(f"CA-{menu_name}-{digits}", "+15550001", digits=digits, current_menu=menu_name)
+            assert result['twiml'] == twiml_bytes(ivr._generate_action_response(option))
+
+        # Progressive help, then the operator
+        call_sid = f"CA-{menu_name}-invalid"
+        for attempts in (1, 2, 3):
+            result = ivr.process_input(call_sid, "+15550001", digits="8", current_menu=menu_name)
+            expected = ivr._invalid_input_response(menu_name, attempts >= 3, attempts == 1)
+            assert result['twiml'] == twiml_bytes(expected)
+        assert result['action'] == 'transfer'
+
+    assert ivr.render_main_menu_twiml("CA1", "+15550001") == twiml_bytes(ivr.generate_main_menu_twiml("CA1", "+15550001"))
+    assert ivr.render_hours_info() == twiml_bytes(ivr.generate_hours_info())
+
+
+def test_webhook_responses_match_builders(voice_handler):
+    for is_business_hours in (True, False):
+        assert (voice_handler.render_twiml(('incoming', is_business_hours),
+                                           lambda: voice_handler.generate_incoming_call(is_business_hours))
+                == twiml_bytes(voice_handler.generate_incoming_call(is_business_hours)))
+
+    for active_calls in range(12):
+        assert (voice_handler.render_transfer_to_human('support', active_calls)
+                == twiml_bytes(voice_handler.generate_transfer_to_human('support', active_calls)))
+
+    for message_type in ('general', 'emergency', 'callback&priority="high"'):
+        assert (voice_handler.render_voicemail_flow(message_type)
+                == twiml_bytes(voice_handler.generate_voicemail_flow(message_type)))
+
+
+def test_webhook_templates_follow_premium_audio(voice_handler):
+    voice_handler.__dict__['elevenlabs_handler'] = object()
+    render = lambda: voice_handler.render_twiml(('voicemail_received', False),
+                                                lambda: voice_handler.generate_voicemail_received(False))
+    assert b'<Say' in render()
+
+    # Audio finished fetching in the background
+    text = "Thank you for your message. We'll return your call within 4 hours during business days. Have a great day!"
+    voice_handler._voice_audio_urls[('thank_you', text)] = "https://example.com/thanks.mp3"
+    voice_handler._voice_audio_version += 1
+    assert render() == b'<?xml version="1.0" encoding="UTF-8"?><Response><Play>https://example.com/thanks.mp3</Play></Response>'
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+def test_template_render_is_cheaper_than_building(ivr, voice_handler):
+    steps = [('main', '1'), ('scheduling', '9'), ('main', '2'), ('quotes', '3'), ('main', '8')]
+    requests = 2000
+
+    def builder_path(i):
+        twiml_bytes(voice_handler.generate_incoming_call(i % 2 == 0))
+        menu_name, digits = steps[i % len(steps)]
+        option = ivr.menus[menu_name]['options'].get(digits)
+        twiml_bytes(ivr._generate_action_response(option) if option
+                    else ivr._invalid_input_response(menu_name, False, True))
+        twiml_bytes(voice_handler.generate_voicemail_flow('general'))
+
+    def template_path(i):
+        is_business_hours = i % 2 == 0
+        voice_handler.render_twiml(('incoming', is_business_hours),
+                                   lambda: voice_handler.generate_incoming_call(is_business_hours))
+        menu_name, digits = steps[i % len(steps)]
+        option = ivr.menus[menu_name]['options'].get(digits)
+        if option:
+            ivr.twiml_templates.render(('action', option['action'], option['target']),
+                                       lambda: ivr._generate_action_response(option))
+        else:
+            ivr.twiml_templates.render(('invalid', menu_name, False, True),
+                                       lambda: ivr._invalid_input_response(menu_name, False, True))
+        voice_handler.render_voicemail_flow('general')
+
+    timings = {}
+    for name, path in (('builder', builder_path), ('template', template_path)):
+        start = time.perf_counter()
+        for i in range(requests):
+            path(i)
+        timings[name] = (time.perf_counter() - start) / requests
+
+    print(f"\nper-request TwiML: builder {timings['builder'] * 1e6:.1f}us, "
+          f"template {timings['template'] * 1e6:.1f}us")
+    assert timings['template'] * 5 < timings['builder']
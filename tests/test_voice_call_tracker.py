@@ -0,0 +1,135 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from src.voice_call_tracker import CallOutcome, CallStatus, CallTracker
+
+
+@pytest.fixture
+def tracker():
+    return CallTracker(redis_client=fakeredis.FakeRedis(decode_responses=True))
+
+
+def seed_calls(tracker, count, now, days=60, callers=500):
+    """Write `count` call records spread over `days`, laid out as start_call stored them before the caller hash"""
+    pipe = tracker.redis_client.pipeline(transaction=False)
+    for i in range(count):
+        started = now - timedelta(seconds=i * days * 86400 // count)
+        caller_id = f"+1555{i % callers:07d}"
+        call_sid = f"CA{i:08d}"
+        pipe.hset(f"call:{call_sid}", mapping={
+            'call_sid': call_sid, 'caller_id': caller_id, 'status': 'completed',
+            'start_time': started.isoformat(), 'call_quality': (i % 10) / 10
+        })
+        pipe.zadd(tracker.CALLS_BY_START, {call_sid: started.timestamp()})
+        pipe.zadd(f"{tracker.CUSTOMER_CALLS_PREFIX}{tracker._hash_phone(caller_id)}",
+                  {call_sid: started.timestamp()})
+        if i % 5000 == 4999:
+            pipe.execute()
+    pipe.execute()
+
+
+def legacy_cleanup(tracker, days_to_keep):
+    """Reference: the original SCAN + per-key HGET retention pass"""
+    cutoff_date = datetime.now() - timedelta(days=days_to_keep)
+    old_keys = [key for key in tracker.redis_client.scan_iter(match="call:*")
+                if datetime.fromisoformat(tracker.redis_client.hget(key, 'start_time')) < cutoff_date]
+    return old_keys
+
+
+def test_call_lifecycle_is_indexed(tracker):
+    tracker.start_call("CA1", "+15551234567", "+17575550000")
+    tracker.track_ivr_navigation("CA1", "scheduling", ["main_menu", "scheduling"])
+    tracker.update_call_status("CA1", CallStatus.COMPLETED, {'call_quality': 0.95})
+    tracker.set_call_outcome("CA1", CallOutcome.COMPLETED_IVR, satisfaction_score=4, follow_up_required=True)
+
+    details = tracker.get_call_details("CA1")
+    assert details['menu_path'] == ["main_menu", "scheduling"]
+    assert details['follow_up_required'] == 'True'
+    assert tracker.redis_client.zscore(tracker.CALLS_BY_START, "CA1") is not None
+    assert tracker.get_active_call_count() == 0
+
+    summary = tracker.get_analytics_summary(days=1)
+    assert summary['call_quality_distribution'] == {'excellent': 1}
+    assert sum(summary['peak_hours'].values()) == 1
+
+
+def test_history_newest_first_and_prunes_expired(tracker):
+    for i in range(3):
+        tracker.start_call(f"CA{i}", "+15551234567", "+17575550000")
+    tracker.redis_client.delete("call:CA1")
+
+    history = tracker.get_customer_call_history("+15551234567", limit=10)
+    assert [call['call_sid'] for call in history] == ["CA2", "CA0"]
+    customer_key = f"{tracker.CUSTOMER_CALLS_PREFIX}{tracker._hash_phone('+15551234567')}"
+    assert tracker.redis_client.zrange(customer_key, 0, -1) == ["CA0", "CA2"]
+
+
+def test_cleanup_removes_only_old_calls_in_batches(tracker):
+    tracker.BATCH_SIZE = 7
+    now = datetime.now()
+    seed_calls(tracker, 100, now, days=60, callers=3)
+
+    expected = set(legacy_cleanup(tracker, 30))
+    assert tracker.cleanup_old_data(days_to_keep=30) == len(expected) > 0
+    assert not any(tracker.redis_client.exists(key) for key in expected)
+    assert tracker.redis_client.zcard(tracker.CALLS_BY_START) == 100 - len(expected)
+
+    cutoff = (now - timedelta(days=30)).timestamp()
+    for i in range(3):
+        customer_key = f"{tracker.CUSTOMER_CALLS_PREFIX}{tracker._hash_phone(f'+1555{i:07d}')}"
+        assert tracker.redis_client.zcount(customer_key, '-inf', cutoff) == 0
+
+
+def test_cleanup_prunes_history_of_calls_whose_record_expired(tracker):
+    for i in range(3):
+        tracker.start_call(f"CA{i}", "+15551234567", "+17575550000")
+    customer_key = f"{tracker.CUSTOMER_CALLS_PREFIX}{tracker._hash_phone('+15551234567')}"
+    # Two calls from 40 days ago, whose records expired after a day
+    old = (datetime.now() - timedelta(days=40)).timestamp()
+    for call_sid in ("CA0", "CA1"):
+        tracker.redis_client.zadd(tracker.CALLS_BY_START, {call_sid: old})
+        tracker.redis_client.zadd(customer_key, {call_sid: old})
+        tracker.redis_client.delete(f"call:{call_sid}")
+
+    assert tracker.cleanup_old_data(days_to_keep=30) == 2
+    assert tracker.redis_client.zrange(customer_key, 0, -1) == ["CA2"]
+    assert tracker.redis_client.hkeys(tracker.CALL_CALLERS) == ["CA2"]
+
+
+def test_rebuild_index_for_legacy_records(tracker):
+    now = datetime.now()
+    seed_calls(tracker, 20, now, days=2, callers=2)
+    tracker.redis_client.delete(tracker.CALLS_BY_START)
+
+    assert tracker.rebuild_call_index() == 20
+    assert len(tracker.get_calls_between(now - timedelta(days=3), now)) == 20
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+def test_cleanup_and_summary_at_100k_calls():
+    tracker = CallTracker(redis_client=fakeredis.FakeRedis(decode_responses=True))
+    seed_calls(tracker, 100_000, datetime.now(), days=60)
+
+    start = time.perf_counter()
+    expected = len(legacy_cleanup(tracker, 30))
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = tracker.get_analytics_summary(days=7)
+    summary_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    removed = tracker.cleanup_old_data(days_to_keep=30)
+    cleanup_seconds = time.perf_counter() - start
+
+    print(f"\n100k calls: legacy scan {legacy_seconds * 1000:.0f}ms (finding only), "
+          f"indexed cleanup {cleanup_seconds * 1000:.0f}ms ({removed} removed), "
+          f"7-day summary {summary_seconds * 1000:.0f}ms")
+    assert removed == expected
+    assert sum(summary['peak_hours'].values()) == pytest.approx(100_000 * 7 / 60, rel=0.01)
+    assert cleanup_seconds < legacy_seconds
@@ -0,0 +1,160 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.quality_lexicon import PhraseMatcher
+from src.voice_quality_assurance import (
+    CATEGORY_KEYWORDS, CLOSING_RULES, GREETING_RULES, TRANSCRIPT_RULES, VoiceQualityAssurance,
+)
+
+SAMPLE_CALL = '''Agent: Good morning, thank you for calling 757 Handy, this is Karen. How can I help you today?
+Customer: Hi, I have a leaky faucet in my kitchen that's been dripping all night.
+Agent: I understand that must be frustrating. Let me help you get that fixed right away.
+Customer: It's just dripping constantly from the handle area... um, also the price?
+Agent: I see. Let me check our records show a free estimate. Please hold, I'm checking with dispatch.
+Customer: Tomorrow morning would be great.
+Agent: Perfect! You're all set and scheduled. Is there anything else I can help you with today?
+Customer: No, that's everything. Thank you so much!
+Agent: You're very welcome! We'll follow up tomorrow. Have a wonderful day!'''
+
+VOCABULARY = sorted({
+    phrase.lower()
+    for rules in (TRANSCRIPT_RULES, GREETING_RULES, CLOSING_RULES)
+    for phrases in rules.values() for phrase in phrases
+} | {keyword for keywords in CATEGORY_KEYWORDS.values() for keyword in keywords} | {
+    'premier home improvement experts', 'certainly', 'whatever', 'no problem', 'customer', 'also',
+    'the', 'faucet', 'gas', '....', 'thanks', 'hmm', 'agent:', 'customer:', '\n'
+})
+
+
+def random_transcript(rng):
+    words = []
+    for _ in range(rng.randint(0, 80)):
+        word = rng.choice(VOCABULARY)
+        words.append(word.upper() if rng.random() < 0.05 else word)
+    text = ' '.join(words)
+    return text.replace(' \n ', '\nAgent: ' if rng.random() < 0.5 else '\nCustomer: ')
+
+
+@pytest.fixture
+def qa():
+    return VoiceQualityAssurance(use_redis=False)
+
+
+async def legacy_analysis(qa, transcription):
+    """Reference: the original chain of per-rule passes"""
+    return {
+        'category': qa._categorize_call(transcription, {}),
+        'conversation': await qa._analyze_conversation(transcription),
+        'compliance': qa._check_compliance(transcription, {}),
+        'brand': qa._evaluate_brand_adherence(transcription),
+        'customer_experience': qa._assess_customer_experience(transcription, {}),
+    }
+
+
+def test_phrase_matcher_counts_like_str_count():
+    phrases = ['so', 'also', 'als', '...', 'um', 'customer', 'a', 'ab', 'abc',
+               'so al', 'a b c', 'um. x', 'x ', ' so']
+    matcher = PhraseMatcher(phrases)
+    rng = random.Random(3)
+    for _ in range(2000):
+        text = ''.join(rng.choice('also.umcbx  ') for _ in range(rng.randint(0, 60)))
+        expected = {phrase: text.count(phrase) for phrase in phrases if phrase in text}
+        assert matcher.count(text) == expected
+
+
+@pytest.mark.asyncio
+async def test_single_pass_matches_per_rule_methods(qa):
+    rng = random.Random(7)
+    transcripts = [SAMPLE_CALL, '', 'no colon here', 'Agent: hi'] + [random_transcript(rng) for _ in range(300)]
+    for transcription in transcripts:
+        assert qa._analyze_transcription(transcription) == await legacy_analysis(qa, transcription), transcription
+
+
+@pytest.mark.asyncio
+async def test_batch_scores_store_daily_aggregates_for_report():
+    fakeredis = pytest.importorskip("fakeredis")
+    qa = VoiceQualityAssurance(redis_client=fakeredis.FakeRedis(decode_responses=True))
+    yesterday = datetime.now() - timedelta(days=1)
+    calls = [
+        {'call_sid': f"CA{i}", 'agent_id': f"agent_{i % 2}", 'call_duration': 120,
+         'timestamp': yesterday if i % 3 else datetime.now(),
+         'transcription': SAMPLE_CALL if i % 4 else 'Customer: this is terrible, unacceptable'}
+        for i in range(120)
+    ]
+
+    results = await qa.analyze_calls_batch(calls, max_workers=2)
+    assert [metrics.call_sid for metrics in results] == [call['call_sid'] for call in calls]
+    assert results[1] == qa.score_call(calls[1])
+
+    report = await qa.generate_quality_report('2d')
+    summary = report['summary']
+    assert summary['total_calls_analyzed'] == 120
+    assert sum(summary['quality_distribution'].values()) == 120
+    expected_average = sum(metrics.overall_quality.value for metrics in results) / 120
+    assert summary['average_quality_score'] == round(expected_average, 2)
+    assert sum(report['trends']['daily_calls'].values()) == 120
+    assert report['top_issues'][0]['count'] > 0
+
+    agent_report = await qa.generate_quality_report('7d', agent_id='agent_0')
+    assert agent_report['summary']['total_calls_analyzed'] == 60
+
+    stored = qa.redis_client.hgetall('quality_metrics:CA1')
+    assert stored['overall_quality'] == str(results[1].overall_quality.value)
+    assert stored['first_call_resolution'] == 'True'
+
+
+@pytest.mark.asyncio
+async def test_rescoring_a_call_replaces_its_aggregates():
+    fakeredis = pytest.importorskip("fakeredis")
+    qa = VoiceQualityAssurance(redis_client=fakeredis.FakeRedis(decode_responses=True))
+    good = {'call_sid': 'CA1', 'agent_id': 'agent_0', 'call_duration': 120, 'timestamp': datetime.now(),
+            'transcription': SAMPLE_CALL}
+    bad = dict(good, transcription='Customer: this is terrible, unacceptable')
+
+    await qa.analyze_calls_batch([good, dict(good, call_sid='CA2')])
+    await qa.analyze_call_recording(good)
+    report = await qa.generate_quality_report('24h')
+    assert report['summary']['total_calls_analyzed'] == 2
+    assert qa.redis_client.llen(f"daily_quality:{datetime.now():%Y-%m-%d}") == 2
+
+    # A re-score with a different outcome moves the call to its new bucket
+    rescored = await qa.analyze_call_recording(bad)
+    summary = (await qa.generate_quality_report('24h', agent_id='agent_0'))['summary']
+    expected = {qa.score_call(good).overall_quality.name: 1}
+    expected[rescored.overall_quality.name] = expected.get(rescored.overall_quality.name, 0) + 1
+    assert summary['total_calls_analyzed'] == 2
+    assert summary['quality_distribution'] == expected
+
+
+@pytest.mark.asyncio
+async def test_report_without_redis_is_empty(qa):
+    report = await qa.generate_quality_report('24h')
+    assert report['summary']['total_calls_analyzed'] == 0
+    assert 'error' in await qa.generate_quality_report('soon')
+
+
+@pytest.mark.performance
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_single_pass_is_faster_than_per_rule_passes(qa):
+    rng = random.Random(11)
+    turns = SAMPLE_CALL.split('\n')
+    # 60-turn calls (~5KB, a ten minute conversation) assembled from real turns
+    transcripts = ['\n'.join(rng.choice(turns) for _ in range(60)) for _ in range(300)]
+
+    start = time.perf_counter()
+    for transcription in transcripts:
+        await legacy_analysis(qa, transcription)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for transcription in transcripts:
+        qa._analyze_transcription(transcription)
+    single_pass_seconds = time.perf_counter() - start
+
+    print(f"\n300 calls: per-rule passes {legacy_seconds * 1000:.0f}ms, "
+          f"single pass {single_pass_seconds * 1000:.0f}ms")
+    assert single_pass_seconds < legacy_seconds
@@ -224,6 +224,16 @@ class TestAdvancedVoiceTranscriptionHandler:
                 assert result['text'] == 'high quality'
                 assert result['confidence'] == 0.9
 
+    @pytest.mark.asyncio
+    async def test_transcribe_audio_downloads_once_for_all_engines(self, advanced_handler):
+        """Test engines race on a single shared download"""
+        with patch.object(advanced_handler, '_download_audio', return_value=b"audio data") as mock_download:
+            result = await advanced_handler._transcribe_audio("http://test.com/audio.mp3")
+
+            assert result['engine'] in ('google', 'whisper')
+            assert result['confidence'] >= 0.7
+            assert mock_download.await_count == 1
+
     @pytest.mark.asyncio
     async def test_download_audio_success(self, advanced_handler):
         """Test successful audio download"""